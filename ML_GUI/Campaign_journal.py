@@ -0,0 +1,186 @@
+""" Campaign journal
+
+Results of a campaign, appended as they arrive to a JSON-lines file next to the campaign JSON
+(<experiment>_results.json -> <experiment>_results.jsonl). Every experiment is one line, written, flushed and synced to
+the disk before the next experiment is told to the optimizer:
+
+    {"index": 3, "parameters": ["A", 0.06, "B", 2.5, "C1", 0.8, 600, 50], "objectives": [71.2, 0.31],
+     "timestamp": "2024-01-01_T1200", "status": "done"}
+
+The parameters are stored with their types (strings for the discrete variables, numbers otherwise), so resuming a
+campaign does not need literal_eval. Saving a result costs the same for the 1st and the 100th experiment, and a crash can
+at most cut the line being written, which is skipped when the journal is read.
+
+The campaign JSON ({repr(parameters): [objectives, timestamp]}, read by Visualization and by older versions of the
+resume) is produced from the journal by export_legacy, at the end of a campaign or by hand:
+
+    python Campaign_journal.py <experiment>_results.jsonl [<experiment>_results.json]
+
+Author:
+Noël Research Group, Universiteit van Amsterdam (UvA)
+"""
+
+import json
+import os
+import sys
+from ast import literal_eval
+
+JOURNAL_EXTENSION = '.jsonl'
+STATUS_DONE = 'done'
+
+
+def journal_filename(dict_filename):
+    """ Function that gives the journal of a campaign JSON.
+
+    :param dict_filename: str
+        campaign JSON (or journal)
+    :return: str
+    """
+    root, extension = os.path.splitext(dict_filename)
+    return dict_filename if extension == JOURNAL_EXTENSION else root + JOURNAL_EXTENSION
+
+
+def _replace(filename, text):
+    # write next to the file and swap: the file is either the old or the new one, never half written
+    temporary = filename + '.tmp'
+    with open(temporary, 'w') as filepointer:
+        filepointer.write(text)
+        filepointer.flush()
+        os.fsync(filepointer.fileno())
+    os.replace(temporary, filename)
+
+
+class CampaignJournal:
+    """ Append-only journal of the experiments of a campaign. """
+
+    def __init__(self, filename, reset=False):
+        """ Class initialization
+
+        :param filename: str
+            journal (or campaign JSON, the journal is placed next to it)
+        :param reset: boolean
+            True to start a new campaign (the records of a previous campaign with the same name are removed)
+        """
+        self.filename = journal_filename(filename)
+        if reset or not os.path.exists(self.filename):
+            _replace(self.filename, '')
+
+    def append(self, index, parameters, objectives, timestamp, status=STATUS_DONE):
+        """ Function that saves the result of one experiment.
+
+        :param index: int
+            index of the experiment in the campaign
+        :param parameters: list
+            parameters of the experiment (platform format)
+        :param objectives: list
+            the y-value(s) of the experiment
+        :param timestamp: str
+            timestamp of the experiment (name of its data files)
+        :param status: str
+            'done' for the experiments told to the optimizer
+        """
+        record = {'index': index, 'parameters': list(parameters), 'objectives': objectives, 'timestamp': timestamp,
+                  'status': status}
+        with open(self.filename, 'a') as filepointer:
+            filepointer.write(json.dumps(record) + '\n')
+            filepointer.flush()
+            os.fsync(filepointer.fileno())
+
+    def records(self):
+        return read_journal(self.filename)
+
+    def rewrite(self, records):
+        """ Function that replaces the journal by the given records (atomically).
+
+        :param records: list
+            records (dict) as returned by read_journal
+        """
+        _replace(self.filename, ''.join(json.dumps(record) + '\n' for record in records))
+
+
+def read_journal(filename):
+    """ Function that reads the experiments of a journal.
+
+    :param filename: str
+        journal
+    :return: list
+        records (dict) of the experiments done, in the order they were saved
+    """
+    records = []
+    with open(filename, 'r') as filepointer:
+        for number, line in enumerate(filepointer, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # last line of a journal cut by a crash
+                print(f'{filename}:{number}: unreadable experiment skipped')
+                continue
+            if record.get('status') == STATUS_DONE:
+                records.append(record)
+    return records
+
+
+def read_legacy(dict_filename):
+    """ Function that reads the experiments of a campaign JSON ({repr(parameters): [objectives, timestamp]}).
+
+    :param dict_filename: str
+    :return: list
+        records (dict) of the experiments, as in a journal
+    """
+    with open(dict_filename, 'r') as filepointer:
+        expts_dict = json.load(filepointer)
+    return [{'index': index, 'parameters': literal_eval(x), 'objectives': y, 'timestamp': timestamp,
+             'status': STATUS_DONE}
+            for index, (x, [y, timestamp]) in enumerate(expts_dict.items(), 1)]
+
+
+def load_campaign(filename):
+    """ Function that reads the experiments of a campaign: from its journal if there is one, otherwise from the
+    campaign JSON.
+
+    :param filename: str
+        campaign JSON or journal
+    :return: list
+        records (dict) of the experiments
+    """
+    journal = journal_filename(filename)
+    if os.path.exists(journal):
+        return read_journal(journal)
+    return read_legacy(filename)
+
+
+def legacy_dict(records):
+    """ Function that converts records to the dictionary of the campaign JSON.
+
+    :param records: list
+    :return: dict
+        repr(parameters): [objectives, timestamp], later experiments with the same parameters replace earlier ones
+    """
+    return {repr(record['parameters']): [record['objectives'], record['timestamp']] for record in records}
+
+
+def export_legacy(filename, dict_filename=None):
+    """ Function that writes the campaign JSON of a journal (atomically).
+
+    :param filename: str
+        journal (or campaign JSON, the journal next to it is read)
+    :param dict_filename: str
+        campaign JSON to write (default: next to the journal)
+    :return: str
+        the campaign JSON written
+    """
+    journal = journal_filename(filename)
+    if dict_filename is None:
+        dict_filename = os.path.splitext(journal)[0] + '.json'
+    _replace(dict_filename, json.dumps(legacy_dict(read_journal(journal)), indent=True))
+    return dict_filename
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    print(export_legacy(*sys.argv[1:3]))
@@ -28,21 +28,31 @@ import numpy as np
 #-----------------------------------------------------------------------------------------------------------------------
 
 
-from Visualization import get_visualization
+from Campaign_journal import CampaignJournal, load_campaign, export_legacy
+from Optimizer_checkpoint import OptimizerCheckpoint, campaign_signature, record_hyperparameters, restore_optimizer, \
+    same_observations
+from Model_update import ModelUpdatePolicy
+from Parallel_acquisition import ParallelAcquisition
+from Feasibility_constraint import FeasibilityConstraint
 from argparse import Namespace
-from dragonfly import load_config
-from dragonfly.exd.experiment_caller import CPFunctionCaller, CPMultiFunctionCaller
-from dragonfly.opt.gp_bandit import CPGPBandit
-from dragonfly.opt.multiobjective_gp_bandit import CPMultiObjectiveGPBandit
-from dragonfly.exd.worker_manager import SyntheticWorkerManager
+# dragonfly (create_optimizer) and the figures (Visualization, in dragonfly_bo) are imported where they are used: the
+# platform worker, the channel and the GUI pages start without them
 
 # Utilities
 import os
 import time
-import pickle
 import json
-from ast import literal_eval
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 import subprocess
+import sys
+
+# messages to the platform (standard library only, shared with Platform_)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Platform_'))
+from Platform_channel.channel import ChannelListener, OptimizerFileChannel, request_message, shutdown_message, \
+    wait_for_result, wait_for_any_result
+from Campaign_store import open_store, campaign_name
 
 
 # Define constants
@@ -54,6 +64,25 @@ FIGURE_NAME_OBJECTIVES = 'figure_objectives.png'
 FIGURE_NAME_HYPERVOLUME = 'figure_hypervolume.png'
 
 TIME_SLEEP = 0.5  # [s] The time to sleep inbetween updating the frontend.
+PLATFORM_CHANNEL = 'connection'  # 'connection' (event driven) or 'file' (input/output pickles)
+PLATFORM_TIMEOUT = None  # [s] Longest wait for the result of an experiment (None: as long as the platform runs)
+BATCH_SIZE = 1  # experiments proposed at once (> 1: batch mode, the batch is queued on the platform)
+ASYNCHRONOUS = False  # True: the next experiment is proposed in a background process while the platform runs
+ACQUISITION_WORKERS = None  # processes maximising the acquisition (None: one per core but one, 0: in the optimizer)
+ACQUISITION_MEMORY = 2000  # [MB] for these processes, caps their number (see Parallel_acquisition)
+# dragonfly options replacing those of create_optimizer, e.g. {'moors_scalarisation': 'tchebychev'} (compared offline
+# with Reaction_simulator.benchmark)
+OPTIMIZER_OPTIONS = {}
+# only samples the liquid handler can prepare with the stock solutions left are proposed (see Feasibility_constraint)
+FEASIBILITY_CONSTRAINT = True
+
+FILENAME_PYTHON_CACHE = os.path.join('..', 'platform_python_cache.json')  # interpreters found with conda
+PLATFORM_PYTHON_ENV = 'ROBOCHEM_PLATFORM_PYTHON'  # explicit interpreter of the platform (skips conda)
+# conda adds every environment it creates to this file: its mtime tells if the cached paths are still valid
+CONDA_ENVIRONMENTS_FILE = os.path.join(os.path.expanduser('~'), '.conda', 'environments.txt')
+
+_python_executables = {}  # env_name: python executable, for this campaign
+
 
 def get_conda_env_path(env_name):
     '''for some reason conda run does not work in subprocess so we try to go directly and
@@ -66,25 +95,157 @@ def get_conda_env_path(env_name):
 
     # get the environment path:
     for line in lines:
-        if env_name in line:
+        if line.split()[:1] == [env_name]:
             # the path is the end of the line
             return line.split()[-1]
     return None
 
+
+def python_in_env(env_path):
+    # Construct path to Python executable
+    python_path = os.path.join(env_path, 'bin', 'python')  # UNIX-like systems
+    if sys.platform == 'win32':
+        python_path = os.path.join(env_path, 'python.exe')  # Windows
+    return python_path
+
+
+def conda_environments_mtime():
+    try:
+        return os.path.getmtime(CONDA_ENVIRONMENTS_FILE)
+    except OSError:
+        return None
+
+
 def get_python_executable(env_name):
+    """ Function that finds the python executable of a conda environment.
+
+    In order: the ROBOCHEM_PLATFORM_PYTHON environment variable, the running interpreter if it belongs to env_name,
+    the path found earlier in this campaign, the path saved in FILENAME_PYTHON_CACHE (valid as long as the conda
+    environments file does not change) and finally 'conda info --envs', which takes seconds.
+
+    :param env_name: str
+        name of the conda environment
+    :return: str
+        path to the python executable, None if the environment was not found
+    """
+    explicit = os.getenv(PLATFORM_PYTHON_ENV, '').strip()
+    if explicit:
+        return explicit
+    if os.path.basename(os.path.normpath(sys.prefix)) == env_name:
+        return sys.executable
+    if env_name in _python_executables:
+        return _python_executables[env_name]
+
+    mtime = conda_environments_mtime()
+    try:
+        with open(FILENAME_PYTHON_CACHE, 'r') as filepointer:
+            cache = json.load(filepointer)
+    except (OSError, ValueError):
+        cache = {}
+    cached = cache.get(env_name)
+    if cached and mtime is not None and cached['environments_mtime'] == mtime \
+            and os.path.exists(cached['python']):
+        _python_executables[env_name] = cached['python']
+        return cached['python']
+
     env_path = get_conda_env_path(env_name)
     if not env_path:
         return None
-    # Construct path to Python executable
-    python_path = subprocess.os.path.join(env_path, 'bin',
-                                          'python')  # UNIX-like systems
-    if subprocess.sys.platform == 'win32':
-        python_path = subprocess.os.path.join(env_path,
-                                              'python.exe')  # Windows
+    python_path = python_in_env(env_path)
+    _python_executables[env_name] = python_path
+    cache[env_name] = {'python': python_path, 'environments_mtime': mtime}
+    try:
+        with open(FILENAME_PYTHON_CACHE, 'w') as filepointer:
+            json.dump(cache, filepointer, indent=True)
+    except OSError:
+        pass  # cached for this campaign only
 
     return python_path
 
 
+# Resident platform process (Platform_/platform_worker.py), started by the first experiment of a campaign
+_platform_worker = None
+_platform_channel = None
+
+
+def start_platform_worker():
+    """ Function that starts the platform worker, unless it is already running.
+
+    The worker connects to the instruments once and then runs every experiment sent through the channel.
+
+    :return: subprocess.Popen
+        the worker process
+    """
+    global _platform_worker, _platform_channel
+    if _platform_worker is None or _platform_worker.poll() is not None:
+        # find executable (32-bit conda environment):
+        executable = get_python_executable('robochem_platform_32bit')
+        cmd_args = [executable, '..\\Platform_\\platform_worker.py']
+        listener = ChannelListener() if PLATFORM_CHANNEL == 'connection' else None
+        # NOTE: shell must be set to True for the command to find the python file
+        # NOTE: the worker stops when its stdin is closed (see stop_platform_worker)
+        _platform_worker = subprocess.Popen(cmd_args,
+                                            stdin=subprocess.PIPE,
+                                            shell=True,
+                                            env=dict(os.environ, **listener.environment()) if listener else None)
+        if listener:
+            _platform_channel = listener.wait_for_platform(alive=lambda: _platform_worker.poll() is None)
+        else:
+            _platform_channel = OptimizerFileChannel(FILENAME_INPUT_PICKLE, FILENAME_OUTPUT_PICKLE, TIME_SLEEP)
+    return _platform_worker
+
+
+def stop_platform_worker(timeout=60):
+    """ Function that stops the platform worker (the devices are disconnected).
+
+    :param timeout: float
+        time to wait for the worker to stop [s]
+    """
+    global _platform_worker, _platform_channel
+    if _platform_worker is None:
+        return
+    worker, _platform_worker = _platform_worker, None
+    channel, _platform_channel = _platform_channel, None
+    try:
+        channel.send(shutdown_message())
+    except OSError:
+        pass  # already stopped
+    channel.close()
+    worker.stdin.close()
+    try:
+        worker.wait(timeout)
+    except subprocess.TimeoutExpired:
+        worker.kill()
+
+
+def print_progress(message):
+    print(f'platform: {message["stage"]}')
+
+
+def request_experiment(index, x, objectives, variables_):
+    """ Function that runs an experiment on the platform and waits for its result.
+
+    :param index: int
+        index to keep track of the current run.
+    :param x: list
+        list with values for each parameter in the parameter space.
+    :param objectives: list
+        objectives of the optimization.
+    :param variables_: list
+        List of the defined variable space.
+    :return: tuple
+        the y-value(s) and the timestamp of the experiment
+    """
+    print([index, x, objectives, variables_])
+    worker = start_platform_worker()
+    request = request_message(index, x, objectives, variables_)
+    _platform_channel.send(request)
+    # woken up by the result (or by the death of the worker)
+    result = wait_for_result(_platform_channel, request, timeout=PLATFORM_TIMEOUT,
+                             alive=lambda: worker.poll() is None, on_progress=print_progress)
+    return result['y'], result['timestamp']
+
+
 def run_platform(index, x, objectives, variables_):
     # """ Function that runs the platform and returns the yield.
     #
@@ -99,41 +260,71 @@ def run_platform(index, x, objectives, variables_):
     # :return: returns the y-value, yield for single objective optimization
     #     or yield and selectivity for multi objective optimization.
     # """
-    # STEP 1: Add the input to a csv file
-    with open(FILENAME_INPUT_PICKLE, 'wb') as filepointer:
-        pickle.dump([index, x, objectives, variables_], filepointer)
-    print([index, x, objectives, variables_] )
-    # STEP 2: Activate the platform
-    # older depreciated os.popen commands commented out
-    # os.popen('..\\Platform_\\venv\\Scripts\\activate && python ..\\Platform_\\run_test.py', 'w')
-    # os.popen('..\\Platform_\\venv\\Scripts\\activate && python ..\\Platform_\\run_platform.py', 'w')
-    # using 32-bit conda environment
-    # run optimization as a separate thread
-    #find executable:
-    executable = get_python_executable('robochem_platform_32bit')
-    # setting up the command 'conda run -n robochem_crossplatform python ..\\ML_GUI\\run_optimization_from_gui.py'
-    # cmd_args = ['conda', 'run', '-n', 'robochem_platform_32bit', 'python', '..\\Platform_\\run_platform.py']
-    cmd_args = [executable, '..\\Platform_\\run_platform.py']
-    # sending the command to a new thread
-    # NOTE: 1. despite online advice shell must be set to True for the command to find the python file
-    # NOTE: 2. the stdin and stdout must be linked to the subprocess.PIPE variable for the command to be sent
-    proc = subprocess.Popen(cmd_args,
-                                # stdin=subprocess.PIPE,
-                                # stdout=subprocess.PIPE,
-                                shell=True)
-
-
-    # STEP 3: Wait for the platform to generate the result
-    # This line of code is constantly being read. The input pickle (x value to platform) contains the new index.
-    # While the platform is running the output pickle (y from platform to BO) has not yet been updated, thus it has the
-    # old index value. Thus we are waiting for the indexes to match, first then can we return the y value!
-    while True:
-        time.sleep(TIME_SLEEP)
-        if os.path.exists(FILENAME_OUTPUT_PICKLE):
-            with open(FILENAME_OUTPUT_PICKLE, 'rb') as filepointer:
-                [index_, x_, y_, timestamp] = pickle.load(filepointer)
-                if index_ == index:
-                    return y_
+    y, timestamp = request_experiment(index, x, objectives, variables_)
+    return y
+
+class PlatformQueue:
+    """ Experiments queued on the platform worker, the results come back as they arrive.
+
+    The worker runs the experiments of the queue one after the other. With the connection channel the whole queue is
+    sent at once, so the platform never waits for the optimizer within a batch; the pickle files hold one request at a
+    time, the next one is sent when the previous result arrives.
+    """
+
+    def __init__(self, objectives, variables_, campaign=None):
+        """ Class initialization
+
+        :param objectives: list
+            objectives of the optimization.
+        :param variables_: list
+            List of the defined variable space.
+        :param campaign: str
+            name of the campaign in the campaign store (None: the experiment name known by the platform)
+        """
+        self.objectives = objectives
+        self.variables = variables_
+        self.campaign = campaign
+        self.waiting = []  # requests not sent yet
+        self.in_progress = {}  # request id: request sent to the platform
+
+    def capacity(self):
+        return 1 if isinstance(_platform_channel, OptimizerFileChannel) else None
+
+    def _send_waiting(self):
+        capacity = self.capacity()
+        while self.waiting and (capacity is None or len(self.in_progress) < capacity):
+            request = self.waiting.pop(0)
+            _platform_channel.send(request)
+            self.in_progress[request['id']] = request
+
+    def submit(self, index, x):
+        """ Function that adds an experiment to the queue.
+
+        :param index: int
+            index to keep track of the current run.
+        :param x: list
+            list with values for each parameter in the parameter space (platform format).
+        """
+        start_platform_worker()
+        self.waiting.append(request_message(index, x, self.objectives, self.variables, self.campaign))
+        self._send_waiting()
+
+    def next_result(self):
+        """ Function that waits for the next experiment of the queue to finish.
+
+        :return: tuple
+            index, x, the y-value(s) and the timestamp of the experiment
+        """
+        worker = _platform_worker
+        result = wait_for_any_result(_platform_channel, list(self.in_progress.values()), timeout=PLATFORM_TIMEOUT,
+                                     alive=lambda: worker.poll() is None, on_progress=print_progress)
+        del self.in_progress[result['id']]
+        self._send_waiting()
+        return result['index'], result['X'], result['y'], result['timestamp']
+
+    def __len__(self):
+        return len(self.waiting) + len(self.in_progress)
+
 
 def transform_variables(variables):
     '''We figured out that the new streamlit passes the variables in the wrong way to bo. here's a little function that should fix it'''
@@ -206,47 +397,40 @@ def format_previous_with_fixed_vars(transformed_vars, output_list):
     input to BO input'''
 
 
-    discrete_vars = [vals['items'] for vals in transformed_vars if vals['type'] == 'discrete']
+    discrete_vars = {item for vals in transformed_vars if vals['type'] == 'discrete' for item in vals['items']}
 
     cleaned_output = [item for item in output_list if not isinstance(item,str) or item in discrete_vars]
     return cleaned_output
 
-def dragonfly_bo(reactor_volume, variables_, num_init_, num_total_, objectives_, dict_filename_, previous_runs_=False,
-                 ):
-    """ Bayesian optimization for single and multi objective optimization.
-
-    Default is to run single objective optimization. To run multi objective optimizations change objectives_ to 'multi'
-    and add the number of objectives to num_objectives_.
-    To run initialization phase using results from previous runs, change previous_runs to 'True' and add the filename of
-    the dict from that run.
+def create_optimizer(fixed_vars, num_init_, objectives_, batch_size=1, options_=None, constraint=None):
+    """ Function that creates the Dragonfly optimizer (ask-tell mode).
 
-    :param reactor_volume: float
-        the reactor volume
-    :param variables_: list
-        list of dictionary with the parameters spanning the experimental domain
+    :param fixed_vars: list
+        variable space (see transform_variables)
     :param num_init_: int
         number of initial experiments
-    :param num_total_: int
-        total number of experiments, initial experiments are included
     :param objectives_: list
-        list of the objective functions to optimize over. If only one object it is 'single' objective optimization,
-         if more than one object in the list it is 'multi' objective optimization.
-    :param previous_runs_: boolean
-        True if previous runs should be included, False otherwise
-    :param dict_filename_: str
-        json file containing a dictionary with all previous runs that should be included
-    :return:
+        objectives of the optimization (more than one: multi objective optimization)
+    :param batch_size: int
+        number of experiments proposed at once
+    :param options_: dict
+        dragonfly options replacing the ones below (None: OPTIMIZER_OPTIONS)
+    :param constraint: function
+        of a point (as returned by ask), True if it can be proposed (e.g. FeasibilityConstraint, None: no constraint)
+    :return: CPGPBandit or CPMultiObjectiveGPBandit
     """
-
-    fixed_vars = transform_variables(variables_)
+    from dragonfly import load_config
+    from dragonfly.exd.experiment_caller import CPFunctionCaller, CPMultiFunctionCaller
+    from dragonfly.opt.gp_bandit import CPGPBandit
+    from dragonfly.opt.multiobjective_gp_bandit import CPMultiObjectiveGPBandit
+    from dragonfly.exd.worker_manager import SyntheticWorkerManager
 
     # Create domain from variables
     config_params = {'domain': fixed_vars}
+    if constraint is not None:  # checked by dragonfly on every point it samples or mutates
+        config_params['domain_constraints'] = [{'name': 'constraint', 'constraint': constraint}]
     config = load_config(config_params)
 
-    # User settings
-    batch_size = 1  # number of new experiments you want to query at each iteration
-
     if len(objectives_) == 1:  # Single objective optimization
         # Specify algorithm settings
         options = Namespace(
@@ -255,7 +439,9 @@ def dragonfly_bo(reactor_volume, variables_, num_init_, num_total_, objectives_,
             # (-1 is included since Dragonfly generates n+1 experiments)
             gpb_hp_tune_criterion='ml-post_sampling',  # Criterion for tuning GP hyper-parameters.
             # Options: 'ml-post_sampling' (algorithm default), 'ml', 'post_sampling'.
+            handle_parallel='halluc',  # experiments in progress count as observations at the posterior mean
         )
+        vars(options).update(OPTIMIZER_OPTIONS if options_ is None else options_)
 
         # Create optimizer object
         func_caller = CPFunctionCaller(None, config.domain, domain_orderings=config.domain_orderings)
@@ -270,7 +456,9 @@ def dragonfly_bo(reactor_volume, variables_, num_init_, num_total_, objectives_,
             gpb_hp_tune_criterion='ml-post_sampling',  # Criterion for tuning GP hyper-parameters.
             # Options: 'ml-post_sampling' (algorithm default), 'ml', 'post_sampling'.
             moors_scalarisation='linear',  # Scalarization approach for multi-objective opt. 'linear' or 'tchebychev'
+            handle_parallel='halluc',  # experiments in progress count as observations at the posterior mean
         )
+        vars(options).update(OPTIMIZER_OPTIONS if options_ is None else options_)
 
         # Create optimizer object
         func_caller = CPMultiFunctionCaller(None, config.domain, domain_orderings=config.domain_orderings)
@@ -281,41 +469,321 @@ def dragonfly_bo(reactor_volume, variables_, num_init_, num_total_, objectives_,
         opt.ask_tell_mode = True
         opt.worker_manager = None
         opt._set_up()
+    return opt
+
+
+@contextmanager
+def hallucinated(opt, pending):
+    """ Context in which the optimizer treats pending experiments as observed (at the GP posterior mean).
+
+    The acquisition then avoids the neighbourhood of the experiments already proposed, so the points of a batch are
+    diverse. Dragonfly only does this for its own worker managers, not in ask-tell mode.
+
+    :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+    :param pending: list
+        points (as returned by ask) proposed and not told yet
+    """
+    in_progress = opt.eval_points_in_progress
+    opt.eval_points_in_progress = [opt.func_caller.get_processed_domain_point_from_raw(x) for x in pending]
+    try:
+        yield opt
+    finally:
+        opt.eval_points_in_progress = in_progress
+
+
+def ask_batch(opt, batch_size, pending=()):
+    """ Function that asks the optimizer for several experiments at once.
+
+    Note: opt.ask(n) never returns once the initialization points are used up, so the points are asked one by one.
+
+    :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+    :param batch_size: int
+        number of experiments
+    :param pending: list
+        points proposed earlier and still running
+    :return: list
+        the new points
+    """
+    batch = []
+    for i in range(batch_size):
+        with hallucinated(opt, list(pending) + batch):
+            batch.append(opt.ask())
+    return batch
+
+
+def run_batch(opt, queue, batch, fixed_vars, index, on_result=None, observations=None, in_flight=None):
+    """ Function that runs a batch of experiments and tells the results to the optimizer as they arrive.
+
+    :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+    :param queue: PlatformQueue
+        where the experiments run (submit/next_result)
+    :param batch: list
+        points to evaluate (as returned by ask)
+    :param fixed_vars: list
+        variable space (see transform_variables)
+    :param index: int
+        index of the first experiment of the batch
+    :param on_result: function
+        called with index, x (platform format), y and timestamp of every experiment
+    :param observations: list
+        (x, y) told to the optimizer, completed with the new results
+    :param in_flight: dict
+        index: point of the experiments submitted and not told yet, kept up to date
+    :return: int
+        index of the next experiment
+    """
+    points = {} if in_flight is None else in_flight  # index: point of the optimizer
+    for x in batch:
+        x_transformed = format_input_with_variable_names(fixed_vars, x)
+        queue.submit(index, x_transformed)
+        points[index] = x
+        index += 1
+    while points:
+        result_index, x_transformed, y, timestamp = queue.next_result()
+        x = points.pop(result_index)
+        if observations is not None:
+            observations.append((x, y))
+        opt.tell([(x, y)])  # return result to algorithm
+        opt.step_idx += 1  # increment experiment number
+        print("expt #:", opt.step_idx, ", x:", x_transformed, ", y:", y, ", timestamp:", timestamp)
+        if on_result is not None:
+            on_result(result_index, x_transformed, y, timestamp)
+    return index
+
+
+def propose_next(fixed_vars, num_init_, objectives_, observations, pending=(), options_=None, constraint=None):
+    """ Function that proposes the next experiment from the observations (run in a background process).
+
+    The optimizer is rebuilt from the observations, as for previous runs, so only plain lists travel between the
+    processes. The experiments still running are treated as observed at the GP posterior mean (see hallucinated).
+
+    :param fixed_vars: list
+        variable space (see transform_variables)
+    :param num_init_: int
+        number of initial experiments
+    :param objectives_: list
+        objectives of the optimization
+    :param observations: list
+        (x, y) of every experiment told to the optimizer
+    :param pending: list
+        points (as returned by ask) submitted to the platform and not told yet
+    :param options_: dict
+        dragonfly options of the optimizer (see create_optimizer)
+    :param constraint: function
+        constraint of the points (see create_optimizer)
+    :return: list
+        the next point
+    """
+    opt = create_optimizer(fixed_vars, num_init_, objectives_, options_=options_, constraint=constraint)
+    opt.initialise()
+    opt.ask(num_init_)  # clears the initialization points
+    for x, y in observations:
+        opt.tell([(x, y)])
+        opt.step_idx += 1
+    opt._build_new_model()
+    opt._set_next_gp()
+    return ask_batch(opt, 1, pending)[0]
+
+
+def run_asynchronous(opt, queue, observations, fixed_vars, num_init_, objectives_, num_total_, index, batch_size=1,
+                     pending=(), on_result=None, executor=None, in_flight=None, constraint=None):
+    """ Function that runs the experiments while the next ones are proposed in the background.
+
+    batch_size experiments are on the platform at any time. While they run, the next one is proposed in another
+    process (propose_next) with the experiments on the platform as pending points; it is submitted the moment one of
+    them finishes, so the platform does not wait for the model update and the acquisition.
+
+    :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+        told every result (history of the campaign)
+    :param queue: PlatformQueue
+        where the experiments run (submit/next_result)
+    :param observations: list
+        (x, y) already told to the optimizer, completed with the new results
+    :param fixed_vars: list
+        variable space (see transform_variables)
+    :param num_init_: int
+        number of initial experiments
+    :param objectives_: list
+        objectives of the optimization
+    :param num_total_: int
+        total number of experiments, initial experiments are included
+    :param index: int
+        index of the next experiment
+    :param batch_size: int
+        number of experiments on the platform at the same time
+    :param pending: list
+        points to submit first (e.g., the initialization points)
+    :param on_result: function
+        called with index, x (platform format), y and timestamp of every experiment
+    :param executor: concurrent.futures.Executor
+        where the proposals are computed (default: a background process)
+    :param in_flight: dict
+        index: point of the experiments submitted and not told yet, kept up to date
+    :param constraint: function
+        constraint of the points proposed (see create_optimizer), as it is when the proposal starts
+    :return: tuple
+        index of the next experiment, time [s] the platform waited for the optimizer
+    """
+    in_flight = {} if in_flight is None else in_flight  # index: point submitted to the platform and not told yet
+
+    def submit(x):
+        nonlocal index
+        queue.submit(index, format_input_with_variable_names(fixed_vars, x))
+        in_flight[index] = x
+        index += 1
+
+    for x in pending:
+        submit(x)
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=1)
+    proposal = None  # future of the next point
+    idle = 0.
+    try:
+        while opt.step_idx < num_total_:
+            # propose the next experiment while the platform runs the current ones
+            if proposal is None and observations and len(in_flight) <= batch_size and \
+                    opt.step_idx + len(in_flight) < num_total_:
+                proposal = executor.submit(propose_next, fixed_vars, num_init_, objectives_, list(observations),
+                                           list(in_flight.values()), dict(OPTIMIZER_OPTIONS), constraint)
+            # hand it over as soon as the platform has room for it
+            if proposal is not None and len(in_flight) < batch_size:
+                waiting = time.time()
+                x = proposal.result()
+                if not in_flight:
+                    idle += time.time() - waiting
+                proposal = None
+                submit(x)
+                continue
+            result_index, x_transformed, y, timestamp = queue.next_result()
+            x = in_flight.pop(result_index)
+            observations.append((x, y))
+            opt.tell([(x, y)])  # return result to algorithm
+            opt.step_idx += 1  # increment experiment number
+            print("expt #:", opt.step_idx, ", x:", x_transformed, ", y:", y, ", timestamp:", timestamp)
+            if on_result is not None:
+                on_result(result_index, x_transformed, y, timestamp)
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return index, idle
+
+
+def dragonfly_bo(reactor_volume, variables_, num_init_, num_total_, objectives_, dict_filename_, previous_runs_=False,
+                 batch_size_=BATCH_SIZE, asynchronous_=ASYNCHRONOUS):
+    """ Bayesian optimization for single and multi objective optimization.
+
+    Default is to run single objective optimization. To run multi objective optimizations change objectives_ to 'multi'
+    and add the number of objectives to num_objectives_.
+    To run initialization phase using results from previous runs, change previous_runs to 'True' and add the filename of
+    the dict from that run.
+
+    :param reactor_volume: float
+        the reactor volume
+    :param variables_: list
+        list of dictionary with the parameters spanning the experimental domain
+    :param num_init_: int
+        number of initial experiments
+    :param num_total_: int
+        total number of experiments, initial experiments are included
+    :param objectives_: list
+        list of the objective functions to optimize over. If only one object it is 'single' objective optimization,
+         if more than one object in the list it is 'multi' objective optimization.
+    :param previous_runs_: boolean
+        True if previous runs should be included, False otherwise
+    :param dict_filename_: str
+        json file containing a dictionary with all previous runs that should be included. The results are journaled
+        next to it (.jsonl, see Campaign_journal), the json file is written from the journal at the end of the campaign
+        and the state of the optimizer is saved next to it after every result (.checkpoint, see Optimizer_checkpoint):
+        previous runs restore it instead of fitting the model again
+    :param batch_size_: int
+        number of new experiments queried at each iteration (queued on the platform, the results are told to the
+        optimizer as they arrive and the model is rebuilt after each batch)
+    :param asynchronous_: boolean
+        True to propose the next experiment in a background process while the platform runs the current one(s)
+        (batch_size_ experiments on the platform at any time, see run_asynchronous)
+    :return:
+    """
+
+    from Visualization import get_visualization
+
+    fixed_vars = transform_variables(variables_)
+
+    # User settings
+    batch_size = max(int(batch_size_), 1)  # number of new experiments you want to query at each iteration
+
+    # samples that cannot be prepared are not proposed (inventory read from the campaign store, see below)
+    feasibility = FeasibilityConstraint(fixed_vars, variables_) if FEASIBILITY_CONSTRAINT else None
+    opt = create_optimizer(fixed_vars, num_init_, objectives_, batch_size, constraint=feasibility)
+    record_hyperparameters(opt)  # saved in the checkpoint of the optimizer, warm start of the model updates
+    # the hyper-parameters are tuned every few results, the GPs are updated with the others (see Model_update)
+    model_update = ModelUpdatePolicy()
+    campaign = campaign_name(dict_filename_)  # experiment name of the GUI
+    queue = PlatformQueue(objectives_, variables_, campaign)
     # from gui previous_runs_ is stored as 'No' which you can imagine python has trouble
     # interpreting as FALSE and tries to start up previous runs where not needed.
     # Therefore let me add a fix for that xoxo-ES
     if previous_runs_ == 'No':
         previous_runs_ = False # NOT ROBUST AT ALL BUT we gotta work with what we got
 
+    # read the previous runs before the journal of a new campaign replaces them
+    previous = load_campaign(dict_filename_) if previous_runs_ else []
+    # every experiment is appended to the journal of the campaign (next to dict_filename_), see Campaign_journal
+    journal = CampaignJournal(dict_filename_, reset=not previous_runs_)
+    # and the state of the optimizer is saved after it (next to the journal), see Optimizer_checkpoint
+    checkpoint = OptimizerCheckpoint(dict_filename_, campaign_signature(fixed_vars, num_init_, objectives_),
+                                     reset=not previous_runs_)
+    # and recorded in the campaign store (queried by the GUI, shared with the platform), see Platform_/Campaign_store
+    store = open_store()
+    campaign_id = None if store is None else \
+        store.start_campaign(campaign, objectives_, variables_, dict_filename_, resume=bool(previous_runs_))
+
+    def refresh_feasibility():  # stock solutions left, published by the platform after every sample it prepares
+        if feasibility is None:
+            return
+        try:
+            feasibility.refresh(store)
+        except sqlite3.Error as error:  # the last inventory read is kept
+            print(f'inventory not read from the campaign store: {error}')
+
+    refresh_feasibility()
+    observations = []  # (x, y) told to the optimizer, saved in the checkpoint and replayed by the background proposals
+    in_flight = {}  # index: point submitted to the platform and not told yet
+    planned = []  # points proposed and not submitted yet (initialization points)
+
+    def store_result(index, x_transformed, y, timestamp):
+        if store is None:
+            return
+        try:
+            store.record_result(campaign_id, index, x_transformed, objectives_, y, timestamp)
+        except sqlite3.Error as error:  # the journal has the result
+            print(f'expt #{index} not recorded in the campaign store: {error}')
+
+    def save_checkpoint():
+        checkpoint.save(opt, observations, list(in_flight.values()) + planned)
+
+    def update_model():
+        kind = model_update.update(opt)  # key line! update model and set next GP
+        print(f'model: {kind} update in {model_update.updates[-1][2]:.1f} s')
+        save_checkpoint()
+
+    def save_result(index, x_transformed, y, timestamp):
+        journal.append(index, x_transformed, y, timestamp)
+        store_result(index, x_transformed, y, timestamp)
+        save_checkpoint()
+        refresh_feasibility()
+
+        # When the journal has been updated, the scatter plot of the objectives and the plots for hypervolume
+        # has to be updated aswell.
+        get_visualization(dict_filename_, variables_, reactor_volume, FIGURE_NAME_HYPERVOLUME,
+                          FIGURE_NAME_OBJECTIVES, objectives_, num_total_)
+
     # ---------------------------- BUILD FROM RANDOM GENERATED INITIALIZATION POINTS -----------------------------------
     if not previous_runs_:
         opt.initialise()  # this generates initialization points
         init_expts = opt.ask(num_init_)  # get all initialization points
-
-        # Run each experiment
-        expts_dict = {}  # Create an empty dictionary to store each experiment
+        planned = list(init_expts)  # run first, batch_size at a time
         index = 1
-        for x in init_expts:  # x is a list of
-            x_transformed = format_input_with_variable_names(fixed_vars, x)
-            y = run_platform(index, x_transformed, objectives_, variables_)  # simulate
-            # reaction
-
-            expts_dict[repr(x_transformed)] = y # list are an unhashable type
-            with open(FILENAME_OUTPUT_PICKLE, 'rb') as filepointer:  # Read the output pickle to also have the timestamp
-                [index_, x_, y_, timestamp] = pickle.load(filepointer)
-
-            expts_dict[repr(x_transformed)] = [y, timestamp]  # list are an unhashable type
-            with open(dict_filename_, 'w') as filepointer:
-                json.dump(expts_dict, filepointer, indent=True)
-            index += 1
-            opt.tell([(x, y)])  # return result to algorithm
-            opt.step_idx += 1  # increment experiment number
-            print("expt #:", opt.step_idx, ", x:", x_transformed, ", y:", y, ", timestamp:", timestamp)
-
-            # When the json-file has been updated, the scatter plot of the objectives and the plots for hypervolume
-            # has to be updated aswell.
-            get_visualization(dict_filename_, variables_, reactor_volume, FIGURE_NAME_HYPERVOLUME,
-                              FIGURE_NAME_OBJECTIVES, objectives_, num_total_)
 
     # ----------------------------- BUILD FROM PREVIOUS RUNS (for instance for interrupted runs) -----------------------
     if previous_runs_:
@@ -325,55 +793,86 @@ def dragonfly_bo(reactor_volume, variables_, num_init_, num_total_, objectives_,
         # Note: To provide your own initialization data to the algorithm,
         # execute the above 2 lines (which clear the initial experiments generated by the algorithm)
         # and return as many data points as you want in the for loop below.
-        with open(dict_filename_, 'r') as filepointer:
-            expts_dict = json.load(filepointer)
+        # (compaction: the journal starts again from the experiments read, e.g. those of a campaign JSON)
+        journal.rewrite(previous)
 
         index = 1
-        for x, [y, timestamp] in expts_dict.items():
-            x_cleaned = format_previous_with_fixed_vars(fixed_vars, literal_eval(x))
-            index += 1
-            opt.tell([(x_cleaned, y)])  # return result to algorithm
-            opt.step_idx += 1  # increment experiment number
-            print("expt #:", opt.step_idx, ", x:", x, ", y:", y, ", timestamp:", timestamp)
-
-    # Update model using results
-    opt._build_new_model()  # key line! update model using prior results
-    opt._set_next_gp()  # key line! set next GP
-
-    # While experiment budget has not been exceeded
-    while opt.step_idx < num_total_:
-
-        # Get a new batch of experiments
-        batch = []
-        for i in range(batch_size):
-            x = opt.ask()
-            batch.append(x)
-
-        # Run each experiment
-        for x in batch:
-            x_transformed = format_input_with_variable_names(fixed_vars, x)
-            print(x_transformed)
-            y = run_platform(index, x_transformed, objectives_, variables_)  # simulate reaction
-            with open(FILENAME_OUTPUT_PICKLE, 'rb') as filepointer:  # Read the output pickle to also have the timestamp
-                [index_, x_, y_, timestamp] = pickle.load(filepointer)
-
-            expts_dict[repr(x_transformed)] = [y, timestamp]  # list are an unhashable type
-            with open(dict_filename_, 'w') as filepointer:
-                json.dump(expts_dict, filepointer, indent=True)
+        told = []
+        for record in previous:
+            x, y, timestamp = record['parameters'], record['objectives'], record['timestamp']
+            store_result(record['index'], x, y, timestamp)
             index += 1
-            opt.tell([(x, y)])
-            opt.step_idx += 1
-            print("expt #:", opt.step_idx, ", x:", x_transformed, ", y:", y, ", timestamp:", timestamp)
-
-            # When the json-file has been updated, the scatter plot of the objectives and the plots for hypervolume
-            # has to be updated aswell.
-            get_visualization(dict_filename_, variables_, reactor_volume, FIGURE_NAME_HYPERVOLUME,
-                              FIGURE_NAME_OBJECTIVES, objectives_, num_total)
-
-
-        # Update model
-        opt._build_new_model()
-        opt._set_next_gp()
+            told.append((format_previous_with_fixed_vars(fixed_vars, x), y))
+
+        # the checkpoint holds the GP hyper-parameters: the model is not fitted again. It is used if its observations
+        # are the first experiments of the journal, the results journaled after it are told on top of it.
+        state = checkpoint.load()
+        if state is not None and not same_observations(state['observations'], told[:len(state['observations'])]):
+            print(f'{checkpoint.filename}: the journal does not start with the experiments of the checkpoint, '
+                  f'the campaign is replayed')
+            state = None
+        if state is not None:
+            restore_optimizer(opt, state, told)
+            journaled_after = [x for x, y in told[len(state['observations']):]]
+            planned = [x for x in state['pending']
+                       if not any(same_observations(x, told_x) for told_x in journaled_after)]
+            print(f'expt #: {opt.step_idx} restored from {checkpoint.filename} ({len(journaled_after)} journaled after '
+                  f'it, {len(planned)} pending)')
+        else:
+            for (x_cleaned, y), record in zip(told, previous):
+                opt.tell([(x_cleaned, y)])  # return result to algorithm
+                opt.step_idx += 1  # increment experiment number
+                print("expt #:", opt.step_idx, ", x:", record['parameters'], ", y:", y, ", timestamp:",
+                      record['timestamp'])
+        observations.extend(told)
+
+    # the experiments proposed and not run yet (initialization points, experiments interrupted) are run first
+    planned = planned[:max(num_total_ - opt.step_idx, 0)]
+
+    # --------------------------- ASYNCHRONOUS: the proposals are computed while the platform runs ---------------------
+    if asynchronous_:
+        pending, planned = planned, []
+        index, idle = run_asynchronous(opt, queue, observations, fixed_vars, num_init_, objectives_, num_total_, index,
+                                       batch_size, pending=pending, on_result=save_result, in_flight=in_flight,
+                                       constraint=feasibility)
+        print(f'platform waited {idle:.1f} s for the optimizer')
+    else:
+        # the acquisition is maximised by several processes, best candidate kept (see Parallel_acquisition); the
+        # asynchronous proposals are computed in a background process of their own (propose_next), without them
+        acquisition = ParallelAcquisition(fixed_vars, ACQUISITION_WORKERS, ACQUISITION_MEMORY,
+                                          options=dict(OPTIMIZER_OPTIONS), constraint=feasibility)
+        acquisition.start()  # the workers start while the first experiments run
+        try:
+            # Run each experiment (batch_size at a time)
+            while planned:
+                batch, planned = planned[:batch_size], planned[batch_size:]
+                index = run_batch(opt, queue, batch, fixed_vars, index, on_result=save_result,
+                                  observations=observations, in_flight=in_flight)
+
+            # Update model using results (from the hyper-parameters of the checkpoint, if it was restored)
+            update_model()
+
+            # While experiment budget has not been exceeded
+            while opt.step_idx < num_total_:
+
+                # Get a new batch of experiments (the points already in the batch count as observed for the next ones)
+                with acquisition.used_by(opt):
+                    batch = ask_batch(opt, min(batch_size, num_total_ - opt.step_idx))
+
+                # Run the batch, the results are told as they arrive
+                index = run_batch(opt, queue, batch, fixed_vars, index, on_result=save_result,
+                                  observations=observations, in_flight=in_flight)
+
+                # Update model
+                update_model()
+        finally:
+            acquisition.shutdown()
+
+    # campaign JSON of the results (for the tools reading the former format)
+    export_legacy(journal.filename, dict_filename_)
+
+    # disconnect the platform
+    stop_platform_worker()
 
     # run the EagleReactor Script
     # find the python executable:
@@ -0,0 +1,119 @@
+""" Feasibility constraint
+
+Constraint of the domain of the optimizer: only samples the liquid handler can prepare with the stock solutions left
+are proposed. The platform publishes its inventory in the campaign store (run_platform.publish_inventory), the
+volumes of a sample are those of SampleInfo.prepare_sample_info (Platform_/sample_feasibility.py, vectorized).
+
+Dragonfly checks the constraint on every point it samples or mutates (initialization points, genetic algorithm of
+the acquisition): the infeasible conditions never reach the platform, where prepare_sample_info raises (reagents
+above the slug) or stops the platform (vials empty) once the experiment has started. Without an inventory (campaign
+store switched off, platform not connected yet) or when no sample of the domain is feasible any more, the constraint
+lets every point through and the platform reports as before.
+
+Author:
+Noël Research Group, Universiteit van Amsterdam (UvA)
+"""
+
+import os
+import sys
+
+import numpy as np
+
+# modules of the platform (standard library and numpy only)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Platform_'))
+from sample_feasibility import Inventory, chemical_arrays, sample_feasibility
+from variable_space import create_variable_space
+
+DOMAIN_SAMPLES = 1000  # random points of the domain checked when the inventory changes
+
+
+class FeasibilityConstraint:
+    """ Domain constraint of the optimizer: True for the points whose sample can be prepared (see the module). """
+
+    def __init__(self, fixed_vars, variables_, inventory=None, domain_samples=DOMAIN_SAMPLES):
+        """ Class initialization
+
+        :param fixed_vars: list
+            variable space of the optimizer (see Dragonfly_BO.transform_variables)
+        :param variables_: list
+            variable space of the platform (as sent with the experiments)
+        :param inventory: Inventory
+            stock solutions loaded (None: every point is feasible)
+        :param domain_samples: int
+            random points of the domain checked when the inventory changes
+        """
+        self.fixed_vars = fixed_vars
+        self.variables = variables_
+        self.inventory = inventory
+        self.domain_samples = domain_samples
+        self.updated = None  # time the platform published the inventory
+        self.fraction = None  # of the domain feasible with the inventory
+
+    def chemical_spaces(self, points):
+        """ Function that gives the sample compositions of points of the optimizer.
+
+        :param points: list
+            points as returned by ask (raw points of dragonfly)
+        :return: list
+            chemical space of every point (see variable_space.create_variable_space)
+        """
+        from Dragonfly_BO import format_input_with_variable_names
+
+        return [create_variable_space(format_input_with_variable_names(self.fixed_vars, list(x)), self.variables)[2]
+                for x in points]
+
+    def feasible(self, points):
+        """ Function that checks which points can be prepared.
+
+        :param points: list
+            points as returned by ask
+        :return: numpy.ndarray
+            True for the feasible points
+        """
+        if self.inventory is None or not len(points):
+            return np.ones(len(points), dtype=bool)
+        names, amounts = chemical_arrays(self.chemical_spaces(points))
+        return sample_feasibility(names, amounts, self.inventory)
+
+    def __call__(self, raw_point):
+        return bool(self.feasible([raw_point])[0])
+
+    def __deepcopy__(self, memo):
+        # dragonfly copies the configuration of the domain (load_config): the domain keeps this constraint, refreshed
+        return self
+
+    def sample(self, num, rng):
+        """ Function that draws random points of the domain.
+
+        :param num: int
+        :param rng: numpy.random.RandomState
+        :return: list
+            points as returned by ask
+        """
+        columns = [rng.choice(var['items'], size=num) if var['type'] == 'discrete' else
+                   rng.uniform(var['min'], var['max'], size=num) for var in self.fixed_vars]
+        return [[value if isinstance(value, str) else float(value) for value in point] for point in zip(*columns)]
+
+    def refresh(self, store):
+        """ Function that reads the inventory published by the platform.
+
+        :param store: CampaignStore
+            None: no inventory, every point is feasible
+        :return: boolean
+            True if the inventory changed
+        """
+        published = None if store is None else store.inventory()
+        updated = None if published is None else published['updated']
+        if updated == self.updated:
+            return False
+        self.updated = updated
+        self.inventory = None if published is None else Inventory.from_dict(published)
+        if self.inventory is not None:
+            self.fraction = float(np.mean(self.feasible(self.sample(self.domain_samples, np.random.RandomState(0)))))
+            if self.fraction == 0:
+                print('feasibility: no sample of the variable space can be prepared with the stock solutions left, '
+                      'the proposals are not constrained')
+                self.inventory = None
+            else:
+                print(f'feasibility: {self.fraction:.0%} of the variable space can be prepared')
+        return True
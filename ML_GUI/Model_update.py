@@ -0,0 +1,197 @@
+""" Model update
+
+Policy deciding how the GP model of the optimizer is updated after new results (dragonfly_bo, after every batch):
+
+    - posterior: the hyper-parameters are kept and the GPs are rebuilt on all the observations (a Cholesky
+      factorisation: milliseconds for a hundred experiments)
+    - warm: every retune_every observations, the hyper-parameters are tuned again starting from the previous ones, with
+      a budget: a local search of the marginal likelihood (L-BFGS-B, warm_max_evals evaluations) instead of DIRECT over
+      the whole box, and a slice sampling chain started at the previous posterior sample with a burn-in of warm_burn
+      instead of a few hundred
+    - cold: dragonfly fits the hyper-parameters from scratch (opt._build_new_model()), for the first model and when the
+      log marginal likelihood per observation of the hyper-parameters in use dropped by more than drift since they were
+      tuned (the new results do not fit the model any more)
+
+Updating the model from scratch after every result, as dragonfly does, takes seconds after a few experiments and about
+a minute after a hundred, mostly for the posterior sampling. The quality against the time of the policies is compared
+offline by benchmark_model_update.py.
+
+Author:
+Noël Research Group, Universiteit van Amsterdam (UvA)
+"""
+
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from Optimizer_checkpoint import FITTED_GP, gp_fitters, model_hyperparameters, rebuild_model, set_gp_fitters
+
+COLD, WARM, POSTERIOR = 'cold', 'warm', 'posterior'
+
+RETUNE_EVERY = 5  # observations between two tunings of the hyper-parameters
+DRIFT = 0.5  # [nats per observation] drop of the log marginal likelihood that calls for a cold fit
+WARM_MAX_EVALS = 100  # evaluations of the marginal likelihood in a warm tuning (DIRECT: 500 and more)
+WARM_BURN = 20  # burn-in of the posterior sampling in a warm tuning (dragonfly: 100 x sqrt(number of hps))
+
+
+def local_maximise(objective, bounds, start, max_evals):
+    """ Function that maximises a function in a box from a starting point (L-BFGS-B, numerical gradient).
+
+    :param objective: function
+        of a point (array), the value to maximise
+    :param bounds: array
+        [lower, upper] of each coordinate
+    :param start: list
+        starting point
+    :param max_evals: int
+        evaluations of the objective
+    :return: tuple
+        best value, best point (list), None (as the optimisers of the GP fitters of dragonfly)
+    """
+    from scipy.optimize import minimize
+
+    bounds = np.asarray(bounds, dtype=float)
+    best = [-np.inf, np.clip(np.asarray(start, dtype=float), bounds[:, 0], bounds[:, 1])]
+
+    def negative(point):
+        try:
+            value = float(objective(point))
+        except (ValueError, np.linalg.LinAlgError):
+            value = -np.inf
+        if not np.isfinite(value):
+            return 1e10
+        if value > best[0]:
+            best[:] = [value, np.array(point)]
+        return -value
+
+    negative(best[1])
+    minimize(negative, best[1], method='L-BFGS-B', bounds=bounds, options={'maxfun': max_evals})
+    return best[0], list(best[1]), None
+
+
+def _first_sample(fit_type, result):
+    return result[0] if fit_type in FITTED_GP else result[0][0]
+
+
+@contextmanager
+def warm_started(fitter, previous, max_evals=WARM_MAX_EVALS, burn=WARM_BURN):
+    """ Context in which a GP fitter tunes the hyper-parameters from the previous ones, with a budget.
+
+    :param fitter: GPFitter
+        new fitter (see Optimizer_checkpoint.gp_fitters)
+    :param previous: dict
+        tuning criterion: (fit type, hyper-parameters) of the previous model (see model_hyperparameters)
+    :param max_evals: int
+        evaluations of the marginal likelihood for 'ml'
+    :param burn: int
+        burn-in of the posterior sampling for 'post_sampling'
+    """
+    restore = []
+    if 'ml' in previous and previous['ml'][0] in FITTED_GP and hasattr(fitter, 'cts_hp_optimise'):
+        gp_cts_hps, gp_dscr_hps, _ = previous['ml'][1]
+        restore.append((fitter, 'cts_hp_optimise', fitter.cts_hp_optimise))
+        restore.append((fitter, 'dscr_hp_vals', fitter.dscr_hp_vals))
+        fitter.cts_hp_optimise = lambda objective, _: local_maximise(objective, fitter.cts_hp_bounds, gp_cts_hps,
+                                                                    max_evals)
+        fitter.dscr_hp_vals = [[value] for value in gp_dscr_hps]  # the discrete ones are kept
+    if 'post_sampling' in previous and hasattr(fitter, 'hp_priors'):
+        # the chain starts at the previous sample: dragonfly starts it at the mean of the priors
+        sample = _first_sample(*previous['post_sampling'])
+        for prior, value in zip(fitter.hp_priors, sample):
+            restore.append((prior, 'get_mean', None))
+            prior.get_mean = lambda value=value: value
+        restore.append((fitter.options, 'post_hp_tune_burn', fitter.options.post_hp_tune_burn))
+        fitter.options.post_hp_tune_burn = burn
+    try:
+        yield fitter
+    finally:
+        for owner, name, value in reversed(restore):
+            if value is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, value)
+
+
+def log_likelihoods(opt):
+    """ Function that gives the log marginal likelihood per observation of the GPs of the optimizer.
+
+    :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+    :return: list
+        per objective, for the GP tuned by maximum likelihood (None if there is none)
+    """
+    processors = getattr(opt, 'gp_processors', None) or [opt.gp_processor]
+    values = []
+    for processor in processors:
+        fit_type, gp = processor.gp_fitter.hp_tune_results.get('ml', (None, None))
+        values.append(gp.compute_log_marginal_likelihood() / len(gp.Y) if fit_type in FITTED_GP else None)
+    return values
+
+
+class ModelUpdatePolicy:
+    """ Updates of the GP model of an optimizer: posterior, warm or cold (see the module). """
+
+    def __init__(self, retune_every=RETUNE_EVERY, drift=DRIFT, warm_max_evals=WARM_MAX_EVALS, warm_burn=WARM_BURN):
+        """ Class initialization
+
+        :param retune_every: int
+            observations between two tunings of the hyper-parameters (1: tuned, warm, after every result)
+        :param drift: float
+            drop of the log marginal likelihood per observation [nats] that calls for a cold fit (None: never)
+        :param warm_max_evals: int
+            evaluations of the marginal likelihood in a warm tuning
+        :param warm_burn: int
+            burn-in of the posterior sampling in a warm tuning
+        """
+        self.retune_every = max(int(retune_every), 1)
+        self.drift = drift
+        self.warm_max_evals = warm_max_evals
+        self.warm_burn = warm_burn
+        self.tuned_likelihoods = None  # log marginal likelihoods per observation when the hps were tuned
+        self.updates = []  # [step_idx, kind, time [s]] of every update
+
+    def _drifted(self, likelihoods):
+        if self.drift is None or self.tuned_likelihoods is None:
+            return False
+        return any(tuned is not None and value is not None and tuned - value > self.drift
+                   for tuned, value in zip(self.tuned_likelihoods, likelihoods))
+
+    def update(self, opt):
+        """ Function that updates the model of the optimizer with its observations and sets the next GP (replaces
+        opt._build_new_model() and opt._set_next_gp()).
+
+        :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+            with the GP fitters recording their hyper-parameters (see Optimizer_checkpoint.record_hyperparameters)
+        :return: str
+            the update done: 'posterior', 'warm' or 'cold'
+        """
+        start = time.perf_counter()
+        model = model_hyperparameters(opt)
+        kind = COLD
+        if model is not None:
+            rebuild_model(opt, model)
+            likelihoods = log_likelihoods(opt)
+            tuned_at = getattr(opt, 'last_model_build_at', None) or 0
+            if self._drifted(likelihoods):
+                kind = COLD
+            elif opt.step_idx - tuned_at >= self.retune_every:
+                kind = WARM
+            else:
+                kind = POSTERIOR
+                if self.tuned_likelihoods is None:  # e.g. model restored from a checkpoint
+                    self.tuned_likelihoods = likelihoods
+
+        if kind == WARM:
+            fitters = gp_fitters(opt)
+            for fitter, previous in zip(fitters, model):
+                with warm_started(fitter, previous, self.warm_max_evals, self.warm_burn):
+                    fitter.fit_gp_for_gp_bandit(opt.options.build_new_model_every)
+            set_gp_fitters(opt, fitters)
+            opt.last_model_build_at = opt.step_idx
+        elif kind == COLD:
+            opt._build_new_model()
+        if kind != POSTERIOR:
+            self.tuned_likelihoods = log_likelihoods(opt)
+        opt._set_next_gp()
+        self.updates.append([opt.step_idx, kind, time.perf_counter() - start])
+        return kind
@@ -0,0 +1,295 @@
+""" Optimizer checkpoint
+
+State of the optimizer of a campaign, written next to the campaign journal (<experiment>_results.checkpoint) after every
+result told to the optimizer and after every model update:
+
+    - the observations (x, y) told to the optimizer, in the order they were told
+    - the GP hyper-parameters of the last model update (per objective and per tuning criterion)
+    - the state of the random number generators (numpy and random)
+    - the pending points: proposed by the optimizer and not told yet (still on the platform, or initialization points
+      not run yet)
+
+A resumed campaign (previous_runs_) tells the observations to a new optimizer and rebuilds its GPs from the saved
+hyper-parameters, which takes seconds, instead of fitting them again (about a minute for 100 experiments). The
+checkpoint is only used if it was written for the same variables, objectives and number of initial experiments and if
+its observations are the first experiments of the journal; otherwise the campaign is replayed from the journal as
+before.
+
+The file is replaced atomically (written next to it, synced and swapped), so a crash leaves the previous checkpoint.
+
+Author:
+Noël Research Group, Universiteit van Amsterdam (UvA)
+"""
+
+import math
+import os
+import pickle
+import random
+from argparse import Namespace
+
+import numpy as np
+
+from Campaign_journal import journal_filename
+
+CHECKPOINT_EXTENSION = '.checkpoint'
+CHECKPOINT_VERSION = 1
+FITTED_GP = ('fitted_gp', 'post_fitted_gp')  # dragonfly keeps the GP itself, rebuilt from its hyper-parameters
+
+
+def checkpoint_filename(dict_filename):
+    """ Function that gives the checkpoint of a campaign JSON.
+
+    :param dict_filename: str
+        campaign JSON (or journal)
+    :return: str
+    """
+    return os.path.splitext(journal_filename(dict_filename))[0] + CHECKPOINT_EXTENSION
+
+
+def campaign_signature(fixed_vars, num_init_, objectives_):
+    """ Function that gives what a checkpoint must have been written for to be used.
+
+    :param fixed_vars: list
+        variable space (see Dragonfly_BO.transform_variables)
+    :param num_init_: int
+        number of initial experiments
+    :param objectives_: list
+        objectives of the optimization
+    :return: dict
+    """
+    return {'variables': fixed_vars, 'num_init': num_init_, 'objectives': list(objectives_)}
+
+
+def record_hyperparameters(opt):
+    """ Function that makes the optimizer keep the hyper-parameters of the GPs it fits.
+
+    Dragonfly keeps the fitted GPs but not the hyper-parameters they were built with: every GP fitter created by the
+    optimizer from now on records them (checkpoint_hps, tuning criterion: (continuous hps, discrete hps, other
+    parameters)).
+
+    :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+    """
+    get_gp_fitter = opt._get_gp_fitter
+
+    def get_recording_gp_fitter(*args, **kwargs):
+        fitter = get_gp_fitter(*args, **kwargs)
+        fitter.checkpoint_hps = {}
+        fit_gp = fitter.fit_gp
+        build_gp = fitter.build_gp
+
+        def recording_fit_gp(num_samples=1, hp_tune_criterion=None):
+            built = []
+
+            def recording_build_gp(gp_cts_hps, gp_dscr_hps, other_gp_params=None, *build_args, **build_kwargs):
+                built.append((gp_cts_hps, gp_dscr_hps, other_gp_params))
+                return build_gp(gp_cts_hps, gp_dscr_hps, other_gp_params, *build_args, **build_kwargs)
+
+            fitter.build_gp = recording_build_gp
+            try:
+                result = fit_gp(num_samples, hp_tune_criterion)
+            finally:
+                del fitter.build_gp
+            if result[0] in FITTED_GP and built:
+                # the returned GP is the last one built
+                criterion = hp_tune_criterion if hp_tune_criterion is not None else fitter.options.hp_tune_criterion
+                fitter.checkpoint_hps[criterion] = built[-1]
+            return result
+
+        fitter.fit_gp = recording_fit_gp
+        return fitter
+
+    opt._get_gp_fitter = get_recording_gp_fitter
+
+
+def _fitter_hyperparameters(fitter):
+    recorded = getattr(fitter, 'checkpoint_hps', {})
+    results = {}
+    for method, (fit_type, result) in fitter.hp_tune_results.items():
+        if fit_type in FITTED_GP:
+            if method not in recorded:
+                return None
+            results[method] = (fit_type, recorded[method])
+        else:  # hyper-parameters sampled for the next GPs
+            results[method] = (fit_type, list(result))
+    return results
+
+
+def model_hyperparameters(opt):
+    """ Function that gives the hyper-parameters of the last model update.
+
+    :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+    :return: list
+        per objective, tuning criterion: (fit type, hyper-parameters), None if the model was not built (or not
+        recorded, see record_hyperparameters)
+    """
+    processors = getattr(opt, 'gp_processors', None)
+    if processors is None:
+        processor = getattr(opt, 'gp_processor', None)
+        processors = None if processor is None else [processor]
+    if not processors:
+        return None
+    fitters = [_fitter_hyperparameters(processor.gp_fitter) for processor in processors]
+    return None if None in fitters else fitters
+
+
+def gp_fitters(opt):
+    """ Function that gives new GP fitters on the observations told to the optimizer (one per objective).
+
+    :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+    :return: list
+    """
+    if hasattr(opt, 'multi_func_caller'):
+        return [opt._get_gp_fitter(i) for i in range(opt.multi_func_caller.num_funcs)]
+    return [opt._get_gp_fitter(opt._get_gp_reg_data())]
+
+
+def set_gp_fitters(opt, fitters):
+    """ Function that makes the fitted GP fitters the model of the optimizer (as opt._build_new_model() does).
+
+    :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+    :param fitters: list
+        one per objective, see gp_fitters
+    """
+    processors = [Namespace(gp_fitter=fitter) for fitter in fitters]
+    if hasattr(opt, 'multi_func_caller'):
+        opt.gp_processors = processors
+        opt.gps = None
+    else:
+        opt.gp_processor = processors[0]
+        opt.gp = None
+
+
+def rebuild_model(opt, model):
+    """ Function that builds the GPs of the optimizer on its observations with given hyper-parameters (no fitting).
+
+    :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+    :param model: list
+        per objective, tuning criterion: (fit type, hyper-parameters), see model_hyperparameters
+    """
+    fitters = gp_fitters(opt)
+    for fitter, results in zip(fitters, model):
+        fitter.hp_tune_results = {}
+        fitter.checkpoint_hps = {}
+        for method, (fit_type, result) in results.items():
+            if fit_type in FITTED_GP:
+                gp_cts_hps, gp_dscr_hps, other_gp_params = result
+                fitter.hp_tune_results[method] = (fit_type, fitter.build_gp(gp_cts_hps, gp_dscr_hps,
+                                                                            other_gp_params=other_gp_params))
+                fitter.checkpoint_hps[method] = result
+            else:
+                fitter.hp_tune_results[method] = (fit_type, list(result))
+    set_gp_fitters(opt, fitters)
+
+
+def _same(a, b):
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(_same(item_a, item_b) for item_a, item_b in zip(a, b))
+    if isinstance(a, str) or isinstance(b, str):
+        return a == b
+    try:
+        return math.isclose(float(a), float(b), rel_tol=1e-9, abs_tol=1e-12)
+    except (TypeError, ValueError):
+        return a == b
+
+
+def same_observations(observations, others):
+    """ Function that compares observations (x, y), the numbers up to rounding.
+
+    :param observations: list
+    :param others: list
+    :return: boolean
+    """
+    return _same(list(observations), list(others))
+
+
+class OptimizerCheckpoint:
+    """ Checkpoint of the optimizer of a campaign. """
+
+    def __init__(self, filename, signature, reset=False):
+        """ Class initialization
+
+        :param filename: str
+            checkpoint (or campaign JSON, the checkpoint is placed next to it)
+        :param signature: dict
+            campaign the optimizer is for (see campaign_signature)
+        :param reset: boolean
+            True to start a new campaign (the checkpoint of a previous campaign with the same name is removed)
+        """
+        self.filename = filename if os.path.splitext(filename)[1] == CHECKPOINT_EXTENSION else \
+            checkpoint_filename(filename)
+        self.signature = signature
+        if reset and os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def save(self, opt, observations, pending=()):
+        """ Function that saves the state of the optimizer (atomically).
+
+        :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+        :param observations: list
+            (x, y) told to the optimizer
+        :param pending: list
+            points (as returned by ask) proposed and not told yet
+        """
+        state = {'version': CHECKPOINT_VERSION, 'signature': self.signature,
+                 'observations': [(list(x), y) for x, y in observations], 'pending': [list(x) for x in pending],
+                 'step_idx': opt.step_idx, 'last_model_build_at': getattr(opt, 'last_model_build_at', None),
+                 'model': model_hyperparameters(opt),
+                 'numpy_random': np.random.get_state(), 'random': random.getstate()}
+        temporary = self.filename + '.tmp'
+        with open(temporary, 'wb') as filepointer:
+            pickle.dump(state, filepointer, protocol=pickle.HIGHEST_PROTOCOL)
+            filepointer.flush()
+            os.fsync(filepointer.fileno())
+        os.replace(temporary, self.filename)
+
+    def load(self):
+        """ Function that reads the checkpoint.
+
+        :return: dict
+            state saved (see save), None if there is no checkpoint or if it cannot be used for this campaign
+        """
+        if not os.path.exists(self.filename):
+            return None
+        try:
+            with open(self.filename, 'rb') as filepointer:
+                state = pickle.load(filepointer)
+        except Exception as error:  # unpickling raises about anything for a damaged file
+            print(f'{self.filename}: unreadable checkpoint ignored ({error})')
+            return None
+        if not isinstance(state, dict) or state.get('version') != CHECKPOINT_VERSION:
+            print(f'{self.filename}: checkpoint of another version ignored')
+            return None
+        if state['signature'] != self.signature:
+            print(f'{self.filename}: checkpoint of another campaign setup ignored')
+            return None
+        return state
+
+
+def restore_optimizer(opt, state, observations):
+    """ Function that brings a new optimizer to the state of a checkpoint.
+
+    The observations are told, the GPs are rebuilt from the hyper-parameters of the checkpoint (no fitting) and the
+    random number generators are restored. The next GP still has to be set (opt._set_next_gp()).
+
+    :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+        new optimizer (see Dragonfly_BO.create_optimizer), initialised and with the initialization points asked
+    :param state: dict
+        checkpoint (see OptimizerCheckpoint.load)
+    :param observations: list
+        (x, y) to tell: the observations of the checkpoint, possibly followed by results journaled after it
+    :return: boolean
+        True if the model was restored, False if it has to be built (the checkpoint was written before the first
+        model update)
+    """
+    for x, y in observations:
+        opt.tell([(x, y)])
+        opt.step_idx += 1
+
+    model = state['model']
+    if model is not None:
+        rebuild_model(opt, model)
+        opt.last_model_build_at = state['last_model_build_at']
+
+    np.random.set_state(state['numpy_random'])
+    random.setstate(state['random'])
+    return model is not None
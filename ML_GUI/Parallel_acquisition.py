@@ -0,0 +1,351 @@
+""" Parallel acquisition
+
+Maximisation of the acquisition of the optimizer in a pool of processes. Dragonfly maximises it in the process of the
+optimizer, with one run of its genetic algorithm (about a thousand evaluations of the acquisition per proposal); here
+several independent runs (starts) share the work, one per worker:
+
+    - every start runs the genetic algorithm of dragonfly with evaluations // starts evaluations (at least
+      min_start_evals), its own random numbers and an initial population seeded with the incumbent (best observation),
+      another good observation (the k-th best for the k-th start) and random points of the domain
+    - the last part of these evaluations (polish) improves the best point of the genetic algorithm with a local search
+      on its continuous coordinates: the genetic algorithm finds the region, not the maximum in it
+    - the proposal is the best candidate of the starts: they maximise the same acquisition of the same GP
+
+The workers rebuild the GP from its data and hyper-parameters (GPs do not pickle), once per model. They are started
+with spawn on every system (as on Windows): the optimizer process may run threads (platform channel).
+
+Only the acquisitions of single objective optimization that dragonfly maximises with its genetic algorithm are
+maximised in parallel (ei, ucb, pi and ttei), the others are left to dragonfly. The number of workers is capped by the
+number of cores (one is left to the platform and the GUI) and by the memory given to the pool; with fewer than two
+workers dragonfly maximises the acquisition as before.
+
+Author:
+Noël Research Group, Universiteit van Amsterdam (UvA)
+"""
+
+import os
+import pickle
+import random
+import time
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from copy import copy
+import multiprocessing
+
+import numpy as np
+
+from Optimizer_checkpoint import FITTED_GP
+
+ACQUISITIONS = ('ei', 'ucb', 'pi', 'ttei')  # maximised in parallel (gpb_acquisitions.asy)
+MAX_WORKERS = None  # None: one per core but one
+MAX_MEMORY = 2000  # [MB] for all the workers
+WORKER_MEMORY = 250  # [MB] of a worker: python, numpy, scipy, dragonfly and a GP of a few hundred observations
+MIN_START_EVALS = 250  # evaluations of the acquisition of a start, at least
+POLISH = 0.2  # part of the evaluations of a start for the local search
+
+_worker = Namespace(opt=None, model_key=None, gp=None, constraint=None)  # state of a worker process
+
+
+def worker_count(max_workers=MAX_WORKERS, max_memory=MAX_MEMORY, worker_memory=WORKER_MEMORY):
+    """ Function that gives the number of workers of the pool.
+
+    :param max_workers: int
+        None: one per core but one
+    :param max_memory: float
+        [MB] for all the workers (None: no cap)
+    :param worker_memory: float
+        [MB] of a worker
+    :return: int
+    """
+    workers = (os.cpu_count() or 1) - 1 if max_workers is None else int(max_workers)
+    if max_memory is not None:
+        workers = min(workers, int(max_memory // worker_memory))
+    return max(workers, 0)
+
+
+def _start_worker(fixed_vars, options, constraint):
+    # optimizer of the same domain (options and constraint) as the one of the campaign, for its GP fitter
+    from Dragonfly_BO import create_optimizer
+
+    _worker.opt = create_optimizer(fixed_vars, 2, ['yield'], options_=options, constraint=constraint)
+    _worker.constraint = constraint
+
+
+def _ready():
+    return os.getpid()
+
+
+def _worker_gp(model):
+    if _worker.model_key != model['key']:
+        fitter = _worker.opt._get_gp_fitter((model['X'], model['Y']))
+        gp_cts_hps, gp_dscr_hps, other_gp_params = model['hps']
+        _worker.gp = fitter.build_gp(gp_cts_hps, gp_dscr_hps, other_gp_params=other_gp_params)
+        _worker.model_key = model['key']
+    return _worker.gp
+
+
+def _seeded_initial_qinfos(domain, seeds):
+    """ Initial population of the genetic algorithm: the seeds, then random points (as dragonfly). """
+    from dragonfly.exd.exd_utils import get_cp_domain_initial_qinfos
+
+    def get_initial_qinfos(num, *args, **kwargs):
+        seeded = [Namespace(point=point) for point in seeds[:num] if domain.constraints_are_satisfied(point)]
+        sampled = get_cp_domain_initial_qinfos(domain, max(num - len(seeded), 1), dom_euclidean_sample_type='latin_hc',
+                                               dom_integral_sample_type='latin_hc', dom_nn_sample_type='rand', *args,
+                                               **kwargs)
+        return seeded + sampled[:num - len(seeded)]
+    return get_initial_qinfos
+
+
+def polish(acquisition, domain, value, point, max_evals):
+    """ Function that improves a point with a local search on its continuous coordinates (L-BFGS-B, see
+    Model_update.local_maximise), the others are kept.
+
+    :param acquisition: function
+        of a processed point, the value to maximise
+    :param domain: CartesianProductDomain
+    :param value: float
+        of the point
+    :param point: list
+        processed point
+    :param max_evals: int
+        evaluations of the acquisition
+    :return: tuple
+        best value, best point
+    """
+    from Model_update import local_maximise
+
+    euclidean = [i for i, subdomain in enumerate(domain.list_of_domains) if subdomain.get_type() == 'euclidean']
+    for i in euclidean:
+        if max_evals // len(euclidean) < 2:
+            break
+        bounds = np.asarray(domain.list_of_domains[i].bounds, dtype=float)
+        low, span = bounds[:, 0], bounds[:, 1] - bounds[:, 0]
+
+        def moved(unit, i=i, low=low, span=span):  # coordinates scaled to [0, 1]
+            return point[:i] + [low + np.asarray(unit) * span] + point[i + 1:]
+
+        start = (np.asarray(point[i], dtype=float) - low) / span
+        polished, unit, _ = local_maximise(lambda unit: acquisition(moved(unit)), [[0, 1]] * len(low), start,
+                                           max_evals // len(euclidean))
+        if polished > value and domain.constraints_are_satisfied(moved(unit)):
+            value, point = polished, moved(unit)
+    return value, point
+
+
+def maximise_start(task):
+    """ Function that runs one start of the maximisation of an acquisition (in a worker).
+
+    The acquisition is the one of dragonfly (gpb_acquisitions), its maximisation the genetic algorithm of dragonfly
+    with a seeded initial population.
+
+    :param task: dict
+        'model': GP ('key', 'X', 'Y', 'hps'), 'acquisition': name, 'ancillary': data of the acquisition (as
+        CPGPBandit._get_ancillary_data_for_acquisition), 'ref_point': for ttei, 'evals': evaluations of the acquisition,
+        'polish': part of the evaluations for the local search, 'seed': of the random numbers, 'seeds': points of the
+        initial population, 'inventory': of the constraint of the domain (see Feasibility_constraint)
+    :return: tuple
+        best value of the acquisition, best point (processed), processor time of the start [s] (its time on a core
+        of its own)
+    """
+    from dragonfly.exd.experiment_caller import CPFunctionCaller
+    from dragonfly.exd.worker_manager import SyntheticWorkerManager
+    from dragonfly.opt import gpb_acquisitions
+    from dragonfly.opt.cp_ga_optimiser import cp_ga_optimiser_from_proc_args
+
+    started = time.process_time()
+    if _worker.constraint is not None:  # stock solutions left now
+        _worker.constraint.inventory = task['inventory']
+    np.random.seed(task['seed'])
+    random.seed(task['seed'])
+    gp = _worker_gp(task['model'])
+    domain = _worker.opt.domain
+    anc_data = Namespace(domain=domain, max_evals=task['evals'], acq_opt_method='ga', is_mf=False, **task['ancillary'])
+    best = []
+
+    def maximise_acquisition(acq_fn, anc_data_, *args, **kwargs):
+        acquisition = lambda x: float(np.ravel(acq_fn([x]))[0])
+        polish_evals = int(anc_data_.max_evals * task['polish'])
+        options = Namespace(get_initial_qinfos=_seeded_initial_qinfos(domain, task['seeds']))
+        value, point, _ = cp_ga_optimiser_from_proc_args(
+            CPFunctionCaller(acquisition, domain, domain_orderings=None), domain,
+            SyntheticWorkerManager(1, time_distro='const'), anc_data_.max_evals - polish_evals, mode='asy',
+            options=options, reporter='silent')
+        value, point = polish(acquisition, domain, float(np.ravel(value)[0]), point, polish_evals)
+        best.append(value)
+        return point
+
+    maximise = gpb_acquisitions.maximise_acquisition
+    gpb_acquisitions.maximise_acquisition = maximise_acquisition
+    try:
+        if task['acquisition'] == 'ttei':
+            gp_eval = gpb_acquisitions._get_gp_eval_for_parallel_strategy(gp, anc_data, 'std')
+            point = gpb_acquisitions._ttei(gp_eval, anc_data, task['ref_point'])
+        else:
+            point = getattr(gpb_acquisitions, 'asy_' + task['acquisition'])(gp, anc_data)
+    finally:
+        gpb_acquisitions.maximise_acquisition = maximise
+    return best[-1], point, time.process_time() - started
+
+
+def gp_hyperparameters(opt):
+    """ Function that gives the hyper-parameters of the GP the optimizer proposes with (opt.gp).
+
+    :param opt: CPGPBandit
+        with the GP fitters recording their hyper-parameters (see Optimizer_checkpoint.record_hyperparameters)
+    :return: tuple
+        continuous hps, discrete hps, other parameters (None if they are not known)
+    """
+    processor = getattr(opt, 'gp_processor', None)
+    if processor is None or getattr(processor, 'hp_tune_method', None) is None:
+        return None
+    fitter = processor.gp_fitter
+    if processor.fit_type in FITTED_GP:
+        return getattr(fitter, 'checkpoint_hps', {}).get(processor.hp_tune_method)
+    return fitter.hp_tune_results[processor.hp_tune_method][1][-1]  # get_next_gp moved it to the end
+
+
+class ParallelAcquisition:
+    """ Pool of processes maximising the acquisition of an optimizer (see the module). """
+
+    def __init__(self, fixed_vars, max_workers=MAX_WORKERS, max_memory=MAX_MEMORY, worker_memory=WORKER_MEMORY,
+                 min_start_evals=MIN_START_EVALS, polish=POLISH, options=None, constraint=None):
+        """ Class initialization
+
+        :param fixed_vars: list
+            variable space of the optimizer (see Dragonfly_BO.transform_variables)
+        :param max_workers: int
+            processes of the pool, one start of the maximisation each (None: one per core but one)
+        :param max_memory: float
+            [MB] for all the workers, caps their number (None: no cap)
+        :param worker_memory: float
+            [MB] of a worker
+        :param min_start_evals: int
+            evaluations of the acquisition of a start, at least
+        :param polish: float
+            part of the evaluations of a start for the local search (0: the genetic algorithm only)
+        :param options: dict
+            dragonfly options of the optimizer (see Dragonfly_BO.create_optimizer)
+        :param constraint: FeasibilityConstraint
+            constraint of the domain of the optimizer, its inventory is sent with every start (None: no constraint)
+        """
+        self.fixed_vars = fixed_vars
+        self.workers = worker_count(max_workers, max_memory, worker_memory)
+        self.min_start_evals = min_start_evals
+        self.polish = polish
+        self.options = options
+        self.constraint = constraint
+        self.executor = None
+        self.model = None  # GP sent to the workers, its task data
+        self.models = 0
+        # [step_idx, acquisition, best value, time [s], time of the longest start [s]] of every maximisation
+        self.maximisations = []
+
+    def start(self):
+        """ Function that starts the workers (they import dragonfly: seconds), without waiting for them. """
+        if self.workers < 2 or self.executor is not None:
+            return
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_start_worker,
+                                            initargs=(self.fixed_vars, self.options, self.constraint))
+        for _ in range(self.workers):
+            self.executor.submit(_ready)
+
+    def shutdown(self):
+        """ Function that stops the workers. """
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def _model(self, opt, gp):
+        if self.model is None or self.model[0] is not gp:
+            hps = gp_hyperparameters(opt)
+            if hps is None:
+                return None
+            self.models += 1
+            self.model = (gp, {'key': self.models, 'X': list(gp.X), 'Y': list(gp.Y), 'hps': hps})
+        return self.model[1]
+
+    def maximise(self, model, acquisition, anc_data, ref_point=None):
+        """ Function that maximises an acquisition with one start per worker.
+
+        :param model: dict
+            GP of the acquisition (see maximise_start)
+        :param acquisition: str
+            'ei', 'ucb', 'pi' or 'ttei' (ttei: with the reference point given)
+        :param anc_data: Namespace
+            ancillary data of the acquisition (CPGPBandit._get_ancillary_data_for_acquisition)
+        :param ref_point: list
+            reference point of ttei
+        :return: tuple
+            best value of the acquisition, best point (processed)
+        """
+        self.start()
+        started = time.perf_counter()
+        starts = self.workers
+        evals = max(int(anc_data.max_evals) // starts, self.min_start_evals)
+        ancillary = {'t': anc_data.t, 'curr_max_val': anc_data.curr_max_val,
+                     'handle_parallel': anc_data.handle_parallel,
+                     'eval_points_in_progress': list(anc_data.eval_points_in_progress)}
+        order = np.argsort(model['Y'])[::-1]
+        incumbent = [model['X'][order[0]]]
+        extra = [] if ref_point is None else [ref_point]
+        seeds = np.random.randint(2 ** 31 - 1, size=starts)  # from the random numbers of the campaign
+        tasks = [{'model': model, 'acquisition': acquisition, 'ancillary': ancillary, 'ref_point': ref_point,
+                  'evals': evals, 'polish': self.polish, 'seed': int(seed),
+                  'inventory': None if self.constraint is None else self.constraint.inventory,
+                  'seeds': incumbent + extra + ([model['X'][order[k]]] if 0 < k < len(order) else [])}
+                 for k, seed in enumerate(seeds)]
+        results = [future.result() for future in [self.executor.submit(maximise_start, task) for task in tasks]]
+        value, point, _ = max(results, key=lambda result: result[0])
+        self.maximisations.append([anc_data.t, acquisition, value, time.perf_counter() - started,
+                                   max(seconds for _, _, seconds in results)])
+        return value, point
+
+    def _ttei(self, model, anc_data):
+        # as gpb_acquisitions.asy_ttei
+        if np.random.random() < 0.5:
+            return self.maximise(model, 'ei', anc_data)[1]
+        anc_data = copy(anc_data)
+        anc_data.max_evals = anc_data.max_evals // 2
+        ei_argmax = self.maximise(model, 'ei', anc_data)[1]
+        return self.maximise(model, 'ttei', anc_data, ref_point=ei_argmax)[1]
+
+    def _select_pt_func(self, opt, acquisition, dragonfly_select_pt_func):
+        def select_pt_func(gp, anc_data):
+            model = None if self.workers < 2 else self._model(opt, gp)
+            if model is None:
+                return dragonfly_select_pt_func(gp, anc_data)
+            try:
+                if acquisition == 'ttei':
+                    return self._ttei(model, anc_data)
+                return self.maximise(model, acquisition, anc_data)[1]
+            except (BrokenProcessPool, OSError, pickle.PicklingError) as error:
+                print(f'parallel acquisition stopped, dragonfly maximises the acquisition ({error!r})')
+                self.shutdown()
+                self.workers = 0
+                return dragonfly_select_pt_func(gp, anc_data)
+        return select_pt_func
+
+    @contextmanager
+    def used_by(self, opt):
+        """ Context in which the optimizer maximises its acquisition with the pool (opt.ask()).
+
+        :param opt: CPGPBandit or CPMultiObjectiveGPBandit
+            multi objective optimizers and acquisitions not optimised with the genetic algorithm are left to dragonfly
+        """
+        if self.workers < 2 or hasattr(opt, 'multi_func_caller') or opt.acq_opt_method != 'ga':
+            yield opt
+            return
+        from dragonfly.opt import gpb_acquisitions
+
+        dragonfly_select_pt_funcs = {name: getattr(gpb_acquisitions.asy, name) for name in ACQUISITIONS}
+        for name, select_pt_func in dragonfly_select_pt_funcs.items():
+            setattr(gpb_acquisitions.asy, name, self._select_pt_func(opt, name, select_pt_func))
+        try:
+            yield opt
+        finally:
+            for name, select_pt_func in dragonfly_select_pt_funcs.items():
+                setattr(gpb_acquisitions.asy, name, select_pt_func)
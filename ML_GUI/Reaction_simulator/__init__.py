@@ -0,0 +1,12 @@
+""" Reaction simulator
+
+Offline evaluation of the optimizer: synthetic reactions on the variable space of the GUI (reactions), a simulated
+platform for the unchanged dragonfly_bo (simulated_platform) and the benchmark of the settings of the optimizer on them
+(benchmark).
+
+Author:
+Noël Research Group, Universiteit van Amsterdam (UvA)
+"""
+
+from .reactions import *
+from .simulated_platform import *
@@ -0,0 +1,149 @@
+""" Benchmark of the optimizer on synthetic reactions (offline, no platform)
+
+Runs dragonfly_bo, unchanged, on a synthetic reaction (reactions.ReactionModel) through the simulated platform, for
+settings of the optimizer and several seeds. Reports, against the number of experiments:
+
+    - one objective: the simple regret (best yield possible - best true yield of the experiments run) [% points]
+    - two objectives: the hypervolume of the true objective values of the experiments run, as a fraction of the one of
+      the Pareto front of the reaction (estimated by random sampling)
+    - the time dragonfly_bo takes per proposal [s] (the platform answers at once)
+
+Run from ML_GUI:
+
+    python -m Reaction_simulator.benchmark --objectives yield --num-init 4 8 --seeds 3 --num-total 20
+    python -m Reaction_simulator.benchmark --objectives yield throughput --option moors_scalarisation=tchebychev
+
+Author:
+Noël Research Group, Universiteit van Amsterdam (UvA)
+"""
+
+import argparse
+import io
+import itertools
+import os
+import random
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from .reactions import VARIABLES, ReactionModel, hypervolume, pareto_front
+from .simulated_platform import simulated_platform
+
+
+def run_campaign(model, objectives_, num_init, num_total, seed, batch_size=1, options=None, verbose=False):
+    """ Function running one campaign of dragonfly_bo on the simulated platform.
+
+    :param model: ReactionModel
+    :param objectives_: list
+        'yield' or 'yield' and 'throughput'
+    :param num_init: int
+    :param num_total: int
+    :param seed: int
+        of the optimizer and of the measurement noise
+    :param batch_size: int
+    :param options: dict
+        options of the optimizer (Dragonfly_BO.OPTIMIZER_OPTIONS, None: the ones set)
+    :param verbose: boolean
+        True to show the output of dragonfly_bo
+    :return: tuple
+        true objective values of the experiments (in order), time [s] of dragonfly_bo per experiment
+    """
+    from Dragonfly_BO import dragonfly_bo
+
+    np.random.seed(seed)
+    random.seed(seed)
+    model.reset_noise(seed)
+    with tempfile.TemporaryDirectory() as folder, simulated_platform(model, options) as platform:
+        with redirect_stdout(sys.stdout if verbose else io.StringIO()):
+            dragonfly_bo(model.reactor_volume, model.variables, num_init, num_total, objectives_,
+                         os.path.join(folder, 'simulated_campaign.json'), batch_size_=batch_size)
+    results = sorted(platform.queues[0].results)
+    values = [model.objectives(x, objectives_, noise=False) for _, x, _, _ in results]
+    return values, [seconds for _, _, _, seconds in results]
+
+
+def benchmark(objectives_=('yield',), num_init=(4,), batch_sizes=(1,), seeds=3, num_total=20, reaction=0,
+              noise=2.0, options=None):
+    """ Function comparing the settings of the optimizer on a synthetic reaction.
+
+    :param objectives_: list
+    :param num_init: list
+        numbers of initial experiments compared
+    :param batch_sizes: list
+        batch sizes compared
+    :param seeds: int
+        number of campaigns per setting
+    :param num_total: int
+    :param reaction: int
+        seed of the reaction
+    :param noise: float
+        [% points] standard deviation of the yield measured
+    :param options: dict
+        options of the optimizer of every campaign
+    :return: dict
+        setting ('init 4, batch 1', ...): {'score': mean regret or hypervolume fraction after each experiment,
+        'time': mean time per proposal [s], 'last': mean time of the last experiment [s]}
+    """
+    objectives_ = list(objectives_)
+    model = ReactionModel(VARIABLES, seed=reaction, noise=noise)
+    best = model.best(objectives_)
+    single = len(objectives_) == 1
+    checkpoints = sorted(set(range(0, num_total + 1, max(num_total // 5, 1))[1:]) | {num_total})
+
+    if single:
+        print(f'\nBest yield (random search): {best:.1f} %, mean regret [%] after n experiments')
+    else:
+        print(f'\nHypervolume of the Pareto front (random search): {best:.2f}, mean fraction reached after n '
+              f'experiments')
+    print(f'reaction {reaction}, noise {noise} %, {seeds} seeds, options {options or {}}\n')
+    print('setting             ' + ''.join(f'{n:>7d}' for n in checkpoints) + '   time [s]   last [s]')
+    results = {}
+    for init, batch_size in itertools.product(num_init, batch_sizes):
+        name = f'init {init}, batch {batch_size}'
+        scores, times, lasts = [], [], []
+        for seed in range(seeds):
+            values, seconds = run_campaign(model, objectives_, init, num_total, seed, batch_size, options)
+            if single:
+                scores.append([best - max(values[:n]) for n in checkpoints])
+            else:
+                scores.append([hypervolume(pareto_front(values[:n])) / best for n in checkpoints])
+            times.append(np.mean(seconds[init:]))  # the proposals of the optimizer
+            lasts.append(seconds[-1])
+        score = np.mean(scores, axis=0)
+        results[name] = {'score': list(score), 'time': np.mean(times), 'last': np.mean(lasts)}
+        print(f'{name:<18}  ' + ''.join(f'{s:>7.1f}' if single else f'{s:>7.2f}' for s in score) +
+              f'   {np.mean(times):>8.2f}   {np.mean(lasts):>8.2f}')
+    return results
+
+
+def parse_option(text):
+    """ Function reading an option of the optimizer from the command line (KEY=VALUE, numbers are converted).
+
+    :param text: str
+    :return: tuple
+    """
+    key, value = text.split('=', 1)
+    for kind in (int, float):
+        try:
+            return key, kind(value)
+        except ValueError:
+            pass
+    return key, value
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--objectives', nargs='+', default=['yield'], choices=['yield', 'throughput'])
+    parser.add_argument('--num-init', type=int, nargs='+', default=[4])
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[1])
+    parser.add_argument('--seeds', type=int, default=3)
+    parser.add_argument('--num-total', type=int, default=20)
+    parser.add_argument('--reaction', type=int, default=0, help='seed of the synthetic reaction')
+    parser.add_argument('--noise', type=float, default=2.0, help='[%% points] standard deviation of the yield')
+    parser.add_argument('--option', type=parse_option, action='append', default=[],
+                        help='option of the optimizer, KEY=VALUE (e.g. acq=ei)')
+    args = parser.parse_args()
+    benchmark(args.objectives, args.num_init, args.batch_size, args.seeds, args.num_total, args.reaction, args.noise,
+              dict(args.option) or None)
@@ -0,0 +1,246 @@
+""" Synthetic reactions
+
+Analytic response surfaces of a photochemical reaction on the variable space of the GUI (pages/04: a reagent is a
+discrete choice followed by its amount, then residence_time and eagle_percentage). The conditions are read as the
+platform reads them (create_variable_space): pairs of reagent and amount (the first one the concentration of the
+limiting reagent, the others equivalents and loadings), residence time and light intensity.
+
+    - yield [%] = 100 x conversion x selectivity x stability
+    - conversion: first order in the photon dose (residence time x light intensity^0.7), the rate depends on the
+      reagents chosen
+    - selectivity: Gaussian in the amount of every reagent (scaled to its range) around an optimum, a factor per reagent
+      choice
+    - stability: the product degrades when the photon dose exceeds an optimum
+    - throughput [mmol/h]: as the platform (Concentration_check.calculate_objective_outputs), from the yield measured
+    - measurement noise: Gaussian on the yield [% points]
+
+The parameters of a reaction are drawn from its seed, any of them can be given.
+
+Author:
+Noël Research Group, Universiteit van Amsterdam (UvA)
+"""
+
+import os
+import sys
+
+import numpy as np
+
+from Dragonfly_BO import format_input_with_variable_names, transform_variables
+
+# variable space of the platform (standard library only, shared with Platform_)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Platform_'))
+from variable_space import create_variable_space
+
+__all__ = ['REACTOR_VOLUME', 'VARIABLES', 'ReactionModel', 'hypervolume', 'pareto_front']
+
+REACTOR_VOLUME = 3.4  # [mL]
+NOISE = 2.0  # [% points] standard deviation of the yield measured
+
+# variable space as built by the GUI (pages/04_Machine_Learning_Settings)
+VARIABLES = [
+    {'name': 'limiting_reagent', 'type': 'discrete', 'items': ['A']},
+    {'name': 'limiting_reagent conc', 'type': 'float', 'min': 0.05, 'max': 0.2},
+    {'name': 'excess_reagent', 'type': 'discrete', 'items': ['B']},
+    {'name': 'excess_reagent equiv', 'type': 'float', 'min': 1, 'max': 5},
+    {'name': 'catalyst', 'type': 'discrete', 'items': ['TBADT', '4CzIPN', 'EosinY']},
+    {'name': 'catalyst loading', 'type': 'float', 'min': 0.005, 'max': 0.05},
+    {'name': 'residence_time', 'type': 'float', 'min': 120, 'max': 1200},
+    {'name': 'eagle_percentage', 'type': 'float', 'min': 10, 'max': 100},
+]
+
+
+def reagent_slots(variables):
+    """ Function that reads the reagents of a variable space, in the order of the conditions of the platform.
+
+    :param variables: list
+        variable space of the GUI
+    :return: tuple
+        reagents [{'items': choices, 'min': amount, 'max': amount}], residence time variable, light variable (None if
+        they are not variables)
+    """
+    slots, residence_time, eagle_percentage = [], None, None
+    i = 0
+    while i < len(variables):
+        variable = variables[i]
+        if variable['name'] == 'residence_time':
+            residence_time = variable
+        elif variable['name'] == 'eagle_percentage':
+            eagle_percentage = variable
+        elif variable['type'] == 'discrete':  # the choice, then its amount
+            amount = variables[i + 1]
+            slots.append({'items': list(variable['items']), 'min': amount['min'], 'max': amount['max']})
+            i += 1
+        else:
+            slots.append({'items': [variable['name']], 'min': variable['min'], 'max': variable['max']})
+        i += 1
+    return slots, residence_time, eagle_percentage
+
+
+def pareto_front(points):
+    """ Function that gives the points no other point is better than in every objective (maximization).
+
+    :param points: list
+        objective values
+    :return: list
+    """
+    front = []
+    for point in sorted(map(tuple, points), key=lambda point: tuple(-value for value in point)):
+        if not any(all(value >= other for value, other in zip(kept, point)) for kept in front):
+            front.append(point)
+    return front
+
+
+def hypervolume(points, reference=(0, 0)):
+    """ Function that gives the area dominated by points of two objectives (maximization), as Visualization (pymoo).
+
+    :param points: list
+        [objective 1, objective 2]
+    :param reference: tuple
+        lowest values counted
+    :return: float
+    """
+    area, highest = 0.0, reference[1]
+    for first, second in sorted(((float(a), float(b)) for a, b in points), reverse=True):
+        if first > reference[0] and second > highest:
+            area += (first - reference[0]) * (second - highest)
+            highest = second
+    return area
+
+
+class ReactionModel:
+    """ Synthetic reaction on a variable space of the GUI (see the module). """
+
+    def __init__(self, variables=None, seed=0, noise=NOISE, reactor_volume=REACTOR_VOLUME, **parameters):
+        """ Class initialization
+
+        :param variables: list
+            variable space of the GUI (default: VARIABLES)
+        :param seed: int
+            of the parameters of the reaction
+        :param noise: float
+            [% points] standard deviation of the yield measured
+        :param reactor_volume: float
+            [mL]
+        :param parameters:
+            replace the ones drawn from the seed. optimum: amount of each reagent with the best selectivity (0-1 in
+            its range), width: of the selectivity of each reagent (same scale), choices: {reagent choice: factor of the
+            selectivity}, rates: {reagent choice: factor of the rate}, rate: of the conversion per photon dose,
+            best_dose: dose (0-1) above which the product degrades, degradation: per dose above it
+        """
+        self.variables = VARIABLES if variables is None else variables
+        self.noise = noise
+        self.reactor_volume = reactor_volume
+        self.slots, self.residence_time, self.eagle_percentage = reagent_slots(self.variables)
+        self.fixed_vars = transform_variables(self.variables)
+
+        rng = np.random.RandomState(seed)
+        choices, rates = {}, {}
+        for slot in self.slots:
+            factors = rng.uniform(0.55, 1.0, size=len(slot['items']))
+            factors[rng.randint(len(factors))] = 1.0  # one choice is the best one
+            choices.update(zip(slot['items'], factors))
+            rates.update(zip(slot['items'], rng.uniform(0.6, 1.4, size=len(slot['items']))))
+        self.parameters = {'optimum': list(rng.uniform(0.35, 0.85, size=len(self.slots))),
+                           'width': list(rng.uniform(0.35, 0.7, size=len(self.slots))),
+                           'choices': choices, 'rates': rates, 'rate': rng.uniform(3, 6),
+                           'best_dose': rng.uniform(0.35, 0.7), 'degradation': rng.uniform(0.5, 1.5)}
+        self.parameters.update(parameters)
+        self.rng = np.random.RandomState(seed)
+
+    def reset_noise(self, seed):
+        """ Function that sets the random numbers of the measurement noise.
+
+        :param seed: int
+        """
+        self.rng = np.random.RandomState(seed)
+
+    def true_yield(self, x):
+        """ Function that gives the yield of conditions, without measurement noise.
+
+        :param x: list
+            conditions in the platform format (as sent to run_platform)
+        :return: float
+            [%]
+        """
+        residence_time, eagle_percentage, chemical_space = create_variable_space(x, self.variables)
+        p = self.parameters
+        selectivity, rate = 1.0, p['rate']
+        for k, slot in enumerate(self.slots):
+            choice, amount = chemical_space[2 * k], chemical_space[2 * k + 1]
+            scaled = (amount - slot['min']) / (slot['max'] - slot['min'])
+            selectivity *= p['choices'].get(choice, 1.0) * np.exp(-((scaled - p['optimum'][k]) / p['width'][k]) ** 2)
+            rate *= p['rates'].get(choice, 1.0)
+        dose = 1.0
+        if residence_time is not None:
+            dose *= residence_time / self.residence_time['max']
+        if eagle_percentage is not None:
+            dose *= (eagle_percentage / 100) ** 0.7
+        conversion = 1 - np.exp(-rate * dose)
+        stability = np.exp(-p['degradation'] * max(dose - p['best_dose'], 0) / p['best_dose'])
+        return float(100 * conversion * selectivity * stability)
+
+    def throughput(self, x, yield_):
+        """ Function that gives the throughput of conditions (as the platform, Concentration_check).
+
+        :param x: list
+            conditions in the platform format
+        :param yield_: float
+            [%]
+        :return: float
+            [mmol/h]
+        """
+        residence_time, _, chemical_space = create_variable_space(x, self.variables)
+        mmol_generated = chemical_space[1] * self.reactor_volume * yield_ / 100
+        return float(mmol_generated / residence_time * 60 * 60)
+
+    def objectives(self, x, objectives_, noise=True):
+        """ Function that gives the objective values of an experiment, as the platform returns them.
+
+        :param x: list
+            conditions in the platform format
+        :param objectives_: list
+            'yield', 'throughput' and/or 'cost' (0: no prices, as the platform)
+        :param noise: boolean
+            True: the yield is measured (with noise)
+        :return: float or list
+            the value for one objective, the values (yield, throughput, cost order) otherwise
+        """
+        yield_ = self.true_yield(x)
+        if noise and self.noise:
+            yield_ = float(np.clip(yield_ + self.rng.normal(0, self.noise), 0, 100))
+        values = {'yield': yield_, 'cost': 0.0}
+        if 'throughput' in objectives_:
+            values['throughput'] = self.throughput(x, yield_)
+        y = [values[name] for name in ('yield', 'throughput', 'cost') if name in objectives_]
+        return y[0] if len(y) == 1 else y
+
+    def sample(self, num, rng):
+        """ Function that draws random conditions in the variable space.
+
+        :param num: int
+        :param rng: numpy.random.RandomState
+        :return: list
+            conditions in the platform format
+        """
+        conditions = []
+        for _ in range(num):
+            values = [rng.choice(variable['items']) if variable['type'] == 'discrete' else
+                      rng.uniform(variable['min'], variable['max']) for variable in self.fixed_vars]
+            conditions.append(format_input_with_variable_names(self.fixed_vars, [
+                value if isinstance(value, str) else float(value) for value in values]))
+        return conditions
+
+    def best(self, objectives_, num_samples=100000, seed=0):
+        """ Function that estimates the best that can be found (dense random sampling, no noise).
+
+        :param objectives_: list
+        :param num_samples: int
+        :param seed: int
+        :return: float
+            best value (one objective), hypervolume of the Pareto front (two objectives)
+        """
+        values = [self.objectives(x, objectives_, noise=False) for x in self.sample(num_samples,
+                                                                                  np.random.RandomState(seed))]
+        if len(objectives_) == 1:
+            return max(values)
+        return hypervolume(pareto_front(values))
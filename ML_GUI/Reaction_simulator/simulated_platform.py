@@ -0,0 +1,125 @@
+""" Simulated platform
+
+Replacements of the platform for dragonfly_bo: the experiments are evaluated on a synthetic reaction (ReactionModel)
+the moment they are submitted, so a campaign runs offline, as fast as the optimizer.
+
+    - SimulatedPlatformQueue: interface of Dragonfly_BO.PlatformQueue (submit/next_result)
+    - simulated_run_platform: drop-in replacement of Dragonfly_BO.run_platform
+    - simulated_platform: context in which dragonfly_bo runs unchanged on the simulator (platform worker, campaign
+      store, figures and Eagle reactor script left out)
+
+Author:
+Noël Research Group, Universiteit van Amsterdam (UvA)
+"""
+
+import sys
+import time
+from argparse import Namespace
+from contextlib import contextmanager
+
+__all__ = ['SimulatedPlatformQueue', 'simulated_run_platform', 'simulated_platform']
+
+
+class SimulatedPlatformQueue:
+    """ Simulated platform with the interface of Dragonfly_BO.PlatformQueue, the results come back in order. """
+
+    def __init__(self, model, objectives, variables_, campaign=None):
+        """ Class initialization
+
+        :param model: ReactionModel
+            reaction the experiments are run on
+        :param objectives: list
+            objectives of the optimization.
+        :param variables_: list
+            List of the defined variable space.
+        :param campaign: str
+            name of the campaign (not used)
+        """
+        self.model = model
+        self.objectives = objectives
+        self.variables = variables_
+        self.campaign = campaign
+        self.waiting = []  # [index, x]
+        self.results = []  # [index, x, y, time [s] since the previous result] of every experiment
+        self.last_result = time.perf_counter()
+
+    def capacity(self):
+        return None
+
+    def submit(self, index, x):
+        """ Function that adds an experiment to the queue.
+
+        :param index: int
+            index to keep track of the current run.
+        :param x: list
+            list with values for each parameter in the parameter space (platform format).
+        """
+        self.waiting.append([index, x])
+
+    def next_result(self):
+        """ Function that gives the result of the next experiment of the queue.
+
+        :return: tuple
+            index, x, the y-value(s) and the timestamp of the experiment
+        """
+        index, x = self.waiting.pop(0)
+        y = self.model.objectives(x, self.objectives)
+        now = time.perf_counter()
+        # the time since the previous result is the time dragonfly_bo took to tell it and propose the next experiment
+        self.results.append([index, x, y, now - self.last_result])
+        self.last_result = now
+        return index, x, y, f'simulated_{index}'
+
+    def __len__(self):
+        return len(self.waiting)
+
+
+def simulated_run_platform(model):
+    """ Function that gives a replacement of Dragonfly_BO.run_platform running the experiments on a reaction model.
+
+    :param model: ReactionModel
+    :return: function
+        run_platform(index, x, objectives, variables_): the y-value(s)
+    """
+    def run_platform(index, x, objectives, variables_):
+        return model.objectives(x, objectives)
+    return run_platform
+
+
+@contextmanager
+def simulated_platform(model, options=None):
+    """ Context in which dragonfly_bo runs its experiments on a reaction model.
+
+    :param model: ReactionModel
+    :param options: dict
+        options of the optimizer in the context (Dragonfly_BO.OPTIMIZER_OPTIONS, None: unchanged)
+    :return: Namespace
+        queues: the SimulatedPlatformQueue of every campaign started in the context
+    """
+    import Dragonfly_BO
+    import Visualization
+
+    platform = Namespace(queues=[])
+
+    def platform_queue(objectives, variables_, campaign=None):
+        queue = SimulatedPlatformQueue(model, objectives, variables_, campaign)
+        platform.queues.append(queue)
+        return queue
+
+    replaced = [(Dragonfly_BO, 'PlatformQueue', platform_queue),
+                (Dragonfly_BO, 'run_platform', simulated_run_platform(model)),
+                (Dragonfly_BO, 'stop_platform_worker', lambda timeout=60: None),
+                (Dragonfly_BO, 'open_store', lambda: None),
+                (Dragonfly_BO, 'get_python_executable', lambda env_name: sys.executable),
+                (Dragonfly_BO, 'subprocess', Namespace(Popen=lambda *args, **kwargs: None)),  # Eagle reactor script
+                (Dragonfly_BO, 'OPTIMIZER_OPTIONS', Dragonfly_BO.OPTIMIZER_OPTIONS if options is None else options),
+                (Visualization, 'get_visualization', lambda *args, **kwargs: None)]
+    restore = [(owner, name, getattr(owner, name)) for owner, name, _ in replaced]
+    for owner, name, value in replaced:
+        setattr(owner, name, value)
+    try:
+        yield platform
+    finally:
+        for owner, name, value in restore:
+            setattr(owner, name, value)
+
@@ -1,7 +1,8 @@
 """ Visualization
 This file is used to generate the figures of the result and of the hypervolume.
 
-It uses seaborn for the graphics.
+It uses seaborn for the graphics. matplotlib, seaborn and pymoo are imported by the functions that use them, so the
+optimizer (Dragonfly_BO) starts without them.
 
 Author:
 Aidan Slattery, Pauline Tenblad, April 2023
@@ -9,11 +10,8 @@ Aidan Slattery, Pauline Tenblad, April 2023
 
 # Utilities
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
-from pymoo.indicators.hv import HV
-import json
+from Campaign_journal import load_campaign, legacy_dict
 
 
 # Note! This function is hardcoded for yield and throughput
@@ -22,7 +20,7 @@ def get_pandas_dataframe(filename_json, variables, reactor_volume):
     Get a pandas dataframe containing the hypervolume.
 
     :param filename_json: .json file
-        the result of a campaign run on the platform
+        the result of a campaign run on the platform (its journal is read if there is one, see Campaign_journal)
     :param variables: dict
         the variable space of the bayesian optimization
     :param reactor_volume: float
@@ -35,8 +33,7 @@ def get_pandas_dataframe(filename_json, variables, reactor_volume):
     max_throughput = (max_concentration * reactor_volume / min_residence_time) * 60 * 60
     max_volume = max_throughput * 100
 
-    with open(filename_json, 'r') as filepointer:
-        data_dict = json.load(filepointer)
+    data_dict = legacy_dict(load_campaign(filename_json))
 
     # Get the objective values measured so far
     objective_values_list = []
@@ -53,6 +50,7 @@ def get_pandas_dataframe(filename_json, variables, reactor_volume):
     reference_point = [0, 0]
 
     # Create a Hypervolume object for the minimization problem
+    from pymoo.indicators.hv import HV
     hv = HV(ref_point=reference_point)
 
     # Calculate the hypervolume after each run
@@ -82,6 +80,8 @@ def get_hypervolume_visualization(data, figure_name_hypervolume):
     :return:
         generates a figure ot the hypervolume after each run
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     # Set a theme for Seaborn
     sns.set(font_scale=1.6, style='ticks', font='Calibri')
     plt.figure(figsize=(6, 6))
@@ -120,6 +120,8 @@ def get_result_per_run_multi_objectives_visualization(data, figure_name_objectiv
     :return:
         generates a figure ot the result after each run
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
     # Set a theme for Seaborn
     sns.set(font_scale=1.6, style='ticks', font='Calibri')
@@ -160,6 +162,8 @@ def get_result_per_run_single_objective_visualization(data, objective, variables
         the name of the figure
     :return:
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
     df_marker = data.copy()  # for the markers, dont start at 0,0
     # Add a row with 0 at the top of the dataframe, and use this for the line
@@ -0,0 +1,149 @@
+""" Benchmark of the parallel acquisition of Dragonfly_BO (offline, no platform)
+
+Runs sequential campaigns on the synthetic reaction of benchmark_batch_bo.py and, after given numbers of experiments,
+maximises the acquisitions ei and ucb of the current GP with dragonfly (one run of its genetic algorithm, in the
+process of the optimizer) and with the pool of Parallel_acquisition (one start per worker, best candidate kept). Reports
+the value of the acquisition reached (the higher the better, same GP and same acquisition) and the time per proposal:
+wall-clock, and the longest start (the time of a proposal when every worker has a core of its own).
+
+    python benchmark_acquisition.py --workers 2 4 --seeds 3 --experiments 10 20 30
+
+Author:
+Noël Research Group, Universiteit van Amsterdam (UvA)
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from Dragonfly_BO import create_optimizer, ask_batch, format_input_with_variable_names, transform_variables
+from Model_update import ModelUpdatePolicy
+from Optimizer_checkpoint import record_hyperparameters
+from Parallel_acquisition import MAX_MEMORY, ParallelAcquisition
+from benchmark_batch_bo import VARIABLES, synthetic_yield
+
+
+def dragonfly_maximise(opt, acquisition):
+    """ Function maximising an acquisition of the optimizer as dragonfly does (opt.ask()).
+
+    :param opt: CPGPBandit
+    :param acquisition: str
+        'ei', 'ucb' or 'pi'
+    :return: tuple
+        best value of the acquisition, time [s]
+    """
+    from dragonfly.opt import gpb_acquisitions
+
+    maximise_with_method = gpb_acquisitions.maximise_with_method
+    values = []
+
+    def recording_maximise_with_method(*args, **kwargs):
+        value, point = maximise_with_method(*args, **kwargs)
+        values.append(float(np.ravel(value)[0]))
+        return value, point
+
+    gpb_acquisitions.maximise_with_method = recording_maximise_with_method
+    started = time.perf_counter()
+    try:
+        getattr(gpb_acquisitions.asy, acquisition)(opt.gp, opt._get_ancillary_data_for_acquisition(acquisition))
+    finally:
+        gpb_acquisitions.maximise_with_method = maximise_with_method
+    return values[-1], time.perf_counter() - started
+
+
+def parallel_maximise(opt, acquisition, pool):
+    """ Function maximising an acquisition of the optimizer with the pool (opt.ask() in ParallelAcquisition.used_by).
+
+    :param opt: CPGPBandit
+    :param acquisition: str
+        'ei', 'ucb' or 'pi'
+    :param pool: ParallelAcquisition
+    :return: tuple
+        best value of the acquisition, time [s], time of the longest start [s]
+    """
+    from dragonfly.opt import gpb_acquisitions
+
+    with pool.used_by(opt):
+        getattr(gpb_acquisitions.asy, acquisition)(opt.gp, opt._get_ancillary_data_for_acquisition(acquisition))
+    _, _, value, seconds, longest = pool.maximisations[-1]
+    return value, seconds, longest
+
+
+def benchmark(workers=(2, 4), seeds=3, experiments=(10, 20, 30), num_init=6, repeats=3, max_memory=MAX_MEMORY):
+    """ Function comparing the acquisition value and the time of dragonfly and of the pools.
+
+    :param workers: list
+        sizes of the pools compared to dragonfly
+    :param seeds: int
+        number of campaigns
+    :param experiments: list
+        numbers of experiments after which the acquisitions are maximised
+    :param num_init: int
+    :param repeats: int
+        maximisations of each acquisition per method (other random numbers)
+    :param max_memory: float
+        [MB] for the workers of a pool
+    :return: dict
+        method ('dragonfly', '2 workers', ...): {'value': mean value of the acquisition relative to dragonfly,
+        'not worse': fraction of the maximisations at least as good as the mean of dragonfly, 'time': mean time [s],
+        'longest': mean time of the longest start [s]}
+    """
+    fixed_vars = transform_variables(VARIABLES)
+    pools = {f'{n} workers': ParallelAcquisition(fixed_vars, max_workers=n, max_memory=max_memory) for n in workers}
+    for pool in pools.values():
+        pool.start()
+    runs = {name: [] for name in ['dragonfly'] + list(pools)}  # [relative value, not worse, time, longest]
+    try:
+        for seed in range(seeds):
+            np.random.seed(seed)
+            opt = create_optimizer(fixed_vars, num_init, ['yield'])
+            record_hyperparameters(opt)
+            model_update = ModelUpdatePolicy()
+            opt.initialise()
+            for x in opt.ask(num_init):
+                opt.tell([(x, synthetic_yield(format_input_with_variable_names(fixed_vars, x)))])
+                opt.step_idx += 1
+            for num in sorted(experiments):
+                while opt.step_idx < num:
+                    model_update.update(opt)
+                    x = ask_batch(opt, 1)[0]
+                    opt.tell([(x, synthetic_yield(format_input_with_variable_names(fixed_vars, x)))])
+                    opt.step_idx += 1
+                model_update.update(opt)
+                for acquisition in ('ei', 'ucb'):
+                    state = np.random.get_state()
+                    reference = [dragonfly_maximise(opt, acquisition) for _ in range(repeats)]
+                    mean = np.mean([value for value, _ in reference])
+                    runs['dragonfly'] += [[value / mean, value >= mean, seconds, seconds] for value, seconds in reference]
+                    for name, pool in pools.items():
+                        for _ in range(repeats):
+                            value, seconds, longest = parallel_maximise(opt, acquisition, pool)
+                            runs[name].append([value / mean, value >= mean, seconds, longest])
+                    np.random.set_state(state)  # the campaign goes on as without the benchmark
+                print(f'seed {seed}, {num} experiments done')
+    finally:
+        for pool in pools.values():
+            pool.shutdown()
+
+    print(f'\n{seeds} campaigns, ei and ucb maximised after {", ".join(map(str, experiments))} experiments, '
+          f'{repeats} times per method')
+    print('method        value / dragonfly   not worse   time [s]   longest start [s]')
+    results = {}
+    for name, values in runs.items():
+        relative, not_worse, seconds, longest = np.mean(values, axis=0)
+        results[name] = {'value': relative, 'not worse': not_worse, 'time': seconds, 'longest': longest}
+        print(f'{name:<12}  {relative:>17.4f}   {not_worse:>9.0%}   {seconds:>8.2f}   {longest:>17.2f}')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--seeds', type=int, default=3)
+    parser.add_argument('--experiments', type=int, nargs='+', default=[10, 20, 30])
+    parser.add_argument('--num-init', type=int, default=6)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--max-memory', type=float, default=MAX_MEMORY, help='[MB] for the workers of a pool')
+    args = parser.parse_args()
+    benchmark(args.workers, args.seeds, args.experiments, args.num_init, args.repeats, args.max_memory)
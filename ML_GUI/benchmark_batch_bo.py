@@ -0,0 +1,269 @@
+""" Benchmark of the batch mode of Dragonfly_BO (offline, no platform)
+
+Runs the optimization loop of dragonfly_bo (create_optimizer, ask_batch, run_batch) on a synthetic reaction and
+reports the regret (best possible yield - best yield found) against the wall-clock time of the campaign, for the
+sequential mode (batch size 1), for batches and for the asynchronous mode (--asynchronous: the next experiment is
+proposed while the platform runs, see run_asynchronous).
+
+The platform is simulated: an experiment takes the preparation of the sample, the residence time and the NMR analysis.
+Experiments queued on the platform are prepared while the previous one reacts (pipelined=True, see
+Platform_/Slug_scheduler), otherwise they run strictly one after the other. The optimizer is not simulated: the time it
+really takes to update the model and propose the next points is added to the campaign, during which the platform waits
+(asynchronous mode: only the part of it longer than the experiments running meanwhile).
+
+    python benchmark_batch_bo.py --batch-sizes 1 3 --seeds 3 --asynchronous
+
+Author:
+Noël Research Group, Universiteit van Amsterdam (UvA)
+"""
+
+import argparse
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from Dragonfly_BO import create_optimizer, ask_batch, run_batch, run_asynchronous, transform_variables
+
+VARIABLES = [
+    {'name': 'A', 'type': 'float', 'min': 0.1, 'max': 0.2},
+    {'name': 'B', 'type': 'float', 'min': 1, 'max': 18},
+    {'name': 'catalyst_type', 'type': 'discrete', 'items': ['CatA', 'CatB']},
+    {'name': 'catalyst_loading', 'type': 'float', 'min': 0.01, 'max': 0.1},
+    {'name': 'residence_time', 'type': 'float', 'min': 300, 'max': 900},  # seconds
+    {'name': 'eagle_percentage', 'type': 'float', 'min': 5, 'max': 100}
+]
+
+PREPARATION_TIME = 420  # [s] liquid handler: sample preparation and injection
+ANALYSIS_TIME = 300  # [s] delivery to the NMR, acquisition and processing
+
+
+def synthetic_yield(x):
+    """ Function giving the yield [%] of a synthetic photocatalytic reaction.
+
+    :param x: list
+        conditions in the platform format: ['A', conc, 'B', equiv, <catalyst>, loading, residence_time, eagle]
+    :return: float
+    """
+    a, b, catalyst, loading, residence_time, eagle = x[1], x[3], x[4], x[5], x[6], x[7]
+    # conversion: first order in photons (residence time x light intensity) and in catalyst
+    rate = 0.004 if catalyst == 'CatA' else 0.0025
+    conversion = 1 - np.exp(-rate * residence_time * (eagle / 100) ** 0.7 * loading / 0.05)
+    # selectivity: excess of B helps up to ~8 equivalents, concentrated mixtures over-react
+    selectivity = np.exp(-((b - 8) / 6) ** 2) * np.exp(-((a - 0.13) / 0.08) ** 2)
+    if catalyst == 'CatB':
+        selectivity = min(1.0, 1.15 * selectivity)
+    # over-irradiation degrades the product
+    degradation = np.exp(-0.0006 * max(residence_time * eagle / 100 - 400, 0))
+    return float(100 * conversion * selectivity * degradation)
+
+
+def random_conditions(num, rng):
+    """ Function drawing random conditions (platform format) in VARIABLES.
+
+    :param num: int
+    :param rng: numpy.random.RandomState
+    :return: list
+    """
+    bounds = {var['name']: var for var in VARIABLES}
+    conditions = []
+    for i in range(num):
+        conditions.append([
+            'A', rng.uniform(bounds['A']['min'], bounds['A']['max']),
+            'B', rng.uniform(bounds['B']['min'], bounds['B']['max']),
+            rng.choice(bounds['catalyst_type']['items']),
+            rng.uniform(bounds['catalyst_loading']['min'], bounds['catalyst_loading']['max']),
+            rng.uniform(bounds['residence_time']['min'], bounds['residence_time']['max']),
+            rng.uniform(bounds['eagle_percentage']['min'], bounds['eagle_percentage']['max']),
+        ])
+    return conditions
+
+
+def best_yield(num_samples=200000, seed=0):
+    """ Function estimating the best yield of the synthetic reaction (dense random sampling).
+
+    :param num_samples: int
+    :param seed: int
+    :return: float
+    """
+    rng = np.random.RandomState(seed)
+    return max(synthetic_yield(x) for x in random_conditions(num_samples, rng))
+
+
+class SimulatedQueue:
+    """ Simulated platform with the interface of Dragonfly_BO.PlatformQueue (submit/next_result).
+
+    The time is simulated: clock is the time [s] since the start of the campaign.
+    """
+
+    def __init__(self, pipelined=True):
+        """ Class initialization
+
+        :param pipelined: bool
+            True: the next experiment of the queue is prepared while the previous one reacts and is analysed
+        """
+        self.pipelined = pipelined
+        self.clock = 0.0
+        self.liquid_handler_free = 0.0
+        self.reactor_free = 0.0
+        self.proposal_ready = 0.0  # when the optimizer delivers the next point (asynchronous mode)
+        self.idle = 0.0  # [s] the platform waited for the optimizer
+        self.in_progress = []  # [end, index, x]
+        self.trace = []  # [clock, y] of every result
+
+    def wait_for_optimizer(self, seconds):
+        # the optimizer runs while the platform finishes what was queued
+        self.clock += seconds
+
+    def submit(self, index, x):
+        start = max(self.clock, self.liquid_handler_free, self.proposal_ready)
+        if not self.pipelined:
+            start = max(start, self.reactor_free)
+        if not self.in_progress:
+            self.idle += max(start - self.reactor_free, 0)
+        prepared = start + PREPARATION_TIME
+        end = max(prepared, self.reactor_free) + x[6] + ANALYSIS_TIME
+        self.liquid_handler_free = prepared if self.pipelined else end
+        self.reactor_free = end
+        self.in_progress.append([end, index, x])
+
+    def next_result(self):
+        self.in_progress.sort(key=lambda experiment: experiment[0])
+        end, index, x = self.in_progress.pop(0)
+        self.clock = max(self.clock, end)
+        y = synthetic_yield(x)  # single objective: a number, as returned by the platform
+        self.trace.append([self.clock, y])
+        return index, x, y, f'{self.clock:.0f}s'
+
+    def __len__(self):
+        return len(self.in_progress)
+
+
+class SimulatedExecutor:
+    """ Executor computing the proposals of run_asynchronous on the clock of a SimulatedQueue.
+
+    The proposal is computed at once (the simulated experiments do not take real time), the time it really took is
+    added to the simulated time at which it was started: the platform waits for it only if it becomes free before.
+    """
+
+    def __init__(self, queue):
+        """ Class initialization
+
+        :param queue: SimulatedQueue
+        """
+        self.queue = queue
+
+    def submit(self, function, *args):
+        future = Future()
+        started = time.perf_counter()
+        future.set_result(function(*args))
+        self.queue.proposal_ready = self.queue.clock + time.perf_counter() - started
+        return future
+
+
+def run_campaign(batch_size, num_init, num_total, seed, pipelined=True, asynchronous=False):
+    """ Function running one optimization on the simulated platform (as dragonfly_bo does).
+
+    :param batch_size: int
+    :param num_init: int
+    :param num_total: int
+    :param seed: int
+    :param pipelined: bool
+    :param asynchronous: bool
+    :return: SimulatedQueue
+        the platform, with the trace of the results
+    """
+    np.random.seed(seed)
+    fixed_vars = transform_variables(VARIABLES)
+    opt = create_optimizer(fixed_vars, num_init, ['yield'], batch_size)
+    queue = SimulatedQueue(pipelined)
+
+    opt.initialise()
+    init_expts = opt.ask(num_init)
+    index = 1
+    if asynchronous:
+        run_asynchronous(opt, queue, [], fixed_vars, num_init, ['yield'], num_total, index, batch_size,
+                         pending=init_expts, executor=SimulatedExecutor(queue))
+        return queue
+    for start in range(0, len(init_expts), batch_size):
+        index = run_batch(opt, queue, init_expts[start:start + batch_size], fixed_vars, index)
+
+    while opt.step_idx < num_total:
+        started = time.perf_counter()
+        opt._build_new_model()
+        opt._set_next_gp()
+        batch = ask_batch(opt, min(batch_size, num_total - opt.step_idx))
+        queue.wait_for_optimizer(time.perf_counter() - started)
+        index = run_batch(opt, queue, batch, fixed_vars, index)
+    return queue
+
+
+def regret_curve(trace, optimum, times):
+    """ Function giving the regret at given times of the campaign.
+
+    :param trace: list
+        [clock, y] of every result
+    :param optimum: float
+    :param times: list
+        [s]
+    :return: list
+        regret (nan before the first result)
+    """
+    regrets = []
+    for t in times:
+        ys = [y for clock, y in trace if clock <= t]
+        regrets.append(optimum - max(ys) if ys else np.nan)
+    return regrets
+
+
+def benchmark(batch_sizes=(1, 3), seeds=3, num_init=6, num_total=24, pipelined=True, asynchronous=False):
+    """ Function comparing the regret against the wall-clock time for several batch sizes.
+
+    :param batch_sizes: list
+    :param seeds: int
+        number of repetitions of each campaign
+    :param num_init: int
+    :param num_total: int
+    :param pipelined: bool
+    :param asynchronous: bool
+        also run each batch size in asynchronous mode
+    :return: dict
+        mode ('3', '3 async', ...): {'hours': campaign durations, 'idle': platform idle times [s],
+        'regret': mean regret at the reported times}
+    """
+    optimum = best_yield()
+    modes = [(q, False) for q in batch_sizes] + ([(q, True) for q in batch_sizes] if asynchronous else [])
+    platforms = {f'{q} async' if is_async else str(q):
+                 [run_campaign(q, num_init, num_total, seed, pipelined, is_async) for seed in range(seeds)]
+                 for q, is_async in modes}
+    longest = max(queue.trace[-1][0] for runs in platforms.values() for queue in runs)
+    times = np.linspace(0, longest, 9)[1:]
+
+    print(f'\nBest yield (random search, 200000 points): {optimum:.1f} %')
+    print(f'{num_total} experiments ({num_init} initial), {seeds} seeds, '
+          f'{"pipelined" if pipelined else "sequential"} platform\n')
+    print('Mean regret [%] at wall-clock time [h]')
+    print('batch       ' + ''.join(f'{t / 3600:>7.1f}' for t in times) + '   campaign [h]   idle [s]')
+    results = {}
+    for mode, runs in platforms.items():
+        regret = np.nanmean([regret_curve(queue.trace, optimum, times) for queue in runs], axis=0)
+        hours = [queue.trace[-1][0] / 3600 for queue in runs]
+        idle = [queue.idle for queue in runs]
+        results[mode] = {'hours': hours, 'idle': idle, 'regret': list(regret)}
+        print(f'{mode:<10}  ' + ''.join(f'{r:>7.1f}' for r in regret) +
+              f'   {np.mean(hours):>12.1f}   {np.mean(idle):>8.1f}')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 3])
+    parser.add_argument('--seeds', type=int, default=3)
+    parser.add_argument('--num-init', type=int, default=6)
+    parser.add_argument('--num-total', type=int, default=24)
+    parser.add_argument('--not-pipelined', action='store_true',
+                        help='the platform prepares an experiment only when the previous one is analysed')
+    parser.add_argument('--asynchronous', action='store_true',
+                        help='also propose the next experiments while the platform runs')
+    args = parser.parse_args()
+    benchmark(args.batch_sizes, args.seeds, args.num_init, args.num_total, not args.not_pipelined, args.asynchronous)
@@ -0,0 +1,122 @@
+""" Benchmark of the model updates of Dragonfly_BO (offline, no platform)
+
+Runs sequential campaigns (one experiment at a time, as dragonfly_bo) on the synthetic reaction of
+benchmark_batch_bo.py, with the model updated from scratch after every result (dragonfly) and with the policies of
+Model_update (hyper-parameters tuned warm every k results, GPs updated with the others). Reports the regret (best
+possible yield - best yield found) against the number of experiments and the time spent updating the model.
+
+The campaigns of a seed start from the same initialization points.
+
+    python benchmark_model_update.py --retune-every 1 5 10 --seeds 3 --num-total 40
+
+Author:
+Noël Research Group, Universiteit van Amsterdam (UvA)
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from Dragonfly_BO import create_optimizer, ask_batch, format_input_with_variable_names, transform_variables
+from Model_update import DRIFT, ModelUpdatePolicy
+from Optimizer_checkpoint import record_hyperparameters
+from benchmark_batch_bo import VARIABLES, best_yield, synthetic_yield
+
+
+def run_campaign(policy, num_init, num_total, seed):
+    """ Function running one sequential optimization on the synthetic reaction.
+
+    :param policy: ModelUpdatePolicy
+        None: the model is fitted from scratch after every result (opt._build_new_model())
+    :param num_init: int
+    :param num_total: int
+    :param seed: int
+    :return: tuple
+        yields of the experiments, time [s] of every model update
+    """
+    np.random.seed(seed)
+    fixed_vars = transform_variables(VARIABLES)
+    opt = create_optimizer(fixed_vars, num_init, ['yield'])
+    record_hyperparameters(opt)
+
+    opt.initialise()
+    yields, update_times = [], []
+    for x in opt.ask(num_init):
+        y = synthetic_yield(format_input_with_variable_names(fixed_vars, x))
+        opt.tell([(x, y)])
+        opt.step_idx += 1
+        yields.append(y)
+
+    while opt.step_idx < num_total:
+        started = time.perf_counter()
+        if policy is None:
+            opt._build_new_model()
+            opt._set_next_gp()
+        else:
+            policy.update(opt)
+        update_times.append(time.perf_counter() - started)
+        x = ask_batch(opt, 1)[0]
+        y = synthetic_yield(format_input_with_variable_names(fixed_vars, x))
+        opt.tell([(x, y)])
+        opt.step_idx += 1
+        yields.append(y)
+    return yields, update_times
+
+
+def benchmark(retune_every=(1, 5, 10), seeds=3, num_init=6, num_total=30, drift=DRIFT):
+    """ Function comparing the regret and the model update time of the policies.
+
+    :param retune_every: list
+        policies compared to the update from scratch (see ModelUpdatePolicy)
+    :param seeds: int
+        number of repetitions of each campaign
+    :param num_init: int
+    :param num_total: int
+    :param drift: float
+    :return: dict
+        policy ('dragonfly', 'every 5', ...): {'regret': mean regret after each experiment, 'update': mean total
+        update time [s], 'last': mean time of the last update [s], 'kinds': number of posterior/warm/cold updates}
+    """
+    optimum = best_yield()
+    policies = {'dragonfly': lambda: None}
+    policies.update({f'every {k}': (lambda k=k: ModelUpdatePolicy(k, drift)) for k in retune_every})
+    checkpoints = sorted({num_init, (num_init + num_total) // 2, num_total} |
+                         set(range(num_init, num_total + 1, max((num_total - num_init) // 4, 1))))
+
+    print(f'\nBest yield (random search, 200000 points): {optimum:.1f} %')
+    print(f'{num_total} experiments ({num_init} initial), {seeds} seeds, one experiment at a time\n')
+    print('Mean regret [%] after n experiments, time updating the model [s]')
+    print('policy      ' + ''.join(f'{n:>7d}' for n in checkpoints) + '     total   last   posterior/warm/cold')
+    results = {}
+    for name, make_policy in policies.items():
+        regrets, totals, lasts, kinds = [], [], [], {'posterior': 0, 'warm': 0, 'cold': 0}
+        for seed in range(seeds):
+            policy = make_policy()
+            yields, update_times = run_campaign(policy, num_init, num_total, seed)
+            regrets.append([optimum - max(yields[:n]) for n in checkpoints])
+            totals.append(sum(update_times))
+            lasts.append(update_times[-1])
+            if policy is None:
+                kinds['cold'] += len(update_times)
+            else:
+                for _, kind, _ in policy.updates:
+                    kinds[kind] += 1
+        regret = np.mean(regrets, axis=0)
+        results[name] = {'regret': list(regret), 'update': np.mean(totals), 'last': np.mean(lasts), 'kinds': kinds}
+        print(f'{name:<10}  ' + ''.join(f'{r:>7.1f}' for r in regret) +
+              f'   {np.mean(totals):>7.1f} {np.mean(lasts):>6.2f}   '
+              f'{kinds["posterior"]}/{kinds["warm"]}/{kinds["cold"]}')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--retune-every', type=int, nargs='+', default=[1, 5, 10])
+    parser.add_argument('--seeds', type=int, default=3)
+    parser.add_argument('--num-init', type=int, default=6)
+    parser.add_argument('--num-total', type=int, default=30)
+    parser.add_argument('--drift', type=float, default=DRIFT,
+                        help='drop of the log marginal likelihood per observation that calls for a cold fit')
+    args = parser.parse_args()
+    benchmark(args.retune_every, args.seeds, args.num_init, args.num_total, args.drift)
@@ -8,7 +8,7 @@ run_optimization_from_gui.py file which will call the Dragonfly_BO.py file which
 run_platform.py file in the Platform_ folder.
 
 In between each run, the new results will be displayed. This by reading the figures named figure_hypervolyme.png and
-figure_objectives.png.
+figure_objectives.png, and the results and vial usage of the campaign from the campaign store (Platform_/Campaign_store).
 
 Author: Pauline Tenblad
 """
@@ -20,6 +20,11 @@ import os
 import json
 import time
 import subprocess
+import sys
+
+# campaign store (standard library only, shared with Platform_)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Platform_'))
+from Campaign_store import open_store
 # --------------------------------------------- Streamlit page setup ---------------------------------------------------
 st.set_page_config(
     layout='wide',
@@ -129,7 +134,24 @@ if run_platform:
 
         placeholder_objectives = col1.empty()
         placeholder_hypervolume = col2.empty()
+        placeholder_results = st.empty()
+        placeholder_vials = st.empty()
+        store = open_store()
         while True:  # Update the progress images after each run
             placeholder_objectives .image('figure_objectives.png')
             placeholder_hypervolume.image('figure_hypervolume.png')
+            # results and vial usage of the campaign (the latest with this experiment name)
+            campaign_id = None if store is None else store.campaign(st.session_state['experiment_name'],
+                                                                    create=False)
+            if campaign_id is not None:
+                placeholder_results.dataframe([
+                    {'run': experiment['index'], 'timestamp': experiment['timestamp'], **experiment['objectives'],
+                     'conditions': str(experiment['parameters'])}
+                    for experiment in store.experiments(campaign_id)
+                ])
+                placeholder_vials.dataframe([
+                    {'vial': vial, 'chemical': usage['chemical'], 'volume used (mL)': round(usage['volume'], 3),
+                     'draws': usage['draws']}
+                    for vial, usage in store.vial_usage(campaign_id).items()
+                ])
             time.sleep(10)
\ No newline at end of file
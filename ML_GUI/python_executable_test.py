@@ -0,0 +1,71 @@
+""" Check of the cache of Dragonfly_BO.get_python_executable (offline, no conda needed)
+
+A fake 'conda' on PATH counts its calls and lists a fake environment. With the caches empty, the interpreter of the
+environment is looked up twice in the same process and once more after reloading Dragonfly_BO (a new campaign): conda
+must be called once, the other lookups use the in-memory cache and FILENAME_PYTHON_CACHE.
+
+    python python_executable_test.py
+
+Author:
+Noël Research Group, Universiteit van Amsterdam (UvA)
+"""
+
+import importlib
+import os
+import stat
+import sys
+import tempfile
+
+ENV_NAME = 'robochem_fake_platform'
+
+with tempfile.TemporaryDirectory() as folder:
+    # conda environments file (its mtime validates the JSON cache) and fake environment, in a fake home folder
+    home = os.path.join(folder, 'home')
+    os.makedirs(os.path.join(home, '.conda'))
+    open(os.path.join(home, '.conda', 'environments.txt'), 'w').close()
+    env_path = os.path.join(folder, 'envs', ENV_NAME)
+    python = os.path.join(env_path, 'python.exe') if sys.platform == 'win32' else \
+        os.path.join(env_path, 'bin', 'python')
+    os.makedirs(os.path.dirname(python))
+    open(python, 'w').close()
+
+    # fake conda: appends a line to calls.txt and prints the environment as 'conda info --envs'
+    bin_folder = os.path.join(folder, 'bin')
+    os.makedirs(bin_folder)
+    calls = os.path.join(folder, 'calls.txt')
+    if sys.platform == 'win32':
+        with open(os.path.join(bin_folder, 'conda.bat'), 'w') as filepointer:
+            filepointer.write(f'@echo off\r\necho call>> "{calls}"\r\necho {ENV_NAME}  {env_path}\r\n')
+    else:
+        conda = os.path.join(bin_folder, 'conda')
+        with open(conda, 'w') as filepointer:
+            filepointer.write(f'#!/bin/sh\necho call >> "{calls}"\necho "{ENV_NAME}  {env_path}"\n')
+        os.chmod(conda, os.stat(conda).st_mode | stat.S_IEXEC)
+    os.environ['PATH'] = bin_folder + os.pathsep + os.environ['PATH']
+    os.environ['HOME'] = os.environ['USERPROFILE'] = home
+    os.environ.pop('ROBOCHEM_PLATFORM_PYTHON', None)
+
+    # FILENAME_PYTHON_CACHE is relative to the working folder ('..')
+    work = os.path.join(folder, 'work')
+    os.makedirs(work)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(work)
+
+    import Dragonfly_BO
+    Dragonfly_BO = importlib.reload(Dragonfly_BO)  # CONDA_ENVIRONMENTS_FILE of the fake home folder
+    Dragonfly_BO._python_executables.clear()
+    if os.path.exists(Dragonfly_BO.FILENAME_PYTHON_CACHE):
+        os.remove(Dragonfly_BO.FILENAME_PYTHON_CACHE)
+
+    found = [Dragonfly_BO.get_python_executable(ENV_NAME), Dragonfly_BO.get_python_executable(ENV_NAME)]
+    Dragonfly_BO = importlib.reload(Dragonfly_BO)  # new campaign: in-memory cache empty, JSON cache kept
+    found.append(Dragonfly_BO.get_python_executable(ENV_NAME))
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    with open(calls) as filepointer:
+        conda_calls = len(filepointer.read().split())
+    print(f'python executables: {found}')
+    print(f'conda calls: {conda_calls}')
+    assert found == [python] * 3, found
+    assert conda_calls == 1, conda_calls
+    print('OK')
@@ -17,9 +17,13 @@ The data that has to be included per run is:
         objectives (for instance 'yield'),
         dict_filename (filename where data for previous runs are stored, and where to store the data),
         previous_runs (whether the model should use previous runs or not [False/True]),
+        batch_size (number of experiments proposed at once and queued on the platform, optional, default 1),
+        asynchronous (propose the next experiment while the platform runs, optional, default False),
 
     Values used by Run_platform.py:
         sample_information_filename (Path and name to file used by the liquid handler)
+        overlap_experiments (prepare the next experiment while the previous one is processed and cleaned, optional,
+        default False)
 
     Values used by NMR Control loop > NMR_loop.py:
         exp_name (experiment name)
@@ -30,6 +34,7 @@ The data that has to be included per run is:
 """
 
 from Dragonfly_BO import dragonfly_bo
+from Setup_config import reload_setup, setup_filename  # Platform_ is added to the path by Dragonfly_BO
 import json
 
 # Parameter setup
@@ -51,6 +56,8 @@ A = {
     'num_total': 25,  # number of total experiments to perform
     'objectives': ['yield'],
     'previous_runs': False,
+    'batch_size': 1,  # experiments proposed at once (queued on the platform)
+    'asynchronous': False,  # propose the next experiment while the platform runs
     'dict_filename': '../AS_example.json',
 
     # Values used by Run_platform.py
@@ -82,18 +89,22 @@ if __name__ == '__main__':
     for experimental_setup in experimental_setups:
         print(experimental_setup)
         # Serializing json
-        with open('../experimental_setup.json', 'w') as outfile:
+        with open(setup_filename(), 'w') as outfile:
             json.dump(experimental_setup, outfile, indent=4)
+        # read back and validated: the settings of this campaign for the optimizer and the platform
+        setup = reload_setup()
 
         # Each time dragonfly_bo is called it will in itself call run_platform the number of time that is needed.
         # The information that changes per optimization setup is found in the json file.
 
         dragonfly_bo(
-            experimental_setup['reactor_volume'],
-            experimental_setup['variables'],
-            experimental_setup['num_init'],
-            experimental_setup['num_total'],
-            objectives_=experimental_setup['objectives'],
-            dict_filename_=experimental_setup['dict_filename'],
-            previous_runs_=experimental_setup['previous_runs'],
+            setup.reactor_volume,
+            setup.variables,
+            setup.num_init,
+            setup.num_total,
+            objectives_=setup.objectives,
+            dict_filename_=setup.dict_filename,
+            previous_runs_=setup.previous_runs,
+            batch_size_=setup.batch_size,
+            asynchronous_=setup.asynchronous,
         )
\ No newline at end of file
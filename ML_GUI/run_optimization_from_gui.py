@@ -5,23 +5,24 @@ Script to run optimization from the GUI!
 """
 
 from Dragonfly_BO import dragonfly_bo
-import json
+from Setup_config import reload_setup  # Platform_ is added to the path by Dragonfly_BO
 
 if __name__ == '__main__':
-    # Serializing json
-    with open('../experimental_setup.json', 'r') as infile:
-        experimental_setup = json.load(infile)
-    print(experimental_setup)
+    # read and validate the settings written by the GUI
+    experimental_setup = reload_setup()
+    print(experimental_setup.as_dict())
 
     # Each time dragonfly_bo is called it will in itself call run_platform the number of time that is needed.
     # The information that changes per optimization setup is found in the json file.
 
     dragonfly_bo(
-        experimental_setup['reactor_volume'],
-        experimental_setup['variables'],
-        experimental_setup['num_init'],
-        experimental_setup['num_total'],
-        objectives_=experimental_setup['objectives'],
-        dict_filename_=experimental_setup['dict_filename'],
-        previous_runs_=experimental_setup['previous_runs'],
+        experimental_setup.reactor_volume,
+        experimental_setup.variables,
+        experimental_setup.num_init,
+        experimental_setup.num_total,
+        objectives_=experimental_setup.objectives,
+        dict_filename_=experimental_setup.dict_filename,
+        previous_runs_=experimental_setup.previous_runs,
+        batch_size_=experimental_setup.batch_size,
+        asynchronous_=experimental_setup.asynchronous,
     )
\ No newline at end of file
@@ -0,0 +1,546 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Campaign store: one local SQLite database (standard library only) with what
+the optimizer and the platform know about the campaigns, so dashboards and
+the optimizer query what they need instead of reloading JSON, CSV and Excel
+files:
+- campaigns: name, start, objectives and variables of every campaign (a new
+  campaign with the name of an older one is a new row, the latest is the
+  current one);
+- experiments: index, parameters (JSON, typed), timestamp (name of the data
+  files) and status of every experiment of a campaign;
+- objectives: measured value of every objective of an experiment;
+- artifacts: paths of the raw data of an experiment (phase sensor logs,
+  processed NMR data, ...);
+- inventory_events: volume drawn from a vial of the liquid handler;
+- inventory: stock solutions loaded in the liquid handler, as the platform
+  last saw them (concentration and volume left of every chemical), for the
+  feasibility of the samples proposed by the optimizer.
+
+    store = open_store()
+    campaign = store.start_campaign('my_experiment', ['yield'], variables)
+    store.record_result(campaign, 1, x, ['yield'], 71.2, '2024-01-01_T1200')
+    store.best(campaign, 'yield')
+
+The optimizer (ML_GUI) and the platform worker (Platform_) write to the same
+file: the database is in WAL mode, a writer waits for the other one instead of
+failing. The file is ../campaign_store.sqlite (next to experimental_setup.json)
+unless the environment variable ROBOCHEM_CAMPAIGN_STORE gives another one ('0'
+switches the store off).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+__all__ = ['CampaignStore', 'open_store', 'store_filename', 'campaign_name']
+
+STORE_ENV = 'ROBOCHEM_CAMPAIGN_STORE'
+STORE_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              '..', '..', 'campaign_store.sqlite')
+BUSY_TIMEOUT = 30  # [s] longest wait for the other process to finish writing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    started REAL NOT NULL,
+    objectives TEXT,
+    variables TEXT,
+    results_filename TEXT
+);
+CREATE INDEX IF NOT EXISTS campaigns_name ON campaigns (name, started);
+
+CREATE TABLE IF NOT EXISTS experiments (
+    id INTEGER PRIMARY KEY,
+    campaign_id INTEGER NOT NULL REFERENCES campaigns (id),
+    idx INTEGER NOT NULL,
+    parameters TEXT,
+    timestamp TEXT,
+    status TEXT NOT NULL,
+    updated REAL NOT NULL,
+    UNIQUE (campaign_id, idx)
+);
+CREATE INDEX IF NOT EXISTS experiments_time
+    ON experiments (campaign_id, updated);
+CREATE INDEX IF NOT EXISTS experiments_condition
+    ON experiments (campaign_id, parameters);
+CREATE INDEX IF NOT EXISTS experiments_timestamp ON experiments (timestamp);
+
+CREATE TABLE IF NOT EXISTS objectives (
+    experiment_id INTEGER NOT NULL REFERENCES experiments (id),
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (experiment_id, name)
+);
+CREATE INDEX IF NOT EXISTS objectives_value ON objectives (name, value);
+
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY,
+    experiment_id INTEGER NOT NULL REFERENCES experiments (id),
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    UNIQUE (experiment_id, kind, path)
+);
+CREATE INDEX IF NOT EXISTS artifacts_kind ON artifacts (kind);
+
+CREATE TABLE IF NOT EXISTS inventory_events (
+    id INTEGER PRIMARY KEY,
+    campaign_id INTEGER NOT NULL REFERENCES campaigns (id),
+    experiment_id INTEGER REFERENCES experiments (id),
+    vial TEXT NOT NULL,
+    chemical TEXT,
+    position TEXT,
+    volume REAL NOT NULL,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS inventory_campaign_time
+    ON inventory_events (campaign_id, time);
+CREATE INDEX IF NOT EXISTS inventory_vial ON inventory_events (vial);
+
+CREATE TABLE IF NOT EXISTS inventory (
+    chemical TEXT PRIMARY KEY,
+    concentration REAL NOT NULL,
+    volume REAL NOT NULL,
+    solvent INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+def store_filename():
+    """Function to get the database of the campaigns.
+
+    :return: str
+        Name of the file, None if the store is switched off
+    """
+    value = os.getenv(STORE_ENV, '').strip()
+    if value.lower() in ('0', 'false', 'no', 'off'):
+        return None
+    if value.lower() in ('', '1', 'true', 'yes', 'on'):
+        return os.path.normpath(STORE_FILENAME)
+    return value
+
+
+def open_store(filename=None):
+    """Function to open the campaign store.
+
+    :param filename: str
+        Database (default: store_filename())
+    :return: CampaignStore
+        None if the store is switched off
+    """
+    filename = filename if filename is not None else store_filename()
+    if filename is None:
+        return None
+    return CampaignStore(filename)
+
+
+def campaign_name(results_filename):
+    """Function to get the name of a campaign from its results file
+    (<experiment name>_results.json, see the Run Platform page).
+
+    :param results_filename: str
+    :return: str
+    """
+    name = os.path.splitext(os.path.basename(results_filename.replace('\\', '/')))[0]
+    return name[:-len('_results')] if name.endswith('_results') else name
+
+
+def _parameters(parameters):
+    # same text for the same conditions: the index on it finds them
+    return json.dumps(list(parameters))
+
+
+class CampaignStore:
+    """Campaigns, experiments, objectives, raw data and vial usage"""
+
+    def __init__(self, filename):
+        """ Class initialization
+
+        :param filename: str
+            Database (created if needed)
+        """
+        self.filename = filename
+        folder = os.path.dirname(os.path.abspath(filename))
+        os.makedirs(folder, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, timeout=BUSY_TIMEOUT,
+                                          check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+        with self.lock, self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def _query(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    # ------------------------------------------------------------ campaigns
+    def start_campaign(self, name, objectives=None, variables=None,
+                       results_filename=None, resume=False):
+        """Function to start (or resume) a campaign.
+
+        :param name: str
+            Name of the campaign (experiment name of the GUI)
+        :param objectives: list
+            Objectives of the optimization
+        :param variables: list
+            Variable space of the optimization
+        :param results_filename: str
+            Campaign JSON of the optimizer
+        :param resume: boolean
+            True to continue the latest campaign with this name (a new one is
+            started if there is none)
+        :return: int
+            Id of the campaign
+        """
+        if resume:
+            campaign_id = self.campaign(name, create=False)
+            if campaign_id is not None:
+                return campaign_id
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO campaigns (name, started, objectives, variables, '
+                'results_filename) VALUES (?, ?, ?, ?, ?)',
+                (name, time.time(), json.dumps(objectives),
+                 json.dumps(variables), results_filename)
+            )
+        return cursor.lastrowid
+
+    def campaign(self, name, create=True):
+        """Function to get the current (latest) campaign with a name.
+
+        :param name: str
+        :param create: boolean
+            True to start a campaign if there is none with this name
+        :return: int
+            Id of the campaign, None if there is none (and create is False)
+        """
+        rows = self._query('SELECT id FROM campaigns WHERE name = ? '
+                           'ORDER BY started DESC, id DESC LIMIT 1', (name,))
+        if rows:
+            return rows[0]['id']
+        return self.start_campaign(name) if create else None
+
+    def campaigns(self, name=None):
+        """Function to list the campaigns (latest first).
+
+        :param name: str
+            Only the campaigns with this name (default: all)
+        :return: list
+            dict per campaign: id, name, started, objectives, variables,
+            results_filename, experiments (number done)
+        """
+        rows = self._query(
+            'SELECT campaigns.*, (SELECT COUNT(*) FROM experiments WHERE '
+            "campaign_id = campaigns.id AND status = 'done') AS experiments "
+            'FROM campaigns WHERE ? IS NULL OR name = ? '
+            'ORDER BY started DESC, id DESC', (name, name)
+        )
+        campaigns = []
+        for row in rows:
+            campaign = dict(row)
+            campaign['objectives'] = json.loads(campaign['objectives'] or 'null')
+            campaign['variables'] = json.loads(campaign['variables'] or 'null')
+            campaigns.append(campaign)
+        return campaigns
+
+    # ---------------------------------------------------------- experiments
+    def _experiment(self, campaign_id, index, parameters=None, timestamp=None,
+                    status=None):
+        # row of an experiment, created by whichever process records it first
+        # (called with the lock held, in a transaction)
+        self.connection.execute(
+            'INSERT INTO experiments (campaign_id, idx, parameters, timestamp, '
+            'status, updated) VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (campaign_id, idx) DO UPDATE SET '
+            'parameters = COALESCE(excluded.parameters, parameters), '
+            'timestamp = COALESCE(excluded.timestamp, timestamp), '
+            "status = CASE WHEN ? IS NULL THEN status ELSE excluded.status END, "
+            'updated = excluded.updated',
+            (campaign_id, index,
+             None if parameters is None else _parameters(parameters),
+             timestamp, status or 'running', time.time(), status)
+        )
+        return self.connection.execute(
+            'SELECT id FROM experiments WHERE campaign_id = ? AND idx = ?',
+            (campaign_id, index)
+        ).fetchone()['id']
+
+    def record_experiment(self, campaign_id, index, parameters=None,
+                          timestamp=None, status=None):
+        """Function to record an experiment (e.g., when the platform starts
+        it).
+
+        :param campaign_id: int
+        :param index: int
+            Index of the experiment in the campaign
+        :param parameters: list
+            Parameters of the experiment (platform format)
+        :param timestamp: str
+            Name of the data files of the experiment
+        :param status: str
+            'running' (new experiment), 'done', 'failed', ... (default:
+            unchanged)
+        :return: int
+            Id of the experiment
+        """
+        with self.lock, self.connection:
+            return self._experiment(campaign_id, index, parameters, timestamp,
+                                    status)
+
+    def record_result(self, campaign_id, index, parameters, objectives, y,
+                      timestamp, status='done'):
+        """Function to record the result of an experiment.
+
+        :param campaign_id: int
+        :param index: int
+            Index of the experiment in the campaign
+        :param parameters: list
+            Parameters of the experiment (platform format)
+        :param objectives: list
+            Names of the objectives
+        :param y: float or list
+            Value(s) of the objectives, in the order of objectives
+        :param timestamp: str
+            Name of the data files of the experiment
+        :param status: str
+        :return: int
+            Id of the experiment
+        """
+        values = list(y) if isinstance(y, (list, tuple)) else [y]
+        with self.lock, self.connection:
+            experiment_id = self._experiment(campaign_id, index, parameters,
+                                             timestamp, status)
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO objectives (experiment_id, name, value) '
+                'VALUES (?, ?, ?)',
+                [(experiment_id, name, value)
+                 for name, value in zip(objectives, values)]
+            )
+        return experiment_id
+
+    def experiments(self, campaign_id, status='done', since=None):
+        """Function to get the experiments of a campaign (in the order of
+        their index).
+
+        :param campaign_id: int
+        :param status: str
+            Only the experiments with this status (None: all)
+        :param since: float
+            Only the experiments updated after this time [s since epoch]
+        :return: list
+            dict per experiment: index, parameters, timestamp, status,
+            updated, objectives (dict name: value)
+        """
+        rows = self._query(
+            'SELECT id, idx, parameters, timestamp, status, updated '
+            'FROM experiments WHERE campaign_id = ? '
+            'AND (? IS NULL OR status = ?) AND (? IS NULL OR updated > ?) '
+            'ORDER BY idx', (campaign_id, status, status, since, since)
+        )
+        return self._with_objectives(rows)
+
+    def _with_objectives(self, rows):
+        if not rows:
+            return []
+        ids = [row['id'] for row in rows]
+        values = {}
+        for row in self._query(
+                'SELECT experiment_id, name, value FROM objectives WHERE '
+                f'experiment_id IN ({", ".join("?" * len(ids))})', ids):
+            values.setdefault(row['experiment_id'], {})[row['name']] = \
+                row['value']
+        return [{'index': row['idx'],
+                 'parameters': json.loads(row['parameters'] or 'null'),
+                 'timestamp': row['timestamp'], 'status': row['status'],
+                 'updated': row['updated'],
+                 'objectives': values.get(row['id'], {})} for row in rows]
+
+    def find_experiments(self, campaign_id, parameters):
+        """Function to get the experiments of a campaign run with given
+        conditions.
+
+        :param campaign_id: int
+        :param parameters: list
+            Parameters (platform format)
+        :return: list
+            dict per experiment (see experiments)
+        """
+        rows = self._query(
+            'SELECT id, idx, parameters, timestamp, status, updated '
+            'FROM experiments WHERE campaign_id = ? AND parameters = ? '
+            'ORDER BY idx', (campaign_id, _parameters(parameters))
+        )
+        return self._with_objectives(rows)
+
+    def best(self, campaign_id, objective, limit=1):
+        """Function to get the experiments with the highest value of an
+        objective.
+
+        :param campaign_id: int
+        :param objective: str
+        :param limit: int
+            Number of experiments
+        :return: list
+            dict per experiment (see experiments), best first
+        """
+        rows = self._query(
+            'SELECT experiments.id, idx, parameters, timestamp, status, '
+            'updated FROM experiments JOIN objectives '
+            'ON objectives.experiment_id = experiments.id '
+            "WHERE campaign_id = ? AND status = 'done' AND name = ? "
+            'ORDER BY value DESC LIMIT ?', (campaign_id, objective, limit)
+        )
+        return self._with_objectives(rows)
+
+    def results_dict(self, campaign_id):
+        """Function to get the results of a campaign as in the campaign JSON
+        of the optimizer.
+
+        :param campaign_id: int
+        :return: dict
+            repr(parameters): [objective value(s), timestamp]
+        """
+        campaign = self._query('SELECT objectives FROM campaigns WHERE id = ?',
+                               (campaign_id,))
+        names = json.loads(campaign[0]['objectives'] or 'null') \
+            if campaign else None
+        results = {}
+        for experiment in self.experiments(campaign_id):
+            values = experiment['objectives']
+            if names and all(name in values for name in names):
+                y = [values[name] for name in names]
+            else:
+                y = list(values.values())
+            results[repr(experiment['parameters'])] = [
+                y if len(y) > 1 else y[0] if y else None,
+                experiment['timestamp']
+            ]
+        return results
+
+    # -------------------------------------------------------- raw data
+    def add_artifacts(self, campaign_id, index, artifacts):
+        """Function to record the paths of the raw data of an experiment.
+
+        :param campaign_id: int
+        :param index: int
+            Index of the experiment in the campaign
+        :param artifacts: dict
+            kind (e.g. 'processed_nmr', 'phase_sensor_PS1'): path
+        """
+        with self.lock, self.connection:
+            experiment_id = self._experiment(campaign_id, index)
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO artifacts (experiment_id, kind, path) '
+                'VALUES (?, ?, ?)',
+                [(experiment_id, kind, path)
+                 for kind, path in artifacts.items() if path is not None]
+            )
+
+    def artifacts(self, campaign_id, index=None, kind=None):
+        """Function to get the paths of the raw data of a campaign.
+
+        :param campaign_id: int
+        :param index: int
+            Only the data of this experiment (default: all)
+        :param kind: str
+            Only the data of this kind (default: all)
+        :return: list
+            dict per file: index, kind, path
+        """
+        return [dict(row) for row in self._query(
+            'SELECT idx AS "index", kind, path FROM artifacts JOIN experiments '
+            'ON artifacts.experiment_id = experiments.id '
+            'WHERE campaign_id = ? AND (? IS NULL OR idx = ?) '
+            'AND (? IS NULL OR kind = ?) ORDER BY idx, kind',
+            (campaign_id, index, index, kind, kind)
+        )]
+
+    # ---------------------------------------------------------- inventory
+    def add_inventory_events(self, campaign_id, index, events):
+        """Function to record the volumes drawn from the vials for an
+        experiment.
+
+        :param campaign_id: int
+        :param index: int
+            Index of the experiment in the campaign (None: not for an
+            experiment)
+        :param events: list
+            dict per vial: vial, chemical, position, volume [mL]
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            experiment_id = None if index is None else \
+                self._experiment(campaign_id, index)
+            self.connection.executemany(
+                'INSERT INTO inventory_events (campaign_id, experiment_id, '
+                'vial, chemical, position, volume, time) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(campaign_id, experiment_id, event['vial'],
+                  event.get('chemical'), event.get('position'),
+                  event['volume'], now) for event in events]
+            )
+
+    def vial_usage(self, campaign_id):
+        """Function to get the volume drawn from every vial in a campaign.
+
+        :param campaign_id: int
+        :return: dict
+            vial: {'chemical', 'volume' [mL], 'draws', 'last' [s since epoch]}
+        """
+        rows = self._query(
+            'SELECT vial, chemical, SUM(volume) AS volume, COUNT(*) AS draws, '
+            'MAX(time) AS last FROM inventory_events WHERE campaign_id = ? '
+            'GROUP BY vial ORDER BY vial', (campaign_id,)
+        )
+        return {row['vial']: {'chemical': row['chemical'],
+                              'volume': row['volume'], 'draws': row['draws'],
+                              'last': row['last']} for row in rows}
+
+    def set_inventory(self, inventory):
+        """Function to replace the stock solutions loaded in the liquid
+        handler.
+
+        :param inventory: dict
+            {'stocks': {chemical: {'concentration' [M], 'volume' [mL] that can
+            still be drawn from one vial}}, 'solvent': chemical} (see
+            sample_feasibility.Inventory.as_dict)
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM inventory')
+            self.connection.executemany(
+                'INSERT INTO inventory (chemical, concentration, volume, '
+                'solvent, updated) VALUES (?, ?, ?, ?, ?)',
+                [(chemical, stock['concentration'], stock['volume'],
+                  int(chemical == inventory.get('solvent')), now)
+                 for chemical, stock in inventory['stocks'].items()]
+            )
+
+    def inventory(self):
+        """Function to get the stock solutions loaded in the liquid handler.
+
+        :return: dict
+            as set_inventory, with 'updated' [s since epoch] (None if the
+            platform did not publish them)
+        """
+        rows = self._query('SELECT * FROM inventory ORDER BY chemical')
+        if not rows:
+            return None
+        solvents = [row['chemical'] for row in rows if row['solvent']]
+        return {'stocks': {row['chemical']: {
+                    'concentration': row['concentration'],
+                    'volume': row['volume']} for row in rows},
+                'solvent': solvents[0] if solvents else None,
+                'updated': max(row['updated'] for row in rows)}
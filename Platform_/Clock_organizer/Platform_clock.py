@@ -0,0 +1,555 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Clocks used by the platform for all waits and timestamps.
+
+- RealClock: wall-clock time (default, the one used with the hardware).
+- AcceleratedClock: time runs N times faster than the wall clock.
+- VirtualClock: discrete-event clock. Time does not flow on its own: when
+  everybody is waiting, it jumps straight to the earliest pending wake-up.
+
+A simulated campaign (virtual instruments + accelerated or virtual clock)
+runs in a fraction of the real time. The clock is passed to the platform
+(Platform(clock=...)) or selected with the environment variable
+ROBOCHEM_CLOCK ('real', 'accelerated:<N>' or 'virtual'), so that processes
+started by the GUI inherit it.
+
+Usage:
+    clock = get_clock()
+    clock.sleep(1)             # instead of time.sleep(1)
+    await clock.asleep(1)      # instead of await asyncio.sleep(1)
+    clock.time()               # instead of time.time()
+    clock.now()                # instead of datetime.now()
+    clock.run(coroutine())     # instead of asyncio.run(coroutine())
+
+Coroutines run with clock.run() live in an event loop following the clock,
+so asyncio.sleep, asyncio.wait_for, etc. follow the clock as well.
+
+A process running many coroutines one after the other (e.g., the platform
+worker) keeps a single event loop with LoopRunner:
+    runner = LoopRunner(clock)
+    runner.run(coroutine())    # same loop every time
+    runner.close()
+"""
+
+import asyncio
+import concurrent.futures
+import datetime
+import os
+import selectors
+import threading
+import time
+
+CLOCK_ENV = 'ROBOCHEM_CLOCK'
+# Real time [s] everybody must have been waiting before a VirtualClock jumps
+AUTOJUMP_THRESHOLD = 0.001
+
+_clock = None
+_clock_lock = threading.Lock()
+
+
+class RealClock(object):
+    """Wall-clock time"""
+
+    name = 'real'
+
+    def time(self):
+        """Seconds since the epoch, like time.time()"""
+        return time.time()
+
+    def monotonic(self):
+        """Seconds of a monotonic clock, like time.monotonic()"""
+        return time.monotonic()
+
+    def now(self):
+        """Current date and time, like datetime.datetime.now()"""
+        return datetime.datetime.fromtimestamp(self.time())
+
+    def localtime(self):
+        """Current local time, like time.localtime()"""
+        return time.localtime(self.time())
+
+    def strftime(self, format_string):
+        """Format the current local time, like time.strftime()"""
+        return time.strftime(format_string, self.localtime())
+
+    def sleep(self, seconds):
+        """Block the calling thread, like time.sleep()
+
+        :param seconds: float
+            Duration of the wait [s] in the time of this clock
+        """
+        time.sleep(max(seconds, 0))
+
+    async def asleep(self, seconds):
+        """Suspend the calling coroutine, like asyncio.sleep()
+
+        :param seconds: float
+            Duration of the wait [s] in the time of this clock
+        """
+        await asyncio.sleep(max(seconds, 0))
+
+    def new_event_loop(self):
+        """Create an event loop following this clock"""
+        return asyncio.new_event_loop()
+
+    def _join(self):
+        # a thread starts running an event loop of this clock
+        pass
+
+    def _leave(self):
+        pass
+
+    def _reserve(self):
+        # work is handed to another thread (see _ClockEventLoop)
+        pass
+
+    def _adopt(self):
+        pass
+
+    def _release(self):
+        pass
+
+    def run(self, coroutine):
+        """Run a coroutine in a new event loop following this clock, like
+        asyncio.run() (which does not accept a loop on Python 3.9).
+
+        :param coroutine: coroutine
+            Coroutine to execute
+        :return:
+            Result of the coroutine
+        """
+        if asyncio._get_running_loop() is not None:
+            raise RuntimeError(
+                'run() cannot be called from a running event loop'
+            )
+        with LoopRunner(self) as runner:
+            return runner.run(coroutine)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}()'
+
+
+class AcceleratedClock(RealClock):
+    """Clock running factor times faster than the wall clock"""
+
+    name = 'accelerated'
+
+    def __init__(self, factor, start=None):
+        """ Class initialization
+
+        :param factor: float
+            Acceleration (e.g., 60: one hour takes one minute)
+        :param start: float
+            Initial time (seconds since the epoch), default: now
+        """
+        if factor <= 0:
+            raise ValueError('The acceleration factor must be positive.')
+        self.factor = float(factor)
+        self._origin_real = time.monotonic()
+        self._origin_time = time.time() if start is None else start
+
+    def monotonic(self):
+        return (time.monotonic() - self._origin_real) * self.factor
+
+    def time(self):
+        return self._origin_time + self.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(max(seconds, 0) / self.factor)
+
+    async def asleep(self, seconds):
+        loop = asyncio.get_running_loop()
+        if getattr(loop, 'clock', None) is self:
+            await asyncio.sleep(max(seconds, 0))
+        else:
+            await asyncio.sleep(max(seconds, 0) / self.factor)
+
+    def new_event_loop(self):
+        return _ClockEventLoop(self)
+
+    def _select(self, selector, timeout):
+        if timeout is not None:
+            timeout = max(timeout, 0) / self.factor
+        return selector.select(timeout)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.factor:g})'
+
+
+class VirtualClock(RealClock):
+    """Discrete-event clock: waiting takes no real time.
+
+    The time only changes when every participant is waiting: it then jumps
+    to the earliest wake-up among all the waits in progress. Participants
+    are the threads running an event loop of this clock (clock.run()), so
+    the time never jumps while a coroutine is executing, and the threads
+    running work submitted by such a loop (asyncio.to_thread,
+    loop.run_in_executor), from its submission to its end. Other threads
+    (e.g., serial readers, the Spinsolve listener) can wait on the clock
+    too; they get AUTOJUMP_THRESHOLD of real time to react before the next
+    jump, like the autojump of trio's MockClock.
+    """
+
+    name = 'virtual'
+
+    def __init__(self, start=None, autojump_threshold=AUTOJUMP_THRESHOLD):
+        """ Class initialization
+
+        :param start: float
+            Initial time (seconds since the epoch), default: now
+        :param autojump_threshold: float
+            Real time [s] without activity before the clock jumps
+        """
+        self._origin_time = time.time() if start is None else start
+        self.autojump_threshold = autojump_threshold
+        self._now = 0.0
+        self._condition = threading.Condition()
+        self._wake_ups = {}  # id of the wait: wake-up time
+        self._busy = 0  # participants which are not waiting
+        self._participants = threading.local()
+        self._last_activity = time.monotonic()
+
+    def monotonic(self):
+        with self._condition:
+            return self._now
+
+    def time(self):
+        return self._origin_time + self.monotonic()
+
+    def advance(self, seconds):
+        """Move the time forward by hand (e.g., in scripts without waits)
+
+        :param seconds: float
+            Time step [s]
+        """
+        with self._condition:
+            self._now += max(seconds, 0)
+            self._condition.notify_all()
+
+    def sleep(self, seconds):
+        self._wait(self.monotonic() + max(seconds, 0))
+
+    async def asleep(self, seconds):
+        loop = asyncio.get_running_loop()
+        if getattr(loop, 'clock', None) is self:
+            await asyncio.sleep(max(seconds, 0))
+        else:
+            # a foreign event loop cannot wait on this clock: wait in a thread
+            await loop.run_in_executor(None, self.sleep, seconds)
+
+    def new_event_loop(self):
+        return _ClockEventLoop(self)
+
+    def _is_participant(self):
+        return getattr(self._participants, 'count', 0) > 0
+
+    def _join(self):
+        with self._condition:
+            self._participants.count = \
+                getattr(self._participants, 'count', 0) + 1
+            if self._participants.count == 1:
+                self._busy += 1
+                self._last_activity = time.monotonic()
+
+    def _leave(self):
+        with self._condition:
+            self._participants.count -= 1
+            if self._participants.count == 0:
+                self._busy -= 1
+                self._last_activity = time.monotonic()
+                self._condition.notify_all()
+
+    def _reserve(self):
+        # work handed to another thread keeps the clock busy until that thread
+        # takes it over (_adopt) or it is dropped before starting (_release)
+        with self._condition:
+            self._busy += 1
+            self._last_activity = time.monotonic()
+
+    def _adopt(self):
+        # the thread running reserved work becomes a participant
+        with self._condition:
+            self._join()
+            self._release()
+
+    def _release(self):
+        with self._condition:
+            self._busy -= 1
+            self._last_activity = time.monotonic()
+            self._condition.notify_all()
+
+    def _select(self, selector, timeout):
+        events = selector.select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            # nothing scheduled: only I/O (or another thread) can wake us up
+            deadline = None
+        else:
+            deadline = self.monotonic() + timeout
+        return self._wait(deadline, poll=selector.select)
+
+    def _wait(self, deadline, poll=None):
+        """Wait until the clock reaches deadline (None: forever).
+
+        :param deadline: float
+            Wake-up time, in the time of this clock
+        :param poll: function
+            Function polling for I/O with a real timeout, e.g.
+            selector.select; the wait ends if it returns something
+        :return: list
+            What poll returned ([] if the deadline was reached)
+        """
+        key = object()
+        participant = self._is_participant()
+        with self._condition:
+            if deadline is not None:
+                self._wake_ups[key] = deadline
+            if participant:
+                self._busy -= 1
+            self._last_activity = time.monotonic()
+            self._condition.notify_all()
+        try:
+            while True:
+                with self._condition:
+                    if deadline is not None and self._now >= deadline:
+                        return []
+                    self._autojump(deadline)
+                    if deadline is not None and self._now >= deadline:
+                        return []
+                    if poll is None:
+                        self._condition.wait(self.autojump_threshold)
+                        continue
+                events = poll(self.autojump_threshold)
+                if events:
+                    return events
+        finally:
+            with self._condition:
+                self._wake_ups.pop(key, None)
+                if participant:
+                    self._busy += 1
+                self._last_activity = time.monotonic()
+
+    def _autojump(self, deadline):
+        # to be called with the condition acquired
+        if deadline is None or self._busy > 0:
+            return
+        if deadline > min(self._wake_ups.values()):
+            return  # somebody else wakes up first
+        if time.monotonic() - self._last_activity < self.autojump_threshold:
+            return
+        self._now = max(self._now, deadline)
+        self._last_activity = time.monotonic()
+        self._condition.notify_all()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(t={self.monotonic():.3f} s)'
+
+
+class _ClockSelector(object):
+    """Selector of an event loop whose waits follow a clock"""
+
+    def __init__(self, clock, selector):
+        self._clock = clock
+        self._selector = selector
+
+    def select(self, timeout=None):
+        return self._clock._select(self._selector, timeout)
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class _ClockEventLoop(asyncio.SelectorEventLoop):
+    """Event loop whose time and timers follow a clock"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        super(_ClockEventLoop, self).__init__(
+            _ClockSelector(clock, selectors.DefaultSelector())
+        )
+        # the loop time is only compared with itself, no rounding needed
+        self._clock_resolution = 1e-9
+
+    def time(self):
+        return self.clock.monotonic()
+
+    def run_in_executor(self, executor, func, *args):
+        # the threads of an executor are participants of the clock while they
+        # run work of this loop (processes do not follow the clock)
+        if executor is not None and not isinstance(
+                executor, concurrent.futures.ThreadPoolExecutor):
+            return super(_ClockEventLoop, self).run_in_executor(
+                executor, func, *args
+            )
+        work = _ExecutorWork(self.clock, func, args)
+        try:
+            future = super(_ClockEventLoop, self).run_in_executor(executor,
+                                                                  work)
+        except BaseException:
+            work.drop(None)
+            raise
+        future.add_done_callback(work.drop)
+        return future
+
+
+class _ExecutorWork(object):
+    """Function submitted to an executor by an event loop of a clock: the
+    clock is busy from its submission to its end"""
+
+    def __init__(self, clock, func, args):
+        self.clock = clock
+        self.func = func
+        self.args = args
+        self.started = False
+        self.dropped = False
+        self._lock = threading.Lock()
+        clock._reserve()
+
+    def __call__(self):
+        with self._lock:
+            self.started = True
+            if self.dropped:
+                # cancelled too late to stop it: it runs all the same
+                self.clock._join()
+            else:
+                self.clock._adopt()
+        try:
+            return self.func(*self.args)
+        finally:
+            self.clock._leave()
+
+    def drop(self, future):
+        # done callback of the future of the loop: if the work never started
+        # (cancelled, executor shut down), its reservation is given back
+        with self._lock:
+            if not self.started and not self.dropped:
+                self.dropped = True
+                self.clock._release()
+
+
+class LoopRunner(object):
+    """A single event loop following a clock, reused by successive runs
+    (asyncio.Runner appears in Python 3.11)."""
+
+    def __init__(self, clock=None):
+        """ Class initialization (the loop is created on first use)
+
+        :param clock: RealClock
+            Clock of the loop (default: the clock of the process)
+        """
+        self.clock = clock if clock is not None else get_clock()
+        self.loop = None
+
+    def run(self, coroutine):
+        """Run a coroutine in the loop, like clock.run(). The tasks it
+        leaves behind are cancelled, and awaited, before returning.
+
+        :param coroutine: coroutine
+            Coroutine to execute
+        :return:
+            Result of the coroutine
+        """
+        if asyncio._get_running_loop() is not None:
+            raise RuntimeError(
+                'run() cannot be called from a running event loop'
+            )
+        if self.loop is None:
+            self.loop = self.clock.new_event_loop()
+        self.clock._join()
+        try:
+            asyncio.set_event_loop(self.loop)
+            return self.loop.run_until_complete(coroutine)
+        finally:
+            try:
+                _cancel_all_tasks(self.loop)
+            finally:
+                asyncio.set_event_loop(None)
+                self.clock._leave()
+
+    def close(self):
+        if self.loop is None:
+            return
+        loop, self.loop = self.loop, None
+        try:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _cancel_all_tasks(loop):
+    # same clean-up as asyncio.run()
+    to_cancel = asyncio.all_tasks(loop)
+    if not to_cancel:
+        return
+    for task in to_cancel:
+        task.cancel()
+    loop.run_until_complete(
+        asyncio.gather(*to_cancel, return_exceptions=True)
+    )
+    for task in to_cancel:
+        if task.cancelled():
+            continue
+        if task.exception() is not None:
+            loop.call_exception_handler({
+                'message': 'unhandled exception during clock.run() shutdown',
+                'exception': task.exception(),
+                'task': task,
+            })
+
+
+def clock_from_setting(setting):
+    """Function to create a clock from its description.
+
+    :param setting: str
+        'real', 'accelerated:<factor>' (e.g., 'accelerated:60') or 'virtual'
+    :return: RealClock
+        Clock object (RealClock, AcceleratedClock or VirtualClock)
+    """
+    name, _, argument = (setting or 'real').strip().lower().partition(':')
+    if name == 'real':
+        return RealClock()
+    if name == 'accelerated':
+        return AcceleratedClock(float(argument or 1))
+    if name == 'virtual':
+        return VirtualClock()
+    raise ValueError(f'Unknown clock: {setting}')
+
+
+def get_clock():
+    """Function to get the clock of this process (created on first use from
+    the environment variable ROBOCHEM_CLOCK, real time by default).
+
+    :return: RealClock
+        Clock object
+    """
+    global _clock
+    with _clock_lock:
+        if _clock is None:
+            _clock = clock_from_setting(os.getenv(CLOCK_ENV, 'real'))
+        return _clock
+
+
+def set_clock(clock):
+    """Function to set the clock of this process.
+
+    :param clock: RealClock or str
+        Clock object, or its description (see clock_from_setting)
+    :return: RealClock
+        The new clock of this process
+    """
+    global _clock
+    if isinstance(clock, str):
+        clock = clock_from_setting(clock)
+    with _clock_lock:
+        _clock = clock
+    return clock
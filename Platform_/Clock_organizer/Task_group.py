@@ -0,0 +1,107 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Task groups: tasks sharing a lifetime (asyncio.TaskGroup appears in Python
+3.11, the platform runs on 3.9).
+
+    async with TaskGroup('experiment') as tasks:
+        tasks.create_task(phase_sensor_1(), background=True)
+        tasks.create_task(experimental_sequence(...))
+
+The block ends when the tasks created without background=True are done. The
+background tasks (sensor readers, pollers, ...) are then cancelled, and
+awaited, so nothing outlives the block. If a task fails, or the block
+raises, all the other tasks are cancelled and the first error is raised.
+"""
+
+import asyncio
+import logging
+
+__all__ = ['TaskGroup']
+
+
+class TaskGroup(object):
+    """Tasks cancelled together at the end of an async with block"""
+
+    def __init__(self, name='tasks'):
+        """ Class initialization
+
+        :param name: str
+            Name of the group (for the logs and the task names)
+        """
+        self.name = name
+        self.logger = logging.getLogger('Task_group')
+        self._tasks = set()  # awaited at the end of the block
+        self._background = set()  # cancelled at the end of the block
+        self._error = None
+        self._closing = False
+        self._entered = False
+
+    async def __aenter__(self):
+        self._entered = True
+        return self
+
+    def create_task(self, coroutine, background=False, name=None):
+        """Start a task in the group.
+
+        :param coroutine: coroutine
+            Coroutine to execute
+        :param background: bool
+            True for a task that runs until it is cancelled (e.g., a sensor
+            reader): it is cancelled when the other tasks are done
+        :param name: str
+            Name of the task
+        :return: asyncio.Task
+        """
+        if not self._entered or self._closing:
+            coroutine.close()
+            raise RuntimeError(f'Task group {self.name} is not active.')
+        task = asyncio.get_running_loop().create_task(coroutine)
+        task.set_name(f'{self.name}:{name or coroutine.__qualname__}')
+        (self._background if background else self._tasks).add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        if task.cancelled():
+            return
+        error = task.exception()  # also marks the exception as retrieved
+        if error is None:
+            return
+        if self._closing:
+            self.logger.warning(f'{task.get_name()} failed while being '
+                                f'cancelled: {error!r}')
+        elif self._error is None:
+            self._error = error
+            self._cancel_all()
+
+    def _cancel_all(self):
+        for task in self._tasks | self._background:
+            task.cancel()
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        try:
+            if exc is None:
+                while self._error is None:
+                    pending = {task for task in self._tasks
+                               if not task.done()}
+                    if not pending:
+                        break
+                    # woken up by a background task failing too
+                    await asyncio.wait(
+                        pending | {task for task in self._background
+                                   if not task.done()},
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+        finally:
+            # deterministic end: every task is finished when the block exits
+            self._closing = True
+            self._cancel_all()
+            tasks = self._tasks | self._background
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        if exc is None and self._error is not None:
+            raise self._error
+        return False
@@ -0,0 +1,2 @@
+from Clock_organizer.Platform_clock import *
+from Clock_organizer.Task_group import *
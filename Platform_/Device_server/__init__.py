@@ -0,0 +1 @@
+from Device_server.device_client import *
@@ -0,0 +1,214 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Client of the device server (see device_server.py).
+
+    client = DeviceClient()                       # ROBOCHEM_DEVICE_SERVER
+    pump = client.device('syringe_pump_a')
+    pump.set_rate(1.0)                            # blocking method
+    await pump.operate_pump(0.65, 1.0)            # coroutine
+    status = pump.get('status')                   # attribute
+    flow = client.device('mfc').min_flow          # setting of the driver
+
+A RemoteDevice offers the methods of the driver it stands for, blocking or
+async as in the driver, so the orchestration code works unchanged with a
+local or a remote device. Requests are pipelined: several threads or tasks
+can use the same client, each request waits only for its own answer.
+"""
+
+import asyncio
+import itertools
+import logging
+import socket
+import threading
+from concurrent.futures import Future
+
+from Device_server.protocol import server_address, parse_address, encode, \
+    decode
+
+__all__ = ['DeviceClient', 'RemoteDevice', 'DeviceServerError']
+
+
+class DeviceServerError(Exception):
+    """Error raised by the server (or a lost connection)"""
+
+    def __init__(self, message, error_type=None):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+class DeviceClient:
+    """Connection to the device server"""
+
+    def __init__(self, address=None, timeout=5):
+        """ Class initialization (connects to the server)
+
+        :param address: str
+            'tcp://<host>:<port>' or 'unix://<path>' (default: see
+            protocol.server_address)
+        :param timeout: float
+            Timeout of the connection [s]
+        """
+        self.address = address or server_address()
+        self.logger = logging.getLogger('Device_client')
+        kind, location = parse_address(self.address)
+        if kind == 'unix':
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.socket.settimeout(timeout)
+        self.socket.connect(location)
+        self.socket.settimeout(None)
+        self.ids = itertools.count(1)
+        self.pending = {}  # request id: Future
+        self.lock = threading.Lock()
+        self.closed = False
+        self.reader = threading.Thread(
+            target=self._read_answers, name='device_client', daemon=True
+        )
+        self.reader.start()
+
+    def _read_answers(self):
+        file = self.socket.makefile('rb')
+        error = 'Connection to the device server closed.'
+        try:
+            for line in file:
+                answer = decode(line)
+                with self.lock:
+                    future = self.pending.pop(answer.get('id'), None)
+                if future is None:
+                    continue
+                if 'error' in answer:
+                    future.set_exception(DeviceServerError(
+                        answer['error'], answer.get('type')
+                    ))
+                else:
+                    future.set_result(answer.get('result'))
+        except (OSError, ValueError) as exception:
+            error = f'Connection to the device server lost: {exception}'
+        with self.lock:
+            self.closed = True
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.set_exception(DeviceServerError(error))
+
+    def request(self, op, **fields):
+        """Send a request without waiting for the answer.
+
+        :param op: str
+            'call', 'get', 'describe', 'devices' or 'release'
+        :param fields:
+            Other fields of the request (see protocol.py)
+        :return: concurrent.futures.Future
+            Future of the result
+        """
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise DeviceServerError('Not connected to the device server.')
+            request_id = next(self.ids)
+            self.pending[request_id] = future
+            # sent under the lock: the lines of two threads must not mix
+            try:
+                self.socket.sendall(encode(dict(fields, id=request_id, op=op)))
+            except OSError as error:
+                self.pending.pop(request_id, None)
+                raise DeviceServerError(f'Request not sent: {error}')
+        return future
+
+    def call(self, device, method, *args, timeout=None, **kwargs):
+        """Execute a method of a device and wait for the result"""
+        return self.request('call', device=device, method=method,
+                            args=args, kwargs=kwargs).result(timeout)
+
+    async def acall(self, device, method, *args, **kwargs):
+        """Execute a method of a device without blocking the event loop"""
+        return await asyncio.wrap_future(self.request(
+            'call', device=device, method=method, args=args, kwargs=kwargs
+        ))
+
+    def get(self, device, attribute, timeout=None):
+        """Read an attribute of a device (e.g., 'status' of the valves)"""
+        return self.request('get', device=device,
+                            attribute=attribute).result(timeout)
+
+    def devices(self, timeout=None):
+        """Names of the devices of the server"""
+        return self.request('devices').result(timeout)
+
+    def release(self, device, timeout=None):
+        """Close the serial port of a device (reopened on the next request)"""
+        return self.request('release', device=device).result(timeout)
+
+    def device(self, name, timeout=None):
+        """Get a proxy of a device (connects to the device if necessary)"""
+        description = self.request('describe', device=name).result(timeout)
+        return RemoteDevice(self, name, description)
+
+    def close(self):
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+        self.reader.join(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RemoteDevice:
+    """Proxy of a device of the server, with the methods of its driver"""
+
+    def __init__(self, client, name, description):
+        """ Class initialization
+
+        :param client: DeviceClient
+            Connection to the server
+        :param name: str
+            Name of the device on the server
+        :param description: dict
+            Answer of the server to 'describe'
+        """
+        self.client = client
+        self.name = name
+        self.driver_class = description['class']
+        self.methods = description['methods']  # method: is a coroutine
+        # plain attributes of the driver, read from the server on access
+        self.attributes = description.get('attributes', [])
+
+    def __getattr__(self, method):
+        methods = self.__dict__.get('methods', {})
+        if method in self.__dict__.get('attributes', []):
+            return self.get(method)
+        if method not in methods:
+            raise AttributeError(
+                f'{self.__dict__.get("driver_class")} has no method {method}'
+            )
+        if methods[method]:
+            async def remote_coroutine(*args, **kwargs):
+                return await self.client.acall(self.name, method,
+                                               *args, **kwargs)
+            return remote_coroutine
+
+        def remote_method(*args, **kwargs):
+            return self.client.call(self.name, method, *args, **kwargs)
+        return remote_method
+
+    def get(self, attribute):
+        """Read an attribute of the driver"""
+        return self.client.get(self.name, attribute)
+
+    def close(self):
+        """The device stays connected on the server for the other clients
+        (see DeviceClient.release)"""
+        pass
+
+    def __repr__(self):
+        return f'RemoteDevice({self.name}, {self.driver_class})'
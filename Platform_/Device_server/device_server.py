@@ -0,0 +1,306 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Device server: a single process owning the serial instruments, used by
+several clients (run_platform.py, test scripts, the GUI) over a local TCP or
+Unix socket (see protocol.py and device_client.py).
+
+The drivers are the usual ones (SyringePump, SwitchValveArduino, ...). They
+are created on first use and stay connected, so a client connects in
+milliseconds instead of re-opening the hardware. The requests of one device
+are executed one after the other, in the order they arrived; the requests of
+different devices run concurrently:
+- blocking methods run in a thread dedicated to the device;
+- coroutines (e.g., operate_pump) run in an event loop of that thread, so
+  their blocking serial I/O and waits never stall the server.
+
+Start the server from the Platform_ folder (add ROBOCHEM_VIRTUAL_INSTRUMENTS=1
+to serve the virtual instruments):
+    python -m Device_server.device_server [address]
+"""
+
+import asyncio
+import inspect
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from Clock_organizer.Platform_clock import get_clock, LoopRunner
+from Device_server.protocol import server_address, parse_address, encode, \
+    decode, LINE_LIMIT
+
+
+def _syringe_pump(device, name):
+    def connect(clock):
+        from List_connected_devices import find_port
+        from Syringe_pumps.Syringe_pump import SyringePump
+        return SyringePump(find_port(device), 38400, name, clock=clock)
+    return connect
+
+
+def _phase_sensor(number):
+    def connect(clock):
+        from List_connected_devices import find_port
+        from Phase_sensors.OPB350_IO_Arduino_sketch import PhaseSensor
+        return PhaseSensor(find_port(f'PS{number}'), number - 1,
+                           f'ps{number}', clock=clock)
+    return connect
+
+
+def _switch_valves(clock):
+    from List_connected_devices import find_port
+    from Switch_valves.Switch_valves_control_Arduino_sketch import \
+        SwitchValveArduino
+    return SwitchValveArduino(
+        find_port('Switch_valves'), 'switch_valves', [8, 7, 4, 2],
+        ['3-way', '4-way', '3-way', '4-way'], clock=clock
+    )
+
+
+def _mfc(clock):
+    from List_connected_devices import find_port
+    from MFC_control.MFC_control import BronkhorstMFC
+    return BronkhorstMFC(find_port('MFC'), clock=clock)
+
+
+def _ultrasonic_detector(clock):
+    from ultrasonic_detector.ultrasonic_pump_detection import \
+        UltrasonicDetector
+    return UltrasonicDetector(clock=clock)
+
+
+def _liquid_handler(clock):
+    from Liquid_Handler.GX_241_Liquid_Handler import LiquidHandler
+    return LiquidHandler(clock=clock)
+
+
+# Devices served: name -> function connecting to the device (same settings
+# as run_platform.py)
+DEVICES = {
+    'syringe_pump_a': _syringe_pump('Syringe_pump_A', 'syringe_pump_a'),
+    'syringe_pump_b': _syringe_pump('Syringe_pump_B', 'syringe_pump_b'),
+    'syringe_pump_c': _syringe_pump('Syringe_pump_C', 'syringe_pump_c'),
+    'switch_valves': _switch_valves,
+    'mfc': _mfc,
+    'ultrasonic_detector': _ultrasonic_detector,
+    'liquid_handler': _liquid_handler,
+}
+DEVICES.update({f'ps{number}': _phase_sensor(number) for number in range(1, 8)})
+
+
+class ServedDevice:
+    """A driver and the queue of the requests addressed to it"""
+
+    def __init__(self, name, connect, clock):
+        """ Class initialization (the device is connected on first use)
+
+        :param name: str
+            Name of the device for the clients (e.g., 'syringe_pump_a')
+        :param connect: function
+            Function returning the driver, given the clock
+        :param clock: RealClock
+            Clock of the server
+        """
+        self.name = name
+        self.connect = connect
+        self.clock = clock
+        self.driver = None
+        self.lock = asyncio.Lock()  # one request at a time
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix=name)
+        # event loop of the thread of the device, for the coroutines
+        self.runner = LoopRunner(clock)
+
+    async def get_driver(self):
+        # to be called with the lock acquired
+        if self.driver is None:
+            loop = asyncio.get_running_loop()
+            self.driver = await loop.run_in_executor(
+                self.executor, self.connect, self.clock
+            )
+        return self.driver
+
+    async def call(self, method, args, kwargs):
+        async with self.lock:
+            driver = await self.get_driver()
+            function = getattr(driver, _public(method))
+            if inspect.iscoroutinefunction(function):
+                function = partial(self._run_coroutine, function)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, partial(function, *args, **kwargs)
+            )
+
+    def _run_coroutine(self, function, *args, **kwargs):
+        # in the thread of the device
+        return self.runner.run(function(*args, **kwargs))
+
+    async def get(self, attribute):
+        async with self.lock:
+            driver = await self.get_driver()
+            return getattr(driver, _public(attribute))
+
+    async def describe(self):
+        async with self.lock:
+            driver = await self.get_driver()
+            methods = {}
+            for name, member in inspect.getmembers(type(driver)):
+                if not name.startswith('_') and callable(member):
+                    methods[name] = inspect.iscoroutinefunction(member)
+            # settings of the driver read by the clients (e.g., min_flow)
+            attributes = [
+                name for name, value in vars(driver).items()
+                if not name.startswith('_') and name not in methods
+                and isinstance(value, (bool, int, float, str, type(None)))
+            ]
+            return {'class': type(driver).__name__, 'methods': methods,
+                    'attributes': attributes}
+
+    async def release(self):
+        async with self.lock:
+            driver, self.driver = self.driver, None
+            # SyringePump: close_connection, the other drivers: close
+            close = getattr(driver, 'close', None) or \
+                getattr(driver, 'close_connection', None)
+            if close is not None:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self.executor, close)
+
+
+def _public(name):
+    if not isinstance(name, str) or name.startswith('_'):
+        raise AttributeError(f'{name!r} is not part of the device API')
+    return name
+
+
+class DeviceServer:
+    """Server exposing the API of the drivers to the clients"""
+
+    def __init__(self, address=None, devices=None, clock=None):
+        """ Class initialization
+
+        :param address: str
+            'tcp://<host>:<port>' or 'unix://<path>' (default: see
+            protocol.server_address)
+        :param devices: dict
+            Name -> function connecting to the device (default: DEVICES)
+        :param clock: RealClock
+            Clock used by the drivers (default: the clock of the process)
+        """
+        self.address = address or server_address()
+        self.clock = clock if clock is not None else get_clock()
+        self.devices = {
+            name: ServedDevice(name, connect, self.clock)
+            for name, connect in (devices or DEVICES).items()
+        }
+        self.logger = logging.getLogger('Device_server')
+        self.server = None
+
+    async def start(self):
+        """Start listening (returns once the server accepts connections)"""
+        kind, location = parse_address(self.address)
+        if kind == 'unix':
+            self.server = await asyncio.start_unix_server(
+                self.handle_client, location, limit=LINE_LIMIT
+            )
+        else:
+            host, port = location
+            self.server = await asyncio.start_server(
+                self.handle_client, host, port, limit=LINE_LIMIT
+            )
+        self.logger.info(f'Device server listening on {self.address}')
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        loop = asyncio.get_running_loop()
+        for device in self.devices.values():
+            await device.release()
+            await loop.run_in_executor(device.executor, device.runner.close)
+            device.executor.shutdown(wait=False)
+
+    async def handle_client(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # answered as soon as possible, not in order (pipelining)
+                task = asyncio.ensure_future(
+                    self.answer(line, writer, write_lock)
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) \
+                as error:
+            self.logger.warning(f'Client connection lost: {error}')
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    async def answer(self, line, writer, write_lock):
+        request_id = None
+        try:
+            request = decode(line)
+            request_id = request.get('id')
+            answer = {'id': request_id,
+                      'result': await self.execute(request)}
+        except Exception as error:  # reported to the client
+            answer = {'id': request_id, 'error': str(error),
+                      'type': type(error).__name__}
+        async with write_lock:
+            try:
+                writer.write(encode(answer))
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    async def execute(self, request):
+        """Execute a request.
+
+        :param request: dict
+            Request (see protocol.py)
+        :return:
+            Result of the request
+        """
+        op = request.get('op', 'call')
+        if op == 'devices':
+            return sorted(self.devices)
+        device = self.devices.get(request.get('device'))
+        if device is None:
+            raise KeyError(f'Unknown device {request.get("device")!r}')
+        if op == 'call':
+            return await device.call(
+                request['method'],
+                request.get('args', []),
+                request.get('kwargs', {})
+            )
+        if op == 'get':
+            return await device.get(request['attribute'])
+        if op == 'describe':
+            return await device.describe()
+        if op == 'release':
+            await device.release()
+            return None
+        raise ValueError(f'Unknown operation {op!r}')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    server = DeviceServer(sys.argv[1] if len(sys.argv) > 1 else None)
+    try:
+        server.clock.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
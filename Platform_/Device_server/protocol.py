@@ -0,0 +1,88 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Messages exchanged by the device server and its clients.
+
+One JSON object per line (UTF-8). Requests carry an id chosen by the client,
+the answers carry the same id, so a client can send several requests without
+waiting (pipelining) and match the answers, which may come back in a
+different order when they concern different devices.
+
+Requests:
+    {"id": 1, "op": "call", "device": "syringe_pump_a",
+     "method": "set_rate", "args": [1.0], "kwargs": {}}
+    {"id": 2, "op": "get", "device": "switch_valves", "attribute": "status"}
+    {"id": 3, "op": "describe", "device": "syringe_pump_a"}
+    {"id": 4, "op": "devices"}
+    {"id": 5, "op": "release", "device": "ps1"}   (closes the serial port)
+Answers:
+    {"id": 1, "result": ...}
+    {"id": 1, "error": "message", "type": "SerialException"}
+
+Addresses: 'tcp://<host>:<port>' or 'unix://<path>' (POSIX only). The
+default one is the environment variable ROBOCHEM_DEVICE_SERVER.
+"""
+
+import json
+import os
+
+DEVICE_SERVER_ENV = 'ROBOCHEM_DEVICE_SERVER'
+DEFAULT_ADDRESS = 'tcp://127.0.0.1:8765'
+# Longest line accepted by the server and the client [bytes]
+LINE_LIMIT = 2 ** 24
+
+
+def server_address():
+    """Function to get the address of the device server.
+
+    :return: str
+        Address from ROBOCHEM_DEVICE_SERVER, or DEFAULT_ADDRESS
+    """
+    return os.getenv(DEVICE_SERVER_ENV, '').strip() or DEFAULT_ADDRESS
+
+
+def parse_address(address):
+    """Function to split an address in its type and its location.
+
+    :param address: str
+        'tcp://<host>:<port>' or 'unix://<path>'
+    :return: tuple
+        ('tcp', (host, port)) or ('unix', path)
+    """
+    scheme, _, location = address.partition('://')
+    if scheme == 'unix':
+        return 'unix', location
+    if scheme == 'tcp':
+        host, _, port = location.rpartition(':')
+        return 'tcp', (host or '127.0.0.1', int(port))
+    raise ValueError(f'Unknown address {address} (tcp://host:port or '
+                     f'unix://path)')
+
+
+def _to_json(value):
+    # numpy scalars and arrays, sets, ...
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    return str(value)
+
+
+def encode(message):
+    """Function to encode a message as a line of JSON.
+
+    :param message: dict
+    :return: bytes
+    """
+    return json.dumps(message, default=_to_json).encode('utf-8') + b'\n'
+
+
+def decode(line):
+    """Function to decode a line of JSON.
+
+    :param line: bytes
+    :return: dict
+    """
+    return json.loads(line.decode('utf-8'))
@@ -25,12 +25,12 @@ import sys
 #debugging _purposes
 sys.path.append('C:\\Users\\Platform\\code\\RoboChem_auto-optimization-platform\\Platform_')
 import os
-import webbrowser
 from urllib.request import urlopen
 
-import keyboard
 import time
 from Logging_organizer.Logging_Setting import setup_logger
+from Virtual_instruments.settings import use_virtual_instruments
+from Clock_organizer.Platform_clock import get_clock
 
 from phase_sensor_CSV_naming import get_your_abs_project_path
 from dotenv import load_dotenv
@@ -42,15 +42,25 @@ class EagleReactor(object):
     API for interfacing with the Signify Eagle Reactor.
     Args:
         name (str): Optional name of the Eagle Reactor
+        clock (RealClock): Optional clock used for all waits
+            (default: the clock of the process)
     """
 
-    def __init__(self, name=''):
+    def __init__(self, name='', clock=None):
         self.name = name
+        self.clock = clock if clock is not None else get_clock()
         self.device_type = "Eagle_Reactor"
         self.logger = setup_logger('EagleReactor_logger', 'EagleReactor.log')
 
+        # the virtual reactor sets the light level of the fluidic model
+        self.virtual_model = None
+        if use_virtual_instruments():
+            from Virtual_instruments.virtual_platform import \
+                get_virtual_platform
+            self.virtual_model = get_virtual_platform().model
         # 192.168.0.126 is the IP address of the Dynalite ethernet gateway of PC
-        assert env, ValueError('could not load environment of sensitive values')
+        assert env or self.virtual_model is not None, \
+            ValueError('could not load environment of sensitive values')
         self.send_url = os.getenv("EAGLE_CONTROL_SEND_URL")
         self.receive_url = os.getenv("EAGLE_CONTROL_RECEIVE_URL")
         self.area = {2: 'Light', 3: 'Fan'}
@@ -74,14 +84,23 @@ class EagleReactor(object):
             None
         """
 
-        if 0 <= level <= 100:
+        if 0 <= level <= 100 and self.virtual_model is not None:
+            if area == 2:
+                self.virtual_model.set_light_level(level)
+                self.light_level = level
+            self.logger.debug(f"The level of the {self.area[area]} has been set"
+                              f"to {level} % (virtual reactor).")
+        elif 0 <= level <= 100:
             # make command link with area and level
             command_link = self.send_url + 'a=' + str(area) + '&c=' + str(
                 channel) + '&l=' + str(level) + '&f=' + str(fade)
 
+            # browser and keyboard control, only for the real reactor
+            import webbrowser
+            import keyboard
             # send command to Eagle via Chrome browser
             webbrowser.open(command_link, new=0)
-            time.sleep(8)
+            self.clock.sleep(8)
             # pyautogui.hotkey('ctrl', 'w')
             keyboard.send('ctrl+w')
             self.logger.debug(f"The level of the {self.area[area]} has been set"
@@ -104,6 +123,10 @@ class EagleReactor(object):
         :return:
             Level
         """
+        if self.virtual_model is not None:
+            if area == 2:
+                return str(self.virtual_model.light_level)
+            return '0'
         # make command link with area and level
         command_link = self.receive_url + 'a=' + str(area) + '&c=' + str(
             channel)
@@ -114,7 +137,7 @@ class EagleReactor(object):
         received_message = html_page.find("<body>")
         print(received_message)
 
-        time.sleep(5)
+        self.clock.sleep(5)
 
         level = received_message.split('=')[1]
         return level
@@ -138,7 +161,7 @@ class EagleReactor(object):
         Function to turn on the light of Eagle with 100 % level
         """
         self.fan_on()  # Make sure the fan is on before turning on the light
-        time.sleep(2)
+        self.clock.sleep(2)
         self.send_command(area=2, level=100)  # 100% level means on for light
         self.logger.debug(f"The Light of Eagle has been 100% turned on.")
 
@@ -157,7 +180,7 @@ class EagleReactor(object):
             int, range from 0 to 100.
         """
         self.fan_on()  # Make sure the fan is on before turning on the light
-        time.sleep(2)
+        self.clock.sleep(2)
         self.send_command(area=2, level=level)
         self.logger.debug(f"The intensity of the Light of Eagle has been "
                           f"set on with {level} %.")
@@ -23,8 +23,10 @@ import asyncio
 import numpy as np
 from phase_sensor_CSV_naming import get_your_abs_project_path
 from Logging_organizer.Logging_Setting import setup_logger
+from Virtual_instruments.settings import use_virtual_instruments
+from Clock_organizer.Platform_clock import get_clock
+from Timeline_tracing.timeline import traced, current_span
 # from Sample_info import SampleInfo
-import time
 
 
 class LiquidHandler(object):
@@ -32,9 +34,12 @@ class LiquidHandler(object):
     API for interfacing with the Gilson GX-241 liquid handler.
     Args:
         name (str): Optional name of the liquid handler modules
+        clock (RealClock): Optional clock used for all waits
+            (default: the clock of the process)
     """
-    def __init__(self, name=""):
+    def __init__(self, name="", clock=None):
         self.name = name
+        self.clock = clock if clock is not None else get_clock()
         self.device_type = "GX-241"
         self.logger = setup_logger('LiquidHandler_logger', 'LiquidHandler.log')
 
@@ -61,6 +66,12 @@ class LiquidHandler(object):
         self.sample_volume = np.array([4.0, 4.0, 4.0, 4.0, 4.0])
         self.sample_bottle = np.array([0, 0, 0, 0, 0])
         # self.sample_info = SampleInfo()
+        # GSIOC commands go to the virtual liquid handler instead of the .dll
+        self.gsioc = None
+        if use_virtual_instruments():
+            from Virtual_instruments.virtual_platform import \
+                get_virtual_platform
+            self.gsioc = get_virtual_platform().gsioc
 
     def get_dll_version(self):
         try:
@@ -83,6 +94,8 @@ class LiquidHandler(object):
     #   unit_id is the unit id of the instrument (0..63)
     #   command is the command string to send to the instrument
     def immediate(self, unit_id, command):
+        if self.gsioc is not None:
+            return self.gsioc.immediate(unit_id, command)
         try:
             # load the Gsioc32.dll and function
             lib = windll.LoadLibrary(r'C:\Users\Platform\code\RoboChem_auto-optimization-platform\Platform_\Liquid_Handler\Gsioc32.dll')
@@ -98,7 +111,7 @@ class LiquidHandler(object):
             return rsp.value
         except Exception as e:
             print(f'Error with reset: {e}')
-            time.sleep(5)
+            self.clock.sleep(5)
             pass
     # -----------------------------------------------------------------------
     # Returns the result of a buffered command
@@ -106,6 +119,8 @@ class LiquidHandler(object):
     #   command is the command string to send to the instrument
 
     def buffered(self, unit_id, command):
+        if self.gsioc is not None:
+            return self.gsioc.buffered(unit_id, command)
         try:
             # load the Gsioc32.dll and function
             lib = windll.gsioc32
@@ -149,14 +164,14 @@ class LiquidHandler(object):
         :return:
             Character string '$'.
         """
-        time.sleep(1)
+        self.clock.sleep(1)
         liquid_handler_reset = self.immediate(35, '$')
         print('LH Reset: Successful')
-        time.sleep(1)
+        self.clock.sleep(1)
         self.clear_error()
         syringe_pump_reset = self.immediate(7, '$')
 
-        time.sleep(1)
+        self.clock.sleep(1)
         direct_injection_module_reset = self.immediate(9, '$')
 
         self.logger.debug(
@@ -166,25 +181,26 @@ class LiquidHandler(object):
             + f"is {direct_injection_module_reset}"
         )
 
+    @traced()
     async def home(self):
         """Homes liquid handler, syringe pump and direct injection module.
 
         """
         liquid_handler_home = self.buffered(35, 'H')
-        await asyncio.sleep(10)
+        await self.clock.asleep(10)
 
         syringe_pump_home = self.buffered(7, 'p')
-        await asyncio.sleep(15)
+        await self.clock.asleep(15)
 
         direct_injection_module_home = await self.switch_valve_position('VI')
 
-        await asyncio.sleep(5)
+        await self.clock.asleep(5)
         if liquid_handler_home == bytes('.', encoding='utf8') \
                 and syringe_pump_home == bytes('.', encoding='utf8') \
                 and direct_injection_module_home == bytes('.', encoding='utf8'):
             self.read_XY_coordinate()
             self.read_Z_coordinate()
-            await asyncio.sleep(1)
+            await self.clock.asleep(1)
             valve_position, self.current_volume = \
                 self.read_syringe_pump_status()
             injection_valve_position = self.read_valve_status()
@@ -204,15 +220,16 @@ class LiquidHandler(object):
                 + f"{syringe_pump_home} and {direct_injection_module_home}."
             )
 
+    @traced()
     async def Gilson_identification(self):
         """Function to identify, reset and home the Gilson liquid handler.
         """
         self.request_module_identification()
 
-        await asyncio.sleep(5)
+        await self.clock.asleep(5)
         self.reset()
 
-        await asyncio.sleep(5)
+        await self.clock.asleep(5)
         await self.home()
 
 
@@ -320,7 +337,7 @@ class LiquidHandler(object):
             )
             Move_XY_response = self.buffered(35, Move_XY_command)
             current_XY_coordinate = self.read_XY_coordinate()
-            await asyncio.sleep(
+            await self.clock.asleep(
                 (abs(px-current_XY_coordinate[0])
                  + abs(py-current_XY_coordinate[1])) / 300 + 1
             )
@@ -368,7 +385,7 @@ class LiquidHandler(object):
                     + str(dy), encoding='utf-8'
                 )
                 Move_XY_response = self.buffered(35, Move_XY_command)
-                await asyncio.sleep(px / sx + py / sy)
+                await self.clock.asleep(px / sx + py / sy)
                 self.logger.debug(
                     "Moving XY position with speed and drive "
                     + f"level is {Move_XY_response}. The new XY coordinate "
@@ -411,7 +428,7 @@ class LiquidHandler(object):
                     + ':' + str(dz), encoding='utf-8'
                 )
                 Move_Z_response = self.buffered(35, Move_Z_command)
-                await asyncio.sleep(1)
+                await self.clock.asleep(1)
                 self.logger.debug(
                     f"Moving Z position is {Move_Z_response}. "
                     f"The new Z coordinate is Z:{self.XYZ_coordinate[2]}."
@@ -457,7 +474,7 @@ class LiquidHandler(object):
                     + ':' + str(dz), encoding='utf-8'
                 )
                 Move_Z_response = self.buffered(35, Move_Z_command)
-                await asyncio.sleep(pz / sz)
+                await self.clock.asleep(pz / sz)
                 self.logger.debug(
                     f"Moving Z position is {Move_Z_response}. "
                     + f"The new Z coordinate is Z:{self.XYZ_coordinate[2]}."
@@ -516,7 +533,7 @@ class LiquidHandler(object):
 
         """
         stop_syringe_pump = self.buffered(7, 'PX')
-        await asyncio.sleep(0.05)
+        await self.clock.asleep(0.05)
         valve_position, current_volume = self.read_syringe_pump_status()
         self.logger.debug(
             f"The response of stopping pump is {stop_syringe_pump}. "
@@ -562,7 +579,7 @@ class LiquidHandler(object):
         valve_position_response = self.buffered(
             9, switch_valve_position_command
         )
-        await asyncio.sleep(0.5)
+        await self.clock.asleep(0.5)
         valve_status = self.read_valve_status()
         self.logger.debug(
             f"The response of switching valve is {valve_position_response}. "
@@ -612,7 +629,7 @@ class LiquidHandler(object):
             volume *= -1
         else:
             pass
-        await asyncio.sleep(60 * (volume / 1000) / flow_rate + 1)
+        await self.clock.asleep(60 * (volume / 1000) / flow_rate + 1)
         self.logger.debug(
             f"The valve position is {valve_position}, {volume} microliters "
             + f"are pumped with this flow rate {flow_rate} mL/min."
@@ -661,12 +678,12 @@ class LiquidHandler(object):
             float(self.sample_coordinate[1])
         )
         await self.move_Z(float(self.sample_coordinate[2]))
-        await asyncio.sleep(0.1)
+        await self.clock.asleep(0.1)
         await self.set_syringe_pump(
             valve_position='N', volume=volume, flow_rate=4
         )
         await self.move_Z(122)
-        await asyncio.sleep(0.1)
+        await self.clock.asleep(0.1)
 
     async def take_solvent(self):
 
@@ -692,7 +709,7 @@ class LiquidHandler(object):
                 )
                 await self.move_XY(146.05, 0)
                 await self.move_Z(91.1)
-                await asyncio.sleep(1)
+                await self.clock.asleep(1)
                 await self.set_syringe_pump(
                     valve_position='N', volume=-120, flow_rate=2
                 )
@@ -720,11 +737,11 @@ class LiquidHandler(object):
                 await self.take_single_sample(
                     rack_name='338S', row=14, column=0, volume=70
                 )
-                await asyncio.sleep(0.2)
+                await self.clock.asleep(0.2)
                 await self.clean_needle_tip()
                 await self.move_XY(146.05, 0)
                 await self.move_Z(91.1)
-                await asyncio.sleep(1)
+                await self.clock.asleep(1)
                 await self.set_syringe_pump(
                     valve_position='N', volume=-90, flow_rate=2
                 )
@@ -750,6 +767,7 @@ class LiquidHandler(object):
             await self.move_Z(122)
             i += 1
 
+    @traced()
     async def clean_needle_tip(self):
         """The function to clean the needle after each sampling to avoid
         cross-contamination.
@@ -759,15 +777,16 @@ class LiquidHandler(object):
         self.sample_coordinate = self.get_sample_coordinate(
             rack_name='335S', row=11, column=0
         )
-        await asyncio.sleep(0.1)
+        await self.clock.asleep(0.1)
         await self.move_XY(
             float(self.sample_coordinate[0]),
             float(self.sample_coordinate[1])
         )
         await self.move_Z(float(self.sample_coordinate[2]))
-        await asyncio.sleep(0.1)
+        await self.clock.asleep(0.1)
         await self.move_Z(122)
 
+    @traced()
     async def sample_mixing(self):
         """Insert the needle into the inert gas vial and then withdraw/infuse
         sample mixture four times to eliminate gas bubbles and mix the samples.
@@ -793,6 +812,7 @@ class LiquidHandler(object):
         #     valve_position='N', volume=5, flow_rate=5
         # )
 
+    @traced()
     async def clean_needle(self):
         """Function to clean the needle, sample mixer and direct injection
         module after each sampling.
@@ -841,7 +861,7 @@ class LiquidHandler(object):
                 rack_name=sample[0], row=int(sample[1]),
                 column=int(sample[2]), volume=float(sample[3])
             )
-            await asyncio.sleep(0.5)
+            await self.clock.asleep(0.5)
             await self.clean_needle_tip()
             self.total_volume += sample[3]
 
@@ -859,13 +879,19 @@ class LiquidHandler(object):
         await self.switch_valve_position('VI')
         await self.move_Z(122)
 
-    async def prepare_reaction_sample(self, sample_info):
+    @traced()
+    async def prepare_reaction_sample(self, sample_info, inject=True):
         """Function to prepare the reaction sample.
 
         :param sample_info:
         List containing different sample info
             (from the function prepare_sample_info() in Sample_info.py)
+        :param inject: bool
+            Switch the injection module to INJECT once the sample is in the
+            sample loop (False: stays on LOAD, e.g., while the carrier still
+            delivers the previous slug)
         """
+        current_span().set(components=len(sample_info))
         self.total_volume = 50
         await self.set_syringe_pump(
             valve_position='N', volume=50, flow_rate=1.5
@@ -873,30 +899,31 @@ class LiquidHandler(object):
         for sample in sample_info:
             await self.move_XY(float(sample[0].split(',')[0]),
                                float(sample[0].split(',')[1]))
-            await asyncio.sleep(0.5)
+            await self.clock.asleep(0.5)
             await self.move_Z(float(sample[0].split(',')[2]))
             await self.set_syringe_pump(
                 valve_position='N', volume=round(sample[1] * 1000, 1), flow_rate=1.5)
             self.total_volume += round(sample[1] * 1000, 1)
-            await asyncio.sleep(2)
+            await self.clock.asleep(2)
             await self.move_Z(122)
-            await asyncio.sleep(0.5)
+            await self.clock.asleep(0.5)
             await self.clean_needle_tip()
 
         await self.sample_mixing()
         await self.move_Z(122)
-        await asyncio.sleep(0.5)
+        await self.clock.asleep(0.5)
         await self.move_XY(146.05, 0)
-        await asyncio.sleep(0.5)
+        await self.clock.asleep(0.5)
         await self.move_Z(91.1)
-        await asyncio.sleep(0.5)
+        await self.clock.asleep(0.5)
         await self.switch_valve_position('VL')
         await self.set_syringe_pump(
             valve_position='N', volume=-self.total_volume, flow_rate=3
         )
-        await self.switch_valve_position('VI')
+        if inject:
+            await self.switch_valve_position('VI')
         await self.move_Z(122)
-        await asyncio.sleep(1)
+        await self.clock.asleep(1)
 
 
 if __name__ == '__main__':
@@ -88,7 +88,7 @@ class SampleInfo(object):
         # Import the XYZ coordinates corresponding to the positions on the racks
         self.coordinate = pd.read_excel(
             get_your_abs_project_path()
-            + "Liquid_Handler\\XYZ_Values.xlsx",
+            + "Liquid_Handler/XYZ_Values.xlsx",
             engine='openpyxl', keep_default_na=False
         )
         # Reference (not a copy) to the XYZ coordinates for rack 338S
@@ -535,6 +535,22 @@ class SampleInfo(object):
         self.logger.info(f"Sample info for LH is {sample_info_handler}")
         return sample_info_handler
 
+    def vial_draws(self, sample_info_handler):
+        """Function to describe the volumes drawn from the vials for a sample
+        (inventory events of the campaign store).
+
+        :param sample_info_handler: list
+            [position, volume] per vial, from prepare_sample_info
+        :return: list
+            dict per vial: vial, chemical, position, volume [mL]
+        """
+        draws = []
+        for position, volume in sample_info_handler:
+            vial = self.inverted_sample_dict[position][0]
+            draws.append({'vial': vial, 'chemical': vial.split('-')[0],
+                          'position': str(position), 'volume': float(volume)})
+        return draws
+
 
     def solvent_identity(self, X):
         if 'NaDT' in X:
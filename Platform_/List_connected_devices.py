@@ -10,10 +10,19 @@ Script to find serial devices connected to the laptop.
 import serial.tools.list_ports
 from dotenv import load_dotenv
 from phase_sensor_CSV_naming import get_your_abs_project_path
+from Virtual_instruments.settings import use_virtual_instruments, virtual_port
+from Serial_recording.settings import recorded_port, replay_file, \
+    replay_port, is_serial_device
 import os
 dotenv_path = os.path.join(get_your_abs_project_path(), 'Sensitive_data.env')
 load_dotenv(dotenv_path)
 
+# serial.serial_for_url() opens 'virtual://<device>' with the virtual instruments
+# and 'record://' / 'replay://' with the serial traffic recorder
+for package in ('Virtual_instruments', 'Serial_recording'):
+    if package not in serial.protocol_handler_packages:
+        serial.protocol_handler_packages.append(package)
+
 # map of the equipment
 def find_port(device):
     """Function to identify the device given as argument.
@@ -21,7 +30,10 @@ def find_port(device):
     :param device: str
         Name of the device to be identified. It should be one of my_devices.keys
     :return: str
-        Name of the serial port connecting to the desired device.
+        Name of the serial port connecting to the desired device
+        (a 'virtual://<device>' URL when the virtual instruments are used,
+        wrapped in a 'record://' URL when the serial traffic is recorded, or a
+        'replay://' URL when a recording is replayed).
     """
     my_devices = {
         'Syringe_pump_A': os.getenv("SERIAL_N_SYRINGE_PUMP_A"),
@@ -43,7 +55,12 @@ def find_port(device):
         'NMR': None
     }
     
-    if device in my_devices.keys():  # check that the device name exists in dict
+    if device in my_devices.keys() and replay_file() \
+            and is_serial_device(device):
+        return replay_port(device)
+    elif device in my_devices.keys() and use_virtual_instruments():
+        return recorded_port(device, virtual_port(device))
+    elif device in my_devices.keys():  # check that the device name exists in dict
         ports = serial.tools.list_ports.comports()
         for port, desc, hwid in sorted(ports):
             serial_num = [item for item in hwid.split(' ') if 'SER=' in item]
@@ -51,7 +68,7 @@ def find_port(device):
                 if serial_num[0][4:] == my_devices[device]:
                     port_name = port
                     # print(f'The port name for {device} is {port_name}.')
-                    return port_name
+                    return recorded_port(device, port_name)
     else:
         print('Device unknown.')
 
@@ -15,6 +15,7 @@ https://stackoverflow.com/questions/11232230/logging-to-two-files-with-different
 
 import logging
 import datetime
+import os
 import time
 from phase_sensor_CSV_naming import get_your_abs_project_path
 
@@ -39,12 +40,9 @@ def setup_logger(name, log_file, level=logging.DEBUG):
     the_time = time.strftime("%H%M", time.localtime())
     timestamp = f'{the_date}_T{the_time}_'
 
-    complete_filename = (
-        get_your_abs_project_path()
-        + '/Activity_logs/'
-        + timestamp
-        + log_file
-    )
+    log_folder = get_your_abs_project_path() + '/Activity_logs/'
+    os.makedirs(log_folder, exist_ok=True)
+    complete_filename = log_folder + timestamp + log_file
     handler = logging.FileHandler(complete_filename)
     handler.setFormatter(formatter)
 
@@ -20,19 +20,31 @@ import asyncio
 import serial
 from List_connected_devices import find_port
 from Logging_organizer.Logging_Setting import setup_logger
+from Virtual_instruments.settings import is_virtual_port
+from Clock_organizer.Platform_clock import get_clock
 
 
 class BronkhorstMFC:
-    def __init__(self, port):
+    def __init__(self, port, clock=None):
         """ Class initialization connecting to the Mass Flow Controller (MFC)
 
         :param port: (string)
             Serial port name connected to the MFC
+        :param clock: (RealClock)
+            Clock used for all waits (default: the clock of the process)
         """
         # self.port = port
         self.logger = setup_logger('MFC_logger', 'MFC_logger.log')
+        self.clock = clock if clock is not None else get_clock()
         try:
-            self.instrument = propar.master(port, baudrate=38400)
+            if is_virtual_port(port):
+                # propar opens the port itself, so the MFC is emulated at the
+                # level of the propar.master object
+                from Virtual_instruments.virtual_platform import \
+                    get_virtual_platform
+                self.instrument = get_virtual_platform().mfc
+            else:
+                self.instrument = propar.master(port, baudrate=38400)
         except serial.SerialException as error:
             self.logger.warning(error)
             self.logger.error(f"Connection to MFC failed.")
@@ -78,25 +90,25 @@ class BronkhorstMFC:
         :param flow: (float)
             Desired flow rate [mln/min]
         """
-        await asyncio.sleep(0.1)
+        await self.clock.asleep(0.1)
         if flow < self.min_flow or flow > self.max_flow:
             self.logger.warning(f"Invalid input flow rate: {flow} mln/min")
             if flow < self.min_flow:
                 self.logger.info(
                     f"Flow rate too low. Set MFC flow rate: {self.min_flow} mln/min"
                 )
-                await asyncio.sleep(0.1)
+                await self.clock.asleep(0.1)
                 self.instrument.setpoint = 0  # min value
                 self.logger.info(f"Set MFC flow rate: {self.min_flow} mln/min")
             elif flow > self.max_flow:
                 self.logger.info(
                     f"Flow rate too high. Set MFC flow rate: {self.max_flow} mln/min"
                 )
-                await asyncio.sleep(0.1)
+                await self.clock.asleep(0.1)
                 self.instrument.setpoint = 32000  # max value
                 self.logger.info(f"Set MFC flow rate: {self.max_flow} mln/min")
         else:
-            await asyncio.sleep(0.1)
+            await self.clock.asleep(0.1)
             self.instrument.setpoint = self.calculate_setpoint(flow)
             self.logger.info(f"Set MFC flow rate: {flow} mln/min")
 
@@ -107,7 +119,7 @@ class BronkhorstMFC:
             Gas flow rate [mln/min]
         """
         gas_flow = self.instrument.measure
-        await asyncio.sleep(0.1)
+        await self.clock.asleep(0.1)
         converted = self.convert_reading(gas_flow)
         self.logger.info(f"Flow rate reading from MFC: {converted} mln/min")
         return converted
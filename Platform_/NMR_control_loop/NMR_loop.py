@@ -20,10 +20,10 @@ This contains the control loop from the reactor to the NMR.
                              Waste            Reservoir
 """
 
+import asyncio
 from Spinsolve_NMR.Spinsolve_NMR import *
 from NMR_control_loop.NMR_processing import NMR_Process
 import pandas as pd
-import json
 from Phase_sensors.Phase_sensor_detection import *
 from Phase_sensors.Droplet_identification import identify_reaction_mix
 # from Pumps_Valves_PS_MFC_LiquidHandler import SamplePreparation
@@ -31,18 +31,13 @@ from Phase_sensors.Droplet_identification import identify_reaction_mix
 from Syringe_pumps_and_valves_ensemble.Single_pump_and_valve_ensemble import SinglePumpValveEnsemble
 from platform_class import Platform
 from List_connected_devices import find_port
-
-# Constants
-SETUP_INFO_JSON = '../experimental_setup.json'
-with open(SETUP_INFO_JSON) as json_file:
-    experimental_setup = json.load(json_file)
-
-EXP_NAME = experimental_setup["exp_name"]
+from Timeline_tracing.timeline import traced, current_span
+from Setup_config import get_setup
 
 
 class NMRLoop:
 
-    def __init__(self, platform, pump_c, residence_time, chemical_space):
+    def __init__(self, platform, pump_c, residence_time, chemical_space, setup=None):
         '''
         Initialisation of the NMR loop, sets up the connection to the rest of the system and finds the correct
         path of the settings file.
@@ -52,10 +47,13 @@ class NMRLoop:
         establishes connection to the C-pump
         :param residence_time: return from the function variable_space.create_variable_space, contains the residence times
         :param chemical_space: return from the function variable_space.create_variable_space, contains the chemical space
+        :param setup: ExperimentalSetup, settings of the campaign (default: Setup_config.get_setup())
 
         :return: None
         '''
         self.platform = platform
+        self.setup = setup if setup is not None else get_setup()
+        self.clock = platform.clock
         self.detect_frequency = 0.75
         self.chemical_space = chemical_space
         self.residence_time = residence_time
@@ -85,9 +83,9 @@ class NMRLoop:
         """
 
         # A. Loop waiting for droplet at PS6
-        await asyncio.sleep(100)
+        await self.clock.asleep(100)
         while True:
-            await asyncio.sleep(self.detect_frequency)
+            await self.clock.asleep(self.detect_frequency)
             # Check for droplet
             try:
                 detected = await identify_reaction_mix(
@@ -106,7 +104,7 @@ class NMRLoop:
         # B. Loop waiting for droplet at PS7
         print('Now waiting for droplet in phase sensor 7')
         while True:
-            await asyncio.sleep(self.detect_frequency)
+            await self.clock.asleep(self.detect_frequency)
             # Check for droplet
             try:
                 detected = await identify_reaction_mix(
@@ -135,18 +133,19 @@ class NMRLoop:
             continuous=False
         )
 
-        experiment_name = f'{EXP_NAME}_{ps_data_filename("PS1")[-24:-8]}'
+        experiment_name = f'{self.setup.exp_name}_{experiment_timestamp()}'
         print(experiment_name)
         # Trigger NMR
         print('NMR triggered')
-        await Spinsolve(mysql_reader=None).run_nmr(
+        await Spinsolve(mysql_reader=None, clock=self.clock, setup=self.setup).run_nmr(
             experiment_name=experiment_name,
         )
         print('NMR complete')
         print('Processing NMR')
         # await asyncio.sleep(10)
         # ask NMR_Process to calculate the target values
-        nmr_processing = NMR_Process(conc_theo=self.chemical_space[1])
+        nmr_processing = NMR_Process(conc_theo=self.chemical_space[1],
+                                     clock=self.clock, setup=self.setup)
         nmr_processing.perform_nmr_processing()
 
         # begin cleaning cycle
@@ -162,7 +161,8 @@ class NMRLoop:
         print('NMR Loop completed')
 
 
-    async def the_loop_TBADT(self):
+    @traced()
+    async def the_loop_TBADT(self, experiment=None, idle_window=None):
         '''
         This is the loop that runs the NMR-Machine. It calls to Spinsolve, which actuates the NMR itself and
         awaits for the processed data to be returned. It then calls to NMR_Process which calculates the target variables.
@@ -171,30 +171,75 @@ class NMRLoop:
         the catalyst being run. After irradiation TBADT makes a black
         reaction which tricks the phase sensors after the reactor. This works around that
 
+        :param experiment: str, name of the slug analysed (pipelined experiments), default: timestamp of the phase
+        sensor logs of the current experiment
+        :param idle_window: function, coroutine function awaiting the acquisition of the spectrum (flow stopped) and
+        using the time meanwhile, e.g. RefillPlanner.refill_during (default: None)
         :return:
-        None
+        NMRResult, calculated yield, integrals and paths of the experiment
         '''
         # Trigger NMR
         # NMR Settings
+        if experiment is None:
+            experiment = experiment_timestamp()
+
+        if idle_window is None:
+            await self.acquire_spectrum(experiment)
+        else:
+            await idle_window(self.acquire_spectrum(experiment))
+        nmr_result = await self.process_spectrum(experiment)
+        await self.clean_nmr_line()
+
+        print('NMR Loop completed')
+        return nmr_result
+
+    @traced()
+    async def acquire_spectrum(self, experiment):
+        '''
+        Records the NMR spectrum of the slug in the flow cell (flow stopped). Uses the NMR only.
 
-        experiment_name = f'{EXP_NAME}_{ps_data_filename("PS1")[-24:-8]}'
+        :param experiment: str, name of the experiment (suffix of the NMR experiment name)
+        :return: None
+        '''
+        experiment_name = f'{self.setup.exp_name}_{experiment}'
+        current_span().set(experiment_name=experiment_name)
 
         # Trigger NMR
         print('NMR triggered')
         # ask Spinsolve to collect a NMR-spectrum with set NMR parameters
-        await Spinsolve(mysql_reader=None).run_nmr(
+        await Spinsolve(mysql_reader=None, clock=self.clock, setup=self.setup).run_nmr(
             experiment_name=experiment_name,
         )
-
         print('NMR complete')
+
+    @traced()
+    async def process_spectrum(self, experiment):
+        '''
+        Processes the last spectrum (MestReNova) and calculates the yield. No hardware is used: the processing runs in a
+        thread, so the other steps of the platform go on meanwhile.
+
+        :param experiment: str, name of the experiment in the processed data
+        :return: NMRResult, calculated yield, integrals and paths of the experiment
+        '''
         print('Processing NMR')
 
         # ask NMR_Process to calculate the target values
-        nmr_processing = NMR_Process(conc_theo=self.chemical_space[1])
-        nmr_processing.perform_nmr_processing()
+        nmr_processing = NMR_Process(conc_theo=self.chemical_space[1],
+                                     clock=self.clock, experiment=experiment,
+                                     setup=self.setup)
+        nmr_result = await asyncio.to_thread(nmr_processing.perform_nmr_processing)
 
-        #begin cleaning cycle
         print('NMR Processing completed')
+        return nmr_result
+
+    @traced()
+    async def clean_nmr_line(self):
+        '''
+        Flushes the line to the NMR with solvent from pump C. Uses switch valves 3 and 4 and pump C only.
+
+        :return: None
+        '''
+        #begin cleaning cycle
         print('Cleaning cycle starting')
         await self.switch_valves.valve_3_OFF_or_C_3()
         await self.switch_valves.valve_4_OFF_or_C_3()
@@ -204,8 +249,6 @@ class NMRLoop:
         )
         # print('Cleaning cycle completed')
 
-        print('NMR Loop completed')
-
 
 if __name__ == '__main__':
     platform = Platform(
@@ -7,44 +7,70 @@ Universiteit van Amsterdam (UvA)
 Functions to call the Spinsolve NMR class and automate the processing
 """
 
-import time
 import os
 # from Spinsolve_NMR.Spinsolve_NMR import *
 from phase_sensor_CSV_naming import get_your_abs_project_path
 import pandas as pd
-from Phase_sensors.Phase_sensor_detection import ps_data_filename
+from Phase_sensors.Phase_sensor_detection import experiment_timestamp
 from pathlib import Path
-import json
+from Setup_config import get_setup
+from Virtual_instruments.settings import use_virtual_instruments
+from Clock_organizer.Platform_clock import get_clock
+from Timeline_tracing.timeline import traced
 
-# Constants
-SETUP_INFO_JSON = '../experimental_setup.json'
-with open(SETUP_INFO_JSON) as json_file:
-    experimental_setup = json.load(json_file)
 
-PROCESSING_FILENAME = experimental_setup["processing_filename"]
-NMR_CALIBRATION = experimental_setup["integration_calibration"]
+class NMRResult:
+    def __init__(self, experiment, calculated_yield, integrals, spectrum_path,
+                 processed_csv):
+        '''
+        Result of the processing of a spectrum, handed over in memory to the experiment runner (the processed CSV is
+        kept as an archive).
+
+        :param experiment: str, name of the experiment (timestamp of its data files, or slug)
+        :param calculated_yield: float, yield calculated from the integration of the product (%)
+        :param integrals: list of float, integration values parsed from Mestrenova
+        :param spectrum_path: str, folder of the NMR experiment
+        :param processed_csv: str, CSV file where the result is archived
+        '''
+        self.experiment = experiment
+        self.calculated_yield = calculated_yield
+        self.integrals = integrals
+        self.spectrum_path = spectrum_path
+        self.processed_csv = processed_csv
+
+    def __repr__(self):
+        return f'NMRResult({self.experiment}, yield {self.calculated_yield})'
 
 
 class NMR_Process:
-    def __init__(self, conc_theo):
+    def __init__(self, conc_theo, clock=None, experiment=None, setup=None):
         '''
         NMR_Process is the class used to process the NMR data, however by process we mean the calculation of the target
         variables used in the BO-optimisation. The Actual processing of the NMR spectrum, consisting in phasing, baselining
         and integration is done by Mestrenova under control from Spinsolve.
 
         :param conc_theo: Float, value of the theoretical concentration of the product in the sample.
+        :param clock: RealClock object used for all waits (default: the clock of the process)
+        :param experiment: str, name of the experiment in the processed data (default: timestamp of the phase sensor
+        logs of the current experiment)
+        :param setup: ExperimentalSetup, settings of the campaign (processing file, calibration, experiment name)
+        (default: Setup_config.get_setup())
         '''
+        self.clock = clock if clock is not None else get_clock()
+        self.setup = setup if setup is not None else get_setup()
 
         # initialise class attributes
         self.list = None
         self.nmr_filename = None
         self.conc_theo = conc_theo
+        self.experiment = experiment
         self.integration = []
         # self.settings_csv = get_your_abs_project_path() + \
         #                '\\NMR_control_loop\\NMR_Settings.csv'
         # self.settings = pd.read_csv(self.settings_csv)
 
 
+    @traced()
     def get_integration(self):
         """
         Function reads the integration value yielding from the Mestrenova analysis, and stores it in the class attribute
@@ -61,8 +87,8 @@ class NMR_Process:
             get_your_abs_project_path()
         )
         # set-up the path of the processed files
-        processing_files = path + '\\NMR_control_loop\\processing_files\\'
-        processing_path = experimental_setup["processing_filename"]
+        processing_files = path + '/NMR_control_loop/processing_files/'
+        processing_path = self.setup.processing_filename
         process = "ProcessReaction"
         system_string = (f'cmd /c ""C:/Program Files/Mestrelab Research '
                          f'S.L/MestReNova/MestReNova.exe" {processing_path} '
@@ -70,8 +96,18 @@ class NMR_Process:
 
 
         # If sample is a reaction solution run reaction processing
-        os.system(system_string)
-        time.sleep(1)
+        if use_virtual_instruments():
+            from Virtual_instruments.virtual_nmr import \
+                process_latest_spectrum
+            process_latest_spectrum(
+                path + '/NMR_DATA/',
+                f'{processing_files}last_integral.txt',
+                self.conc_theo,
+                self.setup.integration_calibration
+            )
+        else:
+            os.system(system_string)
+        self.clock.sleep(1)
         # read the integration value from file
         with open(f'{processing_files}last_integral.txt') as f:
             # integration = float(f.readline())
@@ -90,6 +126,16 @@ class NMR_Process:
 
         return self.list
 
+    def experiment_name(self):
+        '''
+        Function returns the name of the experiment (the slug for pipelined experiments, else the timestamp of the
+        phase sensor logs)
+        :return: str
+        '''
+        if self.experiment is None:
+            self.experiment = experiment_timestamp()
+        return self.experiment
+
     def initialize_nmr_csv(self):
         '''
         Function initialises the csv file where the target values will be stored.
@@ -103,9 +149,9 @@ class NMR_Process:
         # get the filename of the processed data
         self.nmr_filename = (
             get_your_abs_project_path()
-            + '\\NMR_DATA'
-            + '\\NMR_DATA_PROCESSED'
-            + f'\\Processed_NMR_data_{ps_data_filename("PS1")[-24:-8]}.csv'
+            + '/NMR_DATA'
+            + '/NMR_DATA_PROCESSED'
+            + f'/Processed_NMR_data_{self.experiment_name()}.csv'
         )
         filepath = Path(self.nmr_filename)
         filepath.parent.mkdir(parents=True, exist_ok=True)
@@ -129,10 +175,8 @@ class NMR_Process:
         integration_product = integration[0]
 
         # get the name of the experiment
-        experiment_name = f'{ps_data_filename("PS1")[-24:-8]}'
+        experiment_name = self.experiment_name()
 
-        # 
-        pd_csv = pd.read_csv(self.nmr_filename)
         calculated_yield = self.calculate_yield(
             integration_product
         )
@@ -151,6 +195,7 @@ class NMR_Process:
             header=False,
             index=False,
         )
+        return calculated_yield
 
 
     def calculate_yield(self, integration_product):
@@ -169,22 +214,30 @@ class NMR_Process:
                 Calculated yield for teh reaction (%)
             """
 
-        conc_reaction = float(integration_product) * NMR_CALIBRATION
+        conc_reaction = float(integration_product) * self.setup.integration_calibration
         # conc_reaction = (0.418 * self.conc_theo * float(self.list[0])) / \
         #                 float(self.list[1])
         calculated_yield = (conc_reaction/self.conc_theo)*100
         print(f'Yield: {round(calculated_yield, 1)}%')
         return calculated_yield
 
+    @traced()
     def perform_nmr_processing(self):
         '''
         Function gathers the class methods to perform the NMR processing
-        :return: float, calculated yield, in fraction.
+        :return: NMRResult, calculated yield (%), integrals and paths of the experiment
         '''
         self.initialize_nmr_csv()
         integration = self.get_integration()
         calculated_yield = self.export_NMR_data(integration)
-        return calculated_yield
+        return NMRResult(
+            experiment=self.experiment_name(),
+            calculated_yield=calculated_yield,
+            integrals=[float(value) for value in integration],
+            spectrum_path=os.path.normpath(os.path.join(get_your_abs_project_path(), 'NMR_DATA',
+                                                        f'{self.setup.exp_name}_{self.experiment_name()}')),
+            processed_csv=os.path.normpath(self.nmr_filename),
+        )
 
 
 if __name__ == '__main__':
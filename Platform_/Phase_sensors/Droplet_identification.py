@@ -11,7 +11,6 @@ droplets containing the reaction mixture.
 """
 
 import pandas as pd
-import scipy.signal
 from Phase_sensors.Phase_sensor_data_export import export_droplets_data
 
 
@@ -123,6 +122,8 @@ def measure_droplets(data, filter_kernel=5,):
     :return: pandas.DataFrame
         New dataframe with the analysed data
     """
+    # scipy.signal takes a second to import: only when droplets are measured
+    import scipy.signal
     # Apply a median filter to the date to remove spikes
     data['Phase'] = scipy.signal.medfilt(data['Phase'], filter_kernel)
     # find droplets start and stop points
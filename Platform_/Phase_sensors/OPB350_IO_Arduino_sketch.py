@@ -31,12 +31,13 @@ import numpy as np
 import pandas as pd
 from List_connected_devices import find_port
 from Logging_organizer.Logging_Setting import setup_logger
+from Clock_organizer.Platform_clock import get_clock
 
 
 class PhaseSensor:
     """Class to control phase sensor (TT electronics OCB350 + Arduino UNO)"""
 
-    def __init__(self, device_name, sensor_id, log_name):
+    def __init__(self, device_name, sensor_id, log_name, clock=None):
         """ Class initialization
 
         :param device_name: string
@@ -45,16 +46,19 @@ class PhaseSensor:
             A single number identifying the phase sensor
         :param log_name: string
             name of the log file
+        :param clock: RealClock
+            Clock used for all waits (default: the clock of the process)
         """
         self.logger = setup_logger(f'{log_name}_logger', f'{log_name}.log')
+        self.clock = clock if clock is not None else get_clock()
 
         self.logger.info(f'Port: {device_name}')
         self.logger.info(f'Phase sensor ID: PS{sensor_id + 1}')
         self.sensor_id = sensor_id
         # sensor_id = 0 for PS1, 1 for PS2 etc
         try:
-            self.sensor = serial.Serial(
-                port=device_name,
+            self.sensor = serial.serial_for_url(
+                device_name,
                 baudrate=19200
             )
         except serial.SerialException as error:
@@ -132,7 +136,7 @@ class PhaseSensor:
                         :return: int
                             the detected phase
                         """
-        time.sleep(0.100)  # keep above 100 ms to avoid issues
+        self.clock.sleep(0.100)  # keep above 100 ms to avoid issues
         if self.sensor_id + 1 == 4:
             try:
                 # Read 5 values from the buffer (5 x ~100 ms)
@@ -6,6 +6,7 @@ from Phase_sensors.OPB350_IO_Arduino_sketch import PhaseSensor
 from Phase_sensors.Phase_sensor_data_export import export_phase_sensor_data, \
     initialize_phase_sensor_csv, initialize_droplets_csv
 import phase_sensor_CSV_naming
+from Clock_organizer.Platform_clock import get_clock
 
 
 async def connect_to_board(port, sensor_id, log_name, frequency):
@@ -29,7 +30,8 @@ async def connect_to_board(port, sensor_id, log_name, frequency):
         The phase (0 or 1) is written to the csv file until True loop
         actively broken.
     """
-    board_phase_sensors = PhaseSensor(port, sensor_id, log_name)
+    clock = get_clock()
+    board_phase_sensors = PhaseSensor(port, sensor_id, log_name, clock=clock)
 
     # create CSV file to log PS data
     filename1 = pd.read_csv(
@@ -45,20 +47,25 @@ async def connect_to_board(port, sensor_id, log_name, frequency):
     )['0'][sensor_id]
     initialize_droplets_csv(filename2)
 
-    # to stop transients during start-up from being detected as bubbles
-    # TODO adjust the sleep time
-    await asyncio.sleep(2)
-
-    while True:
-        filename = pd.read_csv(
-            phase_sensor_CSV_naming.get_CSV_with_names_ps(),
-            index_col=0
-        )['0'][sensor_id]
-        await asyncio.sleep(frequency)
-        await export_phase_sensor_data(
-            filename,
-            board_phase_sensors.get_phase()
-        )
+    try:
+        # to stop transients during start-up from being detected as bubbles
+        # TODO adjust the sleep time
+        await clock.asleep(2)
+
+        while True:
+            filename = pd.read_csv(
+                phase_sensor_CSV_naming.get_CSV_with_names_ps(),
+                index_col=0
+            )['0'][sensor_id]
+            await clock.asleep(frequency)
+            await export_phase_sensor_data(
+                filename,
+                board_phase_sensors.get_phase()
+            )
+    finally:
+        # the task is cancelled at the end of the experiment: free the port
+        # for the next one (the platform worker stays alive in between)
+        board_phase_sensors.close()
 
 
 async def phase_sensor_1(freq=1):
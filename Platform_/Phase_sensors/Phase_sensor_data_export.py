@@ -1,6 +1,6 @@
 from datetime import datetime
 import pandas as pd
-import time
+from Clock_organizer.Platform_clock import get_clock
 
 
 def initialize_phase_sensor_csv(name):
@@ -48,10 +48,11 @@ async def export_phase_sensor_data(name, data):
     :param data: float
         Phase data to be exported (typically a reading from the phase sensor)
     """
+    timestamp = get_clock().time()
     phase_data_log = pd.DataFrame(
         {
-            'Time [s]': time.time(),
-            'Time': [convert_timestamp(time.time())],
+            'Time [s]': timestamp,
+            'Time': [convert_timestamp(timestamp)],
             'Phase': data
         }
     )
@@ -1,8 +1,10 @@
 import asyncio
+import os
 import pandas as pd
 
 from Phase_sensors.Droplet_identification import identify_reaction_mix
 import phase_sensor_CSV_naming
+from Clock_organizer.Platform_clock import get_clock
 
 
 def ps_data_filename(phase_sensor):
@@ -95,6 +97,17 @@ def droplet_data_filename(phase_sensor):
     return filenames_droplets[phase_sensor]
 
 
+def experiment_timestamp():
+    """Function to get the timestamp of the phase sensor logs of the current
+    experiment (e.g. '2024-01-01_T1200'), which names its NMR experiment and
+    processed data.
+
+    :return: string
+        Timestamp of the logs
+    """
+    return os.path.basename(ps_data_filename('PS1'))[:-len('_PS1.csv')]
+
+
 async def droplet_detection_loop(phase_sensor,
                                  analysed_interval=300,
                                  frequency=1):
@@ -119,7 +132,7 @@ async def droplet_detection_loop(phase_sensor,
     # loop to analyse the data continuously
     while True:
         # [!!!] this assumes that a separate loop exports to the CSV
-        await asyncio.sleep(frequency)
+        await get_clock().asleep(frequency)
         print(f'Detection loop ({phase_sensor}) still running!')
         detected = await identify_reaction_mix(
             ps_data_filename(phase_sensor),
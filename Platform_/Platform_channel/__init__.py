@@ -0,0 +1 @@
+from Platform_channel.channel import *
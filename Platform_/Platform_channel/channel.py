@@ -0,0 +1,429 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Messages between the optimizer (ML_GUI/Dragonfly_BO.py) and the platform
+worker (platform_worker.py).
+
+A message is a dict with a 'type' and the 'id' of the request it belongs to:
+    request    index, X, objectives, variables,    optimizer -> platform
+               campaign
+    progress   stage, detail                        platform -> optimizer
+    result     index, X, y, timestamp               platform -> optimizer
+    error      error                                platform -> optimizer
+    shutdown                                        optimizer -> platform
+
+Two transports, with the same send()/receive() interface:
+- ConnectionChannel: a multiprocessing connection (named pipe on Windows,
+  Unix socket elsewhere) opened by the optimizer; receive() returns as soon
+  as a message arrives, without polling.
+- OptimizerFileChannel / PlatformFileChannel: the pickle files used so far
+  (../input.pickle, ../output.pickle), written to a temporary file and renamed
+  so they are never read half-written. Used when the worker is started
+  without a connection (e.g., by hand); no progress events.
+
+Several requests can be queued on a connection (the worker runs them in
+order, see wait_for_any_result); the pickle files hold one request at a time.
+
+Standard library only: imported by the GUI and by the platform environments.
+"""
+
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from concurrent import futures
+from multiprocessing.connection import Listener, Client, AuthenticationError
+
+# Environment of the platform worker: where to connect
+CHANNEL_ADDRESS_ENV = 'ROBOCHEM_CHANNEL_ADDRESS'
+CHANNEL_AUTHKEY_ENV = 'ROBOCHEM_CHANNEL_AUTHKEY'
+# Time between two reads of the pickle files [s]
+FILE_POLL_INTERVAL = 0.5
+
+
+def request_message(index, x, objectives, variables, campaign=None):
+    """Function to create the request of an experiment.
+
+    :param index: int
+        Index of the experiment in the campaign
+    :param x: list
+        Conditions of the experiment
+    :param objectives: list
+        Objectives of the optimization (e.g., ['yield', 'throughput'])
+    :param variables: list
+        Variable space (see variable_space.py)
+    :param campaign: str
+        Name of the campaign in the campaign store (None: the experiment name
+        of experimental_setup.json)
+    :return: dict
+    """
+    return {'type': 'request', 'id': uuid.uuid4().hex, 'index': index,
+            'X': x, 'objectives': objectives, 'variables': variables,
+            'campaign': campaign}
+
+
+def progress_message(request, stage, detail=None):
+    """Function to create a progress event of a request.
+
+    :param request: dict
+        Request in progress
+    :param stage: str
+        Step the platform is starting (e.g., 'filling syringes')
+    :param detail:
+        Optional information about the step
+    :return: dict
+    """
+    return {'type': 'progress', 'id': request['id'], 'stage': stage,
+            'detail': detail}
+
+
+def result_message(request, y, timestamp):
+    """Function to create the answer to a request.
+
+    :param request: dict
+        Request answered
+    :param y:
+        Objective value(s)
+    :param timestamp: str
+        Timestamp of the experiment (name of its data files)
+    :return: dict
+    """
+    return {'type': 'result', 'id': request['id'], 'index': request['index'],
+            'X': request['X'], 'y': y, 'timestamp': timestamp}
+
+
+def error_message(request, error):
+    """Function to report that a request failed.
+
+    :param request: dict
+        Request that failed
+    :param error: Exception
+    :return: dict
+    """
+    return {'type': 'error', 'id': request['id'],
+            'error': f'{type(error).__name__}: {error}'}
+
+
+def shutdown_message():
+    return {'type': 'shutdown', 'id': None}
+
+
+def atomic_pickle_dump(obj, filename, retries=20):
+    """Function to write a pickle file that is never seen half-written: the
+    data goes to a temporary file which then replaces filename.
+
+    :param obj:
+        Object to save
+    :param filename: str
+        Pickle file
+    :param retries: int
+        Attempts to replace the file (Windows refuses while it is being read)
+    """
+    folder = os.path.dirname(os.path.abspath(filename))
+    handle, temporary = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as filepointer:
+            pickle.dump(obj, filepointer)
+        for attempt in range(retries):
+            try:
+                os.replace(temporary, filename)
+                return
+            except PermissionError:
+                if attempt == retries - 1:
+                    raise
+                time.sleep(0.05)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def load_pickle(filename):
+    """Function to read a pickle file.
+
+    :param filename: str
+    :return:
+        Content of the file, None if it does not exist (yet)
+    """
+    try:
+        with open(filename, 'rb') as filepointer:
+            return pickle.load(filepointer)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        # EOFError, UnpicklingError: written by a version not using
+        # atomic_pickle_dump, read again later
+        return None
+
+
+def _version(filename):
+    # changes every time the file is replaced
+    try:
+        status = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return status.st_mtime_ns, status.st_ino, status.st_size
+
+
+class ConnectionChannel:
+    """Messages over a multiprocessing connection"""
+
+    def __init__(self, connection):
+        """ Class initialization
+
+        :param connection: multiprocessing.connection.Connection
+        """
+        self.connection = connection
+        self.lock = threading.Lock()  # progress can be sent from threads
+
+    def send(self, message):
+        with self.lock:
+            self.connection.send(message)
+
+    def receive(self, timeout=None):
+        """Wait for the next message.
+
+        :param timeout: float
+            Longest wait [s], None to wait forever
+        :return: dict
+            Message (EOFError if the other side closed the channel)
+        """
+        if not self.connection.poll(timeout):
+            raise TimeoutError('No message received.')
+        return self.connection.recv()
+
+    def close(self):
+        self.connection.close()
+
+
+class OptimizerFileChannel:
+    """Optimizer side of the pickle files"""
+
+    def __init__(self, input_file, output_file,
+                 poll_interval=FILE_POLL_INTERVAL):
+        """ Class initialization
+
+        :param input_file: str
+            Requests ([index, X, objectives, variables])
+        :param output_file: str
+            Results ([index, X, y, timestamp])
+        :param poll_interval: float
+            Time between two reads of output_file [s]
+        """
+        self.input_file = input_file
+        self.output_file = output_file
+        self.poll_interval = poll_interval
+        self.pending = {}  # index: (request id, output_file version)
+
+    def send(self, message):
+        if message['type'] == 'request':
+            # an output with the same index written before the request is
+            # from an earlier campaign
+            self.pending[message['index']] = (message['id'],
+                                              _version(self.output_file))
+            atomic_pickle_dump(
+                [message['index'], message['X'], message['objectives'],
+                 message['variables']],
+                self.input_file
+            )
+        # shutdown: the worker stops when its stdin is closed
+
+    def receive(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            version = _version(self.output_file)
+            output = load_pickle(self.output_file)
+            if output is not None and output[0] in self.pending and \
+                    version != self.pending[output[0]][1]:
+                [index, x, y, timestamp] = output
+                return {'type': 'result', 'id': self.pending.pop(index)[0],
+                        'index': index, 'X': x, 'y': y,
+                        'timestamp': timestamp}
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError('No message received.')
+            time.sleep(self.poll_interval if deadline is None else
+                       max(min(self.poll_interval,
+                               deadline - time.monotonic()), 0))
+
+    def close(self):
+        pass
+
+
+class PlatformFileChannel:
+    """Platform side of the pickle files"""
+
+    def __init__(self, input_file, output_file,
+                 poll_interval=FILE_POLL_INTERVAL):
+        """ Class initialization
+
+        :param input_file: str
+            Requests ([index, X, objectives, variables]); the request present
+            at start-up is the first one
+        :param output_file: str
+            Results ([index, X, y, timestamp])
+        :param poll_interval: float
+            Time between two reads of input_file [s]
+        """
+        self.input_file = input_file
+        self.output_file = output_file
+        self.poll_interval = poll_interval
+        self.last_index = None
+        self.started = False
+
+    def send(self, message):
+        if message['type'] == 'result':
+            atomic_pickle_dump(
+                [message['index'], message['X'], message['y'],
+                 message['timestamp']],
+                self.output_file
+            )
+        # progress and errors cannot be written to the pickle files
+
+    def receive(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            request = load_pickle(self.input_file)
+            if request is not None and \
+                    (not self.started or request[0] != self.last_index):
+                self.started = True
+                [index, x, objectives, variables] = request
+                self.last_index = index
+                return {'type': 'request', 'id': index, 'index': index,
+                        'X': x, 'objectives': objectives,
+                        'variables': variables}
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError('No message received.')
+            time.sleep(self.poll_interval if deadline is None else
+                       max(min(self.poll_interval,
+                               deadline - time.monotonic()), 0))
+
+    def close(self):
+        pass
+
+
+class ChannelListener:
+    """Optimizer side of the connection: waits for the platform worker"""
+
+    def __init__(self):
+        self.authkey = os.urandom(16)
+        self.listener = Listener(authkey=self.authkey)
+        self.accepted = futures.Future()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        try:
+            self.accepted.set_result(self.listener.accept())
+        except (OSError, EOFError, AuthenticationError) as error:
+            self.accepted.set_exception(error)
+
+    def environment(self):
+        """Environment variables telling the worker where to connect"""
+        return {CHANNEL_ADDRESS_ENV: self.listener.address,
+                CHANNEL_AUTHKEY_ENV: self.authkey.hex()}
+
+    def wait_for_platform(self, alive=None, timeout=None):
+        """Wait for the worker to connect.
+
+        :param alive: function
+            Returns False if the worker stopped (checked every second)
+        :param timeout: float
+            Longest wait [s], None to wait forever
+        :return: ConnectionChannel
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return ConnectionChannel(self.accepted.result(1))
+            except futures.TimeoutError:
+                pass
+            if alive is not None and not alive():
+                self.close()
+                raise RuntimeError('The platform worker stopped before '
+                                   'connecting.')
+            if deadline is not None and time.monotonic() >= deadline:
+                self.close()
+                raise TimeoutError('The platform worker did not connect.')
+
+    def close(self):
+        self.listener.close()
+
+
+def connect_from_environment():
+    """Function to connect the worker to the optimizer that started it.
+
+    :return: ConnectionChannel
+        None if the worker was not given a connection
+    """
+    address = os.getenv(CHANNEL_ADDRESS_ENV)
+    if not address:
+        return None
+    authkey = bytes.fromhex(os.getenv(CHANNEL_AUTHKEY_ENV, ''))
+    return ConnectionChannel(Client(address, authkey=authkey))
+
+
+def wait_for_result(channel, request, timeout=None, alive=None,
+                    on_progress=None):
+    """Function to wait for the answer to a request.
+
+    :param channel: ConnectionChannel or OptimizerFileChannel
+    :param request: dict
+        Request sent
+    :param timeout: float
+        Longest wait [s], None to wait forever
+    :param alive: function
+        Returns False if the worker stopped (checked every second)
+    :param on_progress: function
+        Called with every progress event of the request
+    :return: dict
+        Result message
+    """
+    return wait_for_any_result(channel, [request], timeout, alive,
+                               on_progress)
+
+
+def wait_for_any_result(channel, requests, timeout=None, alive=None,
+                        on_progress=None):
+    """Function to wait for the first answer to one of several requests
+    (e.g., a batch of experiments queued on the platform).
+
+    :param channel: ConnectionChannel or OptimizerFileChannel
+    :param requests: list
+        Requests sent and not answered yet
+    :param timeout: float
+        Longest wait [s], None to wait forever
+    :param alive: function
+        Returns False if the worker stopped (checked every second)
+    :param on_progress: function
+        Called with every progress event of the requests
+    :return: dict
+        Result message (its 'id' tells which request it answers)
+    """
+    pending = {request['id']: request for request in requests}
+    indexes = ', '.join(str(request['index']) for request in requests)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        try:
+            message = channel.receive(1)
+        except TimeoutError:
+            if alive is not None and not alive():
+                raise RuntimeError(f'The platform worker stopped before '
+                                   f'returning experiment {indexes}.')
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f'No result for experiment {indexes} '
+                                   f'after {timeout} s.')
+            continue
+        except EOFError:
+            raise RuntimeError(f'The platform worker closed the channel '
+                               f'before returning experiment {indexes}.')
+        request = pending.get(message.get('id'))
+        if request is None:
+            continue  # answer to an older request
+        if message['type'] == 'progress':
+            if on_progress is not None:
+                on_progress(message)
+        elif message['type'] == 'error':
+            raise RuntimeError(f'Experiment {request["index"]} failed: '
+                               f'{message["error"]}')
+        elif message['type'] == 'result':
+            return message
@@ -20,31 +20,28 @@ reaction samples.
 import asyncio
 import logging
 import serial
-import json
 from Pumps_valves_MFC_PS_control.Pumps_valves_MFC_PS_control_v2 import PumpsValvesMFCPS
 from Liquid_Handler.GX_241_Liquid_Handler import LiquidHandler
 from Residence_time_control.Residence_time import find_flow_rate
 from platform_class import Platform
 from List_connected_devices import find_port
-
-
-
-# CONSTANTS
-SETUP_INFO_JSON = '../experimental_setup.json'
-with open(SETUP_INFO_JSON) as json_file:
-    experimental_setup = json.load(json_file)
-
-SAMPlE_PUSH_VOLUME = experimental_setup["sample_push_volume"]
+from Timeline_tracing.timeline import traced, current_span
+from Setup_config import get_setup
 
 
 class SamplePreparation:
-    def __init__(self, platform):
+    def __init__(self, platform, setup=None):
         """ Class initialization, setting up connections to instruments
         and logging.
 
         :param platform: (Platform_ class instance)
             Instance of the Platform_ class defined in platform_class.py
+        :param setup: (ExperimentalSetup)
+            Settings of the campaign (sample push volume). Default: the
+            settings of the current campaign (Setup_config.get_setup()), read
+            at each experiment so a reloaded setup is used
         """
+        self._setup = setup
         self.logger = logging.getLogger('Sample_preparation')
         logging.basicConfig(
             filename='Sample_presentation.log',
@@ -52,8 +49,9 @@ class SamplePreparation:
             datefmt='%y-%m-%d %H:%M:%S',
             level=logging.INFO
         )
+        self.clock = platform.clock
         try:
-            self.liquid_handler = LiquidHandler()
+            self.liquid_handler = LiquidHandler(clock=self.clock)
             self.logger.info('Connected to Liquid Handler')
         except serial.SerialException as error:
             self.logger.warning(error)
@@ -69,13 +67,18 @@ class SamplePreparation:
             )
         self.switch_valves = platform.switch_valves
 
+    @property
+    def setup(self):
+        return self._setup if self._setup is not None else get_setup()
+
+    @traced()
     async def system_start_up(self):
         """System initialization before sample injection.
 
         """
         # InjMod to INJECT
         await self.liquid_handler.switch_valve_position('VI')
-        await asyncio.sleep(10)
+        await self.clock.asleep(10)
         # fill everything with liquid till PS2
         # pump 1500 ml not needed
         # await self.pumps_valves.pump_liquid(
@@ -88,6 +91,7 @@ class SamplePreparation:
         #     bubbles=False
         # )
 
+    @traced()
     async def slug_in_sample_loop(self, sample):
         """Sample preparation with liquid handler and injection in the sample
         loop in between nitrogen bubbles
@@ -109,6 +113,7 @@ class SamplePreparation:
         # InjMod to INJECT
         await self.liquid_handler.switch_valve_position('VI')
 
+    @traced()
     async def slug_out_to_reactor(self):
         """Pump the reaction slug out of the reactor, past PS2
             (slower to facilitate detection at PS3)
@@ -126,12 +131,14 @@ class SamplePreparation:
         # InjMod to LOAD
         await self.liquid_handler.switch_valve_position('VL')
 
+    @traced()
     async def clean_sample_loop(self):
         """Cleaning of the needle and sample loop
         """
         # clean with Verity syringe pump (goes to waste via sample loop)
         await self.liquid_handler.clean_needle()
 
+    @traced()
     async def slug_delivery(self, residence_time, reactor_volume):
         """Delivery of the reaction slug through the photoreactor and to the
         flow NMR at the desired flow rate.
@@ -142,6 +149,7 @@ class SamplePreparation:
             Internal volume of the flow reactor [mL]
         """
         print('in slug delivery')
+        current_span().set(residence_time=residence_time)
         # deliver the sample to the reactor with desired flow rate (res time)
         await self.switch_valves.valve_4_ON_or_C_1()
         ### For UFO Flow Reactor ###
@@ -153,10 +161,11 @@ class SamplePreparation:
 
         ### For Eagle ###
         await self.pumps_valves.pump_liquid(
-            SAMPlE_PUSH_VOLUME,  # μL
+            self.setup.sample_push_volume,  # μL
             find_flow_rate(residence_time, reactor_volume),  # mL/min
         )
 
+    @traced()
     async def full_sample_sequence(self,
                                    sample,
                                    residence_time,
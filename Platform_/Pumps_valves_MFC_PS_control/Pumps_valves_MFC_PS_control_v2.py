@@ -53,6 +53,12 @@ from Phase_sensors.Phase_sensor_detection import *
 from Syringe_pumps_and_valves_ensemble.Pumps_and_valve_ensemble import PumpsValvesEnsemble
 from platform_class import Platform
 from List_connected_devices import find_port
+from Virtual_instruments.settings import use_virtual_instruments
+
+# Pumping cycles of pump_liquid(detect_sample=True) before giving up on the
+# virtual instruments, where a slug never detected is a bug of the simulation
+# (the real platform keeps pumping until the operator steps in)
+VIRTUAL_DETECTION_ATTEMPTS = 10
 
 
 # This Class has been changed to read from csv instead of phase sensor
@@ -73,6 +79,7 @@ class PumpsValvesMFCPS:
         )
 
         self.platform = platform
+        self.clock = platform.clock
         self.PumpsValvesEnsemble = PumpsValvesEnsemble(platform)
         self.MFC = platform.mfc
 
@@ -120,7 +127,7 @@ class PumpsValvesMFCPS:
         await self.PumpsValvesEnsemble.valves.valve_1_OFF_or_C_3()
         await self.MFC.define_setpoint(0.10)
         while await self.phase_is_gas():  # N2 flow until bubble comes out
-            await asyncio.sleep(0.050)  # check every 100 ms
+            await self.clock.asleep(0.050)  # check every 100 ms
         await self.MFC.define_setpoint(self.MFC.min_flow)
         await self.PumpsValvesEnsemble.valves.valve_1_ON_or_C_1()
 
@@ -143,9 +150,9 @@ class PumpsValvesMFCPS:
         if wait_for_phase:
             while not await self.phase_is_gas():  # N2 flow until bubble reaches PS1
                 # out
-                await asyncio.sleep(0.100)  # check every 100 ms
+                await self.clock.asleep(0.100)  # check every 100 ms
         else:
-            await asyncio.sleep(wait_time)
+            await self.clock.asleep(wait_time)
         # stop flow N2
         await self.MFC.define_setpoint(0)  # self.MFC.min_flow)
         # valve back to syringe pumps
@@ -183,13 +190,21 @@ class PumpsValvesMFCPS:
                     volume, flow_rate
                 )
         elif detect_sample:
+            attempts = 0
             while True:
+                if use_virtual_instruments() and \
+                        attempts == VIRTUAL_DETECTION_ATTEMPTS:
+                    raise RuntimeError(
+                        f'No reaction slug detected at {phase_sensor} after '
+                        f'{attempts} pumping cycles of {volume} μL.'
+                    )
+                attempts += 1
                 # pump set volume
                 await self.PumpsValvesEnsemble.operate_ensemble(
                     volume, flow_rate
                 )
                 # wait to allow for signal processing
-                await asyncio.sleep(2)
+                await self.clock.asleep(2)
                 # check for droplet
                 detected = await identify_reaction_mix(
                     ps_data_filename(phase_sensor),
@@ -0,0 +1 @@
+from Serial_recording.settings import *
@@ -0,0 +1,186 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+pyserial URL handler recording the traffic of a serial port.
+
+    serial.serial_for_url('record://PS1?port=COM5', baudrate=19200)
+
+opens COM5 (any port or URL accepted by serial_for_url, e.g. the virtual
+instruments) and writes every byte sent and received, with its timestamp, to
+the recording file of the process (see recording_file.py).
+
+A reader thread collects the incoming bytes as soon as they arrive, so the
+recording holds the time the device answered rather than the time the driver
+got around to reading (e.g., pumps polled with timeout=0).
+"""
+
+import threading
+
+import serial
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError
+
+from Clock_organizer.Platform_clock import get_clock
+from Serial_recording.settings import parse_port_url, recording_folder, \
+    RECORDING_FOLDER
+from Serial_recording.recording_file import get_recorder, RecordingChannel
+
+# Timeout [s] of the reads of the reader thread
+READER_TIMEOUT = 0.1
+# Sleep [s] of a driver waiting for data
+POLL_INTERVAL = 0.005
+
+
+class Serial(SerialBase):
+    """Serial port forwarding everything to another port, and recording it"""
+
+    def __init__(self, *args, **kwargs):
+        self.device = None
+        self.channel = None
+        self.clock = get_clock()
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._reader = None
+        self._error = None
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException('Port is already open.')
+        if self._port is None:
+            raise SerialException(
+                'Port must be configured before it can be used.'
+            )
+        name, query = parse_port_url(self._port)
+        if 'port' not in query:
+            raise SerialException(f'{self._port}: the port to record is '
+                                  f'missing (record://<device>?port=...)')
+        self.device = serial.serial_for_url(query['port'], do_not_open=True)
+        self._reconfigure_port()
+        self.device.open()
+        writer = get_recorder(recording_folder() or RECORDING_FOLDER)
+        settings = dict(self.get_settings(), port=query['port'])
+        self.channel = RecordingChannel(writer, name, settings)
+        self._buffer.clear()
+        self._error = None
+        self.is_open = True
+        self._reader = threading.Thread(
+            target=self._read_device, name=f'record_{name}', daemon=True
+        )
+        self._reader.start()
+
+    def close(self):
+        self.is_open = False
+        if self._reader is not None:
+            self._reader.join(READER_TIMEOUT * 10)
+            self._reader = None
+        if self.channel is not None:
+            self.channel.close()
+            self.channel = None
+        if self.device is not None:
+            self.device.close()
+            self.device = None
+
+    def _reconfigure_port(self):
+        if self.device is not None:
+            settings = self.get_settings()
+            settings['timeout'] = READER_TIMEOUT
+            self.device.apply_settings(settings)
+
+    def _read_device(self):
+        while self.is_open:
+            try:
+                data = self.device.read(max(1, self.device.in_waiting))
+            except (SerialException, AttributeError) as error:
+                # AttributeError: port closed while reading
+                self._error = error
+                return
+            if data:
+                with self._lock:
+                    self._buffer += data
+                    self.channel.rx(data)
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        with self._lock:
+            return len(self._buffer)
+
+    def read(self, size=1):
+        """Read size bytes, following the timeout semantics of pyserial:
+        None blocks until size bytes are read, 0 returns immediately."""
+        if not self.is_open:
+            raise PortNotOpenError()
+        deadline = None if self._timeout is None \
+            else self.clock.monotonic() + self._timeout
+        data = bytearray()
+        while True:
+            with self._lock:
+                count = min(size - len(data), len(self._buffer))
+                data += self._buffer[:count]
+                del self._buffer[:count]
+            if len(data) >= size or self._timeout == 0:
+                break
+            if self._error is not None:
+                raise SerialException(f'{self._port}: {self._error}')
+            now = self.clock.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            wait = POLL_INTERVAL if deadline is None \
+                else min(POLL_INTERVAL, deadline - now)
+            self.clock.sleep(wait)
+        return bytes(data)
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        self.channel.tx(data)
+        return self.device.write(data)
+
+    def flush(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        self.device.flush()
+
+    def reset_input_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        with self._lock:
+            self.channel.reset_input()
+            self._buffer.clear()
+            self.device.reset_input_buffer()
+
+    def reset_output_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        self.device.reset_output_buffer()
+
+    def _update_break_state(self):
+        if self.device is not None:
+            self.device.break_condition = self._break_state
+
+    def _update_rts_state(self):
+        if self.device is not None:
+            self.device.rts = self._rts_state
+
+    def _update_dtr_state(self):
+        if self.device is not None:
+            self.device.dtr = self._dtr_state
+
+    @property
+    def cts(self):
+        return self.device.cts
+
+    @property
+    def dsr(self):
+        return self.device.dsr
+
+    @property
+    def ri(self):
+        return self.device.ri
+
+    @property
+    def cd(self):
+        return self.device.cd
@@ -0,0 +1,276 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+pyserial URL handler replaying a serial traffic recording.
+
+    serial.serial_for_url('replay://PS1?file=traffic.rcsr&speed=1')
+
+returns a fake port answering like the recorded device. Every time a device
+is opened, the next recorded session of that device is replayed.
+
+The received bytes keep their recorded timing (divided by speed), measured
+from the event that preceded them in the recording: the opening of the port
+for the data streamed by the Arduino boards, the end of the command for the
+answers of the pumps and valves. An answer is therefore only released once
+the driver has written the corresponding command, so the replay stays
+deterministic when the driver or the orchestration change their timing.
+Commands that differ from the recorded ones are logged as warnings.
+"""
+
+import logging
+import threading
+
+from serial.serialutil import SerialBase, SerialException, \
+    PortNotOpenError, to_bytes
+
+from Clock_organizer.Platform_clock import get_clock
+from Serial_recording.settings import parse_port_url, replay_speed
+from Serial_recording.recording_file import Recording, TX, RX
+
+# Sleep [s] while waiting for data that is not scheduled yet
+POLL_INTERVAL = 0.05
+
+_recordings = {}  # filename: Recording
+_sessions_used = {}  # (filename, device): number of sessions replayed
+_registry_lock = threading.Lock()
+
+
+def next_session(filename, device):
+    """Function to get the next recorded session of a device.
+
+    :param filename: str
+        Recording file
+    :param device: str
+        Name of the device (e.g., 'PS1')
+    :return: list
+        Events of the session, None if there is none left
+    """
+    with _registry_lock:
+        if filename not in _recordings:
+            _recordings[filename] = Recording(filename)
+        sessions = _recordings[filename].sessions.get(device, [])
+        used = _sessions_used.get((filename, device), 0)
+        _sessions_used[(filename, device)] = used + 1
+        return sessions[used] if used < len(sessions) else None
+
+
+class ReplayedSession:
+    """Schedule of the bytes of one recorded session"""
+
+    def __init__(self, events, speed, clock, logger):
+        """ Class initialization
+
+        :param events: list
+            Events of the recorded session
+        :param speed: float
+            Timing factor (> 1 is faster than the recording)
+        :param clock: RealClock
+            Clock of the replay
+        :param logger: logging.Logger
+        """
+        self.speed = speed
+        self.clock = clock
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.expected = bytearray()  # all the recorded commands
+        self.command_ends = []  # end of each command in expected
+        self.chunks = []  # [anchor (-1 = opening), delay [s], duration, data]
+        opened = events[0].time if events else 0.0
+        anchor, anchor_time = -1, opened
+        for event in events:
+            if event.kind == TX:
+                self.expected += event.data
+                self.command_ends.append(len(self.expected))
+                anchor, anchor_time = len(self.command_ends) - 1, event.time
+            elif event.kind == RX:
+                self.chunks.append([anchor, event.time - anchor_time,
+                                    event.duration, event.data])
+        self.anchor_times = {-1: clock.monotonic()}
+        self.written = 0
+        self.diverged = False
+        self.buffer = bytearray()
+        self.next_chunk = 0
+        self.released = 0  # bytes of chunks[next_chunk] already released
+
+    def write(self, data):
+        with self.lock:
+            now = self.clock.monotonic()
+            start, self.written = self.written, self.written + len(data)
+            if not self.diverged and \
+                    bytes(data) != bytes(self.expected[start:self.written]):
+                self.diverged = True
+                self.logger.warning(
+                    f'Command {bytes(data)!r} differs from the recording '
+                    f'({bytes(self.expected[start:self.written])!r}).'
+                )
+            for number, end in enumerate(self.command_ends):
+                if end <= self.written:
+                    self.anchor_times.setdefault(number, now)
+
+    def _release(self, now):
+        # to be called with the lock acquired
+        while self.next_chunk < len(self.chunks):
+            anchor, delay, duration, data = self.chunks[self.next_chunk]
+            if anchor not in self.anchor_times:
+                return
+            start = self.anchor_times[anchor] + delay / self.speed
+            if now < start:
+                return
+            if duration > 0:
+                fraction = min(1.0, (now - start) * self.speed / duration)
+            else:
+                fraction = 1.0
+            count = max(int(len(data) * fraction), 1)
+            if count > self.released:
+                self.buffer += data[self.released:count]
+                self.released = count
+            if count < len(data):
+                return
+            self.next_chunk += 1
+            self.released = 0
+
+    def next_data_time(self):
+        """Return the time the next byte is released (None if unknown)"""
+        with self.lock:
+            if self.next_chunk >= len(self.chunks):
+                return None
+            anchor, delay, duration, data = self.chunks[self.next_chunk]
+            if anchor not in self.anchor_times:
+                return None
+            start = self.anchor_times[anchor] + delay / self.speed
+            return start + (self.released + 1) / len(data) \
+                * duration / self.speed
+
+    def read_available(self, size):
+        with self.lock:
+            self._release(self.clock.monotonic())
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            return data
+
+    def in_waiting(self):
+        with self.lock:
+            self._release(self.clock.monotonic())
+            return len(self.buffer)
+
+    def reset_input_buffer(self):
+        with self.lock:
+            self._release(self.clock.monotonic())
+            self.buffer.clear()
+
+
+class Serial(SerialBase):
+    """Fake serial port replaying a recorded device"""
+
+    def __init__(self, *args, **kwargs):
+        self.session = None
+        self.clock = None
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException('Port is already open.')
+        if self._port is None:
+            raise SerialException(
+                'Port must be configured before it can be used.'
+            )
+        name, query = parse_port_url(self._port)
+        if 'file' not in query:
+            raise SerialException(f'{self._port}: the recording is missing '
+                                  f'(replay://<device>?file=...)')
+        try:
+            events = next_session(query['file'], name)
+        except (OSError, ValueError) as error:
+            raise SerialException(f'could not open port {self._port}: {error}')
+        if events is None:
+            raise SerialException(f'could not open port {self._port}: no '
+                                  f'recorded session left for {name}')
+        speed = float(query.get('speed', replay_speed()))
+        self.clock = get_clock()
+        self.session = ReplayedSession(
+            events, speed, self.clock, logging.getLogger(f'replay_{name}')
+        )
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+        self.session = None
+
+    def _reconfigure_port(self):
+        pass
+
+    def _update_break_state(self):
+        pass
+
+    def _update_rts_state(self):
+        pass
+
+    def _update_dtr_state(self):
+        pass
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self.session.in_waiting()
+
+    @property
+    def out_waiting(self):
+        return 0
+
+    def read(self, size=1):
+        """Read size bytes, following the timeout semantics of pyserial:
+        None blocks until size bytes are read, 0 returns immediately."""
+        if not self.is_open:
+            raise PortNotOpenError()
+        deadline = None if self._timeout is None \
+            else self.clock.monotonic() + self._timeout
+        data = bytearray()
+        while len(data) < size:
+            data += self.session.read_available(size - len(data))
+            if len(data) >= size or self._timeout == 0:
+                break
+            now = self.clock.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            wake_up = self.session.next_data_time()
+            if wake_up is None:
+                wake_up = now + POLL_INTERVAL
+            if deadline is not None:
+                wake_up = min(wake_up, deadline)
+            self.clock.sleep(max(wake_up - now, 0.001))
+        return bytes(data)
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = to_bytes(data)
+        self.session.write(data)
+        return len(data)
+
+    def reset_input_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        self.session.reset_input_buffer()
+
+    def reset_output_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+
+    @property
+    def cts(self):
+        return True
+
+    @property
+    def dsr(self):
+        return True
+
+    @property
+    def ri(self):
+        return False
+
+    @property
+    def cd(self):
+        return True
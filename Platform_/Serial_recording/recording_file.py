@@ -0,0 +1,294 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Binary format of the serial traffic recordings (.rcsr).
+
+Header:
+    b'RCSR', format version (uint8), start time (float64, s since the epoch)
+Records (little endian), followed by a payload of the given length:
+    kind (uint8), device number (uint8), time (float64, s since the start),
+    duration (float32, s), payload length (uint16)
+
+Kinds:
+    DEVICE  payload = device name (defines the device number)
+    OPEN    payload = port settings (JSON)
+    TX      payload = bytes written to the device
+    RX      payload = bytes read from the device; consecutive reads less than
+            RX_CHUNK_GAP apart are stored as one record lasting 'duration'
+    RESET   input buffer emptied by the driver
+    CLOSE
+
+Summary per device (traffic, response times, gaps in the received data),
+from the Platform_ folder:
+    python -m Serial_recording.recording_file <recording.rcsr>
+"""
+
+import json
+import os
+import struct
+import sys
+import threading
+from collections import defaultdict
+
+from Clock_organizer.Platform_clock import get_clock
+
+MAGIC = b'RCSR'
+VERSION = 1
+HEADER = struct.Struct('<4sBd')
+RECORD = struct.Struct('<BBdfH')
+MAX_PAYLOAD = 0xFFFF
+
+DEVICE, OPEN, TX, RX, RESET, CLOSE = range(6)
+KIND_NAMES = {DEVICE: 'DEVICE', OPEN: 'OPEN', TX: 'TX', RX: 'RX',
+              RESET: 'RESET', CLOSE: 'CLOSE'}
+
+# Reads closer than this [s] are merged in a single RX record
+RX_CHUNK_GAP = 0.005
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+class Event:
+    """One record of a recording"""
+
+    __slots__ = ('kind', 'time', 'duration', 'data')
+
+    def __init__(self, kind, time, duration, data):
+        self.kind = kind
+        self.time = time
+        self.duration = duration
+        self.data = data
+
+    def __repr__(self):
+        return (f'Event({KIND_NAMES[self.kind]}, t={self.time:.4f}, '
+                f'{self.data!r})')
+
+
+class Recording:
+    """Content of a recording file: the sessions (open ... close) of every
+    device, in order."""
+
+    def __init__(self, filename):
+        """ Class initialization (reads the whole file)
+
+        :param filename: str
+            Name of the .rcsr file
+        """
+        self.filename = filename
+        self.sessions = defaultdict(list)  # device name: [[Event, ...], ...]
+        with open(filename, 'rb') as file:
+            magic, version, self.start_time = HEADER.unpack(
+                file.read(HEADER.size)
+            )
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f'{filename} is not a serial recording')
+            names = {}
+            current = {}  # device number: session in progress
+            while True:
+                header = file.read(RECORD.size)
+                if len(header) < RECORD.size:
+                    break  # end of file (or a record cut by a crash)
+                kind, number, time, duration, length = RECORD.unpack(header)
+                data = file.read(length)
+                if kind == DEVICE:
+                    names[number] = data.decode('utf-8')
+                    continue
+                if kind == OPEN:
+                    current[number] = []
+                    self.sessions[names[number]].append(current[number])
+                session = current.get(number)
+                if session is not None:
+                    session.append(Event(kind, time, duration, data))
+                if kind == CLOSE:
+                    current.pop(number, None)
+
+    def devices(self):
+        return list(self.sessions)
+
+
+class RecordingWriter:
+    """Writes the traffic of all the recorded ports of this process to a
+    single file (thread safe)."""
+
+    def __init__(self, filename, clock=None):
+        """ Class initialization
+
+        :param filename: str
+            Name of the .rcsr file to create
+        :param clock: RealClock
+            Clock used for the timestamps (default: the clock of the process)
+        """
+        self.filename = filename
+        self.clock = clock if clock is not None else get_clock()
+        self.lock = threading.Lock()
+        self.origin = self.clock.monotonic()
+        self.devices = {}
+        self.file = open(filename, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.clock.time()))
+        self.file.flush()
+
+    def now(self):
+        return self.clock.monotonic() - self.origin
+
+    def device_number(self, device):
+        """Return the number of a device, declaring it on first use"""
+        with self.lock:
+            if device not in self.devices:
+                if len(self.devices) > 0xFF:
+                    raise ValueError('Too many devices in one recording.')
+                self.devices[device] = len(self.devices)
+                self._write(DEVICE, self.devices[device], 0.0, 0.0,
+                            device.encode('utf-8'))
+            return self.devices[device]
+
+    def write(self, kind, number, time, duration=0.0, data=b''):
+        """Append a record (long payloads are split)"""
+        with self.lock:
+            if self.file.closed:
+                return
+            if not data:
+                self._write(kind, number, time, duration, b'')
+            for start in range(0, len(data), MAX_PAYLOAD):
+                self._write(kind, number, time, duration,
+                            data[start:start + MAX_PAYLOAD])
+
+    def _write(self, kind, number, time, duration, data):
+        self.file.write(RECORD.pack(kind, number, time, duration, len(data)))
+        self.file.write(data)
+        # flushed every time: the interesting recordings end with a crash
+        self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class RecordingChannel:
+    """Recording of the traffic of one port"""
+
+    def __init__(self, writer, device, settings):
+        """ Class initialization
+
+        :param writer: RecordingWriter
+            File the traffic is written to
+        :param device: str
+            Name of the device (e.g., 'PS1')
+        :param settings: dict
+            Port settings (port name, baudrate, timeout, ...)
+        """
+        self.writer = writer
+        self.number = writer.device_number(device)
+        self.lock = threading.Lock()
+        self._rx = bytearray()
+        self._rx_start = self._rx_last = 0.0
+        writer.write(OPEN, self.number, writer.now(),
+                     data=json.dumps(settings, default=str).encode('utf-8'))
+
+    def tx(self, data):
+        with self.lock:
+            self._flush_rx()
+            self.writer.write(TX, self.number, self.writer.now(),
+                              data=bytes(data))
+
+    def rx(self, data):
+        if not data:
+            return
+        with self.lock:
+            now = self.writer.now()
+            if self._rx and now - self._rx_last > RX_CHUNK_GAP:
+                self._flush_rx()
+            if not self._rx:
+                self._rx_start = now
+            self._rx += data
+            self._rx_last = now
+
+    def reset_input(self):
+        with self.lock:
+            self._flush_rx()
+            self.writer.write(RESET, self.number, self.writer.now())
+
+    def close(self):
+        with self.lock:
+            self._flush_rx()
+            self.writer.write(CLOSE, self.number, self.writer.now())
+
+    def _flush_rx(self):
+        # to be called with the lock acquired
+        if self._rx:
+            self.writer.write(RX, self.number, self._rx_start,
+                              self._rx_last - self._rx_start, bytes(self._rx))
+            self._rx.clear()
+
+
+def get_recorder(folder):
+    """Function to get the recording file of this process (created on first
+    use, one file per process).
+
+    :param folder: str
+        Folder of the recordings
+    :return: RecordingWriter
+    """
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            os.makedirs(folder, exist_ok=True)
+            timestamp = get_clock().strftime('%Y-%m-%d_T%H%M%S')
+            _recorder = RecordingWriter(
+                os.path.join(folder, f'{timestamp}_{os.getpid()}.rcsr')
+            )
+        return _recorder
+
+
+def summarize(recording):
+    """Function to describe the traffic of each device of a recording.
+
+    :param recording: Recording
+        Recording to analyse
+    :return: dict
+        Per device: sessions, bytes sent/received, response times [s]
+        (first RX after each TX) and the longest gap between two RX [s]
+    """
+    summary = {}
+    for device, sessions in recording.sessions.items():
+        sent = received = 0
+        responses = []
+        longest_gap = 0.0
+        for session in sessions:
+            last_tx = last_rx = None
+            for event in session:
+                if event.kind == TX:
+                    sent += len(event.data)
+                    last_tx = event.time
+                elif event.kind == RX:
+                    received += len(event.data)
+                    if last_tx is not None:
+                        responses.append(event.time - last_tx)
+                        last_tx = None
+                    if last_rx is not None:
+                        longest_gap = max(longest_gap, event.time - last_rx)
+                    last_rx = event.time + event.duration
+        summary[device] = {
+            'sessions': len(sessions),
+            'bytes sent': sent,
+            'bytes received': received,
+            'responses': len(responses),
+            'mean response [s]':
+                sum(responses) / len(responses) if responses else None,
+            'max response [s]': max(responses) if responses else None,
+            'longest RX gap [s]': longest_gap,
+        }
+    return summary
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:]:
+        print(name)
+        for device_name, numbers in summarize(Recording(name)).items():
+            print(f'  {device_name}: ' + ', '.join(
+                f'{key} {value:.3f}' if isinstance(value, float)
+                else f'{key} {value}'
+                for key, value in numbers.items()
+            ))
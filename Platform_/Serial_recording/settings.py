@@ -0,0 +1,149 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Switches for the serial traffic recorder and replayer.
+
+Both are controlled by environment variables (they can also be set in
+Sensitive_data.env), so that the processes started by the GUI inherit them:
+
+- ROBOCHEM_SERIAL_RECORDING: '1' to record the traffic of every serial
+  device in Serial_recordings/, or the folder where the recordings go.
+  find_port() then returns URLs such as 'record://PS1?port=COM5', opened by
+  Serial_recording/protocol_record.py around the real (or virtual) port.
+- ROBOCHEM_SERIAL_REPLAY: recording file (.rcsr) to replay instead of the
+  instruments. find_port() returns URLs such as 'replay://PS1?file=...',
+  opened by Serial_recording/protocol_replay.py.
+- ROBOCHEM_SERIAL_REPLAY_SPEED: replay timing factor (default 1, i.e. the
+  original timing; 10 replays ten times faster).
+
+Only the devices driven through pyserial are covered: the MFC (propar), the
+liquid handler (GSIOC) and the NMR (TCP) keep their usual connection.
+"""
+
+import os
+from urllib.parse import quote, unquote, urlsplit, parse_qs
+
+SERIAL_RECORDING_ENV = 'ROBOCHEM_SERIAL_RECORDING'
+SERIAL_REPLAY_ENV = 'ROBOCHEM_SERIAL_REPLAY'
+SERIAL_REPLAY_SPEED_ENV = 'ROBOCHEM_SERIAL_REPLAY_SPEED'
+RECORD_PORT_PREFIX = 'record://'
+REPLAY_PORT_PREFIX = 'replay://'
+RECORDING_FOLDER = 'Serial_recordings'
+
+# Devices opened with pyserial (see find_port for the full list)
+SERIAL_DEVICES = (
+    'Syringe_pump_A', 'Syringe_pump_B', 'Syringe_pump_C',
+    'Pump_A_ultrasonic_detector', 'Pump_B_ultrasonic_detector',
+    'Pump_C_ultrasonic_detector',
+    'PS1', 'PS2', 'PS3', 'PS4', 'PS5', 'PS6', 'PS7',
+    'Switch_valves',
+)
+
+
+def _switched_on(value):
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def recording_folder():
+    """Function to get the folder where the serial traffic is recorded.
+
+    :return: str
+        Folder of the recordings, None if the recording is switched off
+    """
+    value = os.getenv(SERIAL_RECORDING_ENV, '0').strip()
+    if not value or value.lower() in ('0', 'false', 'no', 'off'):
+        return None
+    if _switched_on(value):
+        from phase_sensor_CSV_naming import get_your_abs_project_path
+        return get_your_abs_project_path() + '/' + RECORDING_FOLDER
+    return value
+
+
+def enable_serial_recording(folder='1'):
+    """Function to switch the recording on (or off) for this process and the
+    processes it starts.
+
+    :param folder: str
+        '1' for the default folder, a folder name, or '0' to switch it off
+    """
+    os.environ[SERIAL_RECORDING_ENV] = str(folder)
+
+
+def replay_file():
+    """Function to get the recording replayed instead of the instruments.
+
+    :return: str
+        Filename of the recording, None if the replay is switched off
+    """
+    value = os.getenv(SERIAL_REPLAY_ENV, '').strip()
+    return value or None
+
+
+def replay_speed():
+    """Function to get the timing factor of the replay.
+
+    :return: float
+        1 for the original timing, > 1 for a faster replay
+    """
+    return float(os.getenv(SERIAL_REPLAY_SPEED_ENV, '1') or 1)
+
+
+def is_serial_device(device):
+    """Function to check whether a device is driven through pyserial.
+
+    :param device: str
+        Name of the device as used by find_port (e.g., 'PS1')
+    :return: bool
+    """
+    return device in SERIAL_DEVICES
+
+
+def recorded_port(device, port):
+    """Function to wrap the port of a device in the recorder, if the
+    recording is switched on.
+
+    :param device: str
+        Name of the device as used by find_port (e.g., 'PS1')
+    :param port: str
+        Port name or URL of the device (e.g., 'COM5' or 'virtual://PS1')
+    :return: str
+        'record://<device>?port=<port>', or the port itself
+    """
+    if port is None or recording_folder() is None \
+            or not is_serial_device(device):
+        return port
+    return f'{RECORD_PORT_PREFIX}{device}?port={quote(port, safe="")}'
+
+
+def replay_port(device, filename=None, speed=None):
+    """Function to build the port URL of a replayed device.
+
+    :param device: str
+        Name of the device as used by find_port (e.g., 'PS1')
+    :param filename: str
+        Recording to replay (default: ROBOCHEM_SERIAL_REPLAY)
+    :param speed: float
+        Timing factor (default: ROBOCHEM_SERIAL_REPLAY_SPEED)
+    :return: str
+        URL understood by serial.serial_for_url
+    """
+    filename = replay_file() if filename is None else filename
+    speed = replay_speed() if speed is None else speed
+    return (f'{REPLAY_PORT_PREFIX}{device}'
+            f'?file={quote(filename, safe="")}&speed={speed:g}')
+
+
+def parse_port_url(url):
+    """Function to split a record:// or replay:// URL.
+
+    :param url: str
+        URL of the port
+    :return: tuple
+        (device name, dict of the query parameters)
+    """
+    parts = urlsplit(url)
+    device = unquote(parts.netloc + parts.path).strip('/')
+    query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+    return device, query
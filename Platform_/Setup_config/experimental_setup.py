@@ -0,0 +1,201 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Settings of the campaign (experimental_setup.json, written by the GUI or by
+run_optimization.py), loaded and validated once per campaign:
+
+    from Setup_config import get_setup
+    setup = get_setup()
+    setup.reactor_volume, setup.exp_name, setup.nmr_settings, ...
+
+get_setup() reads the file the first time it is called and then returns the
+same object: the classes of the platform take it as a parameter (setup=None:
+get_setup()). reload_setup() reads the file again, e.g. when a new campaign
+starts in a process that stays alive (see platform_worker.py).
+
+The file is experimental_setup.json in the RoboChem folder (next to Platform_
+and ML_GUI), whatever the working directory; the environment variable
+ROBOCHEM_SETUP gives another one. A missing or invalid setting raises
+SetupError with all the problems found.
+
+Standard library only: imported by the GUI and by the platform environments.
+"""
+
+import json
+import numbers
+import os
+import threading
+
+__all__ = ['ExperimentalSetup', 'SetupError', 'get_setup', 'reload_setup',
+           'load_setup', 'setup_filename']
+
+SETUP_ENV = 'ROBOCHEM_SETUP'
+SETUP_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              '..', '..', 'experimental_setup.json')
+
+_NUMBER = 'number'
+# name: (type, required, default)
+FIELDS = {
+    # platform (run_platform.py, NMR control loop, sample preparation)
+    'exp_name': (str, True, None),
+    'reactor_volume': (_NUMBER, True, None),  # [mL]
+    'sample_information_filename': (str, True, None),
+    'processing_filename': (str, True, None),
+    'sample_push_volume': (_NUMBER, True, None),  # [μL]
+    'nmr_nucleus': (str, True, None),
+    'nmr_settings': (dict, True, None),
+    'integration_calibration': (_NUMBER, True, None),  # [M/int]
+    'overlap_experiments': (bool, False, False),
+    # optimizer (Dragonfly_BO.py)
+    'variables': (list, False, None),
+    'num_init': (int, False, None),
+    'num_total': (int, False, None),
+    'objectives': (list, False, None),
+    'previous_runs': ((bool, str), False, False),
+    'dict_filename': (str, False, None),
+    'batch_size': (int, False, 1),
+    'asynchronous': (bool, False, False),
+}
+
+_lock = threading.Lock()
+_setup = None
+
+
+class SetupError(ValueError):
+    """experimental_setup.json is missing, unreadable or invalid"""
+
+
+def setup_filename():
+    """Function to get the name of the settings file.
+
+    :return: str
+    """
+    return os.getenv(SETUP_ENV, '').strip() or os.path.normpath(SETUP_FILENAME)
+
+
+def _check_type(value, expected):
+    if expected == _NUMBER:
+        return isinstance(value, numbers.Real) and not isinstance(value, bool)
+    if expected is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, expected)
+
+
+class ExperimentalSetup:
+    """Validated settings of a campaign (one attribute per setting)"""
+
+    def __init__(self, settings, filename=None):
+        """ Class initialization
+
+        :param settings: dict
+            Content of experimental_setup.json
+        :param filename: str
+            File the settings come from (for the error messages)
+        """
+        self.filename = filename
+        problems = []
+        if not isinstance(settings, dict):
+            raise SetupError(f'{filename}: the settings are not a JSON object')
+        for name, (expected, required, default) in FIELDS.items():
+            if name not in settings or settings[name] is None:
+                if required:
+                    problems.append(f'{name} is missing')
+                setattr(self, name, default)
+                continue
+            value = settings[name]
+            if not _check_type(value, expected):
+                problems.append(f'{name} has the wrong type '
+                                f'({type(value).__name__}: {value!r})')
+            setattr(self, name, value)
+        # settings not known here are kept as they are
+        self.extra = {name: value for name, value in settings.items()
+                      if name not in FIELDS}
+        if not problems:
+            problems = self._check_values()
+        if problems:
+            raise SetupError(f'{filename}: ' + '; '.join(problems))
+        if isinstance(self.previous_runs, str):
+            # the GUI writes 'Yes' / 'No'
+            self.previous_runs = self.previous_runs.strip().lower() in (
+                'yes', 'true', '1')
+
+    def _check_values(self):
+        problems = []
+        for name in ('reactor_volume', 'sample_push_volume'):
+            if getattr(self, name) <= 0:
+                problems.append(f'{name} must be positive')
+        if not self.exp_name.strip():
+            problems.append('exp_name is empty')
+        if self.batch_size < 1:
+            problems.append('batch_size must be at least 1')
+        if self.num_init is not None and self.num_init < 0:
+            problems.append('num_init must be positive')
+        if None not in (self.num_init, self.num_total) and \
+                self.num_total < self.num_init:
+            problems.append('num_total is smaller than num_init')
+        for variable in self.variables or []:
+            if not isinstance(variable, dict) or 'name' not in variable \
+                    or 'type' not in variable:
+                problems.append(f'variable {variable!r} needs a name and a '
+                                f'type')
+        return problems
+
+    def as_dict(self):
+        """Function to get the settings as in experimental_setup.json.
+
+        :return: dict
+        """
+        settings = {name: getattr(self, name) for name in FIELDS}
+        settings.update(self.extra)
+        return settings
+
+    def __repr__(self):
+        return f'ExperimentalSetup({self.exp_name}, {self.filename})'
+
+
+def load_setup(filename=None):
+    """Function to read and validate a settings file (not cached).
+
+    :param filename: str
+        Settings file (default: setup_filename())
+    :return: ExperimentalSetup
+    """
+    filename = filename if filename is not None else setup_filename()
+    try:
+        with open(filename) as json_file:
+            settings = json.load(json_file)
+    except OSError as error:
+        raise SetupError(f'{filename}: cannot be read ({error})') from error
+    except ValueError as error:
+        raise SetupError(f'{filename}: invalid JSON ({error})') from error
+    return ExperimentalSetup(settings, filename)
+
+
+def get_setup():
+    """Function to get the settings of the campaign (read once, then cached).
+
+    :return: ExperimentalSetup
+    """
+    global _setup
+    with _lock:
+        if _setup is None:
+            _setup = load_setup()
+        return _setup
+
+
+def reload_setup(filename=None):
+    """Function to read the settings again (e.g., a new campaign starts):
+    get_setup() returns the new ones from now on. The cached settings are
+    kept if the file is invalid.
+
+    :param filename: str
+        Settings file (default: setup_filename())
+    :return: ExperimentalSetup
+    """
+    global _setup
+    setup = load_setup(filename)
+    with _lock:
+        _setup = setup
+    return setup
@@ -0,0 +1,7 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+"""
+
+from .slug_scheduler import *
@@ -0,0 +1,360 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Pipelined scheduler for reaction slugs.
+
+Every slug goes through the same stages (e.g., prepare -> inject -> deliver
+-> analyse). A stage needs resources (liquid handler, sample loop, reactor,
+NMR, ...):
+- exclusive resources serve one slug at a time (capacity 1);
+- shared resources serve up to 'capacity' slugs at a time, provided they are
+  compatible (same key, e.g., the flow rate of the carrier through the
+  reactor).
+A slug takes a resource at the first stage needing it and gives it back after
+the last one, so the sample loop stays loaded between preparation and
+injection. Ordered resources (the default) serve the slugs in the order they
+were submitted: slugs in one tube cannot overtake each other, and the
+results reach the right slug.
+
+Slug n+1 therefore starts its preparation as soon as the liquid handler is
+free, while slug n is still reacting or being analysed. A stage can also
+impose a minimum interval between two consecutive slugs (e.g., the gas gap
+between slugs entering the reactor).
+
+    stages = [
+        Stage('prepare', prepare, ['liquid_handler', 'sample_loop']),
+        Stage('inject', inject, ['sample_loop', 'reactor'],
+              min_interval=lambda slug: gas_gap_time),
+        Stage('react', react, ['reactor']),
+        Stage('analyse', analyse, ['nmr']),
+    ]
+    resources = [Resource('liquid_handler'), Resource('sample_loop'),
+                 Resource('reactor', capacity=3,
+                          key=lambda slug: slug.data['flow_rate']),
+                 Resource('nmr')]
+    async with SlugScheduler(stages, resources) as scheduler:
+        slugs = [scheduler.submit(conditions) for conditions in batch]
+        results = [await slug.wait() for slug in slugs]
+
+Slugs per hour with and without pipelining, for several residence times
+(virtual clock, see throughput.py):
+    python -m Slug_scheduler.throughput
+"""
+
+import asyncio
+import collections
+import itertools
+import logging
+
+from Clock_organizer.Platform_clock import get_clock
+from Clock_organizer.Task_group import TaskGroup
+
+__all__ = ['Resource', 'Stage', 'Slug', 'SlugScheduler']
+
+
+class Resource(object):
+    """A part of the platform used by the slugs (exclusive or shared)"""
+
+    def __init__(self, name, capacity=1, key=None, ordered=True):
+        """ Class initialization
+
+        :param name: str
+            Name of the resource (used in the stages)
+        :param capacity: int
+            Number of slugs it serves at the same time (1: exclusive)
+        :param key: function
+            For shared resources: slug -> key; slugs served at the same time
+            must have the same key (default: all compatible)
+        :param ordered: bool
+            Serve the slugs in the order they were submitted
+        """
+        if capacity < 1:
+            raise ValueError(f'{name}: the capacity must be at least 1.')
+        self.name = name
+        self.capacity = capacity
+        self.key = key
+        self.ordered = ordered
+        self.holders = {}  # slug: key
+        self.turn = 0  # sequence number of the next slug (ordered)
+        self._condition = None
+
+    def _get_condition(self):
+        # created in the running loop (asyncio objects are bound to a loop)
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _available(self, slug, key):
+        if self.ordered and slug.sequence != self.turn:
+            return False
+        if len(self.holders) >= self.capacity:
+            return False
+        return all(other == key for other in self.holders.values())
+
+    async def acquire(self, slug):
+        """Wait for the resource and take it.
+
+        :param slug: Slug
+        """
+        key = self.key(slug) if self.key is not None else None
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._available(slug, key))
+            self.holders[slug] = key
+            if self.ordered:
+                self.turn += 1
+            condition.notify_all()
+
+    async def release(self, slug):
+        """Give the resource back.
+
+        :param slug: Slug
+        """
+        condition = self._get_condition()
+        async with condition:
+            self.holders.pop(slug, None)
+            condition.notify_all()
+
+    async def skip(self, slug):
+        """Let the next slugs pass (slug stopped before using the resource)
+
+        :param slug: Slug
+        """
+        condition = self._get_condition()
+        async with condition:
+            if self.ordered and self.turn == slug.sequence:
+                self.turn += 1
+            condition.notify_all()
+
+    def __repr__(self):
+        kind = 'exclusive' if self.capacity == 1 else f'shared x{self.capacity}'
+        return f'Resource({self.name}, {kind})'
+
+
+class Stage(object):
+    """A step of the slugs, using some resources"""
+
+    def __init__(self, name, action, resources=(), min_interval=None,
+                 detached=False):
+        """ Class initialization
+
+        :param name: str
+            Name of the stage
+        :param action: function
+            Coroutine function called with the slug; its result is stored in
+            slug.results[name]
+        :param resources: list
+            Names of the resources the stage needs
+        :param min_interval: function
+            slug -> minimum time [s] between the start of this stage for the
+            previous slug and for this one (e.g., gas gap between slugs)
+        :param detached: bool
+            The next stage starts without waiting for this one (e.g.,
+            cleaning the sample loop while the slug is delivered)
+        """
+        self.name = name
+        self.action = action
+        self.resources = list(resources)
+        self.min_interval = min_interval
+        self.detached = detached
+        self.last_start = None
+
+    def __repr__(self):
+        return f'Stage({self.name}, {self.resources})'
+
+
+class Slug(object):
+    """A reaction slug and what happened to it"""
+
+    def __init__(self, slug_id, sequence, data):
+        """ Class initialization
+
+        :param slug_id: str
+            Identity of the slug (e.g., in the NMR experiment names)
+        :param sequence: int
+            Position of the slug in the submission order
+        :param data: dict
+            Everything the stages need (conditions, sample, residence time)
+        """
+        self.slug_id = slug_id
+        self.sequence = sequence
+        self.data = data
+        self.timeline = collections.OrderedDict()  # stage: [start, end]
+        self.results = {}  # stage: result of its action
+        self.result = None  # result of the last stage
+        self.error = None
+        self.done = None  # asyncio.Future, set by the scheduler
+
+    async def wait(self):
+        """Wait for the slug to go through all the stages.
+
+        :return:
+            Result of the last stage
+        """
+        return await asyncio.shield(self.done)
+
+    def __repr__(self):
+        return f'Slug({self.slug_id})'
+
+
+class SlugScheduler(object):
+    """Runs the stages of several slugs at the same time"""
+
+    def __init__(self, stages, resources, clock=None, name='slug'):
+        """ Class initialization
+
+        :param stages: list
+            Stages of every slug, in order
+        :param resources: list
+            Resources used by the stages
+        :param clock: RealClock
+            Clock of the platform (default: the clock of the process)
+        :param name: str
+            Prefix of the slug identities
+        """
+        self.stages = list(stages)
+        self.resources = collections.OrderedDict(
+            (resource.name, resource) for resource in resources
+        )
+        for stage in self.stages:
+            for resource in stage.resources:
+                if resource not in self.resources:
+                    raise ValueError(f'Stage {stage.name}: unknown resource '
+                                     f'{resource}.')
+        self.clock = clock if clock is not None else get_clock()
+        self.name = name
+        self.logger = logging.getLogger('Slug_scheduler')
+        self.slugs = []
+        self._sequence = itertools.count()
+        self._tasks = None
+        # resource: (index of the first stage using it, of the last one)
+        self.spans = {}
+        for index, stage in enumerate(self.stages):
+            for resource in stage.resources:
+                first, _ = self.spans.get(resource, (index, index))
+                self.spans[resource] = (first, index)
+
+    async def __aenter__(self):
+        self._tasks = TaskGroup('slugs')
+        await self._tasks.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        # waits for the slugs submitted (a failure stops them all)
+        tasks, self._tasks = self._tasks, None
+        return await tasks.__aexit__(exc_type, exc, traceback)
+
+    def submit(self, data):
+        """Add a slug at the end of the queue.
+
+        :param data: dict
+            Everything the stages need to know about the slug
+        :return: Slug
+        """
+        if self._tasks is None:
+            raise RuntimeError('Use the scheduler in "async with".')
+        sequence = next(self._sequence)
+        slug = Slug(f'{self.name}_{sequence + 1}', sequence, data)
+        slug.done = asyncio.get_running_loop().create_future()
+        self.slugs.append(slug)
+        self._tasks.create_task(self._run_slug(slug), name=slug.slug_id)
+        return slug
+
+    async def run(self, batch):
+        """Run a batch of slugs and wait for all of them.
+
+        :param batch: list
+            Data of each slug
+        :return: list
+            The slugs, in order
+        """
+        async with self:
+            slugs = [self.submit(data) for data in batch]
+        return slugs
+
+    def _starting(self, index):
+        return [name for name, (first, _) in self.spans.items()
+                if first == index]
+
+    def _ending(self, index):
+        return [name for name, (_, last) in self.spans.items()
+                if last == index]
+
+    async def _run_slug(self, slug):
+        held = []
+        acquired = set()
+        detached = []
+        try:
+            for index, stage in enumerate(self.stages):
+                # resources in declaration order (no deadlock between slugs)
+                for name in self.resources:
+                    if name in self._starting(index):
+                        await self.resources[name].acquire(slug)
+                        held.append(name)
+                        acquired.add(name)
+                if stage.min_interval is not None and \
+                        stage.last_start is not None:
+                    wait = stage.last_start + stage.min_interval(slug) \
+                        - self.clock.monotonic()
+                    if wait > 0:
+                        await self.clock.asleep(wait)
+                stage.last_start = self.clock.monotonic()
+                run = self._run_stage(slug, index, stage, held)
+                if stage.detached:
+                    detached.append(asyncio.ensure_future(run))
+                else:
+                    await run
+            if detached:
+                await asyncio.gather(*detached)
+                detached = []
+            slug.result = slug.results.get(self.stages[-1].name)
+            slug.done.set_result(slug.result)
+        except BaseException as error:
+            for task in detached:
+                task.cancel()
+            if not slug.done.done():
+                slug.error = error
+                if isinstance(error, asyncio.CancelledError):
+                    slug.done.cancel()
+                else:
+                    slug.done.set_exception(error)
+                    slug.done.exception()  # reported by the task group
+            raise
+        finally:
+            for name in list(held):
+                await self.resources[name].release(slug)
+            for name, resource in self.resources.items():
+                if name not in acquired:
+                    await resource.skip(slug)
+
+    async def _run_stage(self, slug, index, stage, held):
+        slug.timeline[stage.name] = [self.clock.monotonic(), None]
+        self.logger.info(f'{slug.slug_id}: {stage.name}')
+        slug.results[stage.name] = await stage.action(slug)
+        slug.timeline[stage.name][1] = self.clock.monotonic()
+        for name in self._ending(index):
+            if name in held:
+                held.remove(name)
+                await self.resources[name].release(slug)
+
+    def report(self):
+        """Timeline of the slugs and throughput.
+
+        :return: dict
+            slug id: {stage: [start, end]}, plus 'slugs per hour'
+        """
+        report = collections.OrderedDict(
+            (slug.slug_id, dict(slug.timeline)) for slug in self.slugs
+        )
+        ends = [slug.timeline[stage][1] for slug in self.slugs
+                for stage in slug.timeline
+                if slug.timeline[stage][1] is not None]
+        starts = [slug.timeline[stage][0] for slug in self.slugs
+                  for stage in slug.timeline]
+        if ends and starts and max(ends) > min(starts):
+            report['slugs per hour'] = \
+                3600 * len(self.slugs) / (max(ends) - min(starts))
+        return report
+
@@ -0,0 +1,79 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Slugs per hour of a campaign run one experiment at a time and of pipelined
+campaigns (SlugScheduler), for several residence times. Virtual clock: the
+comparison takes less than a second.
+    python -m Slug_scheduler.throughput
+"""
+
+from Clock_organizer.Platform_clock import VirtualClock
+from Slug_scheduler.slug_scheduler import Resource, Stage, SlugScheduler
+
+
+def throughput_comparison(residence_times=(300, 600, 1200), slugs=6,
+                           prepare=180, inject=60, gas_gap=30, analyse=150):
+    """Function to compare the slugs per hour of a sequential campaign and of
+    pipelined ones, with a virtual clock (durations in s).
+
+    :return: list
+        [residence time, sequential, pipelined, shared reactor] (slugs/h)
+    """
+    def wait(seconds):
+        async def action(slug):
+            await clock.asleep(seconds(slug) if callable(seconds)
+                               else seconds)
+        return action
+
+    def layouts():
+        react = wait(lambda slug: slug.data['residence_time'])
+        # one experiment at a time, as experimental_sequence does
+        yield ([Stage('prepare', wait(prepare), ['platform']),
+                Stage('inject', wait(inject), ['platform']),
+                Stage('react', react, ['platform']),
+                Stage('analyse', wait(analyse), ['platform'])],
+               [Resource('platform')])
+        # next slug prepared while the previous one reacts (RoboChem: one
+        # carrier stream, stopped-flow NMR)
+        yield ([Stage('prepare', wait(prepare),
+                      ['liquid_handler', 'sample_loop']),
+                Stage('inject', wait(inject), ['sample_loop', 'carrier'],
+                      min_interval=lambda slug: gas_gap),
+                Stage('react', react, ['carrier']),
+                Stage('analyse', wait(analyse), ['carrier', 'nmr'])],
+               [Resource('liquid_handler'), Resource('sample_loop'),
+                Resource('carrier'), Resource('nmr')])
+        # several slugs in the reactor (same flow rate), NMR in a bypass
+        yield ([Stage('prepare', wait(prepare),
+                      ['liquid_handler', 'sample_loop']),
+                Stage('inject', wait(inject), ['sample_loop', 'reactor'],
+                      min_interval=lambda slug: inject + gas_gap),
+                Stage('react', react, ['reactor']),
+                Stage('analyse', wait(analyse), ['nmr'])],
+               [Resource('liquid_handler'), Resource('sample_loop'),
+                Resource('reactor', capacity=slugs,
+                         key=lambda slug: slug.data['residence_time']),
+                Resource('nmr')])
+
+    rows = []
+    for residence_time in residence_times:
+        row = [residence_time]
+        for stages, resources in layouts():
+            clock = VirtualClock()
+            scheduler = SlugScheduler(stages, resources, clock)
+            clock.run(scheduler.run(
+                [{'residence_time': residence_time}] * slugs
+            ))
+            row.append(scheduler.report()['slugs per hour'])
+        rows.append(row)
+    return rows
+
+
+if __name__ == '__main__':
+    print('residence time [s]   sequential   pipelined   shared reactor '
+          '[slugs/h]')
+    for residence, sequential, pipelined, shared in throughput_comparison():
+        print(f'{residence:18d}   {sequential:10.2f}   {pipelined:9.2f}   '
+              f'{shared:14.2f}')
@@ -1,5 +1,3 @@
-import pymysql  # using a python3-compatible fork called mysqlclient, see https://www.lfd.uci.edu/~gohlke/pythonlibs/
-import pymysql.cursors
 import logging
 import subprocess
 
@@ -91,6 +89,9 @@ class MySQLReader:
 
         :return: conn, cur: connection and cursor objects
         '''
+        # using a python3-compatible fork called mysqlclient, see https://www.lfd.uci.edu/~gohlke/pythonlibs/
+        import pymysql
+        import pymysql.cursors
         try:
             conn = pymysql.connect(user=self.mysql_user, passwd=self.mysql_pass,
                                    host=self.mysql_host, db=self.mysql_db,
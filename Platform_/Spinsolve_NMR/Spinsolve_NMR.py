@@ -1,35 +1,34 @@
 import socket
-import time
 import os
 import threading
 import xml.etree.ElementTree as ET
 import traceback
-import json
 from Spinsolve_NMR.MySQLReader import *
 # from MySQLReader import *
 from phase_sensor_CSV_naming import get_your_abs_project_path
+from Virtual_instruments.settings import use_virtual_instruments
+from Clock_organizer.Platform_clock import get_clock
+from Setup_config import get_setup
 import asyncio
 
-SETUP_INFO_JSON = '../experimental_setup.json'
-with open(SETUP_INFO_JSON) as json_file:
-    experimental_setup = json.load(json_file)
-
-NMR_NUCELUS = experimental_setup["nmr_nucleus"]
-NMR_SETTINGS = experimental_setup["nmr_settings"]
-
 class Spinsolve:
     '''
     Class that handles the communication with the Magritec NMR spectrometer through the use of SPINSOLVE
     '''
 
-    def __init__(self, mysql_reader):
+    def __init__(self, mysql_reader, clock=None, setup=None):
         '''
         Initialise the class by creating a Spinsolve object which will handle the communication between the
         spectrometer and software.
 
         :param mysql_reader: MySQLReader object with access to the config (from MYSQLReader.py)
+        :param clock: RealClock object used for all waits and timestamps (default: the clock of the process)
+        :param setup: ExperimentalSetup, settings of the campaign (NMR nucleus and settings)
+        (default: Setup_config.get_setup())
 
         '''
+        self.clock = clock if clock is not None else get_clock()
+        self.setup = setup if setup is not None else get_setup()
 
         # finds the nmr folder
         self.NMRFolder = (
@@ -86,6 +85,11 @@ class Spinsolve:
         config = self.mysql_reader.read_config()
         nmr_ip = '127.0.0.1'
         port = 13000
+        if use_virtual_instruments():
+            # the virtual spectrometer listens on the same address
+            from Virtual_instruments.virtual_platform import \
+                get_virtual_platform
+            get_virtual_platform().start_nmr()
 
         # try the connection to the spectrometer
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -176,7 +180,7 @@ class Spinsolve:
                                     "message: " + str(message))
                                 traceback.print_exc()
                     # Write down the date of the contact with the spectrometer.
-                    self.last_status = int(time.time())
+                    self.last_status = int(self.clock.time())
                 except:
                     logging.warning(
                         "It appears that the Spinsolve software is not "
@@ -187,7 +191,7 @@ class Spinsolve:
                     if conn is not None and cur is not None:
                         cur.execute("UPDATE QueueAbort SET QueueStat = 0")
                         conn.close()
-            time.sleep(0.2)
+            self.clock.sleep(0.2)
 
     def shim(self, shimtype):
         '''
@@ -201,8 +205,7 @@ class Spinsolve:
         '''
 
         # initialise the time and parse it to a string in the preferred format
-        t = time.localtime()
-        tstr = time.strftime("%Y-%m-%d_%H%M%S", t)
+        tstr = self.clock.strftime("%Y-%m-%d_%H%M%S")
         # initialise the return values
         retval = False
         aborted = False
@@ -243,7 +246,7 @@ class Spinsolve:
                     if os.path.isfile(SuccessFile):
                         retval = True
                 break
-            time.sleep(0.1)
+            self.clock.sleep(0.1)
         self.progress = 0  # reset progress
         return retval, aborted
 
@@ -309,7 +312,7 @@ class Spinsolve:
                 for j in range(10):  # 10x100 ms = 1 sec
                     if self.successful == True:
                         break
-                    time.sleep(0.1)
+                    self.clock.sleep(0.1)
                 if self.successful:
                     self.successful = False
                     # wait for a few seconds, sometimes spinsolve is kind of
@@ -319,9 +322,9 @@ class Spinsolve:
                         if os.path.isfile(SuccessFile):
                             retval = True
                             break
-                        time.sleep(1)
+                        self.clock.sleep(1)
                 break
-            time.sleep(0.1)
+            self.clock.sleep(0.1)
         self.progress = 0  # reset progress
         return retval, aborted
 
@@ -380,13 +383,16 @@ class Spinsolve:
         :return:
         '''
 
-        spinsolve = Spinsolve(self.mysql_reader)
+        spinsolve = Spinsolve(self.mysql_reader, clock=self.clock, setup=self.setup)
         spinsolve.connect()
-        spinsolve.measure_sample(str(experiment_name),
-                                 NMR_NUCELUS,
-                                 NMR_SETTINGS
-                                 )
-        await asyncio.sleep(5)
+        # measure_sample blocks until the spectrum is recorded: in a thread,
+        # so the rest of the platform can use the time (e.g. syringe refills)
+        await asyncio.to_thread(spinsolve.measure_sample,
+                                str(experiment_name),
+                                self.setup.nmr_nucleus,
+                                self.setup.nmr_settings
+                                )
+        await self.clock.asleep(5)
 
 if __name__ == '__main__':
     xampp_location = "C:/xampp"
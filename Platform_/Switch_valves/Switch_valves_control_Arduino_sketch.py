@@ -13,10 +13,11 @@ import time
 import asyncio
 from List_connected_devices import find_port
 from Logging_organizer.Logging_Setting import setup_logger
+from Clock_organizer.Platform_clock import get_clock
 
 
 class SwitchValveArduino:
-    def __init__(self, port, log_name, pins, valve_types):
+    def __init__(self, port, log_name, pins, valve_types, clock=None):
         """Class to connect to an Arduino board running the sketch
         switch_pin_output.ino
 
@@ -31,15 +32,18 @@ class SwitchValveArduino:
             List of strings describing the type of valves (sorted in the same
             way as pins)
             (e.g., ['4-way', '3-way', '4-way', '3-way'])
+        :param clock: RealClock
+            Clock used for all waits (default: the clock of the process)
         """
         self.port = port
+        self.clock = clock if clock is not None else get_clock()
         # Setup logging
         self.logger = setup_logger(f'{log_name}_logger', f'{log_name}.log')
 
         # Establish serial connection
         try:
-            self.arduino = serial.Serial(
-                port=port,
+            self.arduino = serial.serial_for_url(
+                port,
                 baudrate=19200,
                 timeout=.5,
             )
@@ -86,7 +90,7 @@ class SwitchValveArduino:
             feedback = self.arduino.readline().decode(encoding='ascii')
             if feedback != '':
                 break
-            time.sleep(.1)
+            self.clock.sleep(.1)
         # Update status
         self.status[pin] = 0 if feedback == "LOW\n" else 1
         # Log status
@@ -117,7 +121,7 @@ class SwitchValveArduino:
             Digital pin to which the switch valve is connected
         """
         self.set_to_status(pin, 0)  # counterintuitive, based on valve behavior
-        await asyncio.sleep(self.valve_delay)
+        await self.clock.asleep(self.valve_delay)
 
     async def set_OFF_or_C_3(self, pin):
         """Set the switch valve to OFF or C-3.
@@ -126,7 +130,7 @@ class SwitchValveArduino:
             Digital pin to which the switch valve is connected
         """
         self.set_to_status(pin, 1)  # counterintuitive, based on valve behavior
-        await asyncio.sleep(self.valve_delay)
+        await self.clock.asleep(self.valve_delay)
 
     async def valve_1_ON_or_C_1(self):
         """Set valve 1 to ON or C-1.
@@ -15,9 +15,8 @@ https://www.chemyx.com/support/knowledge-base/programming-and-computer-control/p
 """
 
 import serial
-import time
-import asyncio
 from Logging_organizer.Logging_Setting import setup_logger
+from Clock_organizer.Platform_clock import get_clock
 from List_connected_devices import find_port
 
 
@@ -35,9 +34,12 @@ class SyringePump:
         No idea what this actually does. Default value is good.
     :param x: int
         No idea what this actually does. Default value is good.
+    :param clock: RealClock
+        Clock used for all waits (default: the clock of the process)
     """
-    def __init__(self, port, baudrate, name, mode=0, x=0):
+    def __init__(self, port, baudrate, name, mode=0, x=0, clock=None):
         self.logger = setup_logger(f'{name}_logger', f'{name}.log')
+        self.clock = clock if clock is not None else get_clock()
 
         self.logger.info(f"Device is initialized.")
 
@@ -47,12 +49,12 @@ class SyringePump:
         self.logger.info(f"Port: {port}")
 
         # Create a serial port connection with the device
-        self.serialObj = serial.Serial()
+        # (serial_for_url also accepts the URLs of the virtual instruments)
+        self.serialObj = serial.serial_for_url(port, do_not_open=True)
         self.serialObj.timeout = 0
         self.serialObj.baudrate = baudrate
         self.serialObj.parity = serial.PARITY_NONE
         self.serialObj.stopbits = serial.STOPBITS_ONE
-        self.serialObj.port = port
         # Open connection
         try:
             self.serialObj.open()
@@ -126,7 +128,7 @@ class SyringePump:
         try:
             arg = bytes(str(command), 'utf8') + b'\r'
             self.serialObj.write(arg)
-            time.sleep(0.3)
+            self.clock.sleep(0.3)
             self.logger.info(f"Command '{command}' sent to {self.name}.")
             return self.get_response()
         except TypeError as error:
@@ -241,7 +243,7 @@ class SyringePump:
         :returns: list
             instrument response
         """
-        time.sleep(0.2)
+        self.clock.sleep(0.2)
         command = 'set rate ' + str(flow_rate)
         return self.send_command(command)
 
@@ -377,16 +379,16 @@ class SyringePump:
             Parameter to avoid waiting for completed execution of pumping
         """
         # self.open_connection()  # try to keep it open to reduce overhead
-        await asyncio.sleep(0.1)
+        await self.clock.asleep(0.1)
         self.set_volume(volume)
-        await asyncio.sleep(0.1)
+        await self.clock.asleep(0.1)
         self.set_rate(1000*flow_rate)
-        await asyncio.sleep(0.1)
+        await self.clock.asleep(0.1)
         self.start_pump()
         if not skip_wait:
-            await asyncio.sleep(self.estimate_time(volume, flow_rate))
+            await self.clock.asleep(self.estimate_time(volume, flow_rate))
         else:
-            await asyncio.sleep(2)
+            await self.clock.asleep(2)
         self.stop_pump()
         # self.close_connection()
 
@@ -403,7 +405,7 @@ class SyringePump:
             flow rate [mL/min]
         """
         # compare volume and flow_rate with allowed values
-        await asyncio.sleep(0.20)
+        await self.clock.asleep(0.20)
         max_volume = 10000  # we use 10 mL gas-tight syringes
         max_flow_rate = float(self.get_parameter_limits()[1].split(" ")[0])
         if abs(volume) > max_volume:
@@ -417,13 +419,13 @@ class SyringePump:
                 f"Input flow rate too high. Changed to {max_flow_rate/1000} mL/min."
             )
         # dispense/aspirate volume at desired flow rate
-        await asyncio.sleep(0.05)
+        await self.clock.asleep(0.05)
         self.set_volume(volume)
-        await asyncio.sleep(0.05)
+        await self.clock.asleep(0.05)
         self.set_rate(1000*flow_rate)
-        await asyncio.sleep(0.20)
+        await self.clock.asleep(0.20)
         self.start_pump()
-        time.sleep(self.estimate_time(volume, flow_rate))
+        self.clock.sleep(self.estimate_time(volume, flow_rate))
         self.stop_pump()
         # check it actually happened and re-try if not
         dispensed_vol = float(self.get_displaced_volume()[1].split(" ")[3])
@@ -431,17 +433,17 @@ class SyringePump:
             f"Required volume: {volume} μL. "
             + f"Displaced volume: {dispensed_vol} μL."
         )
-        await asyncio.sleep(0.10)
+        await self.clock.asleep(0.10)
         pos_neg = -1 if volume < 0 else 1  # set as dispensing/withdrawing
         vol_diff = abs(volume) - dispensed_vol
         if vol_diff > 5:  # 5 μL tolerance
-            await asyncio.sleep(0.05)
+            await self.clock.asleep(0.05)
             self.set_volume(vol_diff * pos_neg)
-            await asyncio.sleep(0.05)
+            await self.clock.asleep(0.05)
             self.set_rate(1000*flow_rate)
-            await asyncio.sleep(0.20)
+            await self.clock.asleep(0.20)
             self.start_pump()
-            time.sleep(self.estimate_time(vol_diff, flow_rate))
+            self.clock.sleep(self.estimate_time(vol_diff, flow_rate))
             self.stop_pump()
 
 if __name__ == '__main__':
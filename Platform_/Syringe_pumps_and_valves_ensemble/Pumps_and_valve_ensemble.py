@@ -37,6 +37,9 @@ import logging
 from platform_class import Platform
 from List_connected_devices import find_port
 
+# Volume [μL] dispensed by a pump when it is set as active
+PRIME_VOLUME = 650
+
 
 class PumpsValvesEnsemble:
     def __init__(self, platform):
@@ -54,13 +57,18 @@ class PumpsValvesEnsemble:
             level=logging.DEBUG
         )
 
+        self.clock = platform.clock
         self.pump_A = platform.syringe_pump_a
         self.volume_A = 0
         self.pump_B = platform.syringe_pump_b
         self.volume_B = 0
+        # ledger: total volume [μL] dispensed by each syringe since start-up
+        self.dispensed_A = 0
+        self.dispensed_B = 0
         self.valves = platform.switch_valves
 
         self.active_pump = ''
+        self.refilling = None  # background refill of the pump set to refill
         self.refill_vol = 9000
         self.refill_flow = 2
         self.logger.info('Pump+valves ensemble initialized')
@@ -73,17 +81,23 @@ class PumpsValvesEnsemble:
             'pump_a' to set Pump A as active and Pump B to refill
             'pump_b' to set Pump B as active and Pump A to refill
         """
+        # a pump still refilling in the background cannot dispense yet
+        await self.wait_idle_refill()
         self.active_pump = active_pump
-        await asyncio.sleep(1.5)  # to give enough time for refilling to start
+        await self.clock.asleep(1.5)  # to give enough time for refilling to start
         if active_pump == 'pump_a':
             await self.valves.valve_2_OFF_or_C_3()
             # Prime pump A
-            await self.pump_A.operate_pump(650, 2)
+            await self.pump_A.operate_pump(PRIME_VOLUME, 2)
+            self.volume_A -= PRIME_VOLUME
+            self.dispensed_A += PRIME_VOLUME
             self.logger.info('Pump A set as active, Pump B set to refill')
         else:  # catches 'pump_b' and wrong input as well
             await self.valves.valve_2_ON_or_C_1()
             # Prime pump B
-            await self.pump_B.operate_pump(650, 2)
+            await self.pump_B.operate_pump(PRIME_VOLUME, 2)
+            self.volume_B -= PRIME_VOLUME
+            self.dispensed_B += PRIME_VOLUME
             self.logger.info('Pump B set as active, Pump A set to refill')
 
 
@@ -110,12 +124,12 @@ class PumpsValvesEnsemble:
             asyncio.to_thread(self.pump_A.set_diameter, diameter_a),
             asyncio.to_thread(self.pump_B.set_diameter, diameter_b)
         )
-        await asyncio.sleep(0.1)
+        await self.clock.asleep(0.1)
         await asyncio.gather(
             asyncio.to_thread(self.pump_A.set_units, 'μL/min'),
             asyncio.to_thread(self.pump_B.set_units, 'μL/min')
         )
-        await asyncio.sleep(0.1)
+        await self.clock.asleep(0.1)
 
         # open way to waste
         await self.valves.valve_1_ON_or_C_1()
@@ -185,7 +199,7 @@ class PumpsValvesEnsemble:
             asyncio.to_thread(self.pump_A.set_diameter, diameter_a),
             asyncio.to_thread(self.pump_B.set_diameter, diameter_b)
         )
-        await asyncio.sleep(.1)
+        await self.clock.asleep(.1)
         await asyncio.gather(
             asyncio.to_thread(self.pump_A.set_units, 'μL/min'),
             asyncio.to_thread(self.pump_B.set_units, 'μL/min')
@@ -195,7 +209,7 @@ class PumpsValvesEnsemble:
         await self.valves.valve_1_ON_or_C_1()
 
         # check which pump has more solvent and set it as the active pump
-        await asyncio.sleep(.1)
+        await self.clock.asleep(.1)
         # syringes almost full --> no fill
         if vol_start_a > 8900 and vol_start_b > 8900:
             self.volume_A = vol_start_a
@@ -241,6 +255,8 @@ class PumpsValvesEnsemble:
             )
         elif vol_start_a >= vol_start_b:
             vol_for_refill = vol_start_b - self.refill_vol
+            self.volume_A = vol_start_a
+            self.volume_B = self.refill_vol
             tasks_a = [
                 asyncio.create_task(
                     self.set_pump_active('pump_a')
@@ -252,8 +268,6 @@ class PumpsValvesEnsemble:
                 ),
             ]
             await asyncio.wait(tasks_a, return_when=asyncio.FIRST_COMPLETED)
-            self.volume_A = vol_start_a
-            self.volume_B = self.refill_vol
             self.logger.info(
                 (
                     'Syringe A and B filled with '
@@ -262,6 +276,8 @@ class PumpsValvesEnsemble:
             )
         elif vol_start_a < vol_start_b:
             vol_for_refill = vol_start_a - self.refill_vol
+            self.volume_A = self.refill_vol
+            self.volume_B = vol_start_b
             tasks_b = [
                 asyncio.create_task(
                     self.set_pump_active('pump_b')
@@ -273,8 +289,6 @@ class PumpsValvesEnsemble:
                 ),
             ]
             await asyncio.wait(tasks_b, return_when=asyncio.FIRST_COMPLETED)
-            self.volume_A = self.refill_vol
-            self.volume_B = vol_start_b
             self.logger.info(
                 (
                     'Syringe A and B filled with '
@@ -282,6 +296,52 @@ class PumpsValvesEnsemble:
                 )
             )
 
+    async def refill_idle_pump(self, max_volume=None):
+        """ Coroutine to refill the syringe of the pump set to refill, while
+        the active pump can keep dispensing.
+
+        :param max_volume: float
+            Maximum volume [μL] to aspirate (None: fill up to refill_vol)
+        :return: float
+            Volume [μL] aspirated
+        """
+        if self.active_pump == 'pump_a':
+            pump, name, volume = self.pump_B, 'B', self.volume_B
+        else:
+            pump, name, volume = self.pump_A, 'A', self.volume_A
+        refill_vol = self.refill_vol - volume
+        if max_volume is not None:
+            refill_vol = min(refill_vol, max_volume)
+        if refill_vol <= 500:  # only run pump if needed
+            return 0
+        await pump.operate_pump(-refill_vol, self.refill_flow)
+        setattr(self, f'volume_{name}', volume + refill_vol)
+        self.logger.info(f'Refilled Syringe {name} with {refill_vol} μL.')
+        return refill_vol
+
+    def start_idle_refill(self):
+        """ Method to refill the pump set to refill in the background, while
+        the active pump keeps dispensing.
+
+        :return: asyncio.Task
+            Task of refill_idle_pump
+        """
+        self.refilling = asyncio.create_task(self.refill_idle_pump())
+        return self.refilling
+
+    async def wait_idle_refill(self):
+        """ Coroutine waiting for the background refill (if any) to finish,
+        before the pump set to refill is used again.
+        """
+        refilling, self.refilling = self.refilling, None
+        if refilling is None:
+            return
+        if refilling.cancelled():
+            # the volume of the syringe is still the one before the refill
+            self.logger.warning('Refill of the idle pump interrupted')
+            return
+        await refilling
+
     async def operate_ensemble(self, volume, flow_rate):
         """ Coroutine to operate the ensemble of pumps and switch valves.
         Manages the active pump and refilling based on required volume.
@@ -297,6 +357,7 @@ class PumpsValvesEnsemble:
             if self.volume_A > volume:
                 await self.pump_A.operate_pump(volume, flow_rate)
                 self.volume_A -= volume
+                self.dispensed_A += volume
                 self.logger.info(f"Pump A dispensed {volume} μL")
             else:
                 self.active_pump = 'pump_b'
@@ -305,6 +366,7 @@ class PumpsValvesEnsemble:
                 refill_vol = - (self.refill_vol - self.volume_A)
                 self.volume_A = self.refill_vol
                 self.volume_B -= volume
+                self.dispensed_B += volume
                 tasks = [
                     asyncio.create_task(
                         self.pump_A.operate_pump(refill_vol, self.refill_flow)
@@ -318,6 +380,7 @@ class PumpsValvesEnsemble:
             if self.volume_B > volume:
                 await self.pump_B.operate_pump(volume, flow_rate)
                 self.volume_B -= volume
+                self.dispensed_B += volume
                 self.logger.info(f'Pump B dispensed {volume} μL')
             else:
                 self.active_pump = 'pump_a'
@@ -326,6 +389,7 @@ class PumpsValvesEnsemble:
                 refill_vol = - (self.refill_vol - self.volume_B)
                 self.volume_B = self.refill_vol
                 self.volume_A -= volume
+                self.dispensed_A += volume
                 tasks = [
                     asyncio.create_task(
                         self.pump_B.operate_pump(refill_vol, self.refill_flow)
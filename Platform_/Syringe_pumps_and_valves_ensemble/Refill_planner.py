@@ -0,0 +1,293 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Planner of the syringe refills (pumps A/B of the carrier, pump C of the NMR
+line).
+
+The volume in every syringe is tracked from the dispensed-volume ledger of the
+ensembles (volume_A/B/C, dispensed_A/B/C) and reconciled with the ultrasonic
+detectors every few experiments. Before an experiment, a syringe is refilled
+only if it cannot deliver what the experiment needs: the largest volume drawn
+by the last experiments, or the estimate given at initialization for the
+first ones. The other refills are done off the critical path: the pump of the
+carrier set to refill is routed to the reservoir and refills while the
+experiment runs; pump C refills in idle windows of the NMR line (while the NMR
+records the spectrum with the flow stopped), limited to what fits in the last
+window so that it never delays the platform.
+
+Every experiment, the time spent refilling before it starts is compared with
+the time the unconditional refill (start-up of the ensembles + refill of
+pump C before every experiment) would have taken, and the saved seconds are
+reported.
+"""
+
+import asyncio
+import logging
+from collections import deque
+
+from Syringe_pumps_and_valves_ensemble.Pumps_and_valve_ensemble import \
+    PRIME_VOLUME
+# Estimates of the detectors below this confidence leave the ledger unchanged
+from ultrasonic_detector.ultrasonic_pump_detection import MIN_CONFIDENCE
+
+# The syringes are reconciled with the ultrasonic detectors every
+# RECONCILE_EVERY experiments
+RECONCILE_EVERY = 5
+# Number of past experiments considered for the volume needed by the next one
+HISTORY = 5
+# Volume [μL] kept in every syringe on top of the need of an experiment
+NEED_MARGIN = 500
+# Syringes missing less than this volume [μL] are not refilled (as in
+# refill_syringe)
+REFILL_THRESHOLD = 500
+# Duration [s] assumed for the first idle window (then: the last one)
+FIRST_WINDOW = 60
+# Time [s] of an idle window kept for the commands to the valves and pumps
+WINDOW_MARGIN = 5
+
+
+def pumping_seconds(volume, flow_rate):
+    """ Duration [s] of operate_pump for a volume [μL] at a flow rate
+    [mL/min], including the commands to the pump.
+
+    :param volume: float
+    :param flow_rate: float
+    :return: float
+    """
+    return 0.3 + abs(volume) / (1000 * flow_rate) * 60
+
+
+class RefillPlanner:
+    def __init__(self, pumps_valves, pump_c, detectors, carrier_need,
+                 line_need, start_up, reconcile_every=RECONCILE_EVERY):
+        """ Class initialization
+
+        :param pumps_valves: PumpsValvesEnsemble
+            Pumps A/B of the carrier
+        :param pump_c: SinglePumpValveEnsemble
+            Pump C (solvent for the NMR line)
+        :param detectors: UltrasonicDetector
+            Volume measurement of the syringes
+        :param carrier_need: float
+            Estimated volume [μL] of carrier delivered in one experiment
+        :param line_need: float
+            Estimated volume [μL] of pump C used in one experiment
+        :param start_up: function
+            Coroutine function measuring the syringes and starting up the
+            ensembles (run before the first experiment)
+        :param reconcile_every: int
+            Number of experiments between two reconciliations with the
+            ultrasonic detectors
+        """
+        self.logger = logging.getLogger('Pump_ensemble_log')
+        self.clock = pumps_valves.clock
+        self.pumps_valves = pumps_valves
+        self.pump_c = pump_c
+        self.detectors = detectors
+        self.start_up = start_up
+        self.reconcile_every = reconcile_every
+        self.estimates = {'carrier': carrier_need, 'line': line_need}
+        # volumes drawn by the last experiments
+        self.history = {'carrier': deque(maxlen=HISTORY),
+                        'line': deque(maxlen=HISTORY)}
+        self.ledger = None  # dispensed volumes when the last experiment began
+        self.experiments = 0
+        self.saved_seconds = []
+        self.window_seconds = FIRST_WINDOW
+
+    def dispensed(self):
+        """ Total volumes [μL] dispensed since start-up
+
+        :return: dict
+            {'carrier': pumps A + B, 'line': pump C}
+        """
+        return {
+            'carrier': (self.pumps_valves.dispensed_A
+                        + self.pumps_valves.dispensed_B),
+            'line': self.pump_c.dispensed_C
+        }
+
+    def need(self, line):
+        """ Volume [μL] an experiment needs from a syringe
+
+        :param line: str
+            'carrier' (active pump A or B) or 'line' (pump C)
+        :return: float
+        """
+        return max([self.estimates[line], *self.history[line]]) + NEED_MARGIN
+
+    def carrier_volumes(self):
+        """ Volumes [μL] in the active pump and in the pump set to refill
+
+        :return: tuple
+            (active, idle)
+        """
+        if self.pumps_valves.active_pump == 'pump_a':
+            return self.pumps_valves.volume_A, self.pumps_valves.volume_B
+        return self.pumps_valves.volume_B, self.pumps_valves.volume_A
+
+    async def reconcile(self):
+        """ Coroutine replacing the volumes of the ledger by the volumes
+        measured by the ultrasonic detectors (if confident enough).
+        """
+        for name, ensemble in (('A', self.pumps_valves),
+                               ('B', self.pumps_valves),
+                               ('C', self.pump_c)):
+            tracked = getattr(ensemble, f'volume_{name}')
+            # the ledger is kept when the detector is not confident enough
+            try:
+                volume, confidence = await self.detectors.get_volume(
+                    pump=name, return_confidence=True, min_confidence=0
+                )
+            except ConnectionError as error:
+                self.logger.info(f'Pump {name}: ledger kept ({tracked:.0f} '
+                                 f'ul), {error}')
+                continue
+            if confidence < MIN_CONFIDENCE:
+                self.logger.info(f'Pump {name}: ledger kept ({tracked:.0f} '
+                                 f'ul), detector confidence {confidence}')
+                continue
+            setattr(ensemble, f'volume_{name}', volume)
+            self.logger.info(f'Pump {name}: ledger {tracked:.0f} ul, '
+                             f'measured {volume:.0f} ul')
+
+    def start_up_seconds(self):
+        """ Estimated duration [s] of the start-up of the ensembles (pump
+        A/B activation, plus a full refill of pump A when both syringes are
+        almost empty).
+
+        :return: float
+        """
+        pumps_valves = self.pumps_valves
+        seconds = 1.5 + pumping_seconds(PRIME_VOLUME, 2)
+        if pumps_valves.volume_A < 2500 and pumps_valves.volume_B < 2500:
+            seconds += pumping_seconds(
+                pumps_valves.refill_vol - pumps_valves.volume_A,
+                pumps_valves.refill_flow
+            )
+        return seconds
+
+    def line_refill_seconds(self):
+        """ Estimated duration [s] of refill_syringe of pump C (it also
+        empties the syringe down to refill_vol when it holds more).
+
+        :return: float
+        """
+        pump_c = self.pump_c
+        seconds = 0.5
+        if abs(pump_c.refill_vol - pump_c.volume_C) > REFILL_THRESHOLD:
+            seconds += pumping_seconds(pump_c.refill_vol - pump_c.volume_C,
+                                       pump_c.refill_flow)
+        return seconds
+
+    async def before_experiment(self):
+        """ Coroutine making the syringes ready for the next experiment,
+        refilling only what the experiment cannot do without.
+
+        :return: float
+            Seconds saved compared to the unconditional refill
+        """
+        started = self.clock.monotonic()
+        if self.ledger is None:
+            await self.start_up()
+            # the refill of pump C formerly run after the start-up
+            baseline = (self.clock.monotonic() - started
+                        + self.line_refill_seconds())
+        else:
+            dispensed = self.dispensed()
+            for line in self.history:
+                self.history[line].append(dispensed[line] - self.ledger[line])
+            if self.experiments % self.reconcile_every == 0:
+                await self.reconcile()
+            # formerly: start-up of the ensembles, then refill of pump C
+            baseline = (max(self.start_up_seconds(), 0.5)
+                        + self.line_refill_seconds())
+        await self._refill_carrier()
+        if self.pump_c.volume_C < self.need('line'):
+            await self.pump_c.refill_syringe()
+        self.ledger = self.dispensed()
+        self.experiments += 1
+
+        spent = self.clock.monotonic() - started
+        saved = baseline - spent
+        self.saved_seconds.append(saved)
+        print(f'Syringe refills: {spent:.0f} s before experiment '
+              f'{self.experiments}, {saved:.0f} s saved '
+              f'({sum(self.saved_seconds):.0f} s in total)')
+        self.logger.info(f'Refill planner: {spent:.1f} s before experiment '
+                         f'{self.experiments}, {saved:.1f} s saved')
+        return saved
+
+    async def _refill_carrier(self):
+        # the active pump must deliver the whole experiment: switching pumps
+        # during the delivery would change the residence time
+        need = self.need('carrier')
+        if self.carrier_volumes()[0] >= need:
+            return
+        # the pump set as active is primed first
+        await self.pumps_valves.wait_idle_refill()
+        if self.carrier_volumes()[1] < need + PRIME_VOLUME:
+            await self.pumps_valves.refill_idle_pump()
+        await self.pumps_valves.set_pump_active(
+            'pump_b' if self.pumps_valves.active_pump == 'pump_a'
+            else 'pump_a'
+        )
+        # the drained pump refills while the experiment runs
+        self.pumps_valves.start_idle_refill()
+
+    async def refill_during(self, window):
+        """ Coroutine running an idle window of the platform (e.g. the NMR
+        acquisition, flow stopped and NMR line closed) and topping up
+        meanwhile the syringes that are not needed: pump C and the pump of the
+        carrier set to refill (unless already refilling). The refills are
+        limited to what fits in the previous window.
+
+        :param window: awaitable
+            What the platform does meanwhile
+        :return:
+            The result of window
+        """
+        async def timed():
+            started = self.clock.monotonic()
+            result = await window
+            self.window_seconds = self.clock.monotonic() - started
+            return result
+
+        result, volume = await asyncio.gather(
+            timed(), self.refill_idle_window(self.window_seconds)
+        )
+        return result
+
+    async def refill_idle_window(self, seconds):
+        """ Coroutine topping up the pump of the carrier set to refill and
+        pump C, as much as can be aspirated in a given time.
+
+        :param seconds: float
+            Duration [s] of the idle window
+        :return: float
+            Volume [μL] aspirated
+        """
+        started = self.clock.monotonic()
+        seconds = max(seconds - WINDOW_MARGIN, 0)
+        pumps_valves, pump_c = self.pumps_valves, self.pump_c
+        refills = []
+        active, idle = self.carrier_volumes()
+        refilling = pumps_valves.refilling
+        if (refilling is None or refilling.done()) and \
+                pumps_valves.refill_vol - idle > REFILL_THRESHOLD:
+            refills.append(pumps_valves.refill_idle_pump(
+                max_volume=seconds * pumps_valves.refill_flow * 1000 / 60
+            ))
+        if pump_c.refill_vol - pump_c.volume_C > REFILL_THRESHOLD:
+            refills.append(pump_c.refill_syringe(
+                max_volume=seconds * pump_c.refill_flow * 1000 / 60
+            ))
+        volume = sum(await asyncio.gather(*refills))
+        if volume:
+            self.logger.info(
+                f'Refill planner: {volume:.0f} ul refilled in '
+                f'{self.clock.monotonic() - started:.1f} s (idle window)'
+            )
+        return volume
@@ -56,12 +56,16 @@ class SinglePumpValveEnsemble:
             level=logging.DEBUG
         )
 
+        self.clock = platform.clock
         self.pump_C = platform.syringe_pump_c
         # self.volume_C = 0
         self.volume_C = 10000
+        # ledger: total volume [μL] dispensed by syringe C since start-up
+        self.dispensed_C = 0
         self.valve = platform.switch_valves
 
         self.refill_vol = 10000
+        self.refill_flow = 3
         self.logger.info('Pump+valves ensemble initialized')
         # self.PumpsValvesMFCPS = PumpsValvesMFCPS(platform)
 
@@ -77,9 +81,9 @@ class SinglePumpValveEnsemble:
         """
         # set pumps parameters
         await asyncio.to_thread(self.pump_C.set_diameter, diameter_c)
-        await asyncio.sleep(0.1)
+        await self.clock.asleep(0.1)
         await asyncio.to_thread(self.pump_C.set_units, 'μL/min')
-        await asyncio.sleep(0.1)
+        await self.clock.asleep(0.1)
 
         # open way to reservoir
         await self.valve.valve_3_ON_or_C_1()
@@ -117,9 +121,9 @@ class SinglePumpValveEnsemble:
         """
         # set pumps parameters
         await asyncio.to_thread(self.pump_C.set_diameter, diameter_c)
-        await asyncio.sleep(.250)
+        await self.clock.asleep(.250)
         await asyncio.to_thread(self.pump_C.set_units, 'μL/min')
-        await asyncio.sleep(.250)
+        await self.clock.asleep(.250)
 
         # open way to NMR loop
         await self.valve.valve_3_OFF_or_C_3()
@@ -131,18 +135,33 @@ class SinglePumpValveEnsemble:
             + "mL (in total)"
         )
 
-    async def refill_syringe(self):
+    async def refill_syringe(self, max_volume=None):
         """Method to refill the syringe.
+
+        :param max_volume: float
+            Maximum volume [μL] to aspirate (None: fill up to refill_vol)
+        :return: float
+            Volume [μL] aspirated
         """
         # open way to reservoir
         await self.valve.valve_3_ON_or_C_1()
         refill_vol = - (self.refill_vol - self.volume_C)
+        if max_volume is not None:
+            refill_vol = max(refill_vol, -max_volume)
         if abs(refill_vol) > 500:  # only run pump if needed
-            await self.pump_C.operate_pump(refill_vol, 3)
-        self.volume_C = self.refill_vol
+            await self.pump_C.operate_pump(refill_vol, self.refill_flow)
+            self.volume_C -= refill_vol
+        else:
+            refill_vol = 0
         self.logger.info('Refilled Syringe C.')
         # open way to reservoir
         await self.valve.valve_3_OFF_or_C_3()
+        return -refill_vol
+
+    def _dispensed(self, volume):
+        # keep the ledger of syringe C
+        self.volume_C -= volume
+        self.dispensed_C += volume
 
     async def operate_ensemble(self, volume, flow_rate):
         """Coroutine to operate the ensemble of pumps and switch valves.
@@ -158,7 +177,7 @@ class SinglePumpValveEnsemble:
         else:
             if self.volume_C > volume:
                 await self.pump_C.operate_pump(volume, flow_rate)
-                self.volume_C -= volume
+                self._dispensed(volume)
                 self.logger.info(f"Pump C dispensed {volume} μL")
             else:
                 await self.refill_syringe()
@@ -208,8 +227,9 @@ class SinglePumpValveEnsemble:
                 await self.pump_C.operate_pump(
                     volume, flow_rate
                 )
+                self._dispensed(volume)
                 # wait to allow for signal processing
-                await asyncio.sleep(2)
+                await self.clock.asleep(2)
                 # check for droplet
                 detected = await identify_reaction_mix(
                     ps_data_filename(phase_sensor),
@@ -225,10 +245,12 @@ class SinglePumpValveEnsemble:
                 await self.pump_C.operate_pump(
                     volume, flow_rate
                 )
+                self._dispensed(volume)
         else:
             await self.pump_C.operate_pump(
                 volume, flow_rate
             )
+            self._dispensed(volume)
 
 if __name__ == '__main__':
     platform = Platform(
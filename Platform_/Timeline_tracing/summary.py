@@ -0,0 +1,130 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Where the time of a campaign goes: durations of the steps of the experiments
+recorded in timeline files (see timeline.py), from the Platform_ folder:
+    python -m Timeline_tracing.summary Timeline_DATA/<file>.jsonl [...]
+
+For every step (span name):
+- count: number of times it ran;
+- total, mean, max: its duration [s];
+- own: total time not spent in its child steps [s] (the steps below it are
+  counted in their own lines);
+- share: own time / time of the experiments (first start to last end of
+  each experiment, summed). Steps running at the same time (pipelined
+  experiments) can add up to more than 100 %.
+"""
+
+import json
+import sys
+from collections import defaultdict
+
+# Steps with the largest share are marked in the summary
+HIGHLIGHTED = 3
+
+
+def load_timeline(filenames):
+    """Function to read the spans of one or more timeline files.
+
+    :param filenames: list
+        Names of the timeline files (JSON lines)
+    :return: list
+        Spans (dict), in the order they ended
+    """
+    spans = []
+    for filename in filenames:
+        with open(filename) as file:
+            for number, line in enumerate(file, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    spans.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # last line of a timeline cut by a crash
+                    print(f'{filename}:{number}: unreadable span skipped')
+    return spans
+
+
+def experiment_durations(spans):
+    """Function to get the duration of every experiment (first start to last
+    end of its spans).
+
+    :param spans: list
+    :return: dict
+        experiment: duration [s]
+    """
+    bounds = {}
+    for record in spans:
+        experiment = record['experiment']
+        if experiment is None:
+            continue
+        start, end = bounds.get(experiment, (record['start'], record['end']))
+        bounds[experiment] = (min(start, record['start']),
+                              max(end, record['end']))
+    return {experiment: end - start
+            for experiment, (start, end) in bounds.items()}
+
+
+def summarize(spans):
+    """Function to aggregate the durations of the steps.
+
+    :param spans: list
+    :return: dict
+        name: {'count', 'total', 'mean', 'max', 'own', 'share', 'errors'},
+        sorted by decreasing own time
+    """
+    # time spent in the children of every span (children running at the
+    # same time can add up to more than their parent: own time >= 0)
+    children = defaultdict(float)
+    for record in spans:
+        if record['parent'] is not None:
+            children[record['parent']] += record['duration']
+
+    steps = defaultdict(lambda: {'count': 0, 'total': 0.0, 'max': 0.0,
+                                 'own': 0.0, 'errors': 0})
+    for record in spans:
+        step = steps[record['name']]
+        duration = record['duration']
+        step['count'] += 1
+        step['total'] += duration
+        step['max'] = max(step['max'], duration)
+        step['own'] += max(duration - children[record['id']], 0.0)
+        if record['error'] is not None:
+            step['errors'] += 1
+
+    campaign = sum(experiment_durations(spans).values())
+    for step in steps.values():
+        step['mean'] = step['total'] / step['count']
+        step['share'] = step['own'] / campaign if campaign else 0.0
+    return dict(sorted(steps.items(), key=lambda item: -item[1]['own']))
+
+
+def print_summary(spans):
+    """Function to print the summary of the steps (largest share first)
+
+    :param spans: list
+    """
+    durations = experiment_durations(spans)
+    steps = summarize(spans)
+    print(f'{len(durations)} experiments, {len(spans)} steps, '
+          f'{sum(durations.values()) / 3600:.2f} h of experiments '
+          f'(mean {sum(durations.values()) / max(len(durations), 1):.0f} s)')
+    width = max([len(name) for name in steps] + [4])
+    print(f'  {"step":<{width}}  count  total [s]  mean [s]  max [s]  '
+          f'own [s]  share')
+    for rank, (name, step) in enumerate(steps.items()):
+        mark = ' <--' if rank < HIGHLIGHTED else ''
+        errors = f'  ({step["errors"]} failed)' if step['errors'] else ''
+        print(f'  {name:<{width}}  {step["count"]:5d}  {step["total"]:9.0f}  '
+              f'{step["mean"]:8.1f}  {step["max"]:7.1f}  {step["own"]:7.0f}  '
+              f'{100 * step["share"]:4.0f} %{mark}{errors}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    print_summary(load_timeline(sys.argv[1:]))
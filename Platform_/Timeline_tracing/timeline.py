@@ -0,0 +1,203 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Timeline of the experiments: where the time of an experiment goes (homing,
+sample preparation, needle cleaning, delivery, NMR acquisition, processing,
+cleaning, ...).
+
+A span is a named step with a start, an end and attributes. Spans nest: a
+span opened inside another one (same task, or a task or thread started from
+it) is its child. Every span belongs to the experiment of the innermost span
+given one.
+
+    with span('experiment', experiment='2024-01-01_T1200'):
+        with span('homing'):
+            ...
+
+    @traced('NMR acquisition')
+    async def acquire_spectrum(self, experiment):
+        current_span().set(experiment_name=...)
+
+Each finished span is appended as one JSON line to the timeline file of the
+process, Timeline_DATA/<date>_T<time>_timeline.jsonl:
+    {"experiment": ..., "id": ..., "parent": ..., "name": ...,
+     "start": ..., "end": ..., "duration": ..., "attributes": {...},
+     "error": ...}
+Times are those of the clock of the process (virtual clock: virtual time).
+
+The timeline is controlled by the environment variable ROBOCHEM_TIMELINE:
+'0' switches it off, a folder name replaces Timeline_DATA.
+
+Summary of a campaign (durations per stage), from the Platform_ folder:
+    python -m Timeline_tracing.summary Timeline_DATA/<file>.jsonl
+"""
+
+import asyncio
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+
+from Clock_organizer.Platform_clock import get_clock
+
+__all__ = ['span', 'traced', 'current_span', 'timeline_filename']
+
+TIMELINE_ENV = 'ROBOCHEM_TIMELINE'
+TIMELINE_FOLDER = 'Timeline_DATA'
+
+_current = contextvars.ContextVar('timeline_span', default=None)
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_filename = None
+
+
+def timeline_filename():
+    """Function to get the timeline file of the process (created with the
+    first span).
+
+    :return: str
+        Name of the file, None if the timeline is switched off
+    """
+    global _filename
+    value = os.getenv(TIMELINE_ENV, '1').strip()
+    if value.lower() in ('0', 'false', 'no', 'off'):
+        return None
+    with _lock:
+        if _filename is None:
+            if value.lower() in ('', '1', 'true', 'yes', 'on'):
+                from phase_sensor_CSV_naming import get_your_abs_project_path
+                folder = get_your_abs_project_path() + '/' + TIMELINE_FOLDER
+            else:
+                folder = value
+            os.makedirs(folder, exist_ok=True)
+            timestamp = get_clock().strftime('%Y-%m-%d_T%H%M')
+            _filename = f'{folder}/{timestamp}_timeline.jsonl'
+        return _filename
+
+
+def _write(record):
+    filename = timeline_filename()
+    if filename is None:
+        return
+    line = json.dumps(record, default=str) + '\n'
+    with _lock:
+        with open(filename, 'a') as file:
+            file.write(line)
+
+
+class Span:
+    """A step of an experiment (context manager)"""
+
+    def __init__(self, name, experiment=None, **attributes):
+        """ Class initialization
+
+        :param name: str
+            Name of the step
+        :param experiment: str
+            Experiment the step (and the steps inside it) belongs to
+            (default: the experiment of the enclosing span)
+        :param attributes:
+            Anything worth keeping about the step (JSON serializable)
+        """
+        self.name = name
+        self.experiment = experiment
+        self.attributes = attributes
+        self.id = None
+        self.parent = None
+        self.start = None
+        self.end = None
+        self._token = None
+
+    def set(self, **attributes):
+        """Add attributes to the span (e.g., known only once it runs)."""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        parent = _current.get()
+        self.id = next(_ids)
+        if parent is not None:
+            self.parent = parent.id
+            if self.experiment is None:
+                self.experiment = parent.experiment
+        self.start = get_clock().time()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.end = get_clock().time()
+        _current.reset(self._token)
+        error = None
+        if exc_type is not None:
+            error = 'cancelled' if issubclass(
+                exc_type, asyncio.CancelledError
+            ) else f'{exc_type.__name__}: {exc}'
+        _write({
+            'experiment': self.experiment,
+            'id': self.id,
+            'parent': self.parent,
+            'name': self.name,
+            'start': self.start,
+            'end': self.end,
+            'duration': self.end - self.start,
+            'attributes': self.attributes,
+            'error': error,
+        })
+        return False
+
+    def __repr__(self):
+        return f'Span({self.name}, {self.experiment})'
+
+
+def span(name, experiment=None, **attributes):
+    """Function to time a step of an experiment:
+        with span('homing'):
+            ...
+
+    :param name: str
+        Name of the step
+    :param experiment: str
+        Experiment the step belongs to (default: the one of the enclosing
+        span)
+    :param attributes:
+        Anything worth keeping about the step (JSON serializable)
+    :return: Span
+    """
+    return Span(name, experiment, **attributes)
+
+
+def traced(name=None, **attributes):
+    """Decorator timing every call of a function or coroutine function.
+
+    :param name: str
+        Name of the step (default: qualified name of the function)
+    :param attributes:
+        Fixed attributes of the step
+    """
+    def decorator(function):
+        step = name if name is not None else function.__qualname__
+
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with Span(step, **attributes):
+                    return await function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with Span(step, **attributes):
+                    return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    """Function to get the innermost span running.
+
+    :return: Span
+        None outside any span
+    """
+    return _current.get()
@@ -0,0 +1 @@
+from Virtual_instruments.settings import *
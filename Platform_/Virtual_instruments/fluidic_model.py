@@ -0,0 +1,453 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Minimal fluidic model of the platform used by the virtual instruments.
+
+The tubing is modelled as a chain of channels that are always completely
+filled. Every channel holds a list of fluid segments (gas or liquid), ordered
+from its inlet to its outlet. Pumping a volume into a channel pushes the same
+volume out of its outlet and into the next channel.
+
+ valve 1 --[inlet]--(injection valve: loop)--[transfer: PS1, PS2, PS3]-->
+   --[reactor]--[outlet: PS5, PS6]--> valve 4 --[NMR line: PS7, PS4, NMR]--> waste
+                                         |
+                                       waste
+
+Injection valve:
+    'I' = the sample loop is part of the flow path
+    'L' = the flow bypasses the loop, the liquid handler fills the loop
+
+Switch valves (status 0 / status 1):
+    valve 1 (pin 8): ON = syringe pumps, OFF = MFC
+    valve 2 (pin 7): C-3 = pump A to setup, C-1 = pump B to setup
+    valve 3 (pin 4): ON = pump C to reservoir, OFF = pump C to NMR loop
+    valve 4 (pin 2): C-1 = reactor to NMR, C-3 = pump C to NMR, reactor to waste
+"""
+
+import bisect
+import threading
+import time
+from collections import deque
+
+GAS = 0
+LIQUID = 1
+
+SOLVENT = 'solvent'
+NITROGEN = 'N2'
+
+# Volumes in μL
+# The N2 left in the inlet and the loop when the liquid handler loads the
+# 650 μL slug (with its 50 μL air gap) makes the bubbles around the slug:
+# about 100 μL each, so that the gas-slug-gas pattern at PS3 passes within
+# two pumping cycles of slug_out_to_reactor and fits in the 120 s window of
+# its detection (identify_reaction_mix)
+INLET_VOLUME = 50
+LOOP_VOLUME = 750
+TRANSFER_VOLUME = 300
+OUTLET_VOLUME = 150
+NMR_CELL_VOLUME = 200
+MIN_NMR_CELL_POSITION = 300
+WASTE_VOLUME = 300
+
+# Positions of the phase sensors: (channel, distance from channel inlet [μL])
+SENSOR_POSITIONS = {
+    'PS1': ('transfer', 50),
+    'PS2': ('transfer', 150),
+    'PS3': ('transfer', 250),
+    'PS5': ('outlet', 50),
+    'PS6': ('outlet', 100),
+    'PS7': ('nmr_line', 100),
+    'PS4': ('nmr_line', 200),
+}
+
+SYRINGE_CAPACITY = {'A': 10000, 'B': 10000, 'C': 25000}
+
+# Maximum volume [μL] moved in a single integration step
+MAX_STEP_VOLUME = 10
+SENSOR_HISTORY_LENGTH = 5000
+EPSILON = 1e-9
+
+
+class Segment:
+    """Volume of a single fluid (gas or liquid) inside the tubing"""
+
+    __slots__ = ('volume', 'phase', 'content', 'exposure')
+
+    def __init__(self, volume, phase, content, exposure=0.0):
+        """ Class initialization
+
+        :param volume: float
+            Volume of the segment [μL]
+        :param phase: int
+            GAS (0) or LIQUID (1), same convention as the phase sensors
+        :param content: str
+            Label of the fluid (e.g., 'solvent', 'N2', 'sample-3')
+        :param exposure: float
+            Irradiation time [s] accumulated inside the reactor
+        """
+        self.volume = volume
+        self.phase = phase
+        self.content = content
+        self.exposure = exposure
+
+    def same_fluid(self, other):
+        return self.phase == other.phase and self.content == other.content
+
+    def merge(self, other):
+        """Add the volume of another segment of the same fluid"""
+        total = self.volume + other.volume
+        if total > 0:
+            self.exposure = (
+                self.exposure * self.volume + other.exposure * other.volume
+            ) / total
+        self.volume = total
+
+    def split(self, volume):
+        """Take a part of the segment away and return it as a new segment"""
+        self.volume -= volume
+        return Segment(volume, self.phase, self.content, self.exposure)
+
+    def __repr__(self):
+        return (f'Segment({self.volume:.1f} μL, '
+                f'{"liquid" if self.phase else "gas"}, {self.content})')
+
+
+class Channel:
+    """Stretch of tubing with a fixed volume, always completely filled"""
+
+    def __init__(self, name, volume, content=SOLVENT):
+        """ Class initialization
+
+        :param name: str
+            Name of the channel
+        :param volume: float
+            Internal volume of the channel [μL]
+        :param content: str
+            Liquid initially filling the channel
+        """
+        self.name = name
+        self.volume = volume
+        # ordered from the inlet (index 0) to the outlet
+        self.segments = [Segment(volume, LIQUID, content)]
+
+    def push(self, incoming):
+        """Push segments into the inlet of the channel.
+
+        :param incoming: list
+            Segments in order of arrival
+        :return: list
+            Segments leaving the outlet of the channel, in order of exit
+        """
+        for segment in incoming:
+            if segment.volume <= EPSILON:
+                continue
+            if self.segments and self.segments[0].same_fluid(segment):
+                self.segments[0].merge(segment)
+            else:
+                self.segments.insert(0, segment)
+        excess = sum(segment.volume for segment in self.segments) - self.volume
+        outgoing = []
+        while excess > EPSILON and self.segments:
+            last = self.segments[-1]
+            if last.volume <= excess + EPSILON:
+                outgoing.append(self.segments.pop())
+                excess -= last.volume
+            else:
+                outgoing.append(last.split(excess))
+                excess = 0
+        return outgoing
+
+    def segment_at(self, position):
+        """Return the segment found at a given distance from the inlet"""
+        cumulative = 0.0
+        for segment in self.segments:
+            cumulative += segment.volume
+            if position < cumulative:
+                return segment
+        return self.segments[-1]
+
+    def contents_between(self, start, end):
+        """Return the (segment, overlapping volume) pairs between two
+        positions measured from the inlet"""
+        contents = []
+        cumulative = 0.0
+        for segment in self.segments:
+            lower, upper = cumulative, cumulative + segment.volume
+            overlap = min(upper, end) - max(lower, start)
+            if overlap > EPSILON:
+                contents.append((segment, overlap))
+            cumulative = upper
+        return contents
+
+
+class SyringeState:
+    """State of the syringe mounted on a (virtual) syringe pump"""
+
+    def __init__(self, capacity, volume=None):
+        """ Class initialization
+
+        :param capacity: float
+            Maximum volume of the syringe [μL]
+        :param volume: float
+            Initial volume of liquid in the syringe [μL]
+        """
+        self.capacity = capacity
+        self.volume = capacity / 2 if volume is None else volume
+        self.rate = 0.0  # [μL/s], > 0 dispensing, < 0 withdrawing
+        self.remaining = 0.0  # [μL]
+        self.dispensed = 0.0  # [μL] since the last start
+        self.running = False
+
+    def start(self, volume, rate):
+        """Start moving the plunger
+
+        :param volume: float
+            Volume to move [μL], > 0 dispense, < 0 withdraw
+        :param rate: float
+            Flow rate [μL/s]
+        """
+        self.remaining = abs(volume)
+        self.rate = abs(rate) if volume >= 0 else -abs(rate)
+        self.dispensed = 0.0
+        self.running = self.remaining > EPSILON and rate != 0
+
+    def stop(self):
+        self.running = False
+        self.remaining = 0.0
+
+    def time_left(self):
+        if not self.running:
+            return float('inf')
+        return self.remaining / abs(self.rate)
+
+    def run(self, dt):
+        """Move the plunger for dt seconds.
+
+        :return: float
+            Volume moved [μL] (> 0 dispensed, < 0 withdrawn)
+        """
+        if not self.running:
+            return 0.0
+        moved = min(self.remaining, abs(self.rate) * dt)
+        if self.rate > 0:
+            moved = min(moved, self.volume)
+        else:
+            moved = min(moved, self.capacity - self.volume)
+        self.remaining -= moved
+        signed = moved if self.rate > 0 else -moved
+        self.volume -= signed
+        self.dispensed += moved
+        if self.remaining <= EPSILON or moved < abs(self.rate) * dt - EPSILON:
+            # target reached or the syringe stalled (empty/full)
+            self.stop()
+        return signed
+
+
+class FluidicModel:
+    """Shared state of all the virtual instruments"""
+
+    def __init__(self, reactor_volume=5000, sample_push_volume=5000,
+                 loop_volume=LOOP_VOLUME, valve_pins=(8, 7, 4, 2),
+                 time_function=time.monotonic):
+        """ Class initialization
+
+        :param reactor_volume: float
+            Internal volume of the photoreactor [μL]
+        :param sample_push_volume: float
+            Volume [μL] used to push the slug from the reactor inlet to the
+            NMR; the NMR flow cell is placed so that a detected slug ends up
+            there. The reactor is shortened if it does not fit.
+        :param loop_volume: float
+            Volume of the sample loop of the injection module [μL]
+        :param valve_pins: tuple
+            Arduino pins of switch valves 1-4
+        :param time_function: callable
+            Returns the current time [s]
+        """
+        self.lock = threading.RLock()
+        self.time = time_function
+        self.last_update = self.time()
+
+        # geometry: the NMR cell is reached by a slug detected at PS3 and
+        # then pushed with sample_push_volume
+        distance_to_cell = sample_push_volume - 200
+        fixed = (TRANSFER_VOLUME - SENSOR_POSITIONS['PS3'][1]
+                 + OUTLET_VOLUME + MIN_NMR_CELL_POSITION)
+        self.reactor_volume = max(100, min(reactor_volume,
+                                           distance_to_cell - fixed))
+        self.nmr_cell_position = max(
+            MIN_NMR_CELL_POSITION,
+            distance_to_cell - fixed + MIN_NMR_CELL_POSITION
+            - self.reactor_volume
+        )
+        self.channels = {
+            'inlet': Channel('inlet', INLET_VOLUME),
+            'loop': Channel('loop', loop_volume),
+            'transfer': Channel('transfer', TRANSFER_VOLUME),
+            'reactor': Channel('reactor', self.reactor_volume),
+            'outlet': Channel('outlet', OUTLET_VOLUME),
+            'nmr_line': Channel(
+                'nmr_line', self.nmr_cell_position + WASTE_VOLUME
+            ),
+        }
+
+        self.pumps = {
+            name: SyringeState(capacity)
+            for name, capacity in SYRINGE_CAPACITY.items()
+        }
+        self.valve_pins = dict(zip(valve_pins, (1, 2, 3, 4)))
+        self.valves = {1: 0, 2: 0, 3: 0, 4: 0}
+        self.gas_flow = 0.0  # [μL/s]
+        self.injection_valve = 'I'
+        self.light_level = 100.0  # [%]
+
+        self.sensor_history = {
+            name: deque([(self.last_update, self.phase_at_sensor(name))],
+                        maxlen=SENSOR_HISTORY_LENGTH)
+            for name in SENSOR_POSITIONS
+        }
+
+    # ----- integration -------------------------------------------------------
+    def advance(self, now=None):
+        """Integrate all the flows up to the given time.
+
+        :param now: float
+            Time [s] to advance to, defaults to the current time
+        """
+        with self.lock:
+            now = self.time() if now is None else now
+            while now - self.last_update > EPSILON:
+                step = now - self.last_update
+                for pump in self.pumps.values():
+                    step = min(step, max(pump.time_left(), EPSILON))
+                max_rate = max(
+                    [abs(pump.rate) for pump in self.pumps.values()
+                     if pump.running] + [self.gas_flow]
+                )
+                if max_rate > 0:
+                    step = min(step, max(MAX_STEP_VOLUME / max_rate, EPSILON))
+                self._step(step)
+                self.last_update += step
+                self._record_sensors()
+
+    def _step(self, dt):
+        moved = {name: pump.run(dt) for name, pump in self.pumps.items()}
+
+        # irradiation of everything inside the reactor
+        if self.light_level > 0:
+            for segment in self.channels['reactor'].segments:
+                segment.exposure += dt * self.light_level / 100
+
+        # main line: syringe pumps A/B or MFC, selected by valves 1 and 2
+        if self.valves[1] == 0:
+            pump = 'A' if self.valves[2] == 1 else 'B'
+            if moved[pump] > 0:
+                self._push_main_line(
+                    [Segment(moved[pump], LIQUID, SOLVENT)]
+                )
+        elif self.gas_flow > 0:
+            self._push_main_line([Segment(self.gas_flow * dt, GAS, NITROGEN)])
+
+        # NMR line: pump C, selected by valves 3 and 4
+        if moved['C'] > 0 and self.valves[3] == 1 and self.valves[4] == 1:
+            self.channels['nmr_line'].push(
+                [Segment(moved['C'], LIQUID, SOLVENT)]
+            )
+
+    def _push_main_line(self, segments):
+        segments = self.channels['inlet'].push(segments)
+        if self.injection_valve == 'I':
+            segments = self.channels['loop'].push(segments)
+        for name in ('transfer', 'reactor', 'outlet'):
+            segments = self.channels[name].push(segments)
+        if self.valves[4] == 0:
+            self.channels['nmr_line'].push(segments)
+
+    def _record_sensors(self):
+        for name, history in self.sensor_history.items():
+            phase = self.phase_at_sensor(name)
+            if history[-1][1] != phase:
+                history.append((self.last_update, phase))
+
+    # ----- actuators ---------------------------------------------------------
+    def start_pump(self, pump, volume, rate):
+        """Start a syringe pump
+
+        :param pump: str
+            'A', 'B' or 'C'
+        :param volume: float
+            Volume [μL], > 0 dispense, < 0 withdraw
+        :param rate: float
+            Flow rate [μL/s]
+        """
+        with self.lock:
+            self.advance()
+            self.pumps[pump].start(volume, rate)
+
+    def stop_pump(self, pump):
+        with self.lock:
+            self.advance()
+            self.pumps[pump].stop()
+
+    def set_valve(self, pin, status):
+        """Set a switch valve (identified by its Arduino pin) to a status"""
+        with self.lock:
+            self.advance()
+            if pin in self.valve_pins:
+                self.valves[self.valve_pins[pin]] = status
+
+    def set_gas_flow(self, flow):
+        """Set the N2 flow [μL/s] delivered by the MFC"""
+        with self.lock:
+            self.advance()
+            self.gas_flow = max(0.0, flow)
+
+    def set_injection_valve(self, position):
+        """Switch the injection module to 'I' (inject) or 'L' (load)"""
+        with self.lock:
+            self.advance()
+            self.injection_valve = position
+
+    def set_light_level(self, level):
+        with self.lock:
+            self.advance()
+            self.light_level = level
+
+    def load_loop(self, segments):
+        """Dispense segments from the liquid handler needle into the injection
+        module (the loop is only filled in the load position)."""
+        with self.lock:
+            self.advance()
+            if self.injection_valve == 'L':
+                self.channels['loop'].push(segments)
+
+    # ----- sensors -----------------------------------------------------------
+    def phase_at_sensor(self, sensor):
+        """Return the phase (0 gas, 1 liquid) currently seen by a sensor"""
+        channel, position = SENSOR_POSITIONS[sensor]
+        return self.channels[channel].segment_at(position).phase
+
+    def phase_history(self, sensor, moment):
+        """Return the phase seen by a sensor at a (recent) moment"""
+        with self.lock:
+            self.advance()
+            history = self.sensor_history[sensor]
+            index = bisect.bisect_right(history, (moment, 2)) - 1
+            return history[max(index, 0)][1]
+
+    def syringe_volume(self, pump):
+        """Return the volume of liquid [μL] in the syringe of a pump"""
+        with self.lock:
+            self.advance()
+            return self.pumps[pump].volume
+
+    def nmr_cell_contents(self):
+        """Return the (segment, volume) pairs inside the NMR flow cell"""
+        with self.lock:
+            self.advance()
+            return self.channels['nmr_line'].contents_between(
+                self.nmr_cell_position - NMR_CELL_VOLUME / 2,
+                self.nmr_cell_position + NMR_CELL_VOLUME / 2
+            )
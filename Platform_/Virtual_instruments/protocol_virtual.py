@@ -0,0 +1,135 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+pyserial URL handler for the virtual instruments.
+
+List_connected_devices.py adds 'Virtual_instruments' to
+serial.protocol_handler_packages, so that
+
+    serial.serial_for_url('virtual://PS1', baudrate=19200)
+
+returns a port connected to the emulator of phase sensor 1 instead of a COM
+port. The drivers do not need to know the difference.
+"""
+
+from serial.serialutil import SerialBase, SerialException, \
+    PortNotOpenError, to_bytes
+
+from Virtual_instruments.settings import virtual_device_name
+from Virtual_instruments.virtual_platform import get_virtual_platform
+
+# Sleep [s] while waiting for data that is not scheduled yet
+POLL_INTERVAL = 0.05
+
+
+class Serial(SerialBase):
+    """Serial port connected to a device emulator"""
+
+    def __init__(self, *args, **kwargs):
+        self.device = None
+        self.platform = None
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException('Port is already open.')
+        if self._port is None:
+            raise SerialException(
+                'Port must be configured before it can be used.'
+            )
+        self.platform = get_virtual_platform()
+        name = virtual_device_name(self._port)
+        try:
+            self.device = self.platform.serial_device(name)
+        except KeyError:
+            raise SerialException(
+                f'could not open port {self._port}: unknown virtual device'
+            )
+        self.is_open = True
+        self.reset_input_buffer()
+
+    def close(self):
+        self.is_open = False
+        self.device = None
+
+    def _reconfigure_port(self):
+        pass
+
+    def _update_break_state(self):
+        pass
+
+    def _update_rts_state(self):
+        pass
+
+    def _update_dtr_state(self):
+        pass
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self.device.in_waiting()
+
+    @property
+    def out_waiting(self):
+        return 0
+
+    def read(self, size=1):
+        """Read size bytes, following the timeout semantics of pyserial:
+        None blocks until size bytes are read, 0 returns immediately."""
+        if not self.is_open:
+            raise PortNotOpenError()
+        clock = self.platform.clock
+        deadline = None if self._timeout is None \
+            else clock.monotonic() + self._timeout
+        data = bytearray()
+        while len(data) < size:
+            data += self.device.read_available(size - len(data))
+            if len(data) >= size or self._timeout == 0:
+                break
+            now = clock.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            # sleep until the device has something to say (a single jump
+            # with a virtual clock)
+            wake_up = self.device.next_data_time()
+            if wake_up is None:
+                wake_up = now + POLL_INTERVAL
+            if deadline is not None:
+                wake_up = min(wake_up, deadline)
+            clock.sleep(max(wake_up - now, 0.001))
+        return bytes(data)
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = to_bytes(data)
+        return self.device.write(data)
+
+    def reset_input_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        self.device.reset_input_buffer()
+
+    def reset_output_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        self.device.reset_output_buffer()
+
+    @property
+    def cts(self):
+        return True
+
+    @property
+    def dsr(self):
+        return True
+
+    @property
+    def ri(self):
+        return False
+
+    @property
+    def cd(self):
+        return True
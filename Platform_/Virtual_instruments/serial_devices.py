@@ -0,0 +1,310 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Byte-level emulators of the devices the platform talks to over a serial port:
+- Chemyx Fusion syringe pumps
+- Arduino UNO driving the switch valves
+- Arduino UNO reading an OPB350 phase sensor
+- Arduino UNO reading an ultrasonic distance sensor (syringe volume)
+
+Each emulator receives the bytes written by the driver and produces the bytes
+the real firmware would send back, with realistic delays. The state of the
+fluidics is shared through a FluidicModel.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+# Bytes kept by the (virtual) input buffer of the serial port
+INPUT_BUFFER_SIZE = 4096
+
+
+class VirtualSerialDevice:
+    """Base class of the device emulators"""
+
+    terminator = b'\r'
+
+    def __init__(self, model, time_function=time.monotonic):
+        """ Class initialization
+
+        :param model: FluidicModel
+            Shared state of the virtual platform
+        :param time_function: callable
+            Returns the current time [s]
+        """
+        self.model = model
+        self.time = time_function
+        self.lock = threading.RLock()
+        self._command = bytearray()
+        self._pending = deque()  # (time available, bytes)
+        self._buffer = bytearray()
+
+    # ----- interface used by protocol_virtual.Serial -------------------------
+    def write(self, data):
+        with self.lock:
+            self._command += data
+            while self.terminator in self._command:
+                command, _, rest = self._command.partition(self.terminator)
+                self._command = bytearray(rest)
+                self.handle_command(
+                    command.decode('ascii', errors='replace').strip()
+                )
+        return len(data)
+
+    def in_waiting(self):
+        with self.lock:
+            self._collect(self.time())
+            return len(self._buffer)
+
+    def read_available(self, size):
+        """Return up to size bytes already received by the port"""
+        with self.lock:
+            self._collect(self.time())
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            return data
+
+    def next_data_time(self):
+        """Return the time at which new bytes will arrive (None if never)"""
+        with self.lock:
+            return self._pending[0][0] if self._pending else None
+
+    def reset_input_buffer(self):
+        with self.lock:
+            self._collect(self.time())
+            self._buffer.clear()
+
+    def reset_output_buffer(self):
+        with self.lock:
+            self._command.clear()
+
+    def close(self):
+        pass
+
+    # ----- helpers for the emulators -----------------------------------------
+    def reply(self, text, delay=0.05):
+        """Queue a response that reaches the port after a delay [s]"""
+        with self.lock:
+            self._pending.append((self.time() + delay, text.encode('ascii')))
+
+    def _collect(self, now):
+        while self._pending and self._pending[0][0] <= now:
+            self._buffer += self._pending.popleft()[1]
+        if len(self._buffer) > INPUT_BUFFER_SIZE:
+            del self._buffer[:len(self._buffer) - INPUT_BUFFER_SIZE]
+
+    def handle_command(self, command):
+        raise NotImplementedError
+
+
+class StreamingDevice(VirtualSerialDevice):
+    """Device printing a new line at a fixed period (Arduino sketches)"""
+
+    terminator = b'\n'
+    period = 0.125
+
+    def __init__(self, model, time_function=time.monotonic):
+        super().__init__(model, time_function)
+        self._next_line = self.time() + self.period
+
+    def line(self, moment):
+        """Return the line printed at a given moment"""
+        raise NotImplementedError
+
+    def _collect(self, now):
+        super()._collect(now)
+        # only the lines that fit in the input buffer are generated
+        lines_due = int((now - self._next_line) / self.period) + 1
+        if lines_due > 0:
+            skipped = max(0, lines_due - INPUT_BUFFER_SIZE // 3)
+            self._next_line += skipped * self.period
+            while self._next_line <= now:
+                self._buffer += self.line(self._next_line).encode('ascii')
+                self._next_line += self.period
+        if len(self._buffer) > INPUT_BUFFER_SIZE:
+            del self._buffer[:len(self._buffer) - INPUT_BUFFER_SIZE]
+
+    def next_data_time(self):
+        with self.lock:
+            pending = super().next_data_time()
+            if pending is None:
+                return self._next_line
+            return min(pending, self._next_line)
+
+    def handle_command(self, command):
+        pass
+
+
+class ChemyxPump(VirtualSerialDevice):
+    """Emulator of a Chemyx Fusion syringe pump (RS-232 command set)"""
+
+    # flow rate units: code -> (μL per volume unit, seconds per time unit)
+    UNITS = {
+        '0': (1000, 60),  # mL/min
+        '1': (1000, 3600),  # mL/hr
+        '2': (1, 60),  # μL/min
+        '3': (1, 3600),  # μL/hr
+    }
+
+    def __init__(self, model, pump, time_function=time.monotonic):
+        """ Class initialization
+
+        :param model: FluidicModel
+            Shared state of the virtual platform
+        :param pump: str
+            Name of the pump in the model ('A', 'B' or 'C')
+        """
+        super().__init__(model, time_function)
+        self.pump = pump
+        self.units = '2'
+        self.diameter = 14.57
+        self.rate = 1.0
+        self.volume = 0.0
+        self.delay = 0.0
+        self.started_at = None
+
+    def handle_command(self, command):
+        words = command.split()
+        # drop the (optional) pump number prefix, e.g. '1 start'
+        if words and words[0].isdigit() and len(words) > 1:
+            words = words[1:]
+        if not words:
+            return
+        keyword = ' '.join(words[:2]).lower()
+        value = words[-1]
+        response = ''
+        if keyword == 'set units':
+            self.units = value if value in self.UNITS else self.units
+            response = f'units = {self.units}'
+        elif keyword == 'set diameter':
+            self.diameter = float(value)
+            response = f'diameter = {self.diameter}'
+        elif keyword == 'set rate':
+            self.rate = float(value)
+            response = f'rate = {self.rate}'
+        elif keyword == 'set volume':
+            self.volume = float(value)
+            response = f'volume = {self.volume}'
+        elif keyword in ('set delay', 'set time'):
+            self.delay = float(value)
+            response = f'{words[1]} = {value}'
+        elif words[0].lower() == 'start':
+            volume_unit, time_unit = self.UNITS[self.units]
+            self.model.start_pump(
+                self.pump,
+                self.volume * volume_unit,
+                self.rate * volume_unit / time_unit
+            )
+            self.started_at = self.time()
+            response = 'pump start'
+        elif words[0].lower() in ('stop', 'pause'):
+            self.model.stop_pump(self.pump)
+            response = f'pump {words[0].lower()}'
+        elif keyword == 'read limit':
+            area = 3.14159 * (self.diameter / 2) ** 2  # mm2
+            max_rate = round(area * 0.12 * 60 / 1000, 4)
+            response = f'{max_rate} 0.0001 {round(area * 0.06, 4)} 0.0001'
+        elif keyword == 'dispensed volume':
+            state = self.model.pumps[self.pump]
+            self.model.advance()
+            volume_unit, _ = self.UNITS[self.units]
+            response = f'dispensed volume = {state.dispensed / volume_unit}'
+        elif keyword == 'elapsed time':
+            elapsed = 0 if self.started_at is None \
+                else self.time() - self.started_at
+            response = f'elapsed time = {elapsed / 60:.4f}'
+        elif keyword == 'pump status':
+            self.model.advance()
+            response = '1' if self.model.pumps[self.pump].running else '0'
+        elif keyword == 'view parameter':
+            response = (f'units = {self.units}\r\n'
+                        f'diameter = {self.diameter}\r\n'
+                        f'rate = {self.rate}\r\n'
+                        f'volume = {self.volume}\r\n'
+                        f'delay = {self.delay}')
+        else:
+            response = 'Unknown command'
+        # the pump echoes the command before answering
+        self.reply(f'{command}\r\n{response}\r\n>')
+
+
+class SwitchValveBoard(VirtualSerialDevice):
+    """Emulator of the Arduino sketch toggling the relays of the valves"""
+
+    terminator = b'\n'
+
+    def __init__(self, model, time_function=time.monotonic):
+        super().__init__(model, time_function)
+        self.pins = {}
+
+    def handle_command(self, command):
+        try:
+            pin = int(command)
+        except ValueError:
+            return
+        self.pins[pin] = 0 if self.pins.get(pin, 0) else 1
+        self.model.set_valve(pin, self.pins[pin])
+        # the sketch answers at the end of its 100 ms loop
+        self.reply('HIGH\n' if self.pins[pin] else 'LOW\n', delay=0.1)
+
+
+class PhaseSensorBoard(StreamingDevice):
+    """Emulator of the Arduino sketch printing the digital output of an
+    OPB350 phase sensor (1 = liquid, 0 = gas) every 125 ms"""
+
+    period = 0.125
+
+    def __init__(self, model, sensor, time_function=time.monotonic):
+        """ Class initialization
+
+        :param model: FluidicModel
+            Shared state of the virtual platform
+        :param sensor: str
+            Name of the phase sensor (e.g., 'PS1')
+        """
+        self.sensor = sensor
+        super().__init__(model, time_function)
+
+    def line(self, moment):
+        return f'{self.model.phase_history(self.sensor, moment)}\r\n'
+
+
+class UltrasonicBoard(StreamingDevice):
+    """Emulator of the Arduino sketch printing the distance measured by the
+    ultrasonic sensor above a syringe every 100 ms"""
+
+    period = 0.1
+
+    def __init__(self, model, pump, calibration, seed=None,
+                 outlier_rate=0.02, time_function=time.monotonic):
+        """ Class initialization
+
+        :param model: FluidicModel
+            Shared state of the virtual platform
+        :param pump: str
+            Name of the pump in the model ('A', 'B' or 'C')
+        :param calibration: tuple
+            (slope, intercept) converting a reading into mL, see the
+            convert_to_volume_pump_* functions in ultrasonic_pump_detection.py
+        :param seed: int
+            Seed of the noise generator
+        :param outlier_rate: float
+            Fraction of readings replaced by a spurious echo
+        """
+        self.pump = pump
+        self.slope, self.intercept = calibration
+        self.random = random.Random(seed)
+        self.outlier_rate = outlier_rate
+        super().__init__(model, time_function)
+
+    def line(self, moment):
+        volume = self.model.syringe_volume(self.pump) / 1000
+        reading = (volume - self.intercept) / self.slope
+        reading += self.random.gauss(0, 0.5)
+        if self.random.random() < self.outlier_rate:
+            reading *= self.random.uniform(0.2, 3.0)
+        return f'{reading:.2f}\r\n'
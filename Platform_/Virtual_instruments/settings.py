@@ -0,0 +1,74 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Switch between the real instruments and the virtual ones.
+
+The switch is the environment variable ROBOCHEM_VIRTUAL_INSTRUMENTS (it can
+also be set in Sensitive_data.env on Windows machines). Because it lives in
+the environment, subprocesses started by the GUI inherit it as well.
+When it is on, find_port() returns URLs such as 'virtual://Syringe_pump_A',
+which pyserial opens through Virtual_instruments/protocol_virtual.py.
+"""
+
+import os
+
+VIRTUAL_INSTRUMENTS_ENV = 'ROBOCHEM_VIRTUAL_INSTRUMENTS'
+VIRTUAL_PORT_PREFIX = 'virtual://'
+
+
+def use_virtual_instruments():
+    """Function to check whether the virtual instruments are switched on.
+
+    :return: bool
+        True if the platform should use the virtual instruments
+    """
+    return os.getenv(VIRTUAL_INSTRUMENTS_ENV, '0').strip().lower() in (
+        '1', 'true', 'yes', 'on'
+    )
+
+
+def enable_virtual_instruments(enabled=True):
+    """Function to switch the virtual instruments on (or off) for this process
+    and the processes it starts.
+
+    :param enabled: bool
+        True to use the virtual instruments, False for the real ones
+    """
+    os.environ[VIRTUAL_INSTRUMENTS_ENV] = '1' if enabled else '0'
+
+
+def virtual_port(device):
+    """Function to build the port URL of a virtual device.
+
+    :param device: str
+        Name of the device as used by find_port (e.g., 'PS1')
+    :return: str
+        URL understood by serial.serial_for_url (e.g., 'virtual://PS1')
+    """
+    return f'{VIRTUAL_PORT_PREFIX}{device}'
+
+
+def is_virtual_port(port):
+    """Function to check whether a port name points to a virtual device.
+
+    :param port: str
+        Port name or URL
+    :return: bool
+        True for 'virtual://...' URLs
+    """
+    return isinstance(port, str) and port.lower().startswith(
+        VIRTUAL_PORT_PREFIX
+    )
+
+
+def virtual_device_name(port):
+    """Function to extract the device name from a virtual port URL.
+
+    :param port: str
+        URL of the virtual device (e.g., 'virtual://PS1')
+    :return: str
+        Name of the device (e.g., 'PS1')
+    """
+    return port[len(VIRTUAL_PORT_PREFIX):].split('?')[0].strip('/')
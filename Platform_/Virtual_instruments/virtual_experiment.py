@@ -0,0 +1,167 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+End-to-end check of the platform on the virtual instruments (no hardware,
+runs on Linux): one experiment from run_platform.run_experiment to the yield
+of its NMR result.
+
+The check fails (exit status 1) if the experiment does not finish within the
+timeout, if the NMR did not see the slug it was sent, or if the yield
+returned is not the one measured. Run from Platform_:
+
+    python -m Virtual_instruments.virtual_experiment
+    python -m Virtual_instruments.virtual_experiment --clock accelerated:20
+
+The experiment writes its data (phase sensor logs, NMR data, timeline) where
+the platform does; the settings and the campaign store are temporary files.
+"""
+
+import argparse
+import faulthandler
+import json
+import os
+import sys
+import tempfile
+import time
+
+PLATFORM_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLE_SETUP = os.path.join(PLATFORM_FOLDER, '..',
+                             'experimental_setup_example.json')
+# vials of the check (Sample info in GX-241 format), written in Platform_
+# where SampleInfo keeps their volumes up to date
+SAMPLE_INFORMATION = 'virtual_experiment_samples.xlsx'
+VIALS = {'G8': 'A-0_500_4', 'H8': 'B1-0_1000_4', 'I8': 'B2-0_1000_4',
+         'J8': 'C-0_50_4', 'G9': 'MeCN-0_0_4'}
+SAMPLE_NAMES = {'Substrate A': ['A'], 'Substrate B': ['B1', 'B2'],
+                'Catalyst': ['C'], 'Solvent': ['MeCN']}
+VARIABLES = [
+    {'name': 'A', 'type': 'float', 'min': 0.05, 'max': 0.15},
+    {'name': 'B', 'type': 'discrete', 'items': ['B1', 'B2']},
+    {'name': 'B_equiv', 'type': 'float', 'min': 1, 'max': 5},
+    {'name': 'C', 'type': 'float', 'min': 0.001, 'max': 0.1},
+    {'name': 'residence_time', 'type': 'float', 'min': 120, 'max': 900},
+    {'name': 'eagle_percentage', 'type': 'float', 'min': 10, 'max': 100},
+]
+CONDITIONS = [0.1, 'B1', 2.0, 0.05, 300, 50.0]
+MIN_FILL = 0.5  # of the NMR flow cell by the slug
+
+
+def write_sample_information(filename):
+    """Function to write the vials of the check.
+
+    :param filename: str
+        Excel file (Sample info in GX-241 format)
+    """
+    import openpyxl
+
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet['A2'] = 'Sample table in GX-241'
+    sheet['B7'] = '338S'
+    sheet['G7'] = '335S'
+    for cell, vial in VIALS.items():
+        sheet[cell] = vial
+    sheet['B27'] = 'Sample Name'
+    for column, (name, chemicals) in enumerate(SAMPLE_NAMES.items(), 2):
+        sheet.cell(28, column, name)
+        for row, chemical in enumerate(chemicals, 29):
+            sheet.cell(row, column, chemical)
+    workbook.save(filename)
+
+
+def write_setup(folder):
+    """Function to write the settings of the check (the example settings with
+    the vials of the check).
+
+    :param folder: str
+        Folder of the settings
+    :return: str
+        Name of the settings file
+    """
+    with open(EXAMPLE_SETUP) as file:
+        setup = json.load(file)
+    setup.update(variables=VARIABLES, objectives=['yield'],
+                 sample_information_filename=SAMPLE_INFORMATION,
+                 exp_name='virtual_experiment')
+    filename = os.path.join(folder, 'experimental_setup.json')
+    with open(filename, 'w') as file:
+        json.dump(setup, file, indent=4)
+    return filename
+
+
+def run_check(clock='virtual'):
+    """Function running one experiment on the virtual instruments.
+
+    :param clock: str
+        Clock of the platform (see Platform_clock.clock_from_setting)
+    :return: list
+        Problems found (empty: the check passed)
+    """
+    from Virtual_instruments.settings import enable_virtual_instruments
+    from Clock_organizer.Platform_clock import set_clock
+    from Setup_config.experimental_setup import SETUP_ENV
+    from Campaign_store.store import STORE_ENV
+
+    enable_virtual_instruments()
+    set_clock(clock)
+    with tempfile.TemporaryDirectory() as folder:
+        os.environ[SETUP_ENV] = write_setup(folder)
+        os.environ[STORE_ENV] = os.path.join(folder, 'campaign_store.sqlite')
+        write_sample_information(SAMPLE_INFORMATION)
+        import run_platform
+        from Virtual_instruments.virtual_platform import get_virtual_platform
+
+        try:
+            output = run_platform.run_experiment(0, CONDITIONS, ['yield'],
+                                                 VARIABLES)
+        finally:
+            run_platform.close_devices()
+            os.remove(SAMPLE_INFORMATION)
+    _, _, measured_yield, timestamp = output
+    print(f'Output: {output}')
+
+    problems = []
+    measurements = get_virtual_platform().measurements
+    if not measurements or measurements[-1]['sample'] is None:
+        problems.append('the NMR did not see a slug')
+    else:
+        measurement = measurements[-1]
+        print(f'NMR: {measurement}')
+        if measurement['fill'] < MIN_FILL:
+            problems.append(f'the slug filled {measurement["fill"]:.0%} of '
+                            f'the NMR flow cell')
+        if abs(run_platform.format_yield(measurement['yield'])
+               - measured_yield) > 0.01:
+            problems.append(f'yield {measured_yield} returned, '
+                            f'{measurement["yield"]} measured')
+    processed = os.path.join(PLATFORM_FOLDER, 'NMR_DATA', 'NMR_DATA_PROCESSED',
+                             f'Processed_NMR_data_{timestamp}.csv')
+    if not os.path.exists(processed):
+        problems.append(f'{processed} not written')
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[5])
+    parser.add_argument('--clock', default='virtual',
+                        help="'virtual' or 'accelerated:<factor>'")
+    parser.add_argument('--timeout', type=float, default=600,
+                        help='[s] of real time before the check fails')
+    args = parser.parse_args()
+
+    # the platform reads its files relative to Platform_
+    os.chdir(PLATFORM_FOLDER)
+    sys.path.insert(0, PLATFORM_FOLDER)
+    # a stuck experiment fails the check, with the stack of every thread
+    faulthandler.dump_traceback_later(args.timeout, exit=True)
+    start = time.time()
+    problems = run_check(args.clock)
+    faulthandler.cancel_dump_traceback_later()
+    print(f'{time.time() - start:.0f} s')
+    for problem in problems:
+        print(f'FAILED: {problem}')
+    if problems:
+        sys.exit(1)
+    print('Virtual experiment OK')
@@ -0,0 +1,195 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Emulator of the Gilson GX-241 liquid handler.
+
+The liquid handler is not a serial device: GX_241_Liquid_Handler.py talks to
+it through Gsioc32.dll (Windows only). VirtualGsioc answers the same
+immediate and buffered GSIOC commands for the three units:
+    35: GX-241 arm (XYZ)
+    7: VERITY 4020 syringe pump
+    9: direct injection module (injection valve)
+"""
+
+import re
+import threading
+
+from Virtual_instruments.fluidic_model import Segment, GAS, LIQUID, \
+    SOLVENT, NITROGEN
+
+LIQUID_HANDLER_UNIT = 35
+SYRINGE_PUMP_UNIT = 7
+INJECTION_MODULE_UNIT = 9
+
+HOME_Z = 122.0
+# Needle docked in the injection module
+INJECTION_PORT = (146.05, 0.0)
+INJECTION_PORT_Z = 91.1
+# Below this height the needle is inside the liquid of a vial
+LIQUID_LEVEL_Z = 85.0
+SYRINGE_CAPACITY = 5000  # [μL]
+REAGENT = 'reagent'
+
+
+class VirtualGsioc:
+    """Replacement for the GSIOC interface of Gsioc32.dll"""
+
+    def __init__(self, model):
+        """ Class initialization
+
+        :param model: FluidicModel
+            Shared state of the virtual platform
+        """
+        self.model = model
+        self.lock = threading.RLock()
+        self.xyz = [0.0, 0.0, HOME_Z]
+        self.syringe_valve = 'R'
+        # fluids in the syringe, from the bottom to the plunger tip (LIFO)
+        self.syringe = []
+        self.sample_count = 0
+        # volumes aspirated from each vial for the sample being prepared
+        self.recipe = {}
+        self.recipes = {}
+        self.error = 0
+
+    # ----- GSIOC commands ----------------------------------------------------
+    def immediate(self, unit_id, command):
+        """Answer an immediate command, returns bytes like ICmd"""
+        command = self._decode(command)
+        with self.lock:
+            if command == '%':
+                return {
+                    LIQUID_HANDLER_UNIT: b'GX-241 II v1.0 (virtual)',
+                    SYRINGE_PUMP_UNIT: b'VERITY 4020 v1.0 (virtual)',
+                    INJECTION_MODULE_UNIT: b'GX D Inject v1.0 (virtual)',
+                }.get(unit_id, b'')
+            if command == '$':
+                self.xyz = [0.0, 0.0, HOME_Z]
+                self.syringe = []
+                self.error = 0
+                return b'$'
+            if command == 'e':
+                return str(self.error).encode()
+            if unit_id == LIQUID_HANDLER_UNIT:
+                if command == 'X':
+                    return f'{self.xyz[0]:.2f}/{self.xyz[1]:.2f}'.encode()
+                if command == 'Z':
+                    return f'{self.xyz[2]:.2f}'.encode()
+                if command == 'P':
+                    return '{:.2f}/{:.2f}/{:.2f}'.format(*self.xyz).encode()
+            if unit_id == SYRINGE_PUMP_UNIT:
+                if command == 'P':
+                    return f'{self.syringe_valve}:{self.syringe_volume():.1f}' \
+                        .encode()
+                if command == 'M':
+                    return b'PP'
+                if command == 'F':
+                    return f'{SYRINGE_CAPACITY}'.encode()
+            if unit_id == INJECTION_MODULE_UNIT and command == 'X':
+                return b'I' if self.model.injection_valve == 'I' else b'L'
+        return b''
+
+    def buffered(self, unit_id, command):
+        """Execute a buffered command, returns bytes like BCmd"""
+        command = self._decode(command)
+        with self.lock:
+            if command == 'e':
+                self.error = 0
+            elif unit_id == LIQUID_HANDLER_UNIT:
+                self._arm_command(command)
+            elif unit_id == SYRINGE_PUMP_UNIT:
+                self._syringe_command(command)
+            elif unit_id == INJECTION_MODULE_UNIT:
+                if command in ('VI', 'VL'):
+                    self.model.set_injection_valve(command[1])
+        return b''
+
+    @staticmethod
+    def _decode(command):
+        if isinstance(command, bytes):
+            command = command.decode('utf-8')
+        return command.strip()
+
+    # ----- arm ---------------------------------------------------------------
+    def _arm_command(self, command):
+        numbers = [float(value) for value in
+                   re.findall(r'-?\d+(?:\.\d+)?', command)]
+        if command.startswith('H'):
+            self.xyz = [0.0, 0.0, HOME_Z]
+        elif command.startswith('X') and len(numbers) >= 4:
+            # X px:sx:dx/py:sy:dy
+            self.xyz[0] = numbers[0]
+            self.xyz[1] = numbers[3]
+        elif command.startswith('Z') and numbers:
+            self.xyz[2] = numbers[0]
+
+    def _docked(self):
+        return (abs(self.xyz[0] - INJECTION_PORT[0]) < 0.5
+                and abs(self.xyz[1] - INJECTION_PORT[1]) < 0.5
+                and self.xyz[2] <= INJECTION_PORT_Z + 0.5)
+
+    # ----- syringe pump ------------------------------------------------------
+    def syringe_volume(self):
+        return sum(volume for _, volume, _ in self.syringe)
+
+    def _syringe_command(self, command):
+        if command == 'p':  # home
+            self.syringe = []
+        elif command.startswith('P') and ':' in command:
+            valve = command[1]
+            volume = float(command[2:].split(':')[1])
+            self.syringe_valve = valve
+            if volume > 0:
+                self._aspirate(valve, volume)
+            elif volume < 0:
+                self._dispense(valve, -volume)
+
+    def _aspirate(self, valve, volume):
+        volume = min(volume, SYRINGE_CAPACITY - self.syringe_volume())
+        if valve == 'R':
+            fluid = (LIQUID, SOLVENT)
+        elif self._docked() or self.xyz[2] >= LIQUID_LEVEL_Z:
+            fluid = (GAS, NITROGEN)
+        else:
+            fluid = (LIQUID, REAGENT)
+            vial = (round(self.xyz[0], 2), round(self.xyz[1], 2))
+            self.recipe[vial] = self.recipe.get(vial, 0) + volume
+        if self.syringe and tuple(self.syringe[-1][0::2]) == fluid:
+            self.syringe[-1][1] += volume
+        else:
+            self.syringe.append([fluid[0], volume, fluid[1]])
+
+    def _dispense(self, valve, volume):
+        dispensed = []
+        while volume > 1e-9 and self.syringe:
+            phase, available, content = self.syringe[-1]
+            taken = min(volume, available)
+            if taken >= available:
+                self.syringe.pop()
+            else:
+                self.syringe[-1][1] -= taken
+            volume -= taken
+            dispensed.append((phase, taken, content))
+        if valve != 'N':
+            return  # back to the reservoir
+        if not self._docked():
+            # back into a vial (e.g., mixing): no longer part of the sample
+            vial = (round(self.xyz[0], 2), round(self.xyz[1], 2))
+            for _, taken, content in dispensed:
+                if content == REAGENT and vial in self.recipe:
+                    self.recipe[vial] -= taken
+                    if self.recipe[vial] <= 1e-9:
+                        del self.recipe[vial]
+            return
+        segments = []
+        for phase, taken, content in dispensed:
+            if content == REAGENT:
+                if self.recipe:
+                    self.sample_count += 1
+                    self.recipes[self.sample_count] = self.recipe
+                    self.recipe = {}
+                content = f'sample-{self.sample_count}'
+            segments.append(Segment(taken, phase, content))
+        self.model.load_loop(segments)
@@ -0,0 +1,58 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Emulator of the Bronkhorst MFC.
+
+The bronkhorst-propar library opens the serial port itself, so the MFC is
+emulated at the level of the propar.master object: BronkhorstMFC uses
+VirtualPropar instead of propar.master for 'virtual://MFC'.
+"""
+
+# Setpoint of the MFC at full scale
+FULL_SCALE_SETPOINT = 32000
+
+
+class VirtualPropar:
+    """Replacement for propar.master connected to the virtual platform"""
+
+    def __init__(self, model, min_flow=0.014, max_flow=1.0):
+        """ Class initialization
+
+        :param model: FluidicModel
+            Shared state of the virtual platform
+        :param min_flow: float
+            Flow rate [mln/min] at setpoint 1
+        :param max_flow: float
+            Flow rate [mln/min] at full scale
+        """
+        self.model = model
+        self.min_flow = min_flow
+        self.max_flow = max_flow
+        self._setpoint = 0
+
+    @property
+    def setpoint(self):
+        return self._setpoint
+
+    @setpoint.setter
+    def setpoint(self, value):
+        self._setpoint = int(min(max(value, 0), FULL_SCALE_SETPOINT))
+        # mln/min -> μL/s
+        self.model.set_gas_flow(self.flow_rate() * 1000 / 60)
+
+    @property
+    def measure(self):
+        return self._setpoint
+
+    def flow_rate(self):
+        """Return the flow rate [mln/min] corresponding to the setpoint"""
+        if self._setpoint <= 0:
+            return 0.0
+        return self.min_flow + self._setpoint * (
+            self.max_flow - self.min_flow
+        ) / FULL_SCALE_SETPOINT
+
+    def stop(self):
+        pass
@@ -0,0 +1,195 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Emulators of the analytical chain:
+- VirtualSpinsolve: TCP server speaking the XML remote control protocol of the
+  Spinsolve software (the one used by Spinsolve_NMR.py). It "measures" the
+  content of the NMR flow cell and writes a spectrum.1d file in the
+  UserFolder of the request.
+- process_latest_spectrum(): stand-in for the MestReNova processing script,
+  it writes last_integral.txt like the real script does.
+"""
+
+import glob
+import json
+import logging
+import os
+import re
+import socket
+import threading
+
+SPINSOLVE_HOST = '127.0.0.1'
+SPINSOLVE_PORT = 13000
+XML_HEADER = "<?xml version='1.0' encoding='UTF-8'?>"
+SHIM_DURATION = {'CheckShim': 10, 'QuickShim': 60, 'PowerShim': 600}  # [s]
+PROGRESS_STEPS = 10
+
+
+def status_notification(content):
+    """Wrap a status notification in a Spinsolve XML message"""
+    return (f'{XML_HEADER}<Message><StatusNotification>{content}'
+            f'</StatusNotification></Message>')
+
+
+class VirtualSpinsolve:
+    """Emulator of the Spinsolve remote control interface"""
+
+    def __init__(self, platform, host=SPINSOLVE_HOST, port=SPINSOLVE_PORT):
+        """ Class initialization
+
+        :param platform: VirtualPlatform
+            Virtual platform providing the content of the NMR flow cell
+        :param host: str
+            Address the server listens on
+        :param port: int
+            TCP port the server listens on (13000 for Spinsolve)
+        """
+        self.logger = logging.getLogger('Virtual_Spinsolve')
+        self.platform = platform
+        self.host = host
+        self.port = port
+        self.server = None
+        self.aborted = threading.Event()
+
+    def start(self):
+        """Start listening for connections (only once per process).
+
+        :return: bool
+            True if the server is running
+        """
+        if self.server is not None:
+            return True
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            server.bind((self.host, self.port))
+        except OSError as error:
+            # most likely another process already hosts the virtual NMR
+            self.logger.warning(f'Virtual Spinsolve not started: {error}')
+            server.close()
+            return False
+        server.listen()
+        self.server = server
+        thread = threading.Thread(target=self._accept, daemon=True)
+        thread.start()
+        self.logger.info(f'Virtual Spinsolve on {self.host}:{self.port}')
+        return True
+
+    def _accept(self):
+        while True:
+            connection, _ = self.server.accept()
+            thread = threading.Thread(
+                target=self._serve, args=(connection,), daemon=True
+            )
+            thread.start()
+
+    def _serve(self, connection):
+        received = ''
+        folder = None
+        sample = None
+        with connection:
+            while True:
+                try:
+                    data = connection.recv(4096)
+                except OSError:
+                    return
+                if not data:
+                    return
+                received += data.decode('utf-8')
+                if '<Abort' in received:
+                    self.aborted.set()
+                    received = ''
+                match = re.search(r'<UserFolder>(.*?)</UserFolder>', received)
+                if match:
+                    folder = match.group(1)
+                match = re.search(r'<Sample>(.*?)</Sample>', received)
+                if match:
+                    sample = match.group(1)
+                match = re.search(
+                    r"<Start protocol='(.*?)'>(.*?)</Start>", received, re.S
+                )
+                if match:
+                    received = received[match.end():]
+                    options = dict(re.findall(
+                        r"<Option name='(.*?)' value='(.*?)'", match.group(2)
+                    ))
+                    self._measure(connection, match.group(1), options,
+                                  folder, sample)
+
+    def _measure(self, connection, protocol, options, folder, sample):
+        self.aborted.clear()
+        if protocol == 'SHIM':
+            duration = SHIM_DURATION.get(options.get('Shim'), 10)
+        else:
+            duration = (float(options.get('Number', 1))
+                        * float(options.get('RepetitionTime', 1)))
+        self.logger.info(f'Measuring {sample} ({protocol}, {duration} s)')
+        self._send(connection, status_notification(
+            f"<State protocol='{protocol}' status='Running' />"
+        ))
+        for step in range(1, PROGRESS_STEPS + 1):
+            self.platform.clock.sleep(duration / PROGRESS_STEPS)
+            if self.aborted.is_set():
+                self._send(connection, status_notification(
+                    "<Completed completed='false' successful='false' />"
+                ))
+                return
+            self._send(connection, status_notification(
+                f"<Progress percentage='{100 * step // PROGRESS_STEPS}' />"
+            ))
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+            if protocol == 'SHIM':
+                filename = os.path.join(folder, 'protocol.par')
+                content = {'protocol': protocol, 'options': options}
+            else:
+                filename = os.path.join(folder, 'spectrum.1d')
+                content = dict(
+                    self.platform.measure_nmr(),
+                    sample=sample,
+                    protocol=protocol,
+                    options=options,
+                )
+            with open(filename, 'w') as file:
+                json.dump(content, file)
+        self._send(connection, status_notification(
+            "<Completed completed='true' successful='true' />"
+        ))
+
+    def _send(self, connection, message):
+        try:
+            connection.sendall(message.encode('utf-8'))
+        except OSError as error:
+            self.logger.warning(f'Virtual Spinsolve lost the client: {error}')
+        # separate messages, like the real software does
+        self.platform.clock.sleep(0.05)
+
+
+def process_latest_spectrum(nmr_folder, output_file, conc_theo,
+                            calibration):
+    """Stand-in for the MestReNova processing script: integrate the product
+    peak of the latest virtual spectrum and write it to last_integral.txt.
+
+    :param nmr_folder: str
+        Folder containing the NMR data (one sub-folder per experiment)
+    :param output_file: str
+        Path of last_integral.txt
+    :param conc_theo: float
+        Theoretical concentration of the product at 100% yield [M]
+    :param calibration: float
+        Integration calibration factor (concentration per integral unit)
+    :return: float
+        Integral of the product peak
+    """
+    spectra = glob.glob(os.path.join(nmr_folder, '*', 'spectrum.1d'))
+    integral = 0.0
+    if spectra:
+        with open(max(spectra, key=os.path.getmtime)) as file:
+            spectrum = json.load(file)
+        integral = spectrum.get('yield', 0.0) / 100 * conc_theo / calibration
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, 'w') as file:
+        file.write(f'{integral}\n')
+    return integral
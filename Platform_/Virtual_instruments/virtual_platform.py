@@ -0,0 +1,182 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Virtual RoboChem platform: one fluidic model shared by the emulators of all
+the instruments, plus a simple photochemical kinetic model to generate yields.
+
+The kinetic model is first order in the irradiation time of the slug:
+    yield = 100 * (1 - exp(-k * t_exposure)) + noise
+where k depends (deterministically) on the vials the sample was prepared from,
+so that different recipes give different yields.
+"""
+
+import math
+import random
+import threading
+
+from Clock_organizer.Platform_clock import get_clock
+from Virtual_instruments.fluidic_model import FluidicModel, LIQUID
+from Virtual_instruments.serial_devices import ChemyxPump, SwitchValveBoard, \
+    PhaseSensorBoard, UltrasonicBoard
+from Virtual_instruments.virtual_liquid_handler import VirtualGsioc
+from Virtual_instruments.virtual_mfc import VirtualPropar
+from Virtual_instruments.virtual_nmr import VirtualSpinsolve
+
+# Inverse of convert_to_volume_pump_* (ultrasonic_pump_detection.py)
+ULTRASONIC_CALIBRATION = {
+    'A': (0.0274572, -7.9125325),
+    'B': (0.16456500, -9.6948657),
+    'C': (0.0707606, -25.2220271),
+}
+# Rate constant [1/s] of a sample at 100% light intensity
+BASE_RATE_CONSTANT = 1 / 240
+YIELD_NOISE = 1.0  # [%], standard deviation
+
+_virtual_platform = None
+_virtual_platform_lock = threading.Lock()
+
+
+class VirtualPlatform:
+    """Collection of all the virtual instruments"""
+
+    def __init__(self, reactor_volume=5.0, sample_push_volume=5000, seed=0,
+                 clock=None):
+        """ Class initialization
+
+        :param reactor_volume: float
+            Internal volume of the photoreactor [mL]
+        :param sample_push_volume: float
+            Volume [μL] used to push the slug to the NMR
+        :param seed: int
+            Seed of all the random number generators (noise)
+        :param clock: RealClock
+            Clock of the simulation (default: the clock of the process)
+        """
+        self.clock = clock if clock is not None else get_clock()
+        self.model = FluidicModel(
+            reactor_volume=reactor_volume * 1000,
+            sample_push_volume=sample_push_volume,
+            time_function=self.clock.monotonic
+        )
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.gsioc = VirtualGsioc(self.model)
+        self.nmr = VirtualSpinsolve(self)
+        self.mfc = VirtualPropar(self.model)
+        # what the NMR saw at every acquisition (see measure_nmr)
+        self.measurements = []
+        self._serial_devices = {}
+        self._lock = threading.Lock()
+
+    def serial_device(self, name):
+        """Return the emulator behind a virtual serial port.
+        Every port name gets its own emulator, created on first use.
+
+        :param name: str
+            Name of the device as used by find_port (e.g., 'PS1')
+        :return: VirtualSerialDevice
+        """
+        with self._lock:
+            if name not in self._serial_devices:
+                self._serial_devices[name] = self._create_serial_device(name)
+            return self._serial_devices[name]
+
+    def _create_serial_device(self, name):
+        if name.startswith('Syringe_pump_'):
+            pump = name[-1]
+            if pump in self.model.pumps:
+                return ChemyxPump(self.model, pump, self.clock.monotonic)
+        elif name == 'Switch_valves':
+            return SwitchValveBoard(self.model, self.clock.monotonic)
+        elif name in ('PS1', 'PS2', 'PS3', 'PS4', 'PS5', 'PS6', 'PS7'):
+            return PhaseSensorBoard(self.model, name, self.clock.monotonic)
+        elif name.endswith('_ultrasonic_detector'):
+            pump = name.split('_')[1]
+            if pump in ULTRASONIC_CALIBRATION:
+                return UltrasonicBoard(
+                    self.model, pump, ULTRASONIC_CALIBRATION[pump],
+                    seed=self.seed + ord(pump),
+                    time_function=self.clock.monotonic
+                )
+        raise KeyError(name)
+
+    def start_nmr(self):
+        """Start the virtual Spinsolve server (idempotent)"""
+        return self.nmr.start()
+
+    # ----- kinetics ----------------------------------------------------------
+    def rate_constant(self, sample):
+        """Return the rate constant [1/s] of a sample prepared by the liquid
+        handler, based on the share of each vial in the recipe.
+
+        :param sample: int
+            Number of the sample (see VirtualGsioc.recipes)
+        :return: float
+        """
+        recipe = self.gsioc.recipes.get(sample, {})
+        total = sum(recipe.values())
+        if total <= 0:
+            return BASE_RATE_CONSTANT
+        activity = 0.0
+        for vial, volume in recipe.items():
+            # every vial has a fixed (pseudo-random) contribution
+            weight = random.Random(f'{self.seed}-{vial}').uniform(0.2, 1.8)
+            activity += weight * volume / total
+        return BASE_RATE_CONSTANT * activity
+
+    def measure_nmr(self):
+        """Return what the NMR sees in the flow cell.
+
+        :return: dict
+            'sample': number of the sample in the flow cell (None if none),
+            'fill': fraction of the flow cell filled with the sample,
+            'exposure': mean irradiation time of the sample [s],
+            'yield': yield [%] measured (scaled by the filling of the cell)
+        """
+        contents = self.model.nmr_cell_contents()
+        cell_volume = sum(volume for _, volume in contents) or 1.0
+        samples = {}
+        for segment, volume in contents:
+            if segment.phase == LIQUID and segment.content.startswith('sample'):
+                entry = samples.setdefault(segment.content, [0.0, 0.0])
+                entry[0] += volume
+                entry[1] += volume * segment.exposure
+        if not samples:
+            measurement = {'sample': None, 'fill': 0.0, 'exposure': 0.0,
+                           'yield': round(self.random.gauss(0, YIELD_NOISE),
+                                          2)}
+            self.measurements.append(measurement)
+            return measurement
+        content, (volume, exposure) = max(
+            samples.items(), key=lambda item: item[1][0]
+        )
+        number = int(content.split('-')[1])
+        exposure /= volume
+        fill = volume / cell_volume
+        conversion = 1 - math.exp(-self.rate_constant(number) * exposure)
+        measured = 100 * conversion * fill + self.random.gauss(0, YIELD_NOISE)
+        measurement = {
+            'sample': number,
+            'fill': round(fill, 3),
+            'exposure': round(exposure, 1),
+            'yield': round(measured, 2),
+        }
+        self.measurements.append(measurement)
+        return measurement
+
+
+def get_virtual_platform(**settings):
+    """Return the virtual platform of this process, creating it on first use.
+
+    :param settings:
+        Keyword arguments of VirtualPlatform, only used when the platform is
+        created (call this before connecting to the instruments)
+    :return: VirtualPlatform
+    """
+    global _virtual_platform
+    with _virtual_platform_lock:
+        if _virtual_platform is None:
+            _virtual_platform = VirtualPlatform(**settings)
+        return _virtual_platform
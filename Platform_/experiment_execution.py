@@ -10,17 +10,19 @@ from Phase_sensors.Phase_sensor_board import phase_sensor_1, phase_sensor_2, \
     phase_sensor_7
 from phase_sensor_CSV_naming import *
 from NMR_control_loop.NMR_loop import NMRLoop
-from phase_sensor_CSV_naming import get_your_abs_project_path
-from Phase_sensors.Phase_sensor_detection import ps_data_filename
-import pandas as pd
+from Phase_sensors.Phase_sensor_detection import experiment_timestamp
 from platform_class import Platform
 from List_connected_devices import find_port
 from Liquid_Handler.Sample_info import SampleInfo
+from Clock_organizer.Task_group import TaskGroup
+from Slug_scheduler.slug_scheduler import Resource, Stage, SlugScheduler
+from Timeline_tracing.timeline import span
 
 
 async def experimental_sequence(
         platform, liquid_handling, pump_C,
-        chemical_space, sample, residence_time, reactor_volume
+        chemical_space, sample, residence_time, reactor_volume,
+        idle_refill=None
 ):
     """sub-routine to coordinate the liquid handler pumps and NMR to deliver, reac, and analyse the slug
     :param platform:
@@ -29,93 +31,302 @@ async def experimental_sequence(
     :param sample:
     :param residence_time:
     :param reactor_volume:
-    :return:
+    :param idle_refill: coroutine function refilling the syringes while the
+        NMR records the spectrum, called with the acquisition (see
+        RefillPlanner.refill_during; None: no refill)
+    :return: NMRResult
+        Result of the NMR analysis of the slug
     """
-    # 1. Cleaning or cycle start-up
-    print('LH homing')
-    await liquid_handling.liquid_handler.Gilson_identification()
-    # 2. Sample preparation + delivery // NMR analysis
-
-    nmr_loop = NMRLoop(platform, pump_C, residence_time, chemical_space)
-    await liquid_handling.full_sample_sequence(
-            sample,
-            residence_time,
-            reactor_volume
-            )
-    await nmr_loop.the_loop_TBADT()
+    # named as its NMR experiment (timestamp of the phase sensor logs)
+    experiment = experiment_timestamp()
+    with span('experiment', experiment=experiment,
+              chemical_space=chemical_space, residence_time=residence_time):
+        # 1. Cleaning or cycle start-up
+        print('LH homing')
+        await liquid_handling.liquid_handler.Gilson_identification()
+        # 2. Sample preparation + delivery // NMR analysis
+
+        nmr_loop = NMRLoop(platform, pump_C, residence_time, chemical_space)
+        await liquid_handling.full_sample_sequence(
+                sample,
+                residence_time,
+                reactor_volume
+                )
+        return await nmr_loop.the_loop_TBADT(experiment,
+                                             idle_window=idle_refill)
+
 
 async def single_automated_experiment(
         platform, liquid_handling, pump_C,
-        chemical_space, sample, residence_time, reactor_volume
+        chemical_space, sample, residence_time, reactor_volume,
+        idle_refill=None
 ):
     """sub-routine to set up the sample for delivery, call experimental sequence
-    to deliver the slug, read and return the yield reported by the NMR analysis
-    of the slug
+    to deliver the slug and return the result of the NMR analysis of the slug
+    (handed over in memory, see NMR_processing.NMRResult)
     """
     # Create the names for the CSV files where PS log data
     create_list_of_CSV_names()
     frequency = 1  # NOTE: there is a 500+ ms overhead (1 s --> ~1.6 s)
 
-    # set up loop for initializing the phase sensors, execute the experiment,
-    # & check for yield data
-    experiment_successful = False
-    while not experiment_successful:
-        # Set-up tasks for PS data export
-        # (new files for every experiment)
-        ps1 = asyncio.create_task(
-            phase_sensor_1(frequency)
-        )
-        ps2 = asyncio.create_task(
-            phase_sensor_2(frequency)
-        )
-        ps3 = asyncio.create_task(
-            phase_sensor_3(frequency)
-        )
-
-        # ps5 = asyncio.create_task(
-        #     phase_sensor_5(frequency)
-        # )
-        # ps7 = asyncio.create_task(
-        #     phase_sensor_7(frequency)
-        # )
+    # PS data export (new files for every experiment) runs in the background
+    # of the experiment: the readers are cancelled, and their ports closed, as
+    # soon as the experiment is over
+    async with TaskGroup('experiment') as tasks:
+        for phase_sensor in (phase_sensor_1, phase_sensor_2, phase_sensor_3):
+            tasks.create_task(phase_sensor(frequency), background=True)
+        # tasks.create_task(phase_sensor_5(frequency), background=True)
+        # tasks.create_task(phase_sensor_7(frequency), background=True)
 
         # Set-up task for the execution of the experiment
-        experiment = asyncio.create_task(
+        experiment = tasks.create_task(
             experimental_sequence(
                 platform, liquid_handling, pump_C,
                 chemical_space, sample, residence_time, reactor_volume,
+                idle_refill,
             )
         )
 
-        tasks = [
-            ps1, ps2, ps3,
-            experiment,
-        ]
-
-        await asyncio.wait(
-            tasks,
-            return_when=asyncio.FIRST_COMPLETED
-        )
-
-        # read yield csv from NMR
-        yield_csv = (get_your_abs_project_path()
-                     + 'NMR_DATA'
-                     + '\\NMR_DATA_PROCESSED'
-                     + f'\\Processed_NMR_data'
-                       f'_{ps_data_filename("PS1")[-24:-8]}.csv')
-
-        df = pd.read_csv(yield_csv)
-        experiment_successful = True
+    # result of the NMR processing of the slug
+    nmr_result = await experiment
+    print(f'single automated experiment yield: '
+          f'{format_yield(nmr_result.calculated_yield)}')
+    return nmr_result
 
-        await asyncio.sleep(5)
 
-    # format and return measured yield
-    measured_yield = float(df['Yield'])
+def format_yield(measured_yield):
+    """Yield reported to the optimizer: noise around 0 and failed
+    measurements count as 0.
+    """
     if 0.5 > measured_yield > -9:
         measured_yield = 0
     elif measured_yield < -10:
         measured_yield = 0
         # raise ValueError('Value is too low, possibly an error has occurred')
-    print(f'single automated experiment yield: {measured_yield}')
     return measured_yield
 
+
+def platform_stages(platform, liquid_handling, pump_C, reactor_volume,
+                    gas_gap=None, refill=None, eagle=None, idle_refill=None):
+    """Stages and resources of a slug on the platform (see
+    Slug_scheduler.slug_scheduler).
+
+    The liquid handler prepares slug n+1 in the sample loop (injection valve
+    on LOAD, the carrier bypasses the loop) while slug n reacts and is
+    analysed. The carrier stream (pumps A/B) and the NMR stay exclusive: the
+    residence time is set by the flow rate of the whole stream, and the NMR
+    measures with the flow stopped.
+
+    The resources are the devices, so two slugs never drive the same valves
+    at the same time:
+    - liquid_handler: GX-241, its syringe and the injection valve;
+    - sample_loop: the sample loop of the injection valve;
+    - carrier: pumps A/B and the MFC;
+    - nmr_line: switch valves 3 and 4 (to the NMR or to the waste);
+    - nmr: the Spinsolve;
+    - pump_c: pump C (solvent for the NMR line);
+    - mestrenova: the processing (one last_integral.txt).
+    Once the spectrum of slug n is recorded, its processing and the flush of
+    the NMR line run while slug n+1 is prepared; slug n+1 is delivered when
+    the line is clean.
+
+    Optional data of a slug: 'eagle_percentage' (light intensity, set when
+    the slug enters the reactor), 'progress' (called with the name of each
+    stage) and 'on_yield' (called with the slug and its yield as soon as it
+    is known, before the cleaning is over).
+
+    :param reactor_volume: float
+        Internal volume of the flow reactor [mL]
+    :param gas_gap: float
+        Minimum time [s] between two injections (None: the nitrogen bubble
+        of slug_in_sample_loop only)
+    :param refill: function
+        Coroutine function filling the syringes of pumps A, B and C before an
+        injection (None: no refill)
+    :param eagle: EagleReactor
+        Photoreactor, set to the intensity of each slug (None: unchanged)
+    :param idle_refill: function
+        Coroutine function refilling the syringes while the spectrum is
+        recorded, called with the acquisition (see
+        RefillPlanner.refill_during; None: no refill); the acquisition then
+        holds pump C too
+    :return: tuple
+        (stages, resources)
+    """
+    async def prepare(slug):
+        await liquid_handling.liquid_handler.Gilson_identification()
+        # InjMod to LOAD
+        await liquid_handling.liquid_handler.switch_valve_position('VL')
+        # stays on LOAD: the carrier may still deliver the previous slug
+        await liquid_handling.liquid_handler.prepare_reaction_sample(
+            slug.data['sample'], inject=False
+        )
+
+    async def refill_syringes(slug):
+        await refill()
+
+    async def inject(slug):
+        # N2 bubble ahead of the slug, then the slug out of the sample loop
+        await liquid_handling.pumps_valves.nitrogen_bubble(
+            wait_time=25,
+            wait_for_phase=True,
+        )
+        await liquid_handling.liquid_handler.switch_valve_position('VI')
+        await liquid_handling.slug_out_to_reactor()
+
+    async def clean_loop(slug):
+        await liquid_handling.clean_sample_loop()
+
+    async def deliver(slug):
+        if eagle is not None and 'eagle_percentage' in slug.data:
+            eagle.light_on_with_level(level=slug.data['eagle_percentage'])
+        await liquid_handling.slug_delivery(slug.data['residence_time'],
+                                            reactor_volume)
+
+    def nmr_loop(slug):
+        return NMRLoop(platform, pump_C, slug.data['residence_time'],
+                       slug.data['chemical_space'])
+
+    async def acquire(slug):
+        if idle_refill is None:
+            await nmr_loop(slug).acquire_spectrum(slug.slug_id)
+        else:
+            await idle_refill(nmr_loop(slug).acquire_spectrum(slug.slug_id))
+
+    async def process(slug):
+        nmr_result = await nmr_loop(slug).process_spectrum(slug.slug_id)
+        measured_yield = format_yield(nmr_result.calculated_yield)
+        if 'on_yield' in slug.data:
+            slug.data['on_yield'](slug, measured_yield)
+        return measured_yield
+
+    async def clean_line(slug):
+        await nmr_loop(slug).clean_nmr_line()
+
+    def stage(name, action, resources, **options):
+        async def run(slug):
+            if 'progress' in slug.data:
+                slug.data['progress'](name)
+            with span(name, experiment=slug.slug_id):
+                return await action(slug)
+        return Stage(name, run, resources, **options)
+
+    stages = [stage('prepare', prepare, ['liquid_handler', 'sample_loop'])]
+    if refill is not None:
+        stages.append(stage('refill syringes', refill_syringes,
+                            ['carrier', 'pump_c']))
+    stages += [
+        stage('inject', inject, ['sample_loop', 'carrier'],
+              min_interval=None if gas_gap is None else
+              (lambda slug: gas_gap)),
+        stage('clean loop', clean_loop, ['liquid_handler', 'sample_loop'],
+              detached=True),
+        stage('deliver', deliver, ['carrier', 'nmr_line']),
+        # MestReNova processes the latest spectrum (into last_integral.txt):
+        # the slug holds it from its acquisition to its processing, so the
+        # next slug is only recorded once this one is integrated
+        stage('acquire', acquire, ['carrier', 'nmr_line', 'nmr',
+                                   'mestrenova'] +
+              ([] if idle_refill is None else ['pump_c'])),
+        # the result of the slug, reported before the end of the cleaning
+        stage('process', process, ['mestrenova'], detached=True),
+        stage('clean line', clean_line, ['nmr_line', 'pump_c']),
+    ]
+    resources = [Resource('liquid_handler'), Resource('sample_loop'),
+                 Resource('carrier'), Resource('nmr_line'), Resource('nmr'),
+                 Resource('pump_c'), Resource('mestrenova')]
+    return stages, resources
+
+
+async def pipelined_experiments(
+        platform, liquid_handling, pump_C, experiments, reactor_volume,
+        gas_gap=None
+):
+    """sub-routine to run several experiments with several slugs in flight:
+    the next slug is prepared while the previous one reacts and is analysed.
+
+    :param experiments: list
+        dict per experiment: 'chemical_space', 'sample', 'residence_time'
+    :param reactor_volume: float
+        Internal volume of the flow reactor [mL]
+    :param gas_gap: float
+        Minimum time [s] between two injections
+    :return: list
+        Yield of each experiment, in order
+    """
+    create_list_of_CSV_names()
+    frequency = 1
+    stages, resources = platform_stages(platform, liquid_handling, pump_C,
+                                        reactor_volume, gas_gap)
+    # slug ids (NMR experiments, processed data) unique over the campaigns
+    batch = experiment_timestamp()
+    scheduler = SlugScheduler(stages, resources, platform.clock, name=batch)
+    async with TaskGroup('pipelined experiments') as tasks:
+        for phase_sensor in (phase_sensor_1, phase_sensor_2,
+                             phase_sensor_3):
+            tasks.create_task(phase_sensor(frequency), background=True)
+        # InjMod to INJECT (once for the batch)
+        await liquid_handling.system_start_up()
+        slugs = await scheduler.run(experiments)
+    yields = [slug.results['process'] for slug in slugs]
+    for slug, measured_yield in zip(slugs, yields):
+        print(f'{slug.slug_id} yield: {measured_yield}')
+    return yields
+
+
+
+async def overlapped_experiments(
+        platform, liquid_handling, pump_C, next_experiment, reactor_volume,
+        gas_gap=None, refill=None, eagle=None, idle_refill=None
+):
+    """sub-routine to run the experiments as they are requested: each one
+    starts as soon as the devices of its first stage are free, e.g., the
+    preparation of experiment n+1 while the spectrum of experiment n is
+    processed and the NMR line flushed (see platform_stages).
+
+    :param next_experiment: function
+        Coroutine function called with busy (function telling if experiments
+        are in progress) and returning the data of the next experiment
+        (see pipelined_experiments and platform_stages), None to stop
+    :param reactor_volume: float
+        Internal volume of the flow reactor [mL]
+    :param gas_gap: float
+        Minimum time [s] between two injections
+    :param refill: function
+        Coroutine function filling the syringes before each injection
+    :param eagle: EagleReactor
+        Photoreactor, set to the intensity of each experiment
+    :param idle_refill: function
+        Coroutine function refilling the syringes during the NMR acquisitions
+    :return: list
+        The slugs, in order
+    """
+    create_list_of_CSV_names()
+    frequency = 1
+    stages, resources = platform_stages(platform, liquid_handling, pump_C,
+                                        reactor_volume, gas_gap, refill, eagle,
+                                        idle_refill)
+    batch = experiment_timestamp()
+    scheduler = SlugScheduler(stages, resources, platform.clock, name=batch)
+
+    def busy():
+        # a failed experiment stops the others (raised by the scheduler)
+        for slug in scheduler.slugs:
+            if slug.error is not None and \
+                    not isinstance(slug.error, asyncio.CancelledError):
+                raise slug.error
+        return any(not slug.done.done() for slug in scheduler.slugs)
+
+    async with TaskGroup('overlapped experiments') as tasks:
+        for phase_sensor in (phase_sensor_1, phase_sensor_2,
+                             phase_sensor_3):
+            tasks.create_task(phase_sensor(frequency), background=True)
+        # InjMod to INJECT (once for the campaign)
+        await liquid_handling.system_start_up()
+        async with scheduler:
+            while True:
+                experiment = await next_experiment(busy)
+                if experiment is None:
+                    break
+                scheduler.submit(experiment)
+    return scheduler.slugs
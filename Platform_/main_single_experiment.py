@@ -159,7 +159,7 @@ def run_platform(X):
 
     # Run experiment and calculate yield (Basic functionality)
     conditions = literal_eval(repr(X))
-    measured_exp_yield = asyncio.run(
+    nmr_result = asyncio.run(
         single_automated_experiment(
             RoboChem,
             liquid_handling,
@@ -171,6 +171,8 @@ def run_platform(X):
         )
     )
 
+    measured_exp_yield = format_yield(nmr_result.calculated_yield)
+
     RoboChem.switch_valves.close()
     RoboChem.mfc.close()
     detectors.close()
@@ -1,12 +1,12 @@
 """Functions to create list of files and corresponding files to store phase and droplet data in
 
 """
-import datetime
 import sys
-import time
 import platform
 import os
 import pandas as pd
+from Virtual_instruments.settings import use_virtual_instruments
+from Clock_organizer.Platform_clock import get_clock
 
 
 # (NOT used, at least for now)
@@ -31,17 +31,18 @@ def find_folder_or_file(name='', search_path='.'):
 
 def get_your_abs_project_path():
     """Function to find the absolute path of the RoboChem project.
-    (currently only works on Windows)
+    (currently only works on Windows, or anywhere with the virtual
+    instruments)
 
     :return: str
         absolute path of the project
     """
-    if platform.system() != 'Windows':
+    if platform.system() != 'Windows' and not use_virtual_instruments():
         print('WARNING: The platform only works on Windows machines!')
         sys.exit()
     project_folder = os.path.abspath('..')
     if 'Platform_' not in project_folder:
-        project_folder = project_folder + '\\Platform_\\'
+        project_folder = os.path.join(project_folder, 'Platform_', '')
     return project_folder
 
 
@@ -83,8 +84,8 @@ def phase_sensor_csv_name(sensor):
     :return: str
         absolute path of the CSV file with data
     """
-    the_date = datetime.date.today()
-    the_time = time.strftime("%H%M", time.localtime())
+    the_date = get_clock().now().date()
+    the_time = get_clock().strftime("%H%M")
     absolute_name = (
         get_your_abs_project_path()
         + '/Phase_sensor_DATA/'
@@ -101,8 +102,8 @@ def droplets_csv_name(sensor):
     :return: str
         absolute path of the CSV file with data
     """
-    the_date = datetime.date.today()
-    the_time = time.strftime("%H%M", time.localtime())
+    the_date = get_clock().now().date()
+    the_time = get_clock().strftime("%H%M")
     absolute_name = (
         get_your_abs_project_path()
         + '/Phase_sensor_DATA'
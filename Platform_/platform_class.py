@@ -29,11 +29,23 @@ Hardware:
 - Eagle reactor from Signify (variable volume, 6x high-power LEDs)
 - Flow NMR (Magritek Spinsolve 60)
 
+All the hardware above can be replaced by the virtual instruments
+(Virtual_instruments package) to run the platform without it, e.g., on a
+Linux CI machine. With an accelerated or virtual clock (Clock_organizer
+package) a simulated campaign runs faster than real time.
+
 """
 
+import os
+
 from Syringe_pumps.Syringe_pump import SyringePump
 from Switch_valves.Switch_valves_control_Arduino_sketch import SwitchValveArduino
 from MFC_control.MFC_control import BronkhorstMFC
+from Virtual_instruments.settings import use_virtual_instruments, \
+    enable_virtual_instruments, is_virtual_port, virtual_port
+from Clock_organizer.Platform_clock import get_clock, set_clock
+from Device_server.protocol import DEVICE_SERVER_ENV
+from Device_server.device_client import DeviceClient
 
 
 class Platform(object):
@@ -44,7 +56,9 @@ class Platform(object):
                  syringe_pump_c=None,
                  switch_valves=None,
                  mfc=None,
-                 export_freq=0.5
+                 export_freq=0.5,
+                 virtual_instruments=None,
+                 clock=None
                  ):
         """ Platform_ initialization establishing a serial connection to all
         elements (except liquid handler and flow NMR, which are handled by
@@ -83,13 +97,56 @@ class Platform(object):
             controller
             {'port': the name of the port
              }
+        :param virtual_instruments: bool
+            True to connect to the virtual instruments instead of the real
+            ones, False for the real ones. None (default) keeps the setting
+            of the environment variable ROBOCHEM_VIRTUAL_INSTRUMENTS.
+            With the virtual instruments, the ports of the dictionaries above
+            are replaced by the virtual ones (the other settings are kept).
+        :param clock: RealClock or str
+            Clock used for all waits and timestamps (see
+            Clock_organizer/Platform_clock.py), e.g. VirtualClock() or
+            'accelerated:60'. It becomes the clock of the whole process, so
+            that the modules not owned by the platform (liquid handler, phase
+            sensors, NMR) follow it too. None (default) keeps the clock of
+            the process (environment variable ROBOCHEM_CLOCK, real time by
+            default).
+
+        With the environment variable ROBOCHEM_DEVICE_SERVER set, the pumps,
+        valves and MFC are those of the device server (Device_server
+        package), already connected and shared with the other processes; the
+        ports of the dictionaries above are then those of the server.
         """
+        if clock is not None:
+            set_clock(clock)
+        self.clock = get_clock()
+        if virtual_instruments is not None:
+            enable_virtual_instruments(virtual_instruments)
+        self.device_client = None
+        if os.getenv(DEVICE_SERVER_ENV, '').strip():
+            self.device_client = DeviceClient()
+            for device in ('syringe_pump_a', 'syringe_pump_b',
+                           'syringe_pump_c', 'switch_valves', 'mfc'):
+                setattr(self, device, self.device_client.device(device))
+            return
+        if use_virtual_instruments():
+            for settings, device in (
+                    (syringe_pump_a, 'Syringe_pump_A'),
+                    (syringe_pump_b, 'Syringe_pump_B'),
+                    (syringe_pump_c, 'Syringe_pump_C'),
+                    (switch_valves, 'Switch_valves'),
+                    (mfc, 'MFC'),
+            ):
+                if not is_virtual_port(settings['port']):
+                    settings['port'] = virtual_port(device)
+
         self.syringe_pump_a = SyringePump(
             syringe_pump_a['port'],
             syringe_pump_a['baudrate'],
             syringe_pump_a['name'],
             mode=0,
             x=0,
+            clock=self.clock,
         )
         self.syringe_pump_b = SyringePump(
             syringe_pump_b['port'],
@@ -97,6 +154,7 @@ class Platform(object):
             syringe_pump_b['name'],
             mode=0,
             x=0,
+            clock=self.clock,
         )
         self.syringe_pump_c = SyringePump(
             syringe_pump_c['port'],
@@ -104,11 +162,13 @@ class Platform(object):
             syringe_pump_c['name'],
             mode=0,
             x=0,
+            clock=self.clock,
         )
         self.switch_valves = SwitchValveArduino(
             switch_valves['port'],
             switch_valves['name'],
             switch_valves['pins'],
             switch_valves['valve types'],
+            clock=self.clock,
         )
-        self.mfc = BronkhorstMFC(mfc['port'])
+        self.mfc = BronkhorstMFC(mfc['port'], clock=self.clock)
@@ -0,0 +1,200 @@
+"""Resident platform worker
+
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+run_platform.py connects to the instruments, reads the vial Excel file and sets
+up the MFC and valve 4 every time it is started, which used to be once per
+experiment. This worker does that once per campaign and then runs every
+experiment requested by the GUI in the same process: the device connections,
+the vial inventory (SampleInfo) and the ultrasonic detectors stay warm.
+
+The requests and answers keep their content (index, X, objectives, variables
+-> index, X, objective value(s), timestamp) and travel through the channel
+given by Dragonfly_BO (see Platform_channel): the optimizer is woken up as
+soon as a result exists, and receives progress events in between. Started
+without a channel (e.g., by hand), the worker reads the requests from
+../input.pickle and writes the answers to ../output.pickle; a new index in
+../input.pickle is a new experiment (the request present at start-up is
+served first).
+
+With "overlap_experiments" in experimental_setup.json, a request starts as
+soon as it arrives and the devices it needs are free: the liquid handler
+prepares experiment n+1 while the spectrum of experiment n is processed and
+the NMR line flushed (see experiment_execution.platform_stages). The result of
+an experiment is sent as soon as its yield is known.
+
+The worker stops, closing the devices, when the optimizer sends 'shutdown' or
+closes the channel, or when its standard input is closed (file mode).
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+
+from Platform_channel.channel import connect_from_environment, \
+    PlatformFileChannel, progress_message, result_message, error_message
+from Clock_organizer.Platform_clock import get_clock
+
+logger = logging.getLogger('Platform_worker')
+
+POLL_INTERVAL = 1  # [s] between two checks of the channel while experiments run (overlap mode)
+
+
+def wait_for_end_of_input(stop):
+    """Function setting stop when the standard input is closed.
+
+    :param stop: threading.Event
+    """
+    try:
+        sys.stdin.buffer.read()
+    except (OSError, ValueError):
+        pass
+    stop.set()
+
+
+def serve(channel, stop=None):
+    """Function to run the experiments requested by the GUI.
+
+    :param channel: ConnectionChannel or PlatformFileChannel
+        Where the requests come from
+    :param stop: threading.Event
+        Set to stop the worker between two experiments (optional)
+    :return: int
+        Number of experiments executed
+    """
+    import run_platform
+    from run_platform import run_experiment, close_devices
+
+    # connects to the devices (once per campaign)
+    run_platform.connect_platform()
+    if run_platform.OVERLAP_EXPERIMENTS:
+        return serve_overlapped(channel, stop)
+    experiments = 0
+    try:
+        while stop is None or not stop.is_set():
+            try:
+                message = channel.receive(1)
+            except TimeoutError:
+                continue
+            except EOFError:
+                break  # the optimizer is gone
+            if message['type'] == 'shutdown':
+                break
+            if message['type'] != 'request':
+                continue
+            logger.info(f'Experiment {message["index"]}: {message["X"]}')
+            try:
+                output = run_experiment(
+                    message['index'], message['X'], message['objectives'],
+                    message['variables'],
+                    progress=lambda stage, request=message: channel.send(
+                        progress_message(request, stage)
+                    ),
+                    campaign=message.get('campaign')
+                )
+            except Exception as error:
+                channel.send(error_message(message, error))
+                raise
+            if output is not None:
+                [index, x, y, timestamp] = output
+                channel.send(result_message(message, y, timestamp))
+            experiments += 1
+    finally:
+        close_devices()
+    return experiments
+
+
+async def receive_request(channel, busy, stop=None):
+    """Coroutine waiting for the next request without holding up the
+    experiments in progress.
+
+    :param channel: ConnectionChannel or PlatformFileChannel
+        Where the requests come from
+    :param busy: function
+        True while experiments are in progress
+    :param stop: threading.Event
+        Set to stop the worker (optional)
+    :return: dict
+        Request, None when the worker has to stop
+    """
+    clock = get_clock()
+    while stop is None or not stop.is_set():
+        try:
+            # blocks the event loop only when nothing runs
+            message = channel.receive(0 if busy() else POLL_INTERVAL)
+        except TimeoutError:
+            if busy():
+                await clock.asleep(POLL_INTERVAL)
+            else:
+                await asyncio.sleep(0)
+            continue
+        except EOFError:
+            return None  # the optimizer is gone
+        if message['type'] == 'shutdown':
+            return None
+        if message['type'] == 'request':
+            logger.info(f'Experiment {message["index"]}: {message["X"]}')
+            return message
+    return None
+
+
+def serve_overlapped(channel, stop=None):
+    """Function to run the experiments requested by the GUI, each one
+    starting while the previous one is processed and cleaned.
+
+    :param channel: ConnectionChannel or PlatformFileChannel
+        Where the requests come from
+    :param stop: threading.Event
+        Set to stop the worker (the experiments in progress are finished)
+    :return: int
+        Number of experiments executed
+    """
+    from run_platform import run_overlapped_experiments, close_devices
+
+    unanswered = {}  # id: request without result
+
+    async def next_request(busy):
+        request = await receive_request(channel, busy, stop)
+        if request is not None:
+            unanswered[request['id']] = request
+        return request
+
+    def send_output(request, output):
+        [index, x, y, timestamp] = output
+        channel.send(result_message(request, y, timestamp))
+        unanswered.pop(request['id'], None)
+
+    try:
+        return run_overlapped_experiments(
+            next_request, send_output,
+            progress=lambda request, stage: channel.send(
+                progress_message(request, stage)
+            )
+        )
+    except Exception as error:
+        for request in unanswered.values():
+            channel.send(error_message(request, error))
+        raise
+    finally:
+        close_devices()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    platform_channel = connect_from_environment()
+    stop_event = None
+    if platform_channel is None:
+        from run_platform import FILENAME_INPUT_PICKLE, FILENAME_OUTPUT_PICKLE
+        platform_channel = PlatformFileChannel(FILENAME_INPUT_PICKLE,
+                                               FILENAME_OUTPUT_PICKLE)
+        stop_event = threading.Event()
+        if sys.stdin is not None:
+            threading.Thread(target=wait_for_end_of_input,
+                             args=(stop_event,), daemon=True).start()
+    try:
+        serve(platform_channel, stop_event)
+    finally:
+        platform_channel.close()
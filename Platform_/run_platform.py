@@ -10,6 +10,7 @@ between GUI and Platform
 3. Connect to devices by creating platform and EagleReactor objects
 4. Retrieve information on the vials loaded in the liquid handler
 5. Set-up pumps and detectors
+(3.-5. in connect_platform, when the first experiment starts: importing the script does not connect to the devices)
 6. Define the run_platform function: Wrap the experiment function in a format compatible with BO
 7.Main loop to open INPUT PICKLE file and execute run_platform function which loads a sample and saves the output for
 the GUI to read
@@ -19,7 +20,9 @@ the GUI to read
 # -----! 1. Import modules and packages !------
 import pickle
 import copy
-import json
+import logging
+import os
+import sqlite3
 from ast import literal_eval
 
 from platform_class import Platform
@@ -29,11 +32,18 @@ from Liquid_Handler.Sample_info import SampleInfo
 from NMR_control_loop.NMR_processing import *
 from Pumps_Valves_PS_MFC_LiquidHandler.Pumps_Valves_PS_MFC_LiquidHandler import SamplePreparation
 from Syringe_pumps_and_valves_ensemble.Single_pump_and_valve_ensemble import SinglePumpValveEnsemble
+from Syringe_pumps_and_valves_ensemble.Refill_planner import RefillPlanner
 from Liquid_Handler import *
 from ultrasonic_detector.ultrasonic_pump_detection import UltrasonicDetector
 from Concentration_check import calculate_objective_outputs, get_price
 from Eagle_Reactor.Eagle_control import EagleReactor
 from variable_space import create_variable_space
+from sample_feasibility import Inventory
+from Virtual_instruments.settings import use_virtual_instruments
+from Platform_channel.channel import atomic_pickle_dump
+from Clock_organizer.Platform_clock import LoopRunner
+from Campaign_store import open_store
+from Setup_config import get_setup, reload_setup
 
 # -----! 2. Define constants !-----
 # pickle file locations to communicate between GUI and Platform code
@@ -48,72 +58,140 @@ TIME_SLEEP = 0.5  # [s] The time to sleep inbetween updating the frontend.
 # load experimental set up data from experimental_setup.json
 # experimental_setup.json is generated by the GUI to inform platform reaction conditions
 # TODO: This info is generated with the multi-runs. So for single runs. We also have to generete this file!
-SETUP_INFO_JSON = '../experimental_setup.json'
-with open(SETUP_INFO_JSON) as json_file:
-    experimental_setup = json.load(json_file)
-
-SAMPLE_INFORMATION_FILENAME = experimental_setup["sample_information_filename"]
-REACTOR_VOLUME = experimental_setup["reactor_volume"]
-
-# -----! 3. Connect to devices !-----
-# [!] PS4-PS6 require manual setup of the COM port name
-# connect to platform and pumps
-RoboChem = Platform(
-    syringe_pump_a={
-        'port': find_port('Syringe_pump_A'),
-        'baudrate': 38400,
-        'name': 'syringe_pump_a'
-    },
-    syringe_pump_b={
-        'port': find_port('Syringe_pump_B'),
-        'baudrate': 38400,
-        'name': 'syringe_pump_b'
-    },
-    syringe_pump_c={
-        'port': find_port('Syringe_pump_C'),
-        'baudrate': 38400,
-        'name': 'syringe_pump_c'
-    },
-    switch_valves={
-        'port': find_port('Switch_valves'),
-        'pins': [8, 7, 4, 2],
-        'name': 'switch_valves',
-        'valve types': [
-            '3-way', '4-way', '3-way', '4-way'
-        ]
-    },
-    mfc={'port': find_port('MFC')},
-)
-
-# connect to photochemical reactor
-Eagle = EagleReactor()
-
-
-
-# -----! 4. Retrieve information on the vials loaded in the liquid handler !----
-sample_information = SampleInfo(
-    SAMPLE_INFORMATION_FILENAME  # EXAMPLE: '/Liquid_Handler/20230111_CF3_quinine_AS035.xlsx'
-)
-
-sample_information.get_sample_name()
-sample_information.get_sample_info()
-sample_information.initial_sample_info()
-sample_information.get_sample_bottles_number()
-
-# -----! 5. Set-up pumps and detectors !-----
-liquid_handling = SamplePreparation(RoboChem)
-pump_C = SinglePumpValveEnsemble(RoboChem)
-detectors = UltrasonicDetector()
-
-# Set MFC to MAX flow rate (in conjunction with home-made ~1 atm BPR)
-asyncio.run(
-    liquid_handling.pumps_valves.MFC.define_setpoint(0)
-)
-
-# Set 4-way valve next to the NMR to send solvent to waste
-asyncio.run(
-    RoboChem.switch_valves.valve_4_OFF_or_C_3()
-)
+# read and validated by connect_platform (Setup_config), read again by start_campaign when a new campaign starts
+experimental_setup = None
+SAMPLE_INFORMATION_FILENAME = None
+REACTOR_VOLUME = None
+# campaign of the experiments requested without campaign name (campaign store)
+EXP_NAME = None
+# resident worker: start the next experiment while the previous one is processed and its NMR line cleaned
+OVERLAP_EXPERIMENTS = False
+
+# devices, vials and event loop of the process, see connect_platform (None: not connected)
+RoboChem = None
+Eagle = None
+sample_information = None
+liquid_handling = None
+pump_C = None
+detectors = None
+loop_runner = None
+refill_planner = None
+# vials used and raw data of every experiment (None: store switched off)
+campaign_store = None
+logger = logging.getLogger('Campaign_store')
+
+
+def load_sample_information(filename):
+    """Function to read the vials loaded in the liquid handler.
+
+    :param filename: str
+        Excel file of the vial positions (EXAMPLE: '/Liquid_Handler/20230111_CF3_quinine_AS035.xlsx')
+    :return: SampleInfo
+    """
+    sample_info = SampleInfo(filename)
+    sample_info.get_sample_name()
+    sample_info.get_sample_info()
+    sample_info.initial_sample_info()
+    sample_info.get_sample_bottles_number()
+    return sample_info
+
+
+def connect_platform():
+    """Function to read the settings of the campaign, connect to the devices and read the vials loaded in the liquid
+    handler, once per process (the next calls return at once). Done by the entry points (run_experiment,
+    run_overlapped_experiments, platform_worker.py) rather than at import, so importing this module for its constants
+    does not connect to the devices.
+    """
+    global experimental_setup, SAMPLE_INFORMATION_FILENAME, REACTOR_VOLUME, EXP_NAME, OVERLAP_EXPERIMENTS, \
+        RoboChem, Eagle, sample_information, liquid_handling, pump_C, detectors, loop_runner, refill_planner, \
+        campaign_store
+    if RoboChem is not None:
+        return
+    experimental_setup = get_setup()
+    SAMPLE_INFORMATION_FILENAME = experimental_setup.sample_information_filename
+    REACTOR_VOLUME = experimental_setup.reactor_volume
+    EXP_NAME = experimental_setup.exp_name
+    OVERLAP_EXPERIMENTS = experimental_setup.overlap_experiments
+
+    # -----! 3. Connect to devices !-----
+    # [!] PS4-PS6 require manual setup of the COM port name
+    if use_virtual_instruments():
+        # size the virtual platform like the real one before connecting to it
+        from Virtual_instruments.virtual_platform import get_virtual_platform
+        get_virtual_platform(
+            reactor_volume=REACTOR_VOLUME,
+            sample_push_volume=experimental_setup.sample_push_volume
+        )
+    # connect to platform and pumps
+    platform = Platform(
+        syringe_pump_a={
+            'port': find_port('Syringe_pump_A'),
+            'baudrate': 38400,
+            'name': 'syringe_pump_a'
+        },
+        syringe_pump_b={
+            'port': find_port('Syringe_pump_B'),
+            'baudrate': 38400,
+            'name': 'syringe_pump_b'
+        },
+        syringe_pump_c={
+            'port': find_port('Syringe_pump_C'),
+            'baudrate': 38400,
+            'name': 'syringe_pump_c'
+        },
+        switch_valves={
+            'port': find_port('Switch_valves'),
+            'pins': [8, 7, 4, 2],
+            'name': 'switch_valves',
+            'valve types': [
+                '3-way', '4-way', '3-way', '4-way'
+            ]
+        },
+        mfc={'port': find_port('MFC')},
+    )
+
+    # connect to photochemical reactor
+    Eagle = EagleReactor(clock=platform.clock)
+
+    # -----! 4. Retrieve information on the vials loaded in the liquid handler !----
+    sample_information = load_sample_information(SAMPLE_INFORMATION_FILENAME)
+
+    # -----! 5. Set-up pumps and detectors !-----
+    liquid_handling = SamplePreparation(platform)
+    pump_C = SinglePumpValveEnsemble(platform)
+    detectors = UltrasonicDetector(clock=platform.clock)
+
+    # One event loop for the whole process: every experiment runs in it, and the
+    # tasks an experiment leaves behind are cancelled at its end
+    loop_runner = LoopRunner(platform.clock)
+
+    campaign_store = open_store()
+    publish_inventory()
+
+    # refills only when the next experiment needs them, the others while the NMR
+    # records a spectrum (see Refill_planner)
+    refill_planner = RefillPlanner(
+        liquid_handling.pumps_valves.PumpsValvesEnsemble,
+        pump_C,
+        detectors,
+        # delivery to the reactor + slug out of the sample loop
+        carrier_need=experimental_setup.sample_push_volume + 600,
+        line_need=2000,  # cleaning of the NMR line
+        start_up=fill_up_syringes
+    )
+
+    # connected: set last, the next calls return at once
+    RoboChem = platform
+    loop_runner.run(set_up_flow_path())
+
+
+async def set_up_flow_path():
+    """Coroutine to put the MFC and valve 4 in their start position.
+    """
+    # Set MFC to MAX flow rate (in conjunction with home-made ~1 atm BPR)
+    await liquid_handling.pumps_valves.MFC.define_setpoint(0)
+    # Set 4-way valve next to the NMR to send solvent to waste
+    await RoboChem.switch_valves.valve_4_OFF_or_C_3()
 
 
 # defining sub routine to fill syringes (A+B, C) with solvent
@@ -121,13 +199,17 @@ async def fill_up_syringes():
     """Coroutine to fill up all syringes concurrently.
     """
 
-    vol_a, vol_b, vol_c = await asyncio.gather(
-        detectors.get_volume(pump='A'),
-        detectors.get_volume(pump='B'),
-        detectors.get_volume(pump='C')
+    # the detectors stream continuously, so these return immediately (they
+    # wait for fresh readings, or raise, if an estimate is stale or not
+    # confident enough: the ensembles would start from a wrong volume)
+    (vol_a, conf_a), (vol_b, conf_b), (vol_c, conf_c) = await asyncio.gather(
+        detectors.get_volume(pump='A', return_confidence=True),
+        detectors.get_volume(pump='B', return_confidence=True),
+        detectors.get_volume(pump='C', return_confidence=True)
     )
 
-    print(f'\nPump A: {vol_a} ul  Pump B: {vol_b} ul  Pump C: {vol_c} ul')
+    print(f'\nPump A: {vol_a} ul ({conf_a:.0%})  Pump B: {vol_b} ul '
+          f'({conf_b:.0%})  Pump C: {vol_c} ul ({conf_c:.0%})')
     await asyncio.gather(
         liquid_handling.pumps_valves.PumpsValvesEnsemble.ensemble_start_up_no_fill(
             vol_start_a=vol_a,  # volumes in microliters!
@@ -142,14 +224,167 @@ async def fill_up_syringes():
     )
 
 
+# campaign whose settings are loaded (None: those read at start-up)
+current_campaign = None
+
+
+def start_campaign(campaign):
+    """Function to switch to the settings of a new campaign: experimental_setup.json is read again (reactor volume,
+    experiment name, NMR and sample push settings) and the vials of the new campaign are loaded. The settings read at
+    start-up are those of the first campaign, nothing is done for it, for a request of the current campaign or for a
+    request without campaign.
+
+    :param campaign: str
+        Campaign of the next experiment
+    """
+    global current_campaign, experimental_setup, SAMPLE_INFORMATION_FILENAME, REACTOR_VOLUME, EXP_NAME, \
+        sample_information
+    if campaign is None or campaign == current_campaign:
+        return
+    if current_campaign is not None:
+        experimental_setup = reload_setup()
+        SAMPLE_INFORMATION_FILENAME = experimental_setup.sample_information_filename
+        REACTOR_VOLUME = experimental_setup.reactor_volume
+        EXP_NAME = experimental_setup.exp_name
+        sample_information = load_sample_information(SAMPLE_INFORMATION_FILENAME)
+        publish_inventory()
+        refill_planner.estimates['carrier'] = experimental_setup.sample_push_volume + 600
+        logger.info(f'Campaign {campaign}: settings of {experimental_setup.filename} loaded')
+    current_campaign = campaign
+
+
+async def refill_syringes():
+    """Coroutine to refill the syringes of pumps A, B and C that cannot
+    deliver the next experiment (start-up of the pumps before the first one).
+    """
+    await refill_planner.before_experiment()
+
+
+async def experiment_workflow(chemical_space, residence_time, progress=None,
+                              campaign=None, index=None):
+    """Coroutine running one experiment, from filling the syringes to the
+    yield.
+
+    :param chemical_space: list
+        Sample composition (see variable_space.py)
+    :param residence_time: float
+        Residence time [s]
+    :param progress: function
+        called with the name of each step when it starts (optional)
+    :param campaign: str
+        Campaign of the experiment in the campaign store (default: EXP_NAME)
+    :param index: int
+        Index of the experiment in the campaign (None: not recorded)
+    :return: NMRResult
+        Result of the NMR analysis (yield, integrals, paths, timestamp)
+    """
+    # Initialize the platform (fill syringes)
+    if progress is not None:
+        progress('filling syringes')
+    await refill_syringes()
+
+    # Run experiment and calculate yield (Basic functionality)
+    if progress is not None:
+        progress('running experiment')
+    sample = sample_information.prepare_sample_info(chemical_space)
+    record_experiment(campaign, index, sample=sample)
+    publish_inventory()
+    return await single_automated_experiment(
+        RoboChem,
+        liquid_handling,
+        pump_C,
+        chemical_space,
+        sample,
+        residence_time,  # residence time (always placed last in the list)
+        REACTOR_VOLUME,  # global variable from the script
+        idle_refill=refill_planner.refill_during
+    )
+
+
 # ------------------------------------------------------------------------------
 
 
 # -----! 6. Define run_platform function !-----
 # #Wrap the experiment function in a format compatible with BO
-def run_platform(index, X, objectives, variables):
-    """Function to take in GUI generated files with sample composition information,
-    run an experiment on the platform and save the output in a format that the GUI can feed back into BO
+def record_experiment(campaign, index, X=None, sample=None, timestamp=None):
+    """Function to record an experiment in the campaign store: its
+    conditions, the vials its sample was drawn from and, once analysed, the
+    paths of its raw data. A failure of the store is logged, the experiment
+    goes on.
+
+    :param campaign: str
+        Campaign of the experiment (None: EXP_NAME)
+    :param index: int
+        Index of the experiment in the campaign (None: nothing is recorded)
+    :param X: list
+        Conditions of the experiment
+    :param sample: list
+        Sample of the experiment (see SampleInfo.prepare_sample_info)
+    :param timestamp: str
+        Name of the data files of the experiment
+    """
+    if campaign_store is None or index is None:
+        return
+    try:
+        campaign_id = campaign_store.campaign(campaign or EXP_NAME)
+        campaign_store.record_experiment(campaign_id, index, X, timestamp)
+        if sample is not None:
+            campaign_store.add_inventory_events(
+                campaign_id, index, sample_information.vial_draws(sample)
+            )
+        if timestamp is not None:
+            campaign_store.add_artifacts(campaign_id, index,
+                                         experiment_artifacts(timestamp))
+    except sqlite3.Error as error:
+        logger.warning(f'Experiment {index} not recorded in the campaign '
+                       f'store: {error}')
+
+
+def publish_inventory():
+    """Function to save the stock solutions left in the liquid handler in the
+    campaign store, where the optimizer reads them to propose only samples
+    that can be prepared (see sample_feasibility.py). A failure of the store
+    is logged.
+    """
+    if campaign_store is None or sample_information is None:
+        return
+    try:
+        campaign_store.set_inventory(
+            Inventory.from_sample_info(sample_information).as_dict()
+        )
+    except sqlite3.Error as error:
+        logger.warning(f'Inventory not saved in the campaign store: {error}')
+
+
+def experiment_artifacts(timestamp):
+    """Function to list the raw data files of an experiment.
+
+    :param timestamp: str
+        Name of the data files of the experiment
+    :return: dict
+        kind: path, for the files that exist
+    """
+    folder = get_your_abs_project_path()
+    artifacts = {
+        'processed_nmr': os.path.join(folder, 'NMR_DATA', 'NMR_DATA_PROCESSED',
+                                      f'Processed_NMR_data_{timestamp}.csv')
+    }
+    # phase sensor and droplet logs of the experiment (or of its batch)
+    for kind, list_of_names in (('phase_sensor', get_CSV_with_names_ps()),
+                                ('droplets', get_CSV_with_names_droplets())):
+        if os.path.exists(list_of_names):
+            names = pd.read_csv(list_of_names, index_col=0).iloc[:, 0]
+            for number, name in enumerate(names, 1):
+                artifacts[f'{kind}_PS{number}'] = name
+    return {kind: os.path.normpath(path) for kind, path in artifacts.items()
+            if os.path.exists(path)}
+
+
+def run_experiment(index, X, objectives, variables, progress=None,
+                   campaign=None):
+    """Function to run an experiment on the platform and format the output
+    that the GUI feeds back into BO (devices stay connected, see
+    platform_worker.py for running several experiments in the same process).
 
     :param index:
         identifier index from the pickle file generated by the GUI
@@ -162,8 +397,17 @@ def run_platform(index, X, objectives, variables):
     :param variables:
         variables space so sampleinfo.py can correctly determine
         in the case that there is a mix of continuous and discrete outputs
-    :return: None
+    :param progress: function
+        called with the name of each step when it starts (optional)
+    :param campaign: str
+        Campaign of the experiment in the campaign store (default: EXP_NAME)
+    :return: list
+        [index, X, objective value(s), timestamp], None if the objectives are
+        not recognised
     """
+    connect_platform()
+    start_campaign(campaign)
+    record_experiment(campaign, index, X)
     # ------------------------------------------------------------------------------
     # 1. create the variable space for the platform to run from X and variables
     residence_time, eagle_percentage, chemical_space = create_variable_space(X,
@@ -172,27 +416,14 @@ def run_platform(index, X, objectives, variables):
     # 2. turn on the Eagle Reactor
     Eagle.light_on_with_level(level=eagle_percentage)
 
-    # 3. Initialize the platform (connect to instrument, fill syringes)
-    asyncio.run(fill_up_syringes())
-    asyncio.run(pump_C.refill_syringe())
-
-    # 4. Run experiment and calculate yield (Basic functionality)
+    # 3. Fill the syringes, 4. run experiment and calculate yield (Basic
+    # functionality), in the event loop of the process
     conditions = literal_eval(repr(X))
-    measured_exp_yield = asyncio.run(
-        single_automated_experiment(
-            RoboChem,
-            liquid_handling,
-            pump_C,
-            chemical_space,
-            sample_information.prepare_sample_info(chemical_space),
-            residence_time,  # residence time (always placed last in the list)
-            REACTOR_VOLUME  # global variable from the script
-        )
+    nmr_result = loop_runner.run(
+        experiment_workflow(chemical_space, residence_time, progress,
+                            campaign, index)
     )
-
-    RoboChem.switch_valves.close()
-    RoboChem.mfc.close()
-    detectors.close()
+    measured_exp_yield = format_yield(nmr_result.calculated_yield)
 
     # create a clone as not to have the same filepointer
     conditions_np = copy.deepcopy(X)
@@ -202,43 +433,170 @@ def run_platform(index, X, objectives, variables):
                                                                 REACTOR_VOLUME,
                                                                 measured_exp_yield)
     # 6. Return results
-    # get timestamp
-    timestamp = f'{ps_data_filename("PS1")[-24:-8]}'
-    # choose appropriate output format and save
+    # timestamp of the experiment (name of its data files)
+    timestamp = nmr_result.experiment
+    record_experiment(campaign, index, timestamp=timestamp)
+    return format_output(index, X, objectives, measured_exp_yield,
+                         measured_exp_throughput, cost, timestamp)
+
+
+def format_output(index, X, objectives, measured_exp_yield,
+                  measured_exp_throughput, cost, timestamp):
+    """Function to format the output of an experiment for the objectives
+    of the optimization.
+
+    :param index:
+        identifier index of the request
+    :param X: list
+        Conditions of the experiment, as requested
+    :param objectives: list
+        Objectives of the optimization
+    :param measured_exp_yield: float
+    :param measured_exp_throughput: float
+    :param cost: float
+    :param timestamp: str
+        Name of the data files of the experiment
+    :return: list
+        [index, X, objective value(s), timestamp], None if the objectives are
+        not recognised
+    """
+    # choose appropriate output format
+    output = None
     if len(objectives) == 1:  # Single objective optimization
         if 'yield' in objectives:
-            with open(FILENAME_OUTPUT_PICKLE, 'wb') as filepointer:
-                pickle.dump([index, X, measured_exp_yield, timestamp],
-                            filepointer)
+            output = [index, X, measured_exp_yield, timestamp]
         if 'throughput' in objectives:
-            with open(FILENAME_OUTPUT_PICKLE, 'wb') as filepointer:
-                pickle.dump([index, X, measured_exp_throughput, timestamp],
-                            filepointer)
+            output = [index, X, measured_exp_throughput, timestamp]
         if 'cost' in objectives:
-            with open(FILENAME_OUTPUT_PICKLE, 'wb') as filepointer:
-                pickle.dump([index, X, cost, timestamp], filepointer)
+            output = [index, X, cost, timestamp]
 
     if len(objectives) > 1:  # Multi objective optimization
         if 'yield' and 'throughput' in objectives and 'cost' not in objectives:  # yield and throughput
-            with open(FILENAME_OUTPUT_PICKLE, 'wb') as filepointer:
-                pickle.dump(
-                    [index, X, [measured_exp_yield, measured_exp_throughput],
-                     timestamp], filepointer)
+            output = [index, X, [measured_exp_yield, measured_exp_throughput],
+                      timestamp]
         if 'yield' and 'cost' in objectives and 'throughput' not in objectives:  # yield and cost
-            with open(FILENAME_OUTPUT_PICKLE, 'wb') as filepointer:
-                pickle.dump(
-                    [index, X, [measured_exp_yield, measured_exp_throughput],
-                     timestamp], filepointer)
+            output = [index, X, [measured_exp_yield, measured_exp_throughput],
+                      timestamp]
         if 'throughput' and 'cost' in objectives and 'yield' not in objectives:  # throughput and cost
-            with open(FILENAME_OUTPUT_PICKLE, 'wb') as filepointer:  #
-                pickle.dump(
-                    [index, X, [measured_exp_throughput, cost], timestamp],
-                    filepointer)
+            output = [index, X, [measured_exp_throughput, cost], timestamp]
         if 'yield' and 'throughput' and 'cost' in objectives:  # yield, throughput and cost
-            with open(FILENAME_OUTPUT_PICKLE, 'wb') as filepointer:  #
-                pickle.dump([index, X,
-                             [measured_exp_yield, measured_exp_throughput,
-                              cost], timestamp], filepointer)
+            output = [index, X,
+                      [measured_exp_yield, measured_exp_throughput, cost],
+                      timestamp]
+
+    return output
+
+
+def run_overlapped_experiments(next_request, send_output, progress=None):
+    """Function to run the experiments requested one after the other, each
+    one starting as soon as the devices it needs are free: the preparation of
+    an experiment overlaps the NMR processing and the cleaning of the
+    previous one (see experiment_execution.platform_stages).
+
+    :param next_request: function
+        Coroutine function called with busy (function telling if experiments
+        are in progress) and returning the next request (dict with 'index',
+        'X', 'objectives' and 'variables', see Platform_channel), None to stop
+    :param send_output: function
+        Called with the request and the output of its experiment (see
+        run_experiment) as soon as the yield is known
+    :param progress: function
+        Called with the request and the name of each stage when it starts
+        (optional)
+    :return: int
+        Number of experiments executed (all of the same campaign: the reactor volume of the pipeline is fixed, the
+        settings are those loaded when it starts)
+    """
+    connect_platform()
+
+    async def next_experiment(busy):
+        request = await next_request(busy)
+        if request is None:
+            return None
+        residence_time, eagle_percentage, chemical_space = \
+            create_variable_space(request['X'], request['variables'])
+        campaign = request.get('campaign')
+        record_experiment(campaign, request['index'], request['X'])
+        sample = sample_information.prepare_sample_info(chemical_space)
+        record_experiment(campaign, request['index'], sample=sample)
+        publish_inventory()
+
+        def on_yield(slug, measured_exp_yield):
+            record_experiment(campaign, request['index'],
+                              timestamp=slug.slug_id)
+            measured_exp_throughput, cost = calculate_objective_outputs(
+                chemical_space, residence_time, REACTOR_VOLUME,
+                measured_exp_yield
+            )
+            output = format_output(request['index'], request['X'],
+                                   request['objectives'], measured_exp_yield,
+                                   measured_exp_throughput, cost, slug.slug_id)
+            if output is not None:
+                send_output(request, output)
+
+        experiment = {
+            'chemical_space': chemical_space,
+            'sample': sample,
+            'residence_time': residence_time,
+            'eagle_percentage': eagle_percentage,
+            'on_yield': on_yield,
+        }
+        if progress is not None:
+            experiment['progress'] = lambda stage: progress(request, stage)
+        return experiment
+
+    slugs = loop_runner.run(overlapped_experiments(
+        RoboChem, liquid_handling, pump_C, next_experiment, REACTOR_VOLUME,
+        refill=refill_syringes, eagle=Eagle,
+        idle_refill=refill_planner.refill_during
+    ))
+    return len(slugs)
+
+
+def save_output(output):
+    """Function to save the output of an experiment for the GUI.
+
+    :param output: list
+        [index, X, objective value(s), timestamp] (nothing is saved if None)
+    :return: None
+    """
+    if output is not None:
+        atomic_pickle_dump(output, FILENAME_OUTPUT_PICKLE)
+
+
+def close_devices():
+    """Function to disconnect the devices that keep a connection open.
+    """
+    if RoboChem is None:
+        return
+    RoboChem.switch_valves.close()
+    RoboChem.mfc.close()
+    detectors.close()
+    loop_runner.close()
+
+
+def run_platform(index, X, objectives, variables):
+    """Function to take in GUI generated files with sample composition information,
+    run an experiment on the platform and save the output in a format that the GUI can feed back into BO
+
+    :param index:
+        identifier index from the pickle file generated by the GUI
+    :param X: list
+        List containing the sample concentration parameters and the residence
+        time.
+    :param objectives: str
+        string describing required objective function for bayesian optimisation which controls format of
+        output pickle file that GUI will use to calculate next point
+    :param variables:
+        variables space so sampleinfo.py can correctly determine
+        in the case that there is a mix of continuous and discrete outputs
+    :return: None
+    """
+    try:
+        output = run_experiment(index, X, objectives, variables)
+    finally:
+        close_devices()
+    save_output(output)
 
     return
 
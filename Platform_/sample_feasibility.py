@@ -0,0 +1,210 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Feasibility of the samples of reaction conditions, for many conditions at
+once (numpy), before they reach the liquid handler. The volumes of stock
+solution of a slug are those of SampleInfo.prepare_sample_info:
+- limiting reagent: SLUG_SIZE x concentration / stock concentration;
+- other reagents: SLUG_SIZE x concentration x equivalents (or loading) /
+  stock concentration;
+- solvent: the rest of the slug.
+A sample is feasible when the reagents fit in the slug, when every volume
+drawn can be pipetted (MIN_PIPETTE_VOLUME to MAX_PIPETTE_VOLUME) and when a
+vial of every chemical still holds the volume above its dead volume. On
+other conditions prepare_sample_info raises or stops the platform, once the
+experiment has started.
+
+    inventory = Inventory.from_sample_info(sample_information)
+    names, amounts = chemical_arrays(chemical_spaces)
+    feasible = sample_feasibility(names, amounts, inventory)
+
+The inventory (stock concentration and volume left of every chemical) is
+published in the campaign store by the platform (run_platform.py) and read
+by the optimizer (ML_GUI/Feasibility_constraint.py).
+
+Standard library and numpy only: imported by the GUI and by the platform
+environments.
+"""
+
+import numpy as np
+
+__all__ = ['SLUG_SIZE', 'DEAD_VOLUME', 'MIN_PIPETTE_VOLUME',
+           'MAX_PIPETTE_VOLUME', 'Inventory', 'chemical_arrays',
+           'sample_volumes', 'sample_feasibility']
+
+SLUG_SIZE = 0.65  # [mL] sample prepared by the liquid handler
+# [mL] left in a vial: prepare_sample_info moves to the next vial below it
+DEAD_VOLUME = 0.15
+# [mL] smallest volume the syringe of the liquid handler draws accurately
+MIN_PIPETTE_VOLUME = 0.002
+# [mL] largest volume drawn at once (the syringe holds the 50 μL air gap and
+# the whole slug)
+MAX_PIPETTE_VOLUME = SLUG_SIZE
+
+
+class Inventory(object):
+    """Stock solutions loaded in the liquid handler"""
+
+    def __init__(self, stocks, solvent=None):
+        """Class initialization.
+
+        :param stocks: dict
+            chemical: (concentration of the stock solution [M], largest volume
+            that can still be drawn from one of its vials [mL])
+        :param solvent: str
+            chemical filling the slug
+        """
+        self.stocks = {chemical: (float(concentration), float(volume))
+                       for chemical, (concentration, volume) in stocks.items()}
+        self.solvent = solvent
+
+    @classmethod
+    def from_sample_info(cls, sample_info):
+        """Function to read the inventory of the vials in use.
+
+        :param sample_info: SampleInfo
+            vials loaded and in use (after initial_sample_info and
+            get_sample_bottles_number)
+        :return: Inventory
+        """
+        stocks = {}
+        for j, working in enumerate(sample_info.working_sample_bottle):
+            chemical = working.split('-')[0]
+            # the vial in use, then the vials not used yet
+            volumes = [sample_info.current_sample_volume[j]]
+            for sequence in range(
+                    sample_info.working_sample_sequence[j] + 1,
+                    sample_info.sample_bottles.get(chemical, 0)):
+                vial = sample_info.sample_dict.get(f'{chemical}-{sequence}')
+                if vial is not None:
+                    volumes.append(float(vial['volume']))
+            # concentrations are given in mM
+            concentration = float(
+                sample_info.sample_dict[working]['concentration']) / 1000
+            stocks[chemical] = (concentration, max(volumes) - DEAD_VOLUME)
+        solvent = sample_info.sample_name_dict.get('Solvent', [None])[0]
+        return cls(stocks, solvent)
+
+    @classmethod
+    def from_dict(cls, inventory):
+        """Function to get the inventory from its dictionary (as_dict).
+
+        :param inventory: dict
+        :return: Inventory
+        """
+        return cls({chemical: (stock['concentration'], stock['volume'])
+                    for chemical, stock in inventory['stocks'].items()},
+                   inventory.get('solvent'))
+
+    def as_dict(self):
+        """Function to get the inventory as a dictionary (JSON).
+
+        :return: dict
+            {'stocks': {chemical: {'concentration', 'volume'}}, 'solvent'}
+        """
+        return {'stocks': {chemical: {'concentration': concentration,
+                                      'volume': volume}
+                           for chemical, (concentration, volume)
+                           in self.stocks.items()},
+                'solvent': self.solvent}
+
+    def lookup(self, names):
+        """Function to get the stock solutions of an array of chemicals.
+
+        :param names: numpy.ndarray
+            chemicals
+        :return: tuple
+            concentrations [M] and volumes left [mL], arrays of the shape of
+            names (NaN for the chemicals not loaded)
+        """
+        unique, inverse = np.unique(names, return_inverse=True)
+        table = np.array([self.stocks.get(name, (np.nan, np.nan))
+                          for name in unique]).reshape(-1, 2)
+        inverse = inverse.reshape(names.shape)
+        return table[inverse, 0], table[inverse, 1]
+
+
+def chemical_arrays(chemical_spaces):
+    """Function to turn sample compositions into arrays.
+
+    :param chemical_spaces: list
+        compositions of the samples, e.g. ['A', 0.1, 'B', 2, 'C', 0.01] (see
+        variable_space.py), all with the same number of chemicals
+    :return: tuple
+        names (object array, samples x chemicals), amounts (float array:
+        concentration of the limiting reagent, then equivalents or loadings)
+    """
+    rows = [list(chemical_space) for chemical_space in chemical_spaces]
+    names = np.array([row[0::2] for row in rows], dtype=object)
+    amounts = np.array([row[1::2] for row in rows], dtype=float)
+    return names.reshape(len(rows), -1), amounts.reshape(len(rows), -1)
+
+
+def _solvent_identity(names):
+    # as SampleInfo.solvent_identity: with NaDT, the chemicals are those of
+    # the vials named with a 1
+    rows = (names == 'NaDT').any(axis=1)
+    if rows.any():
+        names = names.copy()
+        names[rows] = names[rows] + '1'
+    return names
+
+
+def sample_volumes(names, amounts, inventory, slug_size=SLUG_SIZE):
+    """Function to compute the volumes of stock solution of samples.
+
+    :param names: numpy.ndarray
+        chemicals (samples x chemicals, see chemical_arrays)
+    :param amounts: numpy.ndarray
+        concentration of the limiting reagent [M], then equivalents or
+        loadings
+    :param inventory: Inventory
+    :param slug_size: float
+        [mL]
+    :return: tuple
+        volumes of the chemicals [mL] (NaN for chemicals not loaded), volume
+        of solvent [mL] (negative: the reagents do not fit in the slug),
+        volumes left in their vials [mL]
+    """
+    concentrations, left = inventory.lookup(_solvent_identity(names))
+    factors = np.array(amounts, dtype=float)
+    factors[:, 1:] *= factors[:, :1]  # equivalents of the limiting reagent
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volumes = slug_size * factors / concentrations
+    solvent = slug_size - volumes.sum(axis=1)
+    return volumes, solvent, left
+
+
+def sample_feasibility(names, amounts, inventory, slug_size=SLUG_SIZE,
+                       min_volume=MIN_PIPETTE_VOLUME,
+                       max_volume=MAX_PIPETTE_VOLUME):
+    """Function to check which samples the liquid handler can prepare.
+
+    :param names: numpy.ndarray
+        chemicals (samples x chemicals, see chemical_arrays)
+    :param amounts: numpy.ndarray
+        concentration of the limiting reagent [M], then equivalents or
+        loadings
+    :param inventory: Inventory
+    :param slug_size: float
+        [mL]
+    :param min_volume: float
+        [mL] smallest volume pipetted (volumes of 0 are not drawn)
+    :param max_volume: float
+        [mL] largest volume pipetted
+    :return: numpy.ndarray
+        True for the feasible samples
+    """
+    volumes, solvent, left = sample_volumes(names, amounts, inventory,
+                                            slug_size)
+    drawn = np.concatenate([volumes, solvent[:, None]], axis=1)
+    with np.errstate(invalid='ignore'):
+        # NaN (chemical not loaded) fails every comparison
+        pipetted = ((drawn == 0) | ((drawn >= min_volume)
+                                    & (drawn <= max_volume))).all(axis=1)
+        available = (volumes < left).all(axis=1)
+        if inventory.solvent in inventory.stocks:
+            available &= solvent < inventory.stocks[inventory.solvent][1]
+    return (solvent > 0) & pipetted & available
@@ -0,0 +1,137 @@
+"""
+Noël Research Group
+Van 't Hoff Institute for Molecular Sciences (HIMS)
+Universiteit van Amsterdam (UvA)
+
+Start-up report of the entry points of the platform and of the GUI: each
+module is imported in a fresh interpreter (python -X importtime), and the
+report gives the cold-start time, the packages that take the most time and the
+slowest imports.
+
+    python startup_report.py                      # run_platform, platform_worker, ML_GUI/Dragonfly_BO
+    python startup_report.py run_platform --top 20 --runs 5
+    python startup_report.py ../ML_GUI:Visualization
+
+A module is given as [folder:]module, the folder (default: Platform_) being
+the working directory and the import path of the interpreter, as for the
+scripts themselves. Set ROBOCHEM_VIRTUAL_INSTRUMENTS=1 to measure without the
+devices.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+PLATFORM_FOLDER = os.path.dirname(os.path.abspath(__file__))
+ENTRY_POINTS = ['run_platform', 'platform_worker',
+                os.path.join('..', 'ML_GUI') + ':Dragonfly_BO']
+
+
+def split_entry_point(entry_point):
+    """Function to split an entry point into its folder and module.
+
+    :param entry_point: str
+        [folder:]module, folder relative to Platform_
+    :return: tuple
+        (absolute folder, module)
+    """
+    folder, _, module = entry_point.rpartition(':')
+    return os.path.normpath(os.path.join(PLATFORM_FOLDER, folder)), module
+
+
+def parse_importtime(stderr):
+    """Function to read the output of python -X importtime.
+
+    :param stderr: str
+    :return: list
+        (module, self time [s], cumulative time [s], depth), in import order
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us) / 1e6,
+                        int(cumulative_us) / 1e6, depth))
+    return imports
+
+
+def measure(entry_point, runs=3):
+    """Function to import a module in fresh interpreters.
+
+    :param entry_point: str
+        [folder:]module
+    :param runs: int
+        Number of imports timed (the fastest one is kept)
+    :return: dict
+        'wall' (s), 'imports' (see parse_importtime), 'error' (None if the
+        import succeeded)
+    """
+    folder, module = split_entry_point(entry_point)
+    env = dict(os.environ, PYTHONPATH=folder)
+    command = [sys.executable, '-X', 'importtime', '-c', f'import {module}']
+    wall, result = None, None
+    for _ in range(max(runs, 1)):
+        start = time.perf_counter()
+        result = subprocess.run(command, cwd=folder, env=env,
+                                capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        wall = elapsed if wall is None else min(wall, elapsed)
+    error = None
+    if result.returncode != 0:
+        lines = [line for line in result.stderr.splitlines()
+                 if not line.startswith('import time:')]
+        error = lines[-1] if lines else f'exit code {result.returncode}'
+    return {'wall': wall, 'imports': parse_importtime(result.stderr),
+            'error': error}
+
+
+def report(entry_point, runs=3, top=10):
+    """Function to print the start-up report of an entry point.
+
+    :param entry_point: str
+        [folder:]module
+    :param runs: int
+    :param top: int
+        Number of packages and imports listed
+    :return: dict
+        see measure
+    """
+    measurement = measure(entry_point, runs)
+    imports = measurement['imports']
+    total = sum(self_time for _, self_time, _, _ in imports)
+    print(f'\n{entry_point}: {measurement["wall"]:.2f} s cold start, '
+          f'{total:.2f} s importing {len(imports)} modules')
+    if measurement['error'] is not None:
+        print(f'  import failed: {measurement["error"]}')
+
+    packages = {}
+    for name, self_time, _, _ in imports:
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_time
+    print('  packages (own import time):')
+    for package, self_time in sorted(packages.items(),
+                                     key=lambda item: -item[1])[:top]:
+        print(f'    {self_time * 1000:8.1f} ms  {package}')
+
+    print('  slowest imports (with what they import):')
+    slowest = sorted(imports, key=lambda item: -item[2])
+    for name, _, cumulative, depth in slowest[:top]:
+        print(f'    {cumulative * 1000:8.1f} ms  {"  " * depth}{name}')
+    return measurement
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('entry_points', nargs='*', default=ENTRY_POINTS,
+                        help='[folder:]module, folder relative to Platform_')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='imports timed per entry point (fastest kept)')
+    parser.add_argument('--top', type=int, default=10,
+                        help='packages and imports listed')
+    arguments = parser.parse_args()
+    for name in arguments.entry_points:
+        report(name, arguments.runs, arguments.top)
@@ -22,159 +22,428 @@ Do NOT short the analog wire with GND, as it will lead to constant 0 logical out
 """
 
 import asyncio
+import threading
+import time
+from collections import deque
 import pandas as pd
 import numpy as np
 import serial
-import time
 from List_connected_devices import find_port
 from Logging_organizer.Logging_Setting import setup_logger
+from Clock_organizer.Platform_clock import get_clock
+
+# Number of distance readings kept per channel (Arduino writes one every
+# ~100 ms, so the window covers the last ~2 s)
+WINDOW_SIZE = 20
+# Readings further than this many (scaled) median absolute deviations away
+# from the window median are rejected as outliers
+OUTLIER_THRESHOLD = 3.5
+# Lower bound for the median absolute deviation (raw sensor units) to avoid
+# rejecting everything when the window holds identical readings
+MIN_DEVIATION = 1.0
+# Minimum number of accepted readings before an estimate is reported
+MIN_READINGS = 5
+# Estimates without a new reading for longer than this [s] are stale
+MAX_ESTIMATE_AGE = 2.0
+# Volume spread [ul] at which the confidence of an estimate has halved
+VOLUME_TOLERANCE = 100
+# Maximum time [s] get_volume waits for fresh readings of a channel (at
+# start-up, or when its estimate is stale or not confident enough)
+STARTUP_TIMEOUT = 5.0
+# Estimates below this confidence are not used as the volume of a syringe
+MIN_CONFIDENCE = 0.5
+# A reader that lost its detector reopens the port this many times, waiting
+# RECONNECT_DELAY [s] before every attempt, then stops (get_volume then reads
+# the detector directly)
+RECONNECT_ATTEMPTS = 3
+RECONNECT_DELAY = 1.0
+
+
+class RollingDistanceWindow:
+    """Rolling window of ultrasonic distance readings with a streaming median
+    and median-absolute-deviation based outlier rejection"""
+
+    def __init__(self, size=WINDOW_SIZE, threshold=OUTLIER_THRESHOLD,
+                 clock=None):
+        """ Class initialization
+
+        :param size: integer
+            number of accepted readings kept in the window
+        :param threshold: float
+            number of scaled median absolute deviations from the median
+            above which a reading is rejected
+        :param clock: RealClock
+            clock used to date the readings (default: the clock of the
+            process)
+        """
+        self.clock = clock if clock is not None else get_clock()
+        self.size = size
+        self.threshold = threshold
+        self.readings = deque(maxlen=size)
+        # outcome (accepted/rejected) of the most recent readings
+        self.outcomes = deque(maxlen=size)
+        self.consecutive_rejections = 0
+        self.median = None
+        self.deviation = None
+        self.last_reading = None
+        self._lock = threading.Lock()
+
+    def add(self, value):
+        """ Add a reading to the window unless it is an outlier
+
+        A long run of rejected readings means that the level really changed
+        (e.g. the syringe was refilled), so the window is restarted.
+
+        :param value: float
+            raw distance reading
+        :return: bool
+            True if the reading was accepted
+        """
+        with self._lock:
+            self.last_reading = self.clock.monotonic()
+            if self._is_outlier(value):
+                self.outcomes.append(False)
+                self.consecutive_rejections += 1
+                if self.consecutive_rejections < self.size // 2:
+                    return False
+                self.readings.clear()
+
+            self.readings.append(value)
+            self.outcomes.append(True)
+            self.consecutive_rejections = 0
+            values = np.fromiter(self.readings, dtype=float)
+            self.median = float(np.median(values))
+            self.deviation = 1.4826 * float(
+                np.median(np.abs(values - self.median))
+            )
+            return True
+
+    def add_invalid(self):
+        """ Register a reading that could not be parsed (partial line)"""
+        with self._lock:
+            self.last_reading = self.clock.monotonic()
+            self.outcomes.append(False)
+
+    def _is_outlier(self, value):
+        if len(self.readings) < MIN_READINGS:
+            return False
+        deviation = max(self.deviation, MIN_DEVIATION)
+        return abs(value - self.median) > self.threshold * deviation
+
+    def snapshot(self):
+        """ Consistent view of the window statistics
+
+        :return: tuple
+            median, scaled median absolute deviation, number of readings,
+            fraction of accepted recent readings and age [s] of the last
+            reading (median is None while the window is still filling)
+        """
+        with self._lock:
+            if len(self.readings) < MIN_READINGS:
+                return None, None, len(self.readings), 0.0, None
+            acceptance = sum(self.outcomes) / len(self.outcomes)
+            age = self.clock.monotonic() - self.last_reading
+            return (self.median, self.deviation, len(self.readings),
+                    acceptance, age)
+
 
 class UltrasonicDetector:
     """Class to control Ultrasonic detector (HC-SR04 + Arduino
     UNO)"""
 
-    def __init__(self):
+    def __init__(self, streaming=True, window_size=WINDOW_SIZE, clock=None):
         """ Class initialization
 
-        :param device_name: string
-            USB port to which the Arduino is connected
-        :param sensor_id: integer
-            A single number identifying the phase sensor
-        :param log_name: string
-            name of the log file
+        :param streaming: bool
+            if True, a background reader per detector keeps a rolling window
+            of recent readings so get_volume can answer immediately
+        :param window_size: integer
+            number of readings kept in the rolling window of each detector
+        :param clock: RealClock
+            clock used for all waits (default: the clock of the process)
         """
         self.logger = setup_logger(f'ultrasonic_logger', f'ultrasonic.log')
-
-        try:
-            port = find_port('Pump_A_ultrasonic_detector')
-            self.sensor_pump_A = serial.Serial(
-                port=port,
-                baudrate=9600
+        self.clock = clock if clock is not None else get_clock()
+
+        self.sensors = {}
+        self.ports = {}
+        self.converters = {
+            'a': convert_to_volume_pump_a,
+            'b': convert_to_volume_pump_b,
+            'c': convert_to_volume_pump_c
+        }
+        for pump in ('A', 'B', 'C'):
+            try:
+                port = find_port(f'Pump_{pump}_ultrasonic_detector')
+                sensor = serial.serial_for_url(
+                    port,
+                    baudrate=9600
+                )
+                setattr(self, f'sensor_pump_{pump}', sensor)
+                self.sensors[pump.lower()] = sensor
+                self.ports[pump.lower()] = port
+                self.logger.info(f'Port: {port}')
+                self.logger.info(f'Ultrasonic detector ID: Pump {pump}')
+            except serial.SerialException as error:
+                self.logger.error(error)
+                self.logger.info(f'Connection to ultrasonic detector on Pump '
+                                 f'{pump} FAILED')
+
+        self.streaming = streaming
+        self.windows = {
+            pump: RollingDistanceWindow(size=window_size, clock=self.clock)
+            for pump in self.sensors
+        }
+        self._stop_streaming = threading.Event()
+        self._readers = {}
+        if self.streaming:
+            self.start_streaming()
+
+    def start_streaming(self):
+        """ Start one daemon thread per connected detector that continuously
+        feeds its readings into the rolling window of that detector
+        """
+        self._stop_streaming.clear()
+        for pump, sensor in self.sensors.items():
+            if pump in self._readers and self._readers[pump].is_alive():
+                continue
+            # a finite timeout lets the reader notice a stop request
+            sensor.timeout = 0.5
+            # Empty the buffer to ensure the window starts with recent values
+            sensor.reset_input_buffer()
+            reader = threading.Thread(
+                target=self._stream_readings,
+                args=(pump,),
+                daemon=True
             )
-            self.logger.info(f'Port: {port}')
-            self.logger.info(f'Ultrasonic detector ID: Pump A')
-        except serial.SerialException as error:
-            self.logger.error(error)
-            self.logger.info(f'Connection to ultrasonic detector on Pump A'
-                             f'FAILED')
+            reader.start()
+            self._readers[pump] = reader
+        self.streaming = True
+
+    def stop_streaming(self):
+        """ Stop the background readers"""
+        self._stop_streaming.set()
+        for reader in self._readers.values():
+            reader.join(timeout=1)
+        self._readers = {}
+        self.streaming = False
+
+    def _stream_readings(self, pump):
+        """ Reader loop of a single detector (runs in its own thread)
+
+        When the connection is lost, the port is reopened (see
+        RECONNECT_ATTEMPTS); if that fails the reader stops.
+
+        :param pump: string
+            which pump the detector belongs to (a, b or c)
+        """
+        window = self.windows[pump]
+        while not self._stop_streaming.is_set():
+            try:
+                line = self.sensors[pump].readline()
+            except (serial.SerialException, TypeError, AttributeError) as \
+                    error:
+                if self._stop_streaming.is_set():
+                    break
+                self.logger.error(f'Pump {pump.upper()} detector: {error}')
+                if not self._reconnect(pump):
+                    break
+                continue
+            if not line:
+                continue
+            try:
+                window.add(float(line.decode(encoding='ascii')))
+            except (ValueError, UnicodeDecodeError):
+                window.add_invalid()
 
-        try:
-            port = find_port('Pump_B_ultrasonic_detector')
-            self.sensor_pump_B = serial.Serial(
-                port=port,
-                baudrate=9600
-            )
-            self.logger.info(f'Port: {port}')
-            self.logger.info(f'Ultrasonic detector ID: Pump B')
-        except serial.SerialException as error:
-            self.logger.error(error)
-            self.logger.info(f'Connection to ultrasonic detector on Pump B'
-                             f'FAILED')
+    def _reconnect(self, pump):
+        """ Reopen the port of a detector whose connection was lost
 
+        :param pump: string
+            which pump the detector belongs to (a, b or c)
+        :return: bool
+            True if the detector is connected again
+        """
         try:
-            port = find_port('Pump_C_ultrasonic_detector')
-            self.sensor_pump_C = serial.Serial(
-                port=port,
-                baudrate=9600
-            )
-            self.logger.info(f'Port: {port}')
-            self.logger.info(f'Ultrasonic detector ID: Pump C')
-        except serial.SerialException as error:
-            self.logger.error(error)
-            self.logger.info(f'Connection to ultrasonic detector on Pump C'
-                             f'FAILED')
-
+            self.sensors[pump].close()
+        except serial.SerialException:
+            pass
+        for attempt in range(1, RECONNECT_ATTEMPTS + 1):
+            self.clock.sleep(RECONNECT_DELAY)
+            if self._stop_streaming.is_set():
+                return False
+            try:
+                self._open_port(pump)
+            except serial.SerialException as error:
+                self.logger.error(f'Pump {pump.upper()} detector: reconnection '
+                                  f'{attempt}/{RECONNECT_ATTEMPTS} FAILED '
+                                  f'({error})')
+                continue
+            self.logger.info(f'Pump {pump.upper()} detector: reconnected')
+            return True
+        self.logger.error(f'Pump {pump.upper()} detector: streaming stopped, '
+                          f'the detector is read directly')
+        return False
+
+    def _open_port(self, pump):
+        """ Open the port of a detector again (replaces its serial object)
+
+        :param pump: string
+            which pump the detector belongs to (a, b or c)
+        :return: serial.Serial
+            the new serial object of the detector
+        """
+        sensor = serial.serial_for_url(self.ports[pump], baudrate=9600,
+                                       timeout=0.5)
+        sensor.reset_input_buffer()
+        self.sensors[pump] = sensor
+        setattr(self, f'sensor_pump_{pump.upper()}', sensor)
+        return sensor
+
+    def _is_streaming(self, pump):
+        """ True if the background reader of a detector is running"""
+        reader = self._readers.get(pump)
+        return reader is not None and reader.is_alive()
+
+    def get_volume_estimate(self, pump):
+        """ Current volume estimate of the streamed readings
+
+        The confidence (0-1) decreases while the window is still filling,
+        when many recent readings were rejected as outliers and when the
+        remaining readings are spread out. Stale estimates have confidence 0.
+
+        :param pump: string
+            Which pump is being accessed A, B or C
+        :return: tuple
+            (volume [ul], confidence) or None if no estimate is available yet
+        """
+        pump = pump.lower()
+        median, deviation, n_readings, acceptance, age = \
+            self.windows[pump].snapshot()
+        if median is None:
+            return None
+        return self._to_estimate(pump, median, deviation, n_readings,
+                                 acceptance, age)
+
+    def _to_estimate(self, pump, median, deviation, n_readings, acceptance,
+                     age):
+        convert = self.converters[pump]
+        volume = convert(median)
+        spread = abs(convert(median + deviation) - volume)
+        confidence = (
+                min(n_readings / self.windows[pump].size, 1)
+                * acceptance
+                * VOLUME_TOLERANCE / (VOLUME_TOLERANCE + spread)
+        )
+        if age is not None and age > MAX_ESTIMATE_AGE:
+            confidence = 0.0
+        return round(volume, 10), round(confidence, 3)
+
+    async def get_volume(self, pump, return_confidence=False,
+                         min_confidence=MIN_CONFIDENCE):
+        """ Volume in the syringe of a pump from the ultrasonic distance
+
+        When streaming, the estimate of the rolling window is returned
+        immediately. Right after start-up, or when the estimate is stale or
+        below min_confidence, it waits for fresh readings (STARTUP_TIMEOUT).
+        Without streaming (or once the reader of the detector has stopped),
+        20 readings are read and their median is used.
 
-    async def get_volume(self, pump):
-        """ Conversion of the analog voltage from the phase sensor to the
-        corresponding phase (gas < 0.5, liquid > 0.5)
         :param: pump
             Which pump is being accessed A, B or C
-        :return: int
-            the detected phase
+        :param return_confidence: bool
+            if True, return (volume, confidence) instead of only the volume
+        :param min_confidence: float
+            confidence (0-1) below which the volume is not returned (0: the
+            caller checks the confidence)
+        :return: float or tuple
+            the volume in ul (and the confidence of the estimate, 0-1), None
+            with confidence 0 if the detector gave no valid readings
+        :raises ConnectionError: if the port of the detector cannot be opened
         """
-        if pump.lower() in 'a':
-            # Empty the buffer to ensure reading of recent values
-            # Arduino writing frequency >> Python reading frequency
-            self.sensor_pump_A.flushInput()
-
-            # Second attempt to do the calculation if the first one fails
-            # (likely buffer issues)
-            try:
-                # Read 5 values from the buffer (5 x ~100 ms)
-                values = [
-                        float(self.sensor_pump_A.readline().decode(encoding='ascii'))
-                        for _ in range(20)
-                ]
-                value = np.median(values)
-                volume = convert_to_volume_pump_a(value)
-            except ValueError:
-                # Read 5 values from the buffer (5 x ~100 ms)
-                values = [
-                    float(self.sensor_pump_A.readline().decode(encoding='ascii'))
-                    for _ in range(20)
-                ]
-                value = np.median(values)
-                volume = convert_to_volume_pump_a(value)
-
-        elif pump.lower() in 'b':
-            # Empty the buffer to ensure reading of recent values
-            # Arduino writing frequency >> Python reading frequency
-            self.sensor_pump_B.flushInput()
-
-            # Second attempt to do the calculation if the first one fails
-            # (likely buffer issues)
-            try:
-                # Read 5 values from the buffer (5 x ~100 ms)
-                values = [
-                    float(
-                        self.sensor_pump_B.readline().decode(encoding='ascii'))
-                    for _ in range(20)
-                ]
-                value = np.median(values)
-                volume = convert_to_volume_pump_b(value)
-            except ValueError:
-                # Read 5 values from the buffer (5 x ~100 ms)
-                values = [
-                    float(
-                        self.sensor_pump_B.readline().decode(encoding='ascii'))
-                    for _ in range(20)
-                ]
-                value = np.median(values)
-                volume = convert_to_volume_pump_b(value)
-
-        elif pump.lower() in 'c':
+        pump = pump.lower()
+        estimate = None
+        if self.streaming and self._is_streaming(pump):
+            estimate = self.get_volume_estimate(pump)
+            waited = 0
+            while (estimate is None or estimate[1] < min_confidence) and \
+                    waited < STARTUP_TIMEOUT and self._is_streaming(pump):
+                await self.clock.asleep(0.1)
+                waited += 0.1
+                estimate = self.get_volume_estimate(pump)
+            if estimate is None and self._is_streaming(pump):
+                self.logger.error(f'No readings from ultrasonic detector on '
+                                  f'Pump {pump.upper()}')
+                raise TimeoutError(f'No readings from ultrasonic detector on '
+                                   f'Pump {pump.upper()}')
+        if estimate is None or (not self._is_streaming(pump)
+                                and estimate[1] < min_confidence):
+            estimate = await asyncio.to_thread(self._read_volume, pump)
+
+        volume, confidence = estimate
+        self.logger.info(f'Pump {pump.upper()}: {volume} ul '
+                         f'(confidence {confidence})')
+        if confidence < min_confidence:
+            self.logger.error(f'Pump {pump.upper()}: detector confidence '
+                              f'{confidence} below {min_confidence}')
+            raise ValueError(f'Volume of Pump {pump.upper()} unknown: '
+                             f'ultrasonic detector confidence {confidence} '
+                             f'below {min_confidence}')
+        if return_confidence:
+            return volume, confidence
+        return volume
+
+    def _read_volume(self, pump):
+        """ Blocking read of 20 values and conversion of their median
+
+        The port is opened again if it was closed (e.g. after the reader of
+        the detector lost it). Empty or partial lines count as rejected
+        readings.
+
+        :param pump: string
+            Which pump is being accessed a, b or c
+        :return: tuple
+            (volume [ul], confidence), (None, 0.0) if fewer than
+            MIN_READINGS values could be read
+        """
+        try:
+            sensor = self.sensors[pump]
+            if not sensor.is_open:
+                sensor = self._open_port(pump)
             # Empty the buffer to ensure reading of recent values
             # Arduino writing frequency >> Python reading frequency
-            self.sensor_pump_C.flushInput()
+            sensor.reset_input_buffer()
 
             # Second attempt to do the calculation if the first one fails
             # (likely buffer issues)
-            try:
-                # Read 5 values from the buffer (5 x ~100 ms)
-                values = [
-                    float(
-                        self.sensor_pump_C.readline().decode(encoding='ascii'))
-                    for _ in range(20)
-                ]
-                value = np.median(values)
-                volume = convert_to_volume_pump_c(value)
-            except ValueError:
-                # Read 5 values from the buffer (5 x ~100 ms)
-                values = [
-                    float(
-                        self.sensor_pump_C.readline().decode(encoding='ascii'))
-                    for _ in range(20)
-                ]
-                value = np.median(values)
-                volume = convert_to_volume_pump_c(value)
-
-        return round(volume, 10)  # round the average value
+            for attempt in range(2):
+                window = RollingDistanceWindow(size=20, clock=self.clock)
+                # Read 20 values from the buffer (20 x ~100 ms)
+                for _ in range(20):
+                    line = sensor.readline()
+                    try:
+                        window.add(float(line.decode(encoding='ascii')))
+                    except (ValueError, UnicodeDecodeError):
+                        window.add_invalid()
+                median, deviation, n_readings, acceptance, _ = \
+                    window.snapshot()
+                if median is not None:
+                    break
+        except serial.SerialException as error:
+            self.logger.error(f'Pump {pump.upper()} detector: {error}')
+            raise ConnectionError(f'Ultrasonic detector on Pump '
+                                  f'{pump.upper()} not connected: {error}')
+        if median is None:
+            self.logger.error(f'Pump {pump.upper()} detector: only '
+                              f'{n_readings} valid readings')
+            return None, 0.0
+        return self._to_estimate(pump, median, deviation, n_readings,
+                                 acceptance, None)
 
     def close(self):
-        self.sensor_pump_A.close()
-        self.sensor_pump_B.close()
-        self.sensor_pump_C.close()
+        self.stop_streaming()
+        for sensor in self.sensors.values():
+            sensor.close()
 
 async def connect_to_board(port, sensor_id, log_name):
     """ Function to connect to a phase sensor board and start exporting data.
@@ -248,3 +517,4 @@ if __name__ == '__main__':
         vol_c = asyncio.run(detectors.get_volume(pump='C'))
         print(f'Round: {i}  Pump A: {vol_a} ul  Pump B: {vol_b} ul  Pump C: {vol_c} ul')
         i += 1
+        time.sleep(0.5)